@@ -1,20 +1,149 @@
-from google.cloud import bigquery
-from google.oauth2 import service_account
+"""
+Shared BigQuery access for the API.
 
-# 🔹 FULL path to your service account file
-SERVICE_ACCOUNT_FILE = r"C:\Users\navee\OneDrive\Desktop\Revature_Project\config\healthcareproject-488102-e1bec26d4ec5.json"
+Nothing Google is imported or authenticated when the app starts: the
+client is created on first use and reused by every request, with an HTTP
+connection pool sized for the API's worker threads. The app's lifespan
+closes it on shutdown. Routes answered from the in-memory snapshot
+(api/core/snapshot.py) never touch it. Every query's latency and job
+statistics are recorded in api/core/metrics.py.
+"""
 
-# 🔹 Create credentials
-credentials = service_account.Credentials.from_service_account_file(
-    SERVICE_ACCOUNT_FILE,
-)
+import os
+import threading
+import time
+
+from api.core.metrics import CACHE_REQUESTS, record_query
 
-# 🔹 Create BigQuery client
-client = bigquery.Client(
-    credentials=credentials,
-    project=credentials.project_id,
+# Service-account key; when the file is absent, application default credentials are used
+SERVICE_ACCOUNT_FILE = os.getenv(
+    "BIGQUERY_SERVICE_ACCOUNT_FILE",
+    r"C:\Users\navee\OneDrive\Desktop\Revature_Project\config\healthcareproject-488102-e1bec26d4ec5.json",
 )
+BIGQUERY_PROJECT = os.getenv("BIGQUERY_PROJECT", "healthcareproject-488102")
+# Connections kept open to the BigQuery API; requests' default of 10 is below
+# the 40 threads FastAPI runs sync routes on
+BIGQUERY_POOL_SIZE = int(os.getenv("BIGQUERY_POOL_SIZE", "40"))
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The shared BigQuery client, created on first call."""
+    global _client
+    client = _client
+    if client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _create_client()
+            client = _client
+    return client
+
+
+def close_client():
+    """Close the shared client (if one was created) and its pooled connections."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def _create_client():
+    from google.cloud import bigquery
+    from requests.adapters import HTTPAdapter
+
+    if os.path.exists(SERVICE_ACCOUNT_FILE):
+        from google.oauth2 import service_account
+
+        credentials = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE)
+        client = bigquery.Client(credentials=credentials, project=credentials.project_id)
+    else:
+        client = bigquery.Client(project=BIGQUERY_PROJECT)
+    adapter = HTTPAdapter(pool_connections=BIGQUERY_POOL_SIZE, pool_maxsize=BIGQUERY_POOL_SIZE)
+    client._http.mount("https://", adapter)
+    print(f"✓ BigQuery client ready ({client.project}, pool of {BIGQUERY_POOL_SIZE})")
+    return client
+
+
+def run_query(query: str, params: list = None):
+    """
+    Run a query and return rows as dicts.
+
+    params: optional list of (name, type, value) tuples bound as @name,
+            e.g. [("start_year", "INT64", 2018)]
+    """
+    start = time.perf_counter()
+    query_job = None
+    try:
+        query_job = get_client().query(query, job_config=_job_config(params))
+        rows = [dict(row) for row in query_job.result()]
+    except Exception as e:
+        record_query(query, params, time.perf_counter() - start, query_job, error=e)
+        raise
+    record_query(query, params, time.perf_counter() - start, query_job, len(rows))
+    return rows
+
+
+def run_query_arrow(query: str, params: list = None):
+    """Run a query and return the result as a typed pyarrow.Table."""
+    start = time.perf_counter()
+    query_job = None
+    try:
+        query_job = get_client().query(query, job_config=_job_config(params))
+        table = query_job.result().to_arrow(create_bqstorage_client=False)
+    except Exception as e:
+        record_query(query, params, time.perf_counter() - start, query_job, error=e)
+        raise
+    record_query(query, params, time.perf_counter() - start, query_job, table.num_rows)
+    return table
+
+
+def _job_config(params: list = None):
+    if not params:
+        return None
+    from google.cloud import bigquery
+
+    return bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter(name, type_, value)
+                          for name, type_, value in params]
+    )
+
+
+# -------------------- Warehouse version --------------------
+# The max last_modified_time across the dataset changes whenever the ETL
+# reloads a table, so it doubles as a cheap version stamp for caching.
+VERSION_QUERY = """
+SELECT CAST(MAX(last_modified_time) AS STRING) AS version
+FROM `healthcareproject-488102.healthcare.__TABLES__`
+"""
+VERSION_TTL_SECONDS = 30
+
+_version_lock = threading.Lock()
+_version_cache = {"value": None, "error": None, "fetched_at": None}
+
 
-def run_query(query: str):
-    query_job = client.query(query)
-    return [dict(row) for row in query_job.result()]
\ No newline at end of file
+def get_warehouse_version():
+    """
+    Return the current warehouse version, re-checked at most every VERSION_TTL_SECONDS.
+    A failed lookup is cached for the same time, so an unreachable warehouse
+    costs one attempt (and one log line) per TTL rather than one per request.
+    """
+    with _version_lock:
+        now = time.monotonic()
+        fetched_at = _version_cache["fetched_at"]
+        if fetched_at is None or now - fetched_at > VERSION_TTL_SECONDS:
+            CACHE_REQUESTS.inc("warehouse_version", "miss")
+            try:
+                rows = run_query(VERSION_QUERY)
+            except Exception as e:
+                print("⚠ Warehouse version lookup failed:", e)
+                _version_cache.update(value=None, error=e, fetched_at=now)
+                raise
+            _version_cache.update(value=rows[0]["version"] if rows else None, error=None, fetched_at=now)
+        else:
+            CACHE_REQUESTS.inc("warehouse_version", "hit")
+            if _version_cache["error"] is not None:
+                raise _version_cache["error"]
+        return _version_cache["value"]
@@ -0,0 +1,287 @@
+"""
+Cohort queries over the snapshot's patient index (etl/cohort_index.py).
+
+Every (field, value) of the index is a set of patient ids, held as a
+Roaring-style bitmap: ids are split on their high 16 bits into chunks, and
+each chunk is stored in whichever container is smaller for it:
+
+    array container   sorted uint16 low bits, up to ARRAY_MAX ids
+    bitset container  1024 uint64 words (65536 bits), for denser chunks
+
+AND / OR / AND NOT work chunk by chunk on NumPy arrays, so a cohort over a
+million patients is a handful of small vectorized operations. Bitmaps are
+built from the index the first time a value is used and kept for the
+lifetime of the snapshot version.
+
+Cohorts are written as expressions over field:value terms:
+
+    condition:44054006 AND encounter_class_year:inpatient:2019
+    (procedure:430193006 OR procedure:76601001) AND NOT gender:F
+
+AND binds tighter than OR; a value with spaces is quoted (field:"a b").
+Breakdowns count the cohort within every value of a field in one pass over
+that field's id lists.
+"""
+
+import re
+import threading
+
+import numpy as np
+import pyarrow as pa
+
+CHUNK_BITS = 16
+ARRAY_MAX = 4096
+
+_TOKEN = re.compile(r'\s*(\(|\)|[A-Za-z_]+:"[^"]*"|[^\s()]+)')
+
+
+def _words(container: np.ndarray) -> np.ndarray:
+    """A container as a bitset."""
+    if container.dtype == np.uint64:
+        return container
+    bits = np.zeros(1 << CHUNK_BITS, dtype=bool)
+    bits[container] = True
+    return np.packbits(bits, bitorder="little").view(np.uint64)
+
+
+def _compact(words: np.ndarray) -> np.ndarray:
+    """A bitset as the smaller container (None when empty)."""
+    count = int(np.bitwise_count(words).sum())
+    if count == 0:
+        return None
+    if count > ARRAY_MAX:
+        return words
+    return np.flatnonzero(np.unpackbits(words.view(np.uint8), bitorder="little")).astype(np.uint16)
+
+
+def _contains(container: np.ndarray, low: np.ndarray) -> np.ndarray:
+    """Which of the sorted low bits are in the container."""
+    if container.dtype == np.uint16:
+        at = np.minimum(np.searchsorted(container, low), len(container) - 1)
+        return container[at] == low
+    return (container[low >> 6] >> (low & 63).astype(np.uint64)) & np.uint64(1) == 1
+
+
+def _and(a: np.ndarray, b: np.ndarray):
+    if a.dtype == np.uint16 and b.dtype == np.uint16:
+        small, large = (a, b) if len(a) <= len(b) else (b, a)
+        out = small[_contains(large, small)]
+    elif a.dtype == np.uint16:
+        out = a[_contains(b, a)]
+    elif b.dtype == np.uint16:
+        out = b[_contains(a, b)]
+    else:
+        return _compact(a & b)
+    return out if len(out) else None
+
+
+def _or(a: np.ndarray, b: np.ndarray):
+    if a.dtype == np.uint16 and b.dtype == np.uint16 and len(a) + len(b) <= ARRAY_MAX:
+        return np.union1d(a, b)
+    return _compact(_words(a) | _words(b))
+
+
+def _and_not(a: np.ndarray, b: np.ndarray):
+    if a.dtype == np.uint16:
+        out = a[~_contains(b, a)]
+        return out if len(out) else None
+    return _compact(a & ~_words(b))
+
+
+class Bitmap:
+    """A set of patient ids: chunk key (high 16 bits) → container of low 16 bits."""
+
+    __slots__ = ("containers",)
+
+    def __init__(self, containers: dict = None):
+        self.containers = containers or {}
+
+    @classmethod
+    def from_sorted(cls, ids: np.ndarray) -> "Bitmap":
+        ids = np.asarray(ids, dtype=np.uint32)
+        high = ids >> CHUNK_BITS
+        bounds = np.flatnonzero(np.r_[True, high[1:] != high[:-1], True]) if len(ids) else [0]
+        containers = {}
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            low = (ids[start:stop] & 0xFFFF).astype(np.uint16)
+            containers[int(high[start])] = low if len(low) <= ARRAY_MAX else _words(low)
+        return cls(containers)
+
+    @classmethod
+    def full(cls, n: int) -> "Bitmap":
+        return cls.from_sorted(np.arange(n, dtype=np.uint32))
+
+    def __len__(self):
+        return sum(len(c) if c.dtype == np.uint16 else int(np.bitwise_count(c).sum())
+                   for c in self.containers.values())
+
+    def __and__(self, other: "Bitmap") -> "Bitmap":
+        out = {}
+        for key in self.containers.keys() & other.containers.keys():
+            container = _and(self.containers[key], other.containers[key])
+            if container is not None:
+                out[key] = container
+        return Bitmap(out)
+
+    def __or__(self, other: "Bitmap") -> "Bitmap":
+        out = dict(self.containers)
+        for key, container in other.containers.items():
+            out[key] = _or(out[key], container) if key in out else container
+        return Bitmap(out)
+
+    def __sub__(self, other: "Bitmap") -> "Bitmap":
+        out = {}
+        for key, container in self.containers.items():
+            if key in other.containers:
+                container = _and_not(container, other.containers[key])
+            if container is not None:
+                out[key] = container
+        return Bitmap(out)
+
+    def mask(self, n: int) -> np.ndarray:
+        """The set as a bool array over ids 0..n-1."""
+        chunks = (n + (1 << CHUNK_BITS) - 1) >> CHUNK_BITS
+        bits = np.zeros(chunks << CHUNK_BITS, dtype=bool)
+        for key, container in self.containers.items():
+            base = key << CHUNK_BITS
+            if container.dtype == np.uint16:
+                bits[base + container.astype(np.int64)] = True
+            else:
+                bits[base:base + (1 << CHUNK_BITS)] = np.unpackbits(container.view(np.uint8), bitorder="little")
+        return bits[:n]
+
+
+# ---- expressions ----
+
+def parse(expression: str):
+    """
+    Expression → tree of ("term", field, value), ("not", x), ("and", x, y), ("or", x, y).
+    Raises ValueError on a malformed expression.
+    """
+    tokens = _TOKEN.findall(expression)
+    position = 0
+
+    def peek():
+        return tokens[position].upper() if position < len(tokens) else None
+
+    def take():
+        nonlocal position
+        position += 1
+        return tokens[position - 1]
+
+    def either():
+        node = both()
+        while peek() == "OR":
+            take()
+            node = ("or", node, both())
+        return node
+
+    def both():
+        node = negated()
+        while peek() == "AND":
+            take()
+            node = ("and", node, negated())
+        return node
+
+    def negated():
+        if peek() == "NOT":
+            take()
+            return ("not", negated())
+        if peek() == "(":
+            take()
+            node = either()
+            if peek() != ")":
+                raise ValueError("Unbalanced parentheses in cohort expression")
+            take()
+            return node
+        if peek() is None or peek() in ("AND", "OR", ")"):
+            raise ValueError(f"Expected field:value in cohort expression {expression!r}")
+        field, sep, value = take().partition(":")
+        if not sep or not value:
+            raise ValueError(f"Expected field:value, got {field!r}")
+        return ("term", field, value.strip('"'))
+
+    tree = either()
+    if position != len(tokens):
+        raise ValueError(f"Unexpected {tokens[position]!r} in cohort expression")
+    return tree
+
+
+def terms(tree) -> list:
+    """The (field, value) terms of an expression tree."""
+    if tree[0] == "term":
+        return [tree[1:]]
+    return [term for child in tree[1:] for term in terms(child)]
+
+
+# ---- index ----
+
+class CohortIndex:
+    """The cohort tables of one snapshot version, with bitmaps built on first use."""
+
+    def __init__(self, patients: pa.Table, index: pa.Table):
+        self.patient_keys = patients.column("patient_key")
+        fields = index.column("field").to_pylist()
+        values = index.column("value").to_pylist()
+        self.rows = {(f, v): i for i, (f, v) in enumerate(zip(fields, values))}
+        self.fields = {}
+        for i, field in enumerate(fields):
+            first, last = self.fields.get(field, (i, i))
+            self.fields[field] = (first, i + 1)
+        postings = index.column("patients").combine_chunks()
+        self.values = index.column("value")
+        self.offsets = postings.offsets.to_numpy()
+        self.ids = postings.values.to_numpy()
+        self._bitmaps = {}
+        self.everyone = Bitmap.full(len(self))
+
+    def __len__(self):
+        return len(self.patient_keys)
+
+    def bitmap(self, field: str, value: str) -> Bitmap:
+        """Patients with field = value (none for a value or field the index does not have)."""
+        row = self.rows.get((field, value))
+        if row is None:
+            return Bitmap()
+        bitmap = self._bitmaps.get(row)
+        if bitmap is None:
+            bitmap = self._bitmaps[row] = Bitmap.from_sorted(self.ids[self.offsets[row]:self.offsets[row + 1]])
+        return bitmap
+
+    def evaluate(self, tree) -> Bitmap:
+        kind = tree[0]
+        if kind == "term":
+            return self.bitmap(tree[1], tree[2])
+        if kind == "not":
+            return self.everyone - self.evaluate(tree[1])
+        left, right = self.evaluate(tree[1]), self.evaluate(tree[2])
+        return left & right if kind == "and" else left | right
+
+    def breakdown(self, cohort: Bitmap, field: str) -> tuple:
+        """(values, patients of the cohort with each value) over every value of a field."""
+        first, last = self.fields[field]
+        start, stop = self.offsets[first], self.offsets[last]
+        members = cohort.mask(len(self))[self.ids[start:stop]]
+        bounds = self.offsets[first:last] - start
+        # every indexed value has at least one patient, so no range is empty
+        counts = np.add.reduceat(members, bounds, dtype=np.int64) if stop > start else np.zeros(0, dtype=np.int64)
+        return self.values.slice(first, last - first), counts
+
+
+_lock = threading.Lock()
+_cached = (None, None)   # (snapshot version, index)
+
+
+def cohort_index(snapshot):
+    """The cohort index of a snapshot, built on first use; None if it was published without one."""
+    global _cached
+    version, index = _cached
+    if version == snapshot.version:
+        return index
+    if "cohort_index" not in snapshot:
+        return None
+    with _lock:
+        if _cached[0] != snapshot.version:
+            _cached = (snapshot.version, CohortIndex(snapshot.table("cohort_patients"),
+                                                     snapshot.table("cohort_index")))
+        return _cached[1]
@@ -0,0 +1,57 @@
+"""
+Conditional GET support for the analytics API.
+
+Every /api response is a pure function of the warehouse contents and the
+request URL, so the ETag is derived from (warehouse version, path, query).
+Routes answered from the in-memory snapshot depend on its version too, so
+that is folded into the key as well. That lets a matching If-None-Match be
+answered with 304 *before* the route runs, skipping the BigQuery round-trip
+entirely.
+"""
+
+import hashlib
+
+from fastapi import Request, Response
+from starlette.concurrency import run_in_threadpool
+
+from api.core.bigquery_client import get_warehouse_version
+from api.core.metrics import CACHE_REQUESTS
+from api.core.snapshot import snapshot_version
+
+# Served from local stores rather than the warehouse, so the warehouse
+# version says nothing about their freshness
+LOCAL_PREFIXES = ("/api/patients/",)
+
+
+def compute_etag(version: str, request: Request) -> str:
+    # Arrow and JSON bodies for the same URL are different representations
+    key = f"{version}|{request.headers.get('accept', '')}|{request.url.path}?{request.url.query}"
+    return 'W/"' + hashlib.sha1(key.encode("utf-8")).hexdigest()[:24] + '"'
+
+
+async def etag_middleware(request: Request, call_next):
+    path = request.url.path
+    if request.method != "GET" or not path.startswith("/api/") or path.startswith(LOCAL_PREFIXES):
+        return await call_next(request)
+
+    try:
+        version = await run_in_threadpool(get_warehouse_version)
+    except Exception:
+        version = None   # logged by get_warehouse_version() when the lookup ran, not on every request
+
+    version = "|".join(v for v in (version, snapshot_version()) if v)
+    if not version:
+        return await call_next(request)
+
+    etag = compute_etag(version, request)
+    if etag in request.headers.get("if-none-match", ""):
+        CACHE_REQUESTS.inc("etag", "hit")
+        return Response(status_code=304, headers={"ETag": etag})
+    CACHE_REQUESTS.inc("etag", "miss")
+
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["Vary"] = "Accept"
+    return response
@@ -0,0 +1,107 @@
+"""
+In-process point reads of the patient feature store (etl/features.py).
+
+The current generation's feature file is loaded once into NumPy columns,
+sorted by patient key; a lookup is a binary search plus one row read, and
+the most recently requested patients are served from an LRU cache. When the
+ETL publishes a new generation (its manifest changes), the next lookup
+loads it and swaps it in; readers of the old generation are unaffected.
+"""
+
+import json
+import os
+import threading
+from datetime import timezone
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+FEATURE_STORE_DIR = Path(os.getenv("FEATURE_STORE_DIR", BASE_DIR / "etl" / "data" / "features"))
+FEATURE_CACHE_SIZE = int(os.getenv("FEATURE_CACHE_SIZE", "65536"))
+
+MANIFEST = "_manifest.json"
+
+
+class FeatureGeneration:
+    """One published generation of the feature table, held as sorted NumPy columns."""
+
+    def __init__(self, generation: int, table: pa.Table, manifest_mtime: int):
+        self.generation = generation
+        self.manifest_mtime = manifest_mtime
+        self.keys = table.column("patient_key").to_numpy(zero_copy_only=False)
+        self.columns = {}
+        for name in table.column_names:
+            if name == "patient_key":
+                continue
+            column = table.column(name)
+            if pa.types.is_timestamp(column.type):
+                # naive datetime64[us] (UTC); .item() turns it into a datetime
+                column = column.cast(pa.timestamp("us")).to_numpy(zero_copy_only=False).astype("datetime64[us]")
+            else:
+                column = column.to_numpy(zero_copy_only=False)
+            self.columns[name] = column
+        self.lookup = lru_cache(maxsize=FEATURE_CACHE_SIZE)(self._lookup)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.keys.nbytes + sum(values.nbytes for values in self.columns.values()))
+
+    def _lookup(self, patient_key: str):
+        i = int(np.searchsorted(self.keys, patient_key))
+        if i == len(self.keys) or self.keys[i] != patient_key:
+            return None
+        row = {"patient_key": patient_key}
+        for name, values in self.columns.items():
+            value = values[i]
+            if values.dtype.kind == "M":
+                row[name] = None if np.isnat(value) else value.item().replace(tzinfo=timezone.utc)
+            else:
+                row[name] = value.item()
+        return row
+
+
+_lock = threading.Lock()
+_current = None
+
+
+def feature_generation():
+    """The newest published generation (None until the ETL has built the store)."""
+    global _current
+    try:
+        mtime = (FEATURE_STORE_DIR / MANIFEST).stat().st_mtime_ns
+    except FileNotFoundError:
+        return _current
+    current = _current
+    if current is not None and current.manifest_mtime == mtime:
+        return current
+    with _lock:
+        if _current is None or _current.manifest_mtime != mtime:
+            _current = _load(mtime)
+        return _current
+
+
+def get_patient_features(patient_key: str):
+    """Feature row of one patient as a dict, or None if the patient (or the store) is unknown."""
+    generation = feature_generation()
+    return generation.lookup(patient_key) if generation is not None else None
+
+
+def cache_info():
+    """LRU statistics of the loaded generation's lookups (None before the first lookup)."""
+    current = _current
+    return current.lookup.cache_info() if current is not None else None
+
+
+def _load(mtime: int) -> FeatureGeneration:
+    import pyarrow.parquet as pq
+
+    manifest = json.loads((FEATURE_STORE_DIR / MANIFEST).read_text())
+    table = pq.read_table(FEATURE_STORE_DIR / manifest["features"])
+    print(f"✓ patient features generation {manifest['generation']}: {table.num_rows} patients")
+    return FeatureGeneration(manifest["generation"], table, mtime)
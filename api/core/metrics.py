@@ -0,0 +1,316 @@
+"""
+Request, backend and cache metrics for the API, in the Prometheus text format.
+
+Metrics live in process memory and are rendered at /metrics:
+
+    api_requests_total / api_request_duration_seconds / api_response_size_bytes
+        per route template (/api/providers/{id}/neighbors, not the raw path),
+        method and status; the outermost middleware times everything,
+        ETag 304s included
+    api_requests_by_backend_total
+        per route: answered in process ("local": snapshot, feature store) or
+        with BigQuery queries; their ratio is the snapshot hit rate
+    api_bigquery_*
+        query latency, rows returned, bytes processed / billed, slot time and
+        BigQuery result-cache hits, from the job statistics of every query
+    api_cache_requests_total
+        hit / miss of the ETag check (hit = 304) and the warehouse version cache
+    api_feature_cache_*, api_snapshot_*
+        read from their owners when /metrics is scraped
+
+Queries slower than API_SLOW_QUERY_SECONDS (default 1) are also written
+to the slow-query log: one JSON line with the SQL, parameters, duration,
+bytes and slot time, appended to API_SLOW_QUERY_LOG (default
+api/logs/slow_queries.jsonl), and the last SLOW_QUERY_KEEP are served at
+/metrics/slow-queries.
+
+Recording is a lock, a few dict updates and a bisect per event; nothing
+is aggregated or formatted until a scrape.
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+
+from starlette.routing import Match
+
+from api.core.features import cache_info
+from api.core.snapshot import current_snapshot
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+SLOW_QUERY_SECONDS = float(os.getenv("API_SLOW_QUERY_SECONDS", "1"))
+SLOW_QUERY_LOG = Path(os.getenv("API_SLOW_QUERY_LOG", BASE_DIR / "logs" / "slow_queries.jsonl"))
+SLOW_QUERY_KEEP = 100
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+ROW_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000)
+
+_lock = threading.Lock()
+_registry = []
+_slow_queries = deque(maxlen=SLOW_QUERY_KEEP)
+_slow_log_lock = threading.Lock()
+
+# per-request query tally; a dict, so the worker thread of a sync route updates the request's own
+_request = ContextVar("api_request_metrics", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """A monotonically increasing value per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.values = {}
+        _registry.append(self)
+
+    def inc(self, *labels, amount: float = 1):
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        with _lock:
+            values = list(self.values.items())
+        return [(self.name, _labels(self.labels, labels), value) for labels, value in sorted(values)]
+
+
+class Histogram:
+    """Bucketed observations per label combination (cumulative buckets, sum and count on render)."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}   # labels → [count per bucket..., count above the last, sum]
+        _registry.append(self)
+
+    def observe(self, value: float, *labels):
+        i = bisect_left(self.buckets, value)
+        with _lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def samples(self):
+        with _lock:
+            series = [(labels, list(counts)) for labels, counts in self.series.items()]
+        out = []
+        for labels, counts in sorted(series):
+            total = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts[:-1]):
+                total += count
+                le = 'le="' + (bound if isinstance(bound, str) else _number(bound)) + '"'
+                out.append((f"{self.name}_bucket", _labels(self.labels, labels, le), total))
+            out.append((f"{self.name}_sum", _labels(self.labels, labels), counts[-1]))
+            out.append((f"{self.name}_count", _labels(self.labels, labels), total))
+        return out
+
+
+class Collected:
+    """Values owned elsewhere, read at scrape time: collect() → {label values: value}."""
+
+    def __init__(self, name: str, help: str, kind: str, collect, labels: tuple = ()):
+        self.name, self.help, self.kind, self.labels = name, help, kind, tuple(labels)
+        self.collect = collect
+        _registry.append(self)
+
+    def samples(self):
+        try:
+            values = self.collect() or {}
+        except Exception as e:   # a scrape never fails because one source did
+            print("Metrics collection failed:", self.name, e)
+            return []
+        return [(self.name, _labels(self.labels, labels), value) for labels, value in sorted(values.items())]
+
+
+REQUESTS = Counter("api_requests_total", "HTTP requests", ("route", "method", "status"))
+REQUEST_SECONDS = Histogram("api_request_duration_seconds", "Request latency", ("route", "method"))
+RESPONSE_BYTES = Histogram("api_response_size_bytes", "Response body size", ("route",), SIZE_BUCKETS)
+BACKEND_REQUESTS = Counter("api_requests_by_backend_total",
+                           "Requests answered in process (local) or with BigQuery queries", ("route", "backend"))
+CACHE_REQUESTS = Counter("api_cache_requests_total", "Cache lookups", ("cache", "result"))
+
+BQ_QUERIES = Counter("api_bigquery_queries_total", "BigQuery queries", ("route", "status"))
+BQ_SECONDS = Histogram("api_bigquery_query_duration_seconds", "BigQuery query latency, submit to last row",
+                       ("route",))
+BQ_ROWS = Histogram("api_bigquery_rows_returned", "Rows returned per BigQuery query", ("route",), ROW_BUCKETS)
+BQ_BYTES_PROCESSED = Counter("api_bigquery_bytes_processed_total", "Bytes processed by BigQuery queries", ("route",))
+BQ_BYTES_BILLED = Counter("api_bigquery_bytes_billed_total", "Bytes billed for BigQuery queries", ("route",))
+BQ_SLOT_MS = Counter("api_bigquery_slot_milliseconds_total", "Slot time of BigQuery queries", ("route",))
+BQ_CACHE_HITS = Counter("api_bigquery_cache_hits_total", "BigQuery queries answered from its result cache",
+                        ("route",))
+SLOW_QUERIES = Counter("api_slow_queries_total", "Queries slower than API_SLOW_QUERY_SECONDS", ("route",))
+
+
+def _feature_cache() -> dict:
+    info = cache_info()
+    return {("hit",): info.hits, ("miss",): info.misses} if info is not None else {}
+
+
+def _snapshot(values) -> dict:
+    snapshot = current_snapshot()
+    return values(snapshot) if snapshot is not None else {}
+
+
+Collected("api_feature_cache_lookups_total", "Patient feature lookups of the loaded generation, by LRU result",
+          "counter", _feature_cache, ("result",))
+Collected("api_snapshot_info", "Live snapshot version", "gauge",
+          lambda: _snapshot(lambda s: {(s.version,): 1}), ("version",))
+Collected("api_snapshot_memory_bytes", "Memory held by the live snapshot", "gauge",
+          lambda: _snapshot(lambda s: {(): s.nbytes}))
+Collected("api_snapshot_rows", "Rows per live snapshot table", "gauge",
+          lambda: _snapshot(lambda s: {(name,): t.num_rows for name, t in s.tables.items()}), ("table",))
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        samples = metric.samples()
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(f"{name}{labels} {_number(value)}" for name, labels, value in samples)
+    return "\n".join(lines) + "\n"
+
+
+# ---- request instrumentation ----
+
+def route_template(scope: dict) -> str:
+    """The path template of the route serving a request; bounded label cardinality."""
+    route = scope.get("route")
+    if route is None:   # answered before routing (ETag 304), or no route matched
+        for candidate in scope["app"].router.routes:
+            if candidate.matches(scope)[0] == Match.FULL:
+                route = candidate
+                break
+    return getattr(route, "path", "unmatched")
+
+
+class MetricsMiddleware:
+    """
+    Outermost ASGI middleware: times every HTTP request and counts its
+    response bytes as they are sent (streamed responses included). Plain
+    ASGI rather than an http middleware, so it adds no task or stream per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        tally = {"queries": 0, "scope": scope}   # the router adds the matched route to the scope
+        response = {"status": 500, "bytes": 0}
+
+        async def counting_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        token = _request.set(tally)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, counting_send)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request.reset(token)
+            route, method, status = route_template(scope), scope["method"], response["status"]
+            REQUESTS.inc(route, method, str(status))
+            REQUEST_SECONDS.observe(elapsed, route, method)
+            if status == 200:
+                RESPONSE_BYTES.observe(response["bytes"], route)
+                if route.startswith("/api/"):
+                    BACKEND_REQUESTS.inc(route, "bigquery" if tally["queries"] else "local")
+
+
+# ---- BigQuery ----
+
+def record_query(query: str, params: list, seconds: float, job=None, rows: int = None, error: Exception = None):
+    """Record one BigQuery query (api/core/bigquery_client.py), and log it when slow."""
+    tally = _request.get()
+    route = ""
+    if tally is not None:
+        tally["queries"] += 1
+        route = getattr(tally["scope"].get("route"), "path", "")
+    BQ_QUERIES.inc(route, "error" if error is not None else "ok")
+    BQ_SECONDS.observe(seconds, route)
+    if rows is not None:
+        BQ_ROWS.observe(rows, route)
+    stats = _job_stats(job)
+    if stats["bytes_processed"]:
+        BQ_BYTES_PROCESSED.inc(route, amount=stats["bytes_processed"])
+    if stats["bytes_billed"]:
+        BQ_BYTES_BILLED.inc(route, amount=stats["bytes_billed"])
+    if stats["slot_ms"]:
+        BQ_SLOT_MS.inc(route, amount=stats["slot_ms"])
+    if stats["cache_hit"]:
+        BQ_CACHE_HITS.inc(route)
+    if seconds >= SLOW_QUERY_SECONDS:
+        SLOW_QUERIES.inc(route)
+        _log_slow_query({
+            "time": datetime.now().isoformat(timespec="milliseconds"),
+            "route": route,
+            "duration_s": round(seconds, 4),
+            "rows": rows,
+            **stats,
+            "error": str(error) if error is not None else None,
+            "params": [[name, type_, value] for name, type_, value in params or []],
+            "sql": " ".join(query.split()),
+        })
+
+
+def _job_stats(job) -> dict:
+    return {
+        "job_id": getattr(job, "job_id", None),
+        "bytes_processed": getattr(job, "total_bytes_processed", None) or 0,
+        "bytes_billed": getattr(job, "total_bytes_billed", None) or 0,
+        "slot_ms": getattr(job, "slot_millis", None) or 0,
+        "cache_hit": bool(getattr(job, "cache_hit", False)),
+    }
+
+
+def _log_slow_query(entry: dict):
+    _slow_queries.append(entry)
+    print(f"⚠ slow query {entry['duration_s']:.2f}s on {entry['route'] or '-'}: "
+          f"{entry['bytes_processed'] / 1e6:.1f} MB processed, {entry['slot_ms']} slot ms")
+    try:
+        with _slow_log_lock:
+            SLOW_QUERY_LOG.parent.mkdir(parents=True, exist_ok=True)
+            with open(SLOW_QUERY_LOG, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+    except OSError as e:
+        print("Slow query log write failed:", e)
+
+
+def slow_queries() -> list:
+    """The most recent slow queries, newest first."""
+    return list(reversed(_slow_queries))
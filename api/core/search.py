@@ -0,0 +1,152 @@
+"""
+In-process provider name search over the snapshot's search index.
+
+The ETL publishes the index with the snapshot (etl/search_index.py); it is
+turned into NumPy arrays the first time a snapshot version is searched.
+A query is normalized like the indexed names and split into words. A
+provider matches when every query word occurs in its name:
+
+    short words (< 3 characters)  as the start of a name word: a binary-searched
+                                  range of the sorted token list
+    longer words                  anywhere in a name word: the intersection of the
+                                  word's 3-gram posting lists, then a substring check
+
+Matches are ranked by how each word matched (whole word 3, word prefix 2,
+inside a word 1), plus a bonus when the name starts with the whole query;
+ties go to the provider with more encounters. When nothing matches every
+word, providers sharing at least 40% of the query's 3-grams (counting a
+word-start gram, " sm" for "smith") are returned instead (typos), ranked
+by that share.
+"""
+
+import re
+import threading
+import unicodedata
+
+import numpy as np
+import pyarrow as pa
+
+GRAM = 3
+FUZZY_MIN_SHARE = 0.4
+_TOKEN_END = "{"   # sorts after every character a normalized token can hold
+
+SCORE_WORD, SCORE_PREFIX, SCORE_INFIX = 3, 2, 1
+
+
+def normalize(text: str) -> str:
+    """Same normalization as etl/search_index.py normalize_names()."""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii").lower()
+    return re.sub(r"[^a-z0-9]+", " ", text).strip()
+
+
+def grams(word: str) -> list:
+    """3-grams of a word; etl/search_index.py also indexes those of " " + word."""
+    return [word[i:i + GRAM] for i in range(len(word) - GRAM + 1)]
+
+
+class ProviderSearchIndex:
+    """The search tables of one snapshot version, as sorted NumPy arrays."""
+
+    def __init__(self, docs: pa.Table, tokens: pa.Table, gram_table: pa.Table):
+        self.docs = docs
+        self.names = np.array(docs.column("search_name").to_pylist(), dtype=np.str_)
+        self.tokens = np.array(tokens.column("token").to_pylist(), dtype=object)
+        self.token_docs = tokens.column("doc_id").to_numpy()
+        self.grams = np.array(gram_table.column("gram").to_pylist(), dtype=object)
+        postings = gram_table.column("doc_ids").combine_chunks()
+        self.offsets = postings.offsets.to_numpy()
+        self.posting_docs = postings.values.to_numpy()
+
+    def __len__(self):
+        return len(self.names)
+
+    def search(self, query: str, limit: int = 20):
+        """(doc ids, scores, "all_words" | "fuzzy" | None) of the best `limit` matches."""
+        query = normalize(query)
+        words = query.split()
+        if not words:
+            return np.empty(0, dtype=np.int64), np.empty(0), None
+
+        scores = np.zeros(len(self), dtype=np.float64)
+        matched = np.ones(len(self), dtype=bool)
+        for word in words:
+            word_scores = self._word_scores(word)
+            matched &= word_scores > 0
+            scores += word_scores
+        docs = np.flatnonzero(matched)
+        kind = "all_words"
+        if len(docs):
+            scores = scores[docs]
+            scores += np.strings.startswith(self.names[docs], query) * len(words)
+        else:
+            docs, scores = self._fuzzy(query)
+            kind = "fuzzy" if len(docs) else None
+
+        # best score first, then the lower doc id (more encounters)
+        order = np.lexsort((docs, -scores))[:limit]
+        return docs[order], scores[order], kind
+
+    def rows(self, docs: np.ndarray, scores: np.ndarray) -> pa.Table:
+        table = self.docs.take(pa.array(docs, type=pa.int64())).drop_columns(["search_name"])
+        return table.append_column("score", pa.array(np.round(scores, 4), type=pa.float64()))
+
+    def _word_scores(self, word: str) -> np.ndarray:
+        """Per doc: how `word` matched the doc's best name word (0 = not at all)."""
+        scores = np.zeros(len(self), dtype=np.float64)
+        # assigned weakest first, so a doc keeps its best match
+        if len(word) >= GRAM:
+            candidates = self._all_grams(word)
+            if len(candidates):
+                infix = np.strings.find(self.names[candidates], word) >= 0
+                scores[candidates[infix]] = SCORE_INFIX
+        lo = np.searchsorted(self.tokens, word, side="left")
+        exact = np.searchsorted(self.tokens, word, side="right")
+        hi = np.searchsorted(self.tokens, word + _TOKEN_END, side="left")
+        scores[self.token_docs[exact:hi]] = SCORE_PREFIX
+        scores[self.token_docs[lo:exact]] = SCORE_WORD
+        return scores
+
+    def _postings(self, gram: str) -> np.ndarray:
+        i = np.searchsorted(self.grams, gram)
+        if i == len(self.grams) or self.grams[i] != gram:
+            return np.empty(0, dtype=self.posting_docs.dtype)
+        return self.posting_docs[self.offsets[i]:self.offsets[i + 1]]
+
+    def _all_grams(self, word: str) -> np.ndarray:
+        """Docs holding every 3-gram of `word` (shortest posting list first)."""
+        lists = sorted((self._postings(g) for g in set(grams(word))), key=len)
+        docs = lists[0]
+        for other in lists[1:]:
+            if not len(docs):
+                break
+            docs = np.intersect1d(docs, other, assume_unique=True)
+        return docs
+
+    def _fuzzy(self, query: str):
+        query_grams = sorted({g for word in query.split() for g in grams(" " + word)})
+        if not query_grams:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        hits = np.bincount(np.concatenate([self._postings(g) for g in query_grams]), minlength=len(self))
+        share = hits / len(query_grams)
+        docs = np.flatnonzero(share >= FUZZY_MIN_SHARE)
+        return docs, share[docs]
+
+
+_lock = threading.Lock()
+_cached = (None, None)   # (snapshot version, index)
+
+
+def provider_index(snapshot):
+    """The search index of a snapshot, built on first use; None if it was published without one."""
+    global _cached
+    version, index = _cached
+    if version == snapshot.version:
+        return index
+    if "search_providers" not in snapshot:
+        return None
+    with _lock:
+        if _cached[0] != snapshot.version:
+            _cached = (snapshot.version, ProviderSearchIndex(snapshot.table("search_providers"),
+                                                             snapshot.table("search_provider_tokens"),
+                                                             snapshot.table("search_provider_grams")))
+        return _cached[1]
@@ -0,0 +1,147 @@
+"""
+Percentiles from the quantile sketches stored with the mart rows.
+
+The encounter marts carry a t-digest of cost and of duration per row
+(etl/transform/sketches.py), serialized as little-endian float64
+[min, max, mean_1 .. mean_k, weight_1 .. weight_k]. Rows are merged per
+group by pooling their centroids and compressing them on the same k-scale
+as the ETL, so percentiles per speciality, per year or per encounter class
+come from the mart rows alone: no pass over fact_encounters, in the
+snapshot or in BigQuery.
+
+A percentile is read off the piecewise-linear curve through (0, min), the
+centroids (cumulative weight at their middle, mean) and (total weight,
+max); for groups whose centroids are still single values this is NumPy's
+"hazen" percentile. Every step is vectorized over all groups at once.
+"""
+
+import numpy as np
+import pyarrow as pa
+
+from api.core.snapshot import bq_round
+
+COMPRESSION = 100   # as etl/transform/sketches.py
+
+
+class Digests:
+    """Digests of groups 0..n-1: centroids sorted by (group, mean), and each group's min / max."""
+
+    __slots__ = ("n", "groups", "means", "weights", "minimum", "maximum")
+
+    def __init__(self, n, groups, means, weights, minimum, maximum):
+        self.n = n
+        self.groups, self.means, self.weights = groups, means, weights
+        self.minimum, self.maximum = minimum, maximum
+
+    @classmethod
+    def decode(cls, blobs) -> "Digests":
+        """One digest per value of a binary array (empty for a null)."""
+        blobs = blobs.combine_chunks() if isinstance(blobs, pa.ChunkedArray) else blobs
+        blobs = blobs.cast(pa.binary())
+        offsets = np.frombuffer(blobs.buffers()[1], dtype=np.int32)[blobs.offset:blobs.offset + len(blobs) + 1]
+        data = blobs.buffers()[2]
+        values = np.frombuffer(data, dtype="<f8", count=(offsets[-1] - offsets[0]) // 8, offset=offsets[0]) \
+            if data is not None and offsets[-1] > offsets[0] else np.empty(0)
+        starts = (offsets[:-1] - offsets[0]) // 8
+        counts = np.maximum((offsets[1:] - offsets[:-1]) // 8 - 2, 0) // 2
+        present = counts > 0
+        minimum = np.full(len(blobs), np.nan)
+        maximum = np.full(len(blobs), np.nan)
+        minimum[present] = values[starts[present]]
+        maximum[present] = values[starts[present] + 1]
+        groups = np.repeat(np.arange(len(blobs)), counts)
+        position = starts[groups] + 2 + np.arange(len(groups)) - np.repeat(np.cumsum(counts) - counts, counts)
+        return cls(len(blobs), groups, values[position], values[position + counts[groups]], minimum, maximum)
+
+    def merge(self, groups: np.ndarray, n: int) -> "Digests":
+        """Merge digest i into group groups[i] (n groups)."""
+        minimum = np.full(n, np.inf)
+        maximum = np.full(n, -np.inf)
+        np.fmin.at(minimum, groups, self.minimum)
+        np.fmax.at(maximum, groups, self.maximum)
+        empty = np.isinf(minimum)
+        minimum[empty], maximum[empty] = np.nan, np.nan
+        if n == self.n and np.array_equal(np.sort(groups), np.arange(n)):
+            order = np.lexsort((self.means, groups[self.groups]))   # a permutation: nothing to pool
+            return Digests(n, groups[self.groups][order], self.means[order], self.weights[order], minimum, maximum)
+        return Digests(n, *_compress(groups[self.groups], self.means, self.weights), minimum, maximum)
+
+    def totals(self) -> np.ndarray:
+        """Weight (number of values) per group."""
+        return np.bincount(self.groups, weights=self.weights, minlength=self.n)
+
+    def percentiles(self, ps: list) -> np.ndarray:
+        """(groups × len(ps)) estimates of the ps-th percentiles (0-100); NaN for empty groups."""
+        totals = self.totals()
+        out = np.full((self.n, len(ps)), np.nan)
+        present = np.flatnonzero(totals > 0)
+        if not len(present):
+            return out
+        # groups laid out on one axis, two units apart: x = 2·group + cumulative weight share
+        before = np.cumsum(self.weights) - self.weights
+        before -= np.repeat(before[np.searchsorted(self.groups, present)], np.bincount(self.groups)[present])
+        x = np.concatenate([2.0 * present, 2.0 * self.groups + (before + self.weights / 2) / totals[self.groups],
+                            2.0 * present + 1])
+        y = np.concatenate([self.minimum[present], self.means, self.maximum[present]])
+        order = np.argsort(x, kind="stable")
+        targets = 2.0 * present[:, None] + np.asarray(ps, dtype=np.float64)[None, :] / 100
+        out[present] = np.interp(targets.ravel(), x[order], y[order]).reshape(targets.shape)
+        return out
+
+
+def _compress(groups: np.ndarray, means: np.ndarray, weights: np.ndarray):
+    """Pool the centroids of every group into k-buckets (etl/transform/sketches.py _compress())."""
+    order = np.lexsort((means, groups))
+    groups, means, weights = groups[order], means[order], weights[order]
+    if not len(groups):
+        return groups, means, weights
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    totals = np.add.reduceat(weights, starts)
+    sizes = np.diff(np.r_[starts, len(groups)])
+    before = np.cumsum(weights) - weights - np.repeat(np.cumsum(weights)[starts] - weights[starts], sizes)
+    q = (before + weights / 2) / np.repeat(totals, sizes)
+    bucket = np.floor(COMPRESSION / (2 * np.pi) * np.arcsin(np.clip(2 * q - 1, -1, 1))).astype(np.int64)
+    exact = np.repeat(totals <= COMPRESSION / 2, sizes)   # small groups keep every centroid
+    bucket[exact] = COMPRESSION + np.flatnonzero(exact)
+
+    bounds = np.flatnonzero(np.r_[True, (groups[1:] != groups[:-1]) | (bucket[1:] != bucket[:-1])])
+    pooled = np.add.reduceat(weights, bounds)
+    return groups[bounds], np.add.reduceat(means * weights, bounds) / pooled, pooled
+
+
+def check_percentiles(ps: list) -> list:
+    """The requested percentiles, sorted and deduplicated; ValueError outside 0-100."""
+    if not ps or any(not 0 <= p <= 100 for p in ps):
+        raise ValueError(f"Percentiles must be between 0 and 100, got {ps}")
+    return sorted(set(ps))
+
+
+def percentile_column(p: float) -> str:
+    """Output column of a percentile: 50 → p50, 99.9 → p99_9."""
+    return f"p{p:g}".replace(".", "_")
+
+
+def grouped_percentiles(table: pa.Table, keys: list, sketch: str, ps: list) -> pa.Table:
+    """
+    SELECT keys, encounters, p<ps>... GROUP BY keys over mart rows, merging
+    the rows' `sketch` digests per group (one group when keys is empty).
+    `encounters` counts the values summarized (encounters with a cost / duration).
+    """
+    if keys:
+        rows = table.append_column("_row", pa.array(np.arange(table.num_rows)))
+        grouped = rows.group_by(keys, use_threads=False).aggregate([("_row", "list")])
+        members = grouped["_row_list"].combine_chunks()
+        n = len(members)
+        groups = np.empty(table.num_rows, dtype=np.int64)
+        groups[members.values.to_numpy()] = np.repeat(np.arange(n), np.diff(members.offsets.to_numpy()))
+    else:
+        grouped, n, groups = None, 1, np.zeros(table.num_rows, dtype=np.int64)
+
+    digests = Digests.decode(table[sketch]).merge(groups, n)
+    estimates = digests.percentiles(ps)
+    columns = {key: grouped[key] for key in keys}
+    columns["encounters"] = pa.array(digests.totals().round().astype(np.int64))
+    for i, p in enumerate(ps):
+        column = pa.array(estimates[:, i], from_pandas=True)   # NaN (no values) → null
+        columns[percentile_column(p)] = bq_round(column)
+    return pa.table(columns)
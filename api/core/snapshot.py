@@ -0,0 +1,181 @@
+"""
+In-memory analytics snapshot for the API.
+
+The ETL publishes the marts and small dimensions as a versioned snapshot
+(etl/snapshot.py). At startup the API reads the live version from its
+memory-mapped Arrow files and prepares every table for the routes: rows
+are sorted on the column the routes filter or rank by, so a year range is
+a binary search and a top-N is a slice.
+
+A background thread polls the snapshot pointer. When the ETL publishes a
+new version it is loaded completely, then swapped in with a single
+reference assignment: requests in flight finish on the snapshot they
+started with, new requests see the new one, and nothing is ever blocked.
+
+Routes fall back to BigQuery while no snapshot is available.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+SNAPSHOT_DIR = Path(os.getenv("SNAPSHOT_DIR", BASE_DIR / "etl" / "data" / "snapshots"))
+SNAPSHOT_POLL_SECONDS = float(os.getenv("SNAPSHOT_POLL_SECONDS", "10"))
+
+CURRENT = "_current.json"
+
+# Row order each table is kept in; the first key also gets a sorted index for range filters
+SORT_KEYS = {
+    "dim_providers": [("provider_key", "ascending")],
+    "dim_organizations": [("organization_key", "ascending")],
+    "fact_readmissions": [("excess_readmission_ratio", "descending")],
+    "mart_provider_productivity": [("total_encounters", "descending")],
+    "mart_appointment_analytics": [("year", "ascending"), ("month", "ascending")],
+    "mart_provider_readmissions": [("excess_readmission_ratio", "descending"), ("number_of_discharges", "descending")],
+    "mart_provider_network": [("provider_key", "ascending"), ("neighbor_rank", "ascending")],
+    "mart_provider_centrality": [("eigenvector_centrality", "descending"), ("provider_key", "ascending")],
+}
+
+
+class Snapshot:
+    """One published snapshot version, held as sorted Arrow tables."""
+
+    def __init__(self, version: str, tables: dict):
+        self.version = version
+        self.loaded_at = datetime.now().isoformat(timespec="seconds")
+        self.tables = {}
+        self._index = {}
+        for name, table in tables.items():
+            keys = SORT_KEYS.get(name)
+            if keys:
+                table = table.sort_by(keys)
+                column = table.column(keys[0][0])
+                if keys[0][1] == "ascending" and column.null_count == 0:
+                    self._index[name] = column.to_numpy()
+            self.tables[name] = table
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.tables
+
+    def table(self, name: str) -> pa.Table:
+        return self.tables[name]
+
+    def range(self, name: str, low=None, high=None) -> pa.Table:
+        """Rows whose first sort key lies in [low, high] (either bound optional)."""
+        index = self._index[name]
+        start = 0 if low is None else int(np.searchsorted(index, low, side="left"))
+        stop = len(index) if high is None else int(np.searchsorted(index, high, side="right"))
+        return self.tables[name].slice(start, max(stop - start, 0))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(table.nbytes for table in self.tables.values()) + sum(i.nbytes for i in self._index.values())
+
+    def status(self) -> dict:
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "tables": {name: table.num_rows for name, table in self.tables.items()},
+            "memory_bytes": self.nbytes,
+        }
+
+
+_current = None
+_reloader = None
+_stop = threading.Event()
+
+
+def current_snapshot():
+    """The live snapshot, or None (routes then query BigQuery)."""
+    return _current
+
+
+def snapshot_with(name: str):
+    """The live snapshot if it carries table `name`, else None."""
+    snapshot = _current
+    return snapshot if snapshot is not None and name in snapshot else None
+
+
+def snapshot_version():
+    return _current.version if _current is not None else None
+
+
+def load_snapshot(version: str) -> Snapshot:
+    directory = SNAPSHOT_DIR / version
+    tables = {}
+    for path in sorted(directory.glob("*.arrow")):
+        with pa.memory_map(str(path)) as source:
+            tables[path.stem] = pa.ipc.open_file(source).read_all()
+    return Snapshot(version, tables)
+
+
+def refresh() -> bool:
+    """Load and swap in the published version if it is not the live one; True if swapped."""
+    global _current
+    pointer = SNAPSHOT_DIR / CURRENT
+    if not pointer.exists():
+        return False
+    version = json.loads(pointer.read_text())["version"]
+    if _current is not None and _current.version == version:
+        return False
+    snapshot = load_snapshot(version)
+    _current = snapshot   # atomic swap
+    print(f"✓ snapshot {version} loaded: {sum(snapshot.status()['tables'].values())} rows, "
+          f"{snapshot.nbytes / 2**20:.1f} MB")
+    return True
+
+
+def start_reloader():
+    """Load the current snapshot, then poll for new versions in a daemon thread."""
+    global _reloader
+    try:
+        refresh()
+    except Exception as e:
+        print("Snapshot load failed:", e)
+    if _reloader is None:
+        _stop.clear()
+        _reloader = threading.Thread(target=_poll, name="snapshot-reloader", daemon=True)
+        _reloader.start()
+
+
+def stop_reloader():
+    global _reloader
+    _stop.set()
+    if _reloader is not None:
+        _reloader.join(timeout=SNAPSHOT_POLL_SECONDS)
+        _reloader = None
+
+
+def _poll():
+    while not _stop.wait(SNAPSHOT_POLL_SECONDS):
+        try:
+            refresh()
+        except Exception as e:   # a bad version must not take the live snapshot down
+            print("Snapshot reload failed:", e)
+
+
+# ---- helpers for routes ----
+
+def month_start(year: pa.ChunkedArray, month: pa.ChunkedArray) -> pa.Array:
+    """DATE(year, month, 1) as a date32 array."""
+    months = (np.asarray(year, dtype="int64") - 1970) * 12 + np.asarray(month, dtype="int64") - 1
+    return pa.array(months.astype("datetime64[M]").astype("datetime64[D]"), type=pa.date32())
+
+
+def group_sum(table: pa.Table, keys: list, column: str, name: str) -> pa.Table:
+    """SELECT keys, SUM(column) AS name GROUP BY keys ORDER BY keys."""
+    grouped = table.group_by(keys).aggregate([(column, "sum")])
+    grouped = grouped.rename_columns([name if c == f"{column}_sum" else c for c in grouped.column_names])
+    return grouped.sort_by([(k, "ascending") for k in keys])
+
+
+def bq_round(values, digits: int = 2):
+    """ROUND() as BigQuery does it: halves away from zero."""
+    return pc.round(values, ndigits=digits, round_mode="half_towards_infinity")
@@ -0,0 +1,63 @@
+"""
+Response encoding for tabular endpoints.
+
+Clients that send `Accept: application/vnd.apache.arrow.stream` receive an
+Arrow IPC stream built straight from the BigQuery result, so timestamps and
+dates stay typed and low-cardinality strings arrive dictionary-encoded.
+Everyone else gets the usual JSON list of row objects.
+"""
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from fastapi import Request, Response
+
+from api.core.bigquery_client import run_query, run_query_arrow
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+# String columns with fewer distinct values than this share of rows are
+# sent as dictionaries (encounter_class, speciality, measure_name, ...)
+DICTIONARY_MAX_RATIO = 0.5
+
+
+def wants_arrow(request: Request) -> bool:
+    return ARROW_STREAM in request.headers.get("accept", "")
+
+
+def query_response(request: Request, query: str, params: list = None):
+    """Run a query and encode the rows in the format the client negotiated."""
+    if wants_arrow(request):
+        return arrow_response(run_query_arrow(query, params))
+    return run_query(query, params)
+
+
+def table_response(request: Request, table: pa.Table):
+    """Encode an in-process result (api/core/snapshot.py) like a query result."""
+    if wants_arrow(request):
+        return arrow_response(table)
+    return table.to_pylist()
+
+
+def arrow_response(table: pa.Table) -> Response:
+    return Response(content=encode_arrow(table), media_type=ARROW_STREAM)
+
+
+def encode_arrow(table: pa.Table) -> bytes:
+    table = _dictionary_encode_strings(table)
+    sink = pa.BufferOutputStream()
+    options = pa.ipc.IpcWriteOptions(compression="zstd")
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _dictionary_encode_strings(table: pa.Table) -> pa.Table:
+    if table.num_rows == 0:
+        return table
+    for i, field in enumerate(table.schema):
+        if not (pa.types.is_string(field.type) or pa.types.is_large_string(field.type)):
+            continue
+        column = table.column(i)
+        if pc.count_distinct(column).as_py() <= DICTIONARY_MAX_RATIO * table.num_rows:
+            table = table.set_column(i, field.name, pc.dictionary_encode(column))
+    return table
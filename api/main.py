@@ -1,8 +1,55 @@
-from fastapi import FastAPI
-from api.routes import providers, appointments, readmissions
+from contextlib import asynccontextmanager
 
-app = FastAPI(title="Healthcare Analytics API")
+from fastapi import FastAPI, Response
+from api.routes import providers, appointments, readmissions, patients, cohorts
+from api.core.bigquery_client import close_client, get_warehouse_version
+from api.core.etag import etag_middleware
+from api.core.metrics import CONTENT_TYPE, MetricsMiddleware, render, slow_queries
+from api.core.snapshot import current_snapshot, start_reloader, stop_reloader
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # only the local snapshot is loaded up front; the BigQuery client is created on first use
+    start_reloader()
+    yield
+    stop_reloader()
+    close_client()
+
+
+app = FastAPI(title="Healthcare Analytics API", lifespan=lifespan)
+
+app.middleware("http")(etag_middleware)
+# registered last, so it runs first and times the ETag check too
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(providers.router)
 app.include_router(appointments.router)
-app.include_router(readmissions.router)
\ No newline at end of file
+app.include_router(readmissions.router)
+app.include_router(patients.router)
+app.include_router(cohorts.router)
+
+
+@app.get("/health")
+def health():
+    """Liveness check; also reports the warehouse version and the in-memory snapshot."""
+    try:
+        version = get_warehouse_version()
+    except Exception as e:
+        print("API Error:", e)
+        version = None
+    snapshot = current_snapshot()
+    return {"status": "ok", "warehouse_version": version,
+            "snapshot": snapshot.status() if snapshot is not None else None}
+
+
+@app.get("/metrics")
+def metrics():
+    """Request, backend and cache metrics in the Prometheus text format (api/core/metrics.py)."""
+    return Response(content=render(), media_type=CONTENT_TYPE)
+
+
+@app.get("/metrics/slow-queries")
+def recent_slow_queries():
+    """The most recent queries over API_SLOW_QUERY_SECONDS, newest first."""
+    return slow_queries()
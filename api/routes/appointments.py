@@ -1,11 +1,18 @@
-from fastapi import APIRouter, HTTPException
-from api.core.bigquery_client import run_query
+from typing import Literal, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from fastapi import APIRouter, HTTPException, Query, Request
+from api.core.bigquery_client import run_query, run_query_arrow
+from api.core.sketches import check_percentiles, grouped_percentiles
+from api.core.snapshot import bq_round, group_sum, month_start, snapshot_with
+from api.core.transport import query_response, table_response
 
 router = APIRouter(prefix="/api/appointments", tags=["Appointments"])
 
 # -------------------- /analytics --------------------
 @router.get("/analytics")
-def appointment_analytics():
+def appointment_analytics(request: Request):
     query = """
     SELECT
         d.year,
@@ -23,12 +30,210 @@ def appointment_analytics():
     ORDER BY d.year, d.month, e.encounter_class, e.encounter_type
     """
     try:
-        result = run_query(query)
-        # Ensure each row is a dict
-        return [dict(row) for row in result]
+        return query_response(request, query)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# The endpoints below serve the exact shapes the dashboard plots. They read
+# the pre-aggregated appointment mart (year/month/type/class grain) instead
+# of fact_encounters, and all filtering/grouping happens in BigQuery.
+
+MART_TABLE = "`healthcareproject-488102.healthcare.mart_appointment_analytics`"
+MART = "mart_appointment_analytics"
+
+YEAR_FILTER = """
+    WHERE (@start_year IS NULL OR year >= @start_year)
+      AND (@end_year IS NULL OR year <= @end_year)
+"""
+
+
+def _year_params(start_year, end_year):
+    return [("start_year", "INT64", start_year), ("end_year", "INT64", end_year)]
+
+
+def _mart_years(start_year, end_year):
+    """Snapshot mart rows within the year range (the mart is kept sorted by year), or None."""
+    snapshot = snapshot_with(MART)
+    return snapshot.range(MART, start_year, end_year) if snapshot is not None else None
+
+
+# -------------------- /series --------------------
+@router.get("/series")
+def appointment_series(
+    request: Request,
+    start_year: Optional[int] = None,
+    end_year: Optional[int] = None,
+):
+    """Monthly appointment counts per encounter class within a year range."""
+    mart = _mart_years(start_year, end_year)
+    if mart is not None:
+        grouped = group_sum(mart, ["year", "month", "encounter_class"], "encounter_count", "total_appointments")
+        return table_response(request, pa.table({
+            "month_year": month_start(grouped["year"], grouped["month"]),
+            "encounter_class": grouped["encounter_class"],
+            "total_appointments": grouped["total_appointments"],
+        }))
+
+    query = f"""
+    SELECT
+        DATE(year, month, 1) AS month_year,
+        encounter_class,
+        SUM(encounter_count) AS total_appointments
+    FROM {MART_TABLE}
+    {YEAR_FILTER}
+    GROUP BY month_year, encounter_class
+    ORDER BY month_year, encounter_class
+    """
+    try:
+        return query_response(request, query, _year_params(start_year, end_year))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# -------------------- /cumulative --------------------
+@router.get("/cumulative")
+def appointment_cumulative(
+    request: Request,
+    start_year: Optional[int] = None,
+    end_year: Optional[int] = None,
+):
+    """Monthly totals with a running cumulative sum within a year range."""
+    mart = _mart_years(start_year, end_year)
+    if mart is not None:
+        grouped = group_sum(mart, ["year", "month"], "encounter_count", "total_appointments")
+        return table_response(request, pa.table({
+            "month_year": month_start(grouped["year"], grouped["month"]),
+            "total_appointments": grouped["total_appointments"],
+            "cumulative_appointments": pc.cumulative_sum(grouped["total_appointments"]),
+        }))
+
+    query = f"""
+    SELECT
+        month_year,
+        total_appointments,
+        SUM(total_appointments) OVER (ORDER BY month_year) AS cumulative_appointments
+    FROM (
+        SELECT DATE(year, month, 1) AS month_year, SUM(encounter_count) AS total_appointments
+        FROM {MART_TABLE}
+        {YEAR_FILTER}
+        GROUP BY month_year
+    )
+    ORDER BY month_year
+    """
+    try:
+        return query_response(request, query, _year_params(start_year, end_year))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# -------------------- /monthly --------------------
+@router.get("/monthly")
+def appointment_monthly(
+    request: Request,
+    start_year: Optional[int] = None,
+    end_year: Optional[int] = None,
+):
+    """Appointment totals per (year, month) for the heatmap."""
+    mart = _mart_years(start_year, end_year)
+    if mart is not None:
+        return table_response(request, group_sum(mart, ["year", "month"], "encounter_count", "total_appointments"))
+
+    query = f"""
+    SELECT year, month, SUM(encounter_count) AS total_appointments
+    FROM {MART_TABLE}
+    {YEAR_FILTER}
+    GROUP BY year, month
+    ORDER BY year, month
+    """
+    try:
+        return query_response(request, query, _year_params(start_year, end_year))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# -------------------- /by-class --------------------
+@router.get("/by-class")
+def appointment_by_class(
+    request: Request,
+    start_year: Optional[int] = None,
+    end_year: Optional[int] = None,
+):
+    """Per encounter class: appointment total and appointment-weighted avg duration."""
+    mart = _mart_years(start_year, end_year)
+    if mart is not None:
+        weighted = mart.append_column("duration_weight", pc.multiply(mart["avg_duration_hrs"], mart["encounter_count"]))
+        grouped = weighted.group_by("encounter_class").aggregate(
+            [("encounter_count", "sum"), ("duration_weight", "sum")])
+        total = grouped["encounter_count_sum"]
+        avg = pc.if_else(pc.equal(total, 0), None, pc.divide(grouped["duration_weight_sum"], pc.cast(total, pa.float64())))
+        return table_response(request, pa.table({
+            "encounter_class": grouped["encounter_class"],
+            "total_appointments": total,
+            "avg_duration": bq_round(avg),
+        }).sort_by([("total_appointments", "descending")]))
+
+    query = f"""
+    SELECT
+        encounter_class,
+        SUM(encounter_count) AS total_appointments,
+        ROUND(SAFE_DIVIDE(SUM(avg_duration_hrs * encounter_count), SUM(encounter_count)), 2) AS avg_duration
+    FROM {MART_TABLE}
+    {YEAR_FILTER}
+    GROUP BY encounter_class
+    ORDER BY total_appointments DESC
+    """
+    try:
+        return query_response(request, query, _year_params(start_year, end_year))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# -------------------- /percentiles --------------------
+# grouping → mart columns the sketches are merged over ("total": one row)
+PERCENTILE_GROUPS = {
+    "total": [],
+    "year": ["year"],
+    "month": ["year", "month"],
+    "encounter_class": ["encounter_class"],
+    "encounter_type": ["encounter_type"],
+}
+
+
+@router.get("/percentiles")
+def appointment_percentiles(
+    request: Request,
+    metric: Literal["cost", "duration"] = "cost",
+    by: Literal["total", "year", "month", "encounter_class", "encounter_type"] = "encounter_class",
+    p: list[float] = Query([50, 90, 99]),
+    start_year: Optional[int] = None,
+    end_year: Optional[int] = None,
+):
+    """
+    Percentiles of encounter cost or duration (hours) within a year range, per
+    year, month, encounter class or type. The mart rows' quantile sketches are
+    merged per group (api/core/sketches.py) instead of rescanning encounters.
+    """
+    try:
+        ps = check_percentiles(p)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    keys, sketch = PERCENTILE_GROUPS[by], f"{metric}_sketch"
+
+    mart = _mart_years(start_year, end_year)
+    if mart is None:
+        query = f"""
+        SELECT {", ".join(keys + [sketch])}
+        FROM {MART_TABLE}
+        {YEAR_FILTER}
+        """
+        try:
+            mart = run_query_arrow(query, _year_params(start_year, end_year))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    result = grouped_percentiles(mart, keys, sketch, ps)
+    if by in ("year", "month"):
+        result = result.sort_by([(key, "ascending") for key in keys])
+    else:
+        result = result.sort_by([("encounters", "descending")] + [(key, "ascending") for key in keys])
+    return table_response(request, result)
+
 # -------------------- /summary --------------------
 @router.get("/summary")
 def appointment_summary():
@@ -52,8 +257,12 @@ def appointment_summary():
 
 # -------------------- /reasons --------------------
 @router.get("/reasons")
-def appointment_reasons():
-    query = """
+def appointment_reasons(
+    request: Request,
+    order_by: Literal["total_appointments", "total_cost"] = "total_appointments",
+    limit: Optional[int] = Query(None, ge=1),
+):
+    query = f"""
     SELECT
         reason_code,
         reason_description,
@@ -62,10 +271,10 @@ def appointment_reasons():
         ROUND(SUM(total_cost),2) AS total_cost
     FROM `healthcareproject-488102.healthcare.fact_encounters`
     GROUP BY reason_code, reason_description
-    ORDER BY total_appointments DESC
+    ORDER BY {order_by} DESC
+    {"LIMIT @limit" if limit else ""}
     """
     try:
-        result = run_query(query)
-        return [dict(row) for row in result] if result else []
+        return query_response(request, query, [("limit", "INT64", limit)] if limit else None)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
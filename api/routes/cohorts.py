@@ -0,0 +1,134 @@
+import numpy as np
+import pyarrow as pa
+from fastapi import APIRouter, HTTPException, Query, Request
+from api.core.bigquery_client import run_query
+from api.core.cohorts import cohort_index, parse, terms
+from api.core.snapshot import snapshot_with
+from api.core.transport import query_response, table_response
+
+router = APIRouter(prefix="/api/cohorts", tags=["Cohorts"])
+
+DATASET = "healthcareproject-488102.healthcare"
+
+# cohort field → (warehouse table, SQL value of a row); the same fields as etl/cohort_index.py
+FIELD_SQL = {
+    "gender": ("dim_patients", "gender"),
+    "encounter_class": ("fact_encounters", "encounter_class"),
+    "year": ("fact_encounters", "CAST(EXTRACT(YEAR FROM start_datetime) AS STRING)"),
+    "encounter_class_year": ("fact_encounters",
+                             "CONCAT(encounter_class, ':', CAST(EXTRACT(YEAR FROM start_datetime) AS STRING))"),
+    "provider": ("fact_encounters", "provider_key"),
+    "condition": ("fact_conditions", "condition_key"),
+    "procedure": ("fact_procedures", "code"),
+}
+
+
+def _parse(q: str):
+    try:
+        tree = parse(q)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    unknown = sorted({field for field, _ in terms(tree) if field not in FIELD_SQL})
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown cohort fields {unknown}; expected {sorted(FIELD_SQL)}")
+    return tree
+
+
+def _where(tree, params: list) -> str:
+    """An expression tree as a WHERE condition on dim_patients."""
+    kind = tree[0]
+    if kind == "term":
+        table, value = FIELD_SQL[tree[1]]
+        name = f"v{len(params)}"
+        params.append((name, "STRING", tree[2]))
+        return f"patient_key IN (SELECT patient_key FROM `{DATASET}.{table}` WHERE {value} = @{name})"
+    if kind == "not":
+        return f"NOT ({_where(tree[1], params)})"
+    return f"({_where(tree[1], params)} {kind.upper()} {_where(tree[2], params)})"
+
+
+# GET /api/cohorts/count?q=condition:44054006 AND encounter_class_year:inpatient:2019
+@router.get("/count")
+def cohort_count(q: str = Query(..., min_length=1)):
+    """Patients matching a cohort expression (api/core/cohorts.py), out of all patients."""
+    tree = _parse(q)
+    snapshot = snapshot_with("cohort_index")
+    index = cohort_index(snapshot) if snapshot is not None else None
+    if index is not None:
+        return {"query": q, "patients": len(index.evaluate(tree)), "population": len(index)}
+
+    params = []
+    query = f"""
+    SELECT
+        COUNTIF({_where(tree, params)}) AS patients,
+        COUNT(*) AS population
+    FROM `{DATASET}.dim_patients`
+    """
+    try:
+        return {"query": q, **run_query(query, params)[0]}
+    except Exception as e:
+        print("API Error:", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# GET /api/cohorts/breakdown?q=condition:44054006&by=provider
+@router.get("/breakdown")
+def cohort_breakdown(
+    request: Request,
+    q: str = Query(..., min_length=1),
+    by: str = Query(...),
+    limit: int = Query(20, ge=1, le=10000),
+):
+    """
+    Patients of a cohort per value of another field (largest first), with
+    their share of the cohort. A patient counts once for every value they have.
+    """
+    tree = _parse(q)
+    if by not in FIELD_SQL:
+        raise HTTPException(status_code=400, detail=f"Unknown breakdown field {by!r}; expected {sorted(FIELD_SQL)}")
+    snapshot = snapshot_with("cohort_index")
+    index = cohort_index(snapshot) if snapshot is not None else None
+    if index is not None:
+        cohort = index.evaluate(tree)
+        size = len(cohort)
+        if by not in index.fields:
+            return table_response(request, _breakdown_table(pa.array([], type=pa.string()), np.zeros(0), size))
+        values, counts = index.breakdown(cohort, by)
+        order = np.lexsort((np.arange(len(counts)), -counts))[:limit]
+        order = order[counts[order] > 0]
+        return table_response(request, _breakdown_table(values.take(pa.array(order)), counts[order], size))
+
+    params = []
+    table, value = FIELD_SQL[by]
+    where = _where(tree, params)
+    params.append(("limit", "INT64", limit))
+    query = f"""
+    WITH cohort AS (
+        SELECT patient_key FROM `{DATASET}.dim_patients` WHERE {where}
+    ),
+    counts AS (
+        SELECT {value} AS value, COUNT(DISTINCT patient_key) AS patients
+        FROM `{DATASET}.{table}`
+        JOIN cohort USING (patient_key)
+        GROUP BY value
+        HAVING value IS NOT NULL
+    )
+    SELECT
+        value,
+        patients,
+        ROUND(SAFE_DIVIDE(patients, (SELECT COUNT(*) FROM cohort)), 4) AS share
+    FROM counts
+    ORDER BY patients DESC, value
+    LIMIT @limit
+    """
+    try:
+        return query_response(request, query, params)
+    except Exception as e:
+        print("API Error:", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _breakdown_table(values, counts: np.ndarray, size: int) -> pa.Table:
+    counts = counts.astype(np.int64)
+    share = np.round(counts / size, 4) if size else np.zeros(len(counts))
+    return pa.table({"value": values, "patients": pa.array(counts), "share": pa.array(share, type=pa.float64())})
@@ -0,0 +1,22 @@
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, HTTPException
+from api.core.features import get_patient_features
+
+router = APIRouter(prefix="/api/patients", tags=["Patients"])
+
+
+# GET /api/patients/{patient_key}/features
+@router.get("/{patient_key}/features")
+def patient_features(patient_key: str):
+    """
+    Longitudinal rollups of one patient (encounter counts by class, costs,
+    first/last visit, procedures, diagnosed and active conditions), read
+    in-process from the feature store.
+    """
+    features = get_patient_features(patient_key)
+    if features is None:
+        raise HTTPException(status_code=404, detail=f"No features for patient {patient_key}")
+    last = features.get("last_encounter")
+    days = (datetime.now(timezone.utc) - last).days if last else None
+    return {**features, "days_since_last_encounter": days}
@@ -1,18 +1,93 @@
-from fastapi import APIRouter, HTTPException
-from api.core.bigquery_client import run_query
+from typing import Literal, Optional
+
+import pyarrow.compute as pc
+from fastapi import APIRouter, HTTPException, Query, Request
+from api.core.bigquery_client import run_query, run_query_arrow
+from api.core.search import provider_index
+from api.core.sketches import check_percentiles, grouped_percentiles
+from api.core.snapshot import bq_round, snapshot_with
+from api.core.transport import query_response, table_response
 
 router = APIRouter(prefix="/api/providers", tags=["Providers"])
 
+MART_TABLE = "`healthcareproject-488102.healthcare.mart_provider_productivity`"
+MART = "mart_provider_productivity"
+NETWORK = "mart_provider_network"
+CENTRALITY = "mart_provider_centrality"
+DATASET = "healthcareproject-488102.healthcare"
+
+LIST_COLUMNS = ["provider_key", "provider_id", "provider_name", "speciality", "total_encounters",
+                "unique_patients", "avg_encounter_duration_hrs", "total_revenue", "avg_cost_per_encounter",
+                "first_encounter", "last_encounter"]
+NETWORK_COLUMNS = ["provider_key", "provider_name", "speciality", "organization_name", "patients", "degree",
+                   "weighted_degree", "degree_centrality", "eigenvector_centrality", "component", "component_size"]
+NEIGHBOR_COLUMNS = ["neighbor_key", "provider_name", "speciality", "organization_name", "shared_patients",
+                    "jaccard", "neighbor_rank"]
+# /percentiles grouping → mart columns the sketches are merged over
+PERCENTILE_GROUPS = {
+    "provider": ["provider_key", "provider_name", "speciality"],
+    "speciality": ["speciality"],
+    "organization": ["organization_key", "organization_name"],
+}
+TOP_COLUMNS = ["provider_key", "provider_name", "total_encounters", "unique_patients",
+               "avg_encounter_duration_hrs", "total_revenue"]
+METRIC_COLUMNS = ["total_encounters", "unique_patients", "avg_encounter_duration_hrs",
+                  "total_revenue", "avg_cost_per_encounter"]
+
+
+def _metrics(table):
+    """The routes' COALESCE(..., 0) on the metric columns, for snapshot rows."""
+    for name in METRIC_COLUMNS:
+        if name in table.column_names:
+            i = table.column_names.index(name)
+            table = table.set_column(i, name, pc.fill_null(table.column(i), 0))
+    return table
+
+
+def _like_pattern(text: str) -> str:
+    """Escape LIKE wildcards so the search text is matched literally."""
+    escaped = text.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
 @router.get("/")
-def list_providers():
+def list_providers(
+    request: Request,
+    q: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+):
     """
-    Returns all provider productivity metrics for Streamlit dashboard
+    Returns all provider productivity metrics for Streamlit dashboard.
+
+    q: optional case-insensitive substring filter on provider name, matched
+       against the lower-cased provider_search_name column (search-indexed).
+       Rows stay in total_encounters order; ranked and typo-tolerant matching
+       is /search.
     """
-    query = """
+    snapshot = snapshot_with(MART)
+    if snapshot is not None:
+        table = snapshot.table(MART)   # kept in total_encounters DESC order
+        if q and q.strip():
+            table = table.filter(pc.match_substring(table["provider_search_name"], q.strip().lower()))
+        if limit:
+            table = table.slice(0, limit)
+        return table_response(request, _metrics(table.select(LIST_COLUMNS)))
+
+    params = []
+    where = ""
+    if q and q.strip():
+        where = "WHERE provider_search_name LIKE @pattern"
+        params.append(("pattern", "STRING", _like_pattern(q.strip())))
+    limit_clause = ""
+    if limit:
+        limit_clause = "LIMIT @limit"
+        params.append(("limit", "INT64", limit))
+
+    query = f"""
     SELECT 
         provider_key,
         provider_id,
-        INITCAP(TRIM(REGEXP_REPLACE(provider_name, r'\\d+', ''))) AS provider_name,
+        provider_name,
         speciality,
         -- Use COALESCE to ensure no nulls
         COALESCE(ROUND(total_encounters,0), 0) AS total_encounters,
@@ -20,43 +95,253 @@ def list_providers():
         COALESCE(ROUND(avg_encounter_duration_hrs, 2), 0) AS avg_encounter_duration_hrs,
         COALESCE(ROUND(total_revenue, 2), 0) AS total_revenue,
         COALESCE(ROUND(avg_cost_per_encounter, 2), 0) AS avg_cost_per_encounter,
-        FORMAT_TIMESTAMP('%Y-%m-%d %H:%M:%S', first_encounter) AS first_encounter,
-        FORMAT_TIMESTAMP('%Y-%m-%d %H:%M:%S', last_encounter) AS last_encounter
-    FROM `healthcareproject-488102.healthcare.mart_provider_productivity`
+        first_encounter,
+        last_encounter
+    FROM {MART_TABLE}
+    {where}
+    ORDER BY total_encounters DESC
+    {limit_clause}
+    """
+    try:
+        return query_response(request, query, params or None)
+    except Exception as e:
+        print("API Error:", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/search")
+def search_providers(
+    request: Request,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=1000),
+):
+    """
+    Ranked provider name search (api/core/search.py): whole words first, then
+    word prefixes, then matches inside a word; ties go to the provider with
+    more encounters. When no name holds every word of q, names sharing most
+    of its 3-grams are returned (typos). Rows carry their score.
+    """
+    snapshot = snapshot_with(MART)
+    index = provider_index(snapshot) if snapshot is not None else None
+    if index is not None:
+        docs, scores, _ = index.search(q, limit)
+        return table_response(request, index.rows(docs, scores))
+
+    query = f"""
+    SELECT
+        provider_key,
+        provider_name,
+        speciality,
+        organization_name,
+        COALESCE(total_encounters, 0) AS total_encounters,
+        IF(STARTS_WITH(provider_search_name, @prefix), 2.0, 1.0) AS score
+    FROM {MART_TABLE}
+    WHERE provider_search_name LIKE @pattern
+    ORDER BY score DESC, total_encounters DESC
+    LIMIT @limit
+    """
+    params = [("prefix", "STRING", q.strip().lower()), ("pattern", "STRING", _like_pattern(q.strip())),
+              ("limit", "INT64", limit)]
+    try:
+        return query_response(request, query, params)
+    except Exception as e:
+        print("API Error:", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/summary")
+def providers_summary():
+    """KPI totals across all providers (single row)."""
+    snapshot = snapshot_with(MART)
+    if snapshot is not None:
+        table = snapshot.table(MART)
+        return {
+            "provider_count": table.num_rows,
+            "total_providers": pc.count_distinct(table["provider_name"]).as_py(),
+            "total_encounters": pc.sum(table["total_encounters"]).as_py() or 0,
+            "unique_patients": pc.sum(table["unique_patients"]).as_py() or 0,
+            "total_revenue": bq_round(pc.sum(table["total_revenue"])).as_py() or 0,
+        }
+
+    query = f"""
+    SELECT
+        COUNT(*) AS provider_count,
+        COUNT(DISTINCT provider_name) AS total_providers,
+        COALESCE(SUM(total_encounters), 0) AS total_encounters,
+        COALESCE(SUM(unique_patients), 0) AS unique_patients,
+        COALESCE(ROUND(SUM(total_revenue), 2), 0) AS total_revenue
+    FROM {MART_TABLE}
     """
     try:
         result = run_query(query)
-        # Ensure result is a list of dicts
-        return [dict(row) for row in result]
+        return dict(result[0]) if result else {}
     except Exception as e:
         print("API Error:", e)
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/{id}/productivity")
-def provider_productivity(id: str):
+@router.get("/top")
+def top_providers(
+    request: Request,
+    by: Literal["total_encounters", "total_revenue"] = "total_encounters",
+    limit: int = Query(10, ge=1, le=1000),
+):
+    """Top providers ranked by encounters or revenue."""
+    snapshot = snapshot_with(MART)
+    if snapshot is not None:
+        table = snapshot.table(MART)
+        if by != "total_encounters":
+            table = table.sort_by([(by, "descending")])
+        return table_response(request, _metrics(table.slice(0, limit).select(TOP_COLUMNS)))
+
     query = f"""
+    SELECT
+        provider_key,
+        provider_name,
+        COALESCE(ROUND(total_encounters,0), 0) AS total_encounters,
+        COALESCE(unique_patients, 0) AS unique_patients,
+        COALESCE(ROUND(avg_encounter_duration_hrs, 2), 0) AS avg_encounter_duration_hrs,
+        COALESCE(ROUND(total_revenue, 2), 0) AS total_revenue
+    FROM {MART_TABLE}
+    ORDER BY {by} DESC
+    LIMIT @limit
+    """
+    try:
+        return query_response(request, query, [("limit", "INT64", limit)])
+    except Exception as e:
+        print("API Error:", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/percentiles")
+def provider_percentiles(
+    request: Request,
+    metric: Literal["cost", "duration"] = "cost",
+    by: Literal["provider", "speciality", "organization"] = "provider",
+    p: list[float] = Query([50, 90, 99]),
+    limit: int = Query(20, ge=1, le=1000),
+):
+    """
+    Percentiles of encounter cost or duration (hours) per provider, or merged
+    over the providers of each speciality / organization, largest first.
+    Computed from the quantile sketches of the mart rows (api/core/sketches.py),
+    so no encounter is read; p=50&p=90 picks the percentiles.
+    """
+    try:
+        ps = check_percentiles(p)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    keys, sketch = PERCENTILE_GROUPS[by], f"{metric}_sketch"
+
+    snapshot = snapshot_with(MART)
+    if snapshot is not None:
+        table = snapshot.table(MART)   # kept in total_encounters DESC order
+        if by == "provider":
+            table = table.slice(0, limit)
+    else:
+        query = f"""
+        SELECT {", ".join(keys)}, {sketch}
+        FROM {MART_TABLE}
+        {"ORDER BY total_encounters DESC LIMIT @limit" if by == "provider" else ""}
+        """
+        try:
+            table = run_query_arrow(query, [("limit", "INT64", limit)] if by == "provider" else None)
+        except Exception as e:
+            print("API Error:", e)
+            raise HTTPException(status_code=500, detail=str(e))
+
+    result = grouped_percentiles(table, keys, sketch, ps)
+    result = result.sort_by([("encounters", "descending")] + [(key, "ascending") for key in keys])
+    return table_response(request, result.slice(0, limit))
+
+
+@router.get("/network")
+def provider_network(
+    request: Request,
+    by: Literal["eigenvector_centrality", "degree", "weighted_degree"] = "eigenvector_centrality",
+    limit: int = Query(20, ge=1, le=1000),
+):
+    """
+    Most central providers of the shared-patient network (mart_provider_centrality):
+    linked providers, shared patients over all links, and eigenvector centrality.
+    """
+    snapshot = snapshot_with(CENTRALITY)
+    if snapshot is not None:
+        table = snapshot.table(CENTRALITY)   # kept in eigenvector_centrality DESC order
+        if by != "eigenvector_centrality":
+            table = table.sort_by([(by, "descending"), ("provider_key", "ascending")])
+        return table_response(request, table.slice(0, limit).select(NETWORK_COLUMNS))
+
+    query = f"""
+    SELECT {", ".join(NETWORK_COLUMNS)}
+    FROM `{DATASET}.{CENTRALITY}`
+    ORDER BY {by} DESC, provider_key
+    LIMIT @limit
+    """
+    try:
+        return query_response(request, query, [("limit", "INT64", limit)])
+    except Exception as e:
+        print("API Error:", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{id}/neighbors")
+def provider_neighbors(request: Request, id: str, limit: int = Query(10, ge=1, le=1000)):
+    """A provider's top neighbors in the shared-patient network, most shared patients first."""
+    snapshot = snapshot_with(NETWORK)
+    if snapshot is not None and CENTRALITY in snapshot:
+        edges = snapshot.range(NETWORK, id, id)   # one provider's edges, by neighbor_rank
+        edges = edges.slice(0, limit)
+        providers = snapshot.table(CENTRALITY)
+        rows = providers.take(pc.index_in(edges["neighbor_key"], value_set=providers["provider_key"]))
+        table = edges.select(["neighbor_key", "shared_patients", "jaccard", "neighbor_rank"])
+        for name in ["provider_name", "speciality", "organization_name"]:
+            table = table.append_column(name, rows[name])
+        return table_response(request, table.select(NEIGHBOR_COLUMNS))
+
+    query = f"""
+    SELECT
+        n.neighbor_key,
+        c.provider_name,
+        c.speciality,
+        c.organization_name,
+        n.shared_patients,
+        n.jaccard,
+        n.neighbor_rank
+    FROM `{DATASET}.{NETWORK}` n
+    LEFT JOIN `{DATASET}.{CENTRALITY}` c
+        ON c.provider_key = n.neighbor_key
+    WHERE n.provider_key = @provider_key
+    ORDER BY n.neighbor_rank
+    LIMIT @limit
+    """
+    try:
+        return query_response(request, query, [("provider_key", "STRING", id), ("limit", "INT64", limit)])
+    except Exception as e:
+        print("API Error:", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{id}/productivity")
+def provider_productivity(request: Request, id: str):
+    query = """
     SELECT
         p.provider_id,
-        INITCAP(TRIM(REGEXP_REPLACE(p.provider_name, r'\\d+', ''))) AS provider_name,
+        p.provider_name,
         p.speciality,
-        p.organization,
+        p.organization_key AS organization,
         e.encounter_class,
         COUNT(DISTINCT e.encounter_id) AS total_appointments,
         COUNT(DISTINCT e.patient_key) AS unique_patients,
         ROUND(AVG(e.duration_hours), 2) AS avg_duration_hours,
         ROUND(SUM(e.total_cost), 2) AS total_revenue,
         ROUND(SUM(e.total_cost)/NULLIF(COUNT(DISTINCT e.encounter_id),0), 2) AS avg_cost_per_encounter,
-        FORMAT_TIMESTAMP('%Y-%m-%d %H:%M:%S', MIN(e.encounter_datetime)) AS first_encounter,
-        FORMAT_TIMESTAMP('%Y-%m-%d %H:%M:%S', MAX(e.encounter_datetime)) AS last_encounter
+        MIN(e.start_datetime) AS first_encounter,
+        MAX(e.start_datetime) AS last_encounter
     FROM `healthcareproject-488102.healthcare.fact_encounters` e
     JOIN `healthcareproject-488102.healthcare.dim_providers` p
         ON e.provider_key = p.provider_key
-    WHERE p.provider_id = '{id}'
-    GROUP BY p.provider_id, provider_name, p.speciality, p.organization, e.encounter_class
+    WHERE p.provider_id = @provider_id
+    GROUP BY p.provider_id, p.provider_name, p.speciality, p.organization_key, e.encounter_class
     """
     try:
-        result = run_query(query)
-        return [dict(row) for row in result]
+        return query_response(request, query, [("provider_id", "STRING", id)])
     except Exception as e:
         print("API Error:", e)
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -1,11 +1,32 @@
-from fastapi import APIRouter
+from typing import Optional
+
+import pyarrow.compute as pc
+from fastapi import APIRouter, Query, Request
 from api.core.bigquery_client import run_query
+from api.core.snapshot import bq_round, snapshot_with
+from api.core.transport import query_response, table_response
 
 router = APIRouter(prefix="/api/readmissions", tags=["Readmissions"])
 
+RATE_COLUMNS = ["hospital_id", "hospital_name", "readmission_rate", "measure_name", "readmission_id",
+                "number_of_discharges", "expected_readmission_rate", "predicted_readmission_rate",
+                "number_of_readmissions", "start_date", "end_date"]
+PROVIDER_COLUMNS = ["provider_key", "provider_name", "speciality", "organization_name", "number_of_discharges",
+                    "number_of_readmissions", "observed_readmission_rate", "expected_readmission_rate",
+                    "excess_readmission_ratio", "avg_days_to_readmission"]
+
+
 @router.get("/rates")
-def readmission_rates():
-    query = """
+def readmission_rates(request: Request, limit: Optional[int] = Query(None, ge=1)):
+    """All hospital readmission rows; with `limit`, only the highest-ratio rows."""
+    snapshot = snapshot_with("fact_readmissions")
+    if snapshot is not None:
+        table = snapshot.table("fact_readmissions")   # kept in excess_readmission_ratio DESC order
+        table = table.rename_columns(["readmission_rate" if c == "excess_readmission_ratio" else c
+                                      for c in table.column_names])
+        return table_response(request, (table.slice(0, limit) if limit else table).select(RATE_COLUMNS))
+
+    query = f"""
     SELECT
         hospital_id,
         hospital_name,
@@ -20,29 +41,74 @@ def readmission_rates():
         start_date,
         end_date,
     FROM `healthcareproject-488102.healthcare.fact_readmissions`
+    {"ORDER BY readmission_rate DESC LIMIT @limit" if limit else ""}
     """
-    return run_query(query)
+    return query_response(request, query, [("limit", "INT64", limit)] if limit else None)
 
 
 # GET /api/readmissions/stats
 @router.get("/stats")
 def readmission_stats():
+    """KPI totals across all hospitals (single row)."""
+    snapshot = snapshot_with("fact_readmissions")
+    if snapshot is not None:
+        table = snapshot.table("fact_readmissions")
+        return {
+            "total_hospitals": pc.count_distinct(table["hospital_name"]).as_py(),
+            "avg_ratio": bq_round(pc.mean(table["excess_readmission_ratio"])).as_py(),
+            "max_ratio": pc.max(table["excess_readmission_ratio"]).as_py(),
+            "total_readmissions": pc.sum(table["number_of_readmissions"]).as_py(),
+            "total_discharges": pc.sum(table["number_of_discharges"]).as_py(),
+        }
+
     query = """
     SELECT
-        readmission_id,
-        hospital_id,
-        hospital_name,
-        measure_name,
-        number_of_discharges,
-        expected_readmission_rate,
-        predicted_readmission_rate,
-        excess_readmission_ratio,
-        number_of_readmissions,
-        start_date,
-        end_date,
+        COUNT(DISTINCT hospital_name) AS total_hospitals,
         ROUND(AVG(excess_readmission_ratio), 2) AS avg_ratio,
+        MAX(excess_readmission_ratio) AS max_ratio,
         SUM(number_of_readmissions) AS total_readmissions,
         SUM(number_of_discharges) AS total_discharges
     FROM `healthcareproject-488102.healthcare.fact_readmissions`
     """
-    return run_query(query)
\ No newline at end of file
+    result = run_query(query)
+    return dict(result[0]) if result else {}
+
+# GET /api/readmissions/providers
+@router.get("/providers")
+def provider_readmissions(
+    request: Request,
+    min_discharges: int = Query(25, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+):
+    """
+    30-day readmission rates computed from the encounter history, per discharging
+    provider, in the shape of the HRRP hospital rows. HRRP does not report
+    hospitals with fewer than 25 discharges; `min_discharges` applies the same cut.
+    """
+    snapshot = snapshot_with("mart_provider_readmissions")
+    if snapshot is not None:
+        table = snapshot.table("mart_provider_readmissions")   # kept in the ORDER BY below
+        table = table.filter(pc.greater_equal(table["number_of_discharges"], min_discharges))
+        return table_response(request, (table.slice(0, limit) if limit else table).select(PROVIDER_COLUMNS))
+
+    query = f"""
+    SELECT
+        provider_key,
+        provider_name,
+        speciality,
+        organization_name,
+        number_of_discharges,
+        number_of_readmissions,
+        observed_readmission_rate,
+        expected_readmission_rate,
+        excess_readmission_ratio,
+        avg_days_to_readmission
+    FROM `healthcareproject-488102.healthcare.mart_provider_readmissions`
+    WHERE number_of_discharges >= @min_discharges
+    ORDER BY excess_readmission_ratio DESC, number_of_discharges DESC
+    {"LIMIT @limit" if limit else ""}
+    """
+    params = [("min_discharges", "INT64", min_discharges)]
+    if limit:
+        params.append(("limit", "INT64", limit))
+    return query_response(request, query, params)
@@ -0,0 +1,4 @@
+"""
+Benchmarks for the DataFoundation pipeline, API and dashboard transport.
+Results are written as JSON under benchmarks/results/ for comparison across commits.
+"""
@@ -0,0 +1,450 @@
+"""
+Pipeline benchmark: per-stage time, throughput and memory at growing scale.
+
+For each scale (number of encounters) a Synthea-shaped dataset is generated
+(benchmarks/synthetic.py) and every stage is timed on its own:
+
+    staging   CSV → MySQL staging tables (load_to_mysql), row by row and
+              again in bulk-load mode with its rows/s gain, then an
+              unchanged re-ingest (source manifest skips every file) --mysql only
+    extract   MySQL staging tables → DataFrames                 --mysql only
+              CSV files → DataFrames directly (extract_from_csv)
+    transform transform_all(), broken down per dimension / fact / mart builder
+    transform_parallel  transform_parallel() at each --workers count, with
+              its speedup over transform_all() and over one worker   --workers only
+    validate  data-quality rules (etl/validate.py) over every row, then the
+              sampled pre-flight check at ETL_VALIDATE_SAMPLE
+    load      warehouse write to a throwaway LocalWarehouse: full refresh,
+              then an incremental re-run with unchanged data
+    out_of_core  streamed extract + transform under --memory-budget MB
+              (etl/transform/out_of_core.py) and its load    --memory-budget only
+    api       publish the API snapshot, import time of api.main, cold start
+              of a uvicorn process serving it (launch → first response), then
+              first and warm (p50/p95) latency of the snapshot-served routes
+
+Stages are measured with the pipeline's own instrumentation spans
+(etl/instrumentation.py): wall and CPU seconds, rows, rows/s, peak resident
+set size and GC collections. Every scale runs in a fresh process so
+memory figures are not inherited from the previous one; the API stages
+are timed from outside the server process.
+
+Usage:
+    python -m benchmarks.pipeline [--scales 10000 100000 1000000] [--seed 0] [--mysql]
+                                  [--memory-budget 512] [--workers 1 2 4 8]
+    python -m benchmarks.pipeline --compare benchmarks/results/pipeline-<ts>.json
+
+Results go to benchmarks/results/pipeline-<ts>.json; --compare prints the
+per-stage wall-time ratio of a new run against an earlier results file.
+Memory needed grows roughly linearly: budget ~1.5 GB per million encounters.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+
+from etl.instrumentation import finished_spans, span
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Routes answered from the snapshot, timed against the freshly started API
+API_ROUTES = [
+    ("/api/providers/", {}),
+    ("/api/providers/top", {"by": "total_encounters", "limit": 10}),
+    ("/api/providers/search", {"q": "smi", "limit": 20}),
+    ("/api/providers/network", {"limit": 20}),
+    ("/api/providers/percentiles", {"by": "speciality", "p": [50, 90, 99]}),
+    ("/api/appointments/series", {"start_year": 2015, "end_year": 2019}),
+    ("/api/appointments/by-class", {}),
+    ("/api/appointments/percentiles", {"by": "encounter_class"}),
+    ("/api/readmissions/rates", {"limit": 10}),
+    ("/api/readmissions/providers", {}),
+    ("/api/cohorts/breakdown", {"q": "encounter_class_year:inpatient:2019", "by": "provider"}),
+]
+API_REQUESTS = 50
+API_START_TIMEOUT_S = 60
+
+
+def record(s, group: str, stage: str) -> dict:
+    """Flatten a finished instrumentation span into a results row."""
+    a = s.attributes
+    return {
+        "group": group,
+        "stage": stage,
+        "wall_s": round(a["etl.wall_s"], 4),
+        "cpu_s": round(a["etl.cpu_s"], 4),
+        "rows": a.get("etl.rows_in") or a.get("etl.rows_out"),
+        "rows_per_s": a.get("etl.rows_per_s"),
+        "peak_rss_mb": round(a["etl.peak_rss_bytes"] / 2**20, 1),
+        "rss_growth_mb": round(a["etl.rss_growth_bytes"] / 2**20, 1),
+        "gc_collections": sum(v for k, v in a.items() if k.startswith("etl.gc.")),
+        **({"error": s.error} if s.error else {}),
+    }
+
+
+def report(row: dict):
+    print(f"    {'❌' if 'error' in row else '✓'} {row['group']}/{row['stage']}: {row['wall_s']:.3f}s"
+          + (f", {row['rows_per_s']:,} rows/s" if row["rows_per_s"] else "")
+          + (f", peak RSS {row['peak_rss_mb']} MB" if row["peak_rss_mb"] is not None else ""))
+
+
+def measured(results: list, group: str, stage: str, wall_s: float, peak_rss_mb: float = None, **extra):
+    """Record a stage timed outside this process (no instrumentation span)."""
+    results.append({"group": group, "stage": stage, "wall_s": round(wall_s, 4), "rows_per_s": None,
+                    "peak_rss_mb": peak_rss_mb, **extra})
+    report(results[-1])
+
+
+@contextmanager
+def stage(results: list, group: str, name: str):
+    """Run one benchmark stage inside an instrumentation span and record it."""
+    try:
+        with span(f"bench.{group}.{name}") as s:
+            yield s
+    finally:
+        results.append(record(s, group, name))
+        report(results[-1])
+
+
+def skipped(results: list, group: str, stage: str, reason: str):
+    results.append({"group": group, "stage": stage, "skipped": reason})
+    print(f"    - {group}/{stage}: skipped ({reason})")
+
+
+# ---- stages ----
+
+def bench_staging(results: list, raw: dict, csv_dir: Path):
+    from etl.load import load_to_mysql
+
+    load_to_mysql.SYNTHEA_DIR = f"{csv_dir}/"
+    rows = sum(len(raw[name]) for name in ("providers", "patients", "encounters",
+                                           "conditions", "procedures", "organizations"))
+    with stage(results, "staging", "load_to_mysql") as s:
+        s.set(rows_in=rows)
+        load_to_mysql.main()
+    simple = results[-1]
+
+    load_to_mysql.truncate_staging()
+    with stage(results, "staging", "load_to_mysql_bulk") as s:
+        s.set(rows_in=rows)
+        load_to_mysql.main(bulk=True)
+    bulk = results[-1]
+    if simple["rows_per_s"] and bulk["rows_per_s"]:
+        bulk["speedup_vs_row_by_row"] = round(bulk["rows_per_s"] / simple["rows_per_s"], 2)
+        print(f"      bulk load {bulk['speedup_vs_row_by_row']}x the rows/s of the row-by-row load")
+
+    with stage(results, "staging", "load_to_mysql_reingest_unchanged") as s:
+        s.set(rows_in=rows)
+        load_to_mysql.main()
+
+
+def bench_extract_mysql(results: list) -> dict:
+    from etl.extract import extract_from_mysql
+
+    with stage(results, "extract", "extract_from_mysql") as s:
+        raw = extract_from_mysql()
+        s.set_output(raw)
+    return raw
+
+
+def bench_extract_csv(results: list, csv_dir: Path) -> dict:
+    from etl.extract import extract_from_csv
+
+    with stage(results, "extract", "extract_from_csv") as s:
+        raw = extract_from_csv(synthea_dir=csv_dir)
+        s.set_output(raw)
+    return raw
+
+
+def bench_transform(results: list, raw: dict) -> dict:
+    """transform_all() as a whole, plus one row per builder span it emitted."""
+    from etl.transform import transform_all
+
+    with stage(results, "transform", "transform_all") as s:
+        transformed = transform_all(raw)
+        s.set_output(transformed)
+
+    builders = [b for b in finished_spans(s.trace_id) if b.parent is s]
+    for builder in builders:
+        row = record(builder, "transform", builder.name.split(".", 1)[1])
+        results.insert(len(results) - 1, row)
+        report(row)
+    return transformed
+
+
+def bench_parallel(results: list, raw: dict, workdir: Path, worker_counts: list):
+    """transform_parallel() at each worker count; speedup against transform_all() and one worker."""
+    from etl.transform.out_of_core import release
+    from etl.transform.parallel import transform_parallel
+
+    baseline = next(r["wall_s"] for r in results if r.get("stage") == "transform_all")
+    single = None
+    for workers in worker_counts:
+        if workers > (os.cpu_count() or 1):
+            print(f"    ⚠ {workers} workers on {os.cpu_count()} CPUs: expect no speedup beyond the CPU count")
+        with stage(results, "transform_parallel", f"{workers}_workers") as s:
+            s.set(rows_in=sum(len(raw[name]) for name in ("encounters", "procedures")), workers=workers)
+            transformed = transform_parallel(raw, workers=workers, spill_dir=workdir / "spill")
+        release(transformed)
+        row = results[-1]
+        single = single or (row["wall_s"] if workers == 1 else None)
+        row["speedup_vs_transform_all"] = round(baseline / row["wall_s"], 2)
+        if single:
+            row["scaling_vs_1_worker"] = round(single / row["wall_s"], 2)
+        print(f"      speedup {row['speedup_vs_transform_all']}x vs transform_all"
+              + (f", {row['scaling_vs_1_worker']}x vs 1 worker" if single else ""))
+
+
+def bench_validate(results: list, transformed: dict) -> dict:
+    """Full validation (its output is what gets loaded), then the sampled pre-flight check."""
+    from etl.validate import SAMPLE_FRACTION, validate
+
+    rows = sum(len(df) for df in transformed.values())
+    with stage(results, "validate", "full") as s:
+        s.set(rows_in=rows)
+        validated, report = validate(transformed)
+        s.set(quarantined=sum(r["quarantined"] for r in report.values()))
+    with stage(results, "validate", f"sampled_{SAMPLE_FRACTION:g}") as s:
+        s.set(rows_in=rows)
+        validate(transformed, sample=SAMPLE_FRACTION)
+    return validated
+
+
+def bench_load(results: list, transformed: dict, workdir: Path):
+    from etl.load.warehouse import LocalWarehouse, load_tables
+
+    rows = sum(len(df) for df in transformed.values())
+    root = workdir / "warehouse"
+    with stage(results, "load", "warehouse_full_refresh") as s:
+        s.set(rows_in=rows)
+        load_tables(transformed, LocalWarehouse(root), full_refresh=True)
+    with stage(results, "load", "warehouse_incremental_unchanged") as s:
+        s.set(rows_in=rows)
+        load_tables(transformed, LocalWarehouse(root))
+
+
+def bench_out_of_core(results: list, csv_dir: Path, workdir: Path, memory_budget_mb: int):
+    """Streamed extract + transform under a memory budget, then its load (staged from spill files)."""
+    from etl.load.warehouse import LocalWarehouse, load_tables
+    from etl.transform.out_of_core import release, transform_out_of_core
+
+    with stage(results, "out_of_core", f"transform_{memory_budget_mb}mb") as s:
+        transformed = transform_out_of_core("csv", memory_budget_mb=memory_budget_mb,
+                                            spill_dir=workdir / "spill", synthea_dir=csv_dir)
+        s.set(rows_out=sum(len(t) for t in transformed.values()), memory_budget_mb=memory_budget_mb)
+    try:
+        with stage(results, "out_of_core", "warehouse_full_refresh") as s:
+            s.set(rows_in=sum(len(t) for t in transformed.values()))
+            load_tables(transformed, LocalWarehouse(workdir / "warehouse_ooc"), full_refresh=True)
+    finally:
+        release(transformed)
+
+
+def bench_api(results: list, transformed: dict, workdir: Path):
+    """Cold start of an API process serving this scale's snapshot, then per-route latency."""
+    import requests
+    from etl.snapshot import SNAPSHOT_TABLES, publish_snapshot
+
+    snapshots = workdir / "snapshots"
+    with stage(results, "api", "publish_snapshot") as s:
+        s.set(rows_in=sum(len(transformed[name]) for name in SNAPSHOT_TABLES if name in transformed))
+        publish_snapshot(transformed, snapshots)
+
+    out = subprocess.run([sys.executable, "-c", "import time; t = time.perf_counter(); import api.main; "
+                          "print(time.perf_counter() - t)"], cwd=BASE_DIR, capture_output=True, text=True)
+    if out.returncode:
+        skipped(results, "api", "*", f"api.main does not import: {out.stderr.strip().splitlines()[-1]}")
+        return
+    measured(results, "api", "import_api_main", float(out.stdout.split()[-1]))
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    base = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "SNAPSHOT_DIR": str(snapshots), "SNAPSHOT_POLL_SECONDS": "3600"}
+    log = open(workdir / "api.log", "wb")
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port),
+                               "--log-level", "warning"], cwd=BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    session = requests.Session()
+    try:
+        # uvicorn runs the lifespan (snapshot load) before it listens, so any answer means ready
+        while True:
+            try:
+                session.get(f"{base}/", timeout=1)
+                break
+            except requests.ConnectionError:
+                if server.poll() is not None or time.perf_counter() - started > API_START_TIMEOUT_S:
+                    skipped(results, "api", "cold_start", f"API did not start, see {workdir / 'api.log'}")
+                    return
+                time.sleep(0.01)
+        measured(results, "api", "cold_start", time.perf_counter() - started, _peak_rss_mb(server.pid))
+
+        for path, params in API_ROUTES:
+            timings = []
+            for _ in range(API_REQUESTS + 1):
+                t = time.perf_counter()
+                response = session.get(base + path, params=params, timeout=60)
+                timings.append(time.perf_counter() - t)
+            response.raise_for_status()
+            first, warm = timings[0], timings[1:]
+            measured(results, "api", path.removeprefix("/api/").rstrip("/"), statistics.median(warm),
+                     rows=len(response.json()), first_ms=round(first * 1000, 2),
+                     p95_ms=round(statistics.quantiles(warm, n=20)[-1] * 1000, 2))
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+        log.close()
+
+
+def _peak_rss_mb(pid: int):
+    """High-water resident set size of another process (Linux only)."""
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def run_scale(n_encounters: int, seed: int, use_mysql: bool, memory_budget_mb: int = None,
+              worker_counts: list = None) -> dict:
+    """Benchmark every stage at one scale (called in a fresh process)."""
+    from benchmarks.synthetic import generate_raw, write_synthea_csv
+
+    results = []
+    workdir = Path(tempfile.mkdtemp(prefix="bench_pipeline_"))
+    print(f"\n▶ scale: {n_encounters:,} encounters")
+    try:
+        with stage(results, "setup", "generate_synthetic") as s:
+            raw = generate_raw(n_encounters, seed=seed)
+            s.set_output(raw)
+        row_counts = {name: len(df) for name, df in raw.items()}
+        with stage(results, "setup", "write_synthea_csv") as s:
+            csv_dir = write_synthea_csv(raw, workdir / "synthea")
+            s.set(bytes_out=sum(f.stat().st_size for f in csv_dir.iterdir()))
+
+        if use_mysql:
+            bench_staging(results, raw, csv_dir)
+            raw = bench_extract_mysql(results)
+            bench_extract_csv(results, csv_dir)
+        else:
+            skipped(results, "staging", "load_to_mysql", "pass --mysql")
+            skipped(results, "extract", "extract_from_mysql", "pass --mysql")
+            raw = bench_extract_csv(results, csv_dir)
+
+        transformed = bench_transform(results, raw)
+        if worker_counts:
+            bench_parallel(results, raw, workdir, worker_counts)
+        else:
+            skipped(results, "transform_parallel", "*", "pass --workers")
+        del raw
+        transformed = bench_validate(results, transformed)
+        bench_load(results, transformed, workdir)
+        bench_api(results, transformed, workdir)
+        del transformed
+        if memory_budget_mb:
+            bench_out_of_core(results, csv_dir, workdir, memory_budget_mb)
+        else:
+            skipped(results, "out_of_core", "*", "pass --memory-budget")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {"encounters": n_encounters, "input_rows": row_counts, "stages": results}
+
+
+def environment() -> dict:
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=BASE_DIR, capture_output=True,
+                                  text=True, timeout=30).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "pyarrow": pa.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(current: dict, baseline: dict):
+    """Print per-stage wall-time ratios (current / baseline) for matching scale + stage."""
+    def index(report):
+        return {(s["encounters"], st["group"], st["stage"]): st
+                for s in report["scales"] for st in s["stages"] if "wall_s" in st}
+
+    base = index(baseline)
+    print(f"\nvs {baseline['environment'].get('commit', '?')[:12]}  (ratio > 1 is slower)")
+    print(f"{'scale':>12} {'stage':<44} {'base s':>9} {'now s':>9} {'ratio':>7}")
+    for key, stage in index(current).items():
+        if key in base and base[key]["wall_s"] > 0:
+            ratio = stage["wall_s"] / base[key]["wall_s"]
+            flag = "  ⚠" if ratio > 1.2 else ""
+            print(f"{key[0]:>12,} {key[1] + '/' + key[2]:<44} {base[key]['wall_s']:>9.3f} "
+                  f"{stage['wall_s']:>9.3f} {ratio:>7.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=lambda v: int(float(v)), nargs="+", default=[10_000, 100_000],
+                        help="encounter counts, e.g. 1e4 1e5 1e6")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mysql", action="store_true",
+                        help="also benchmark the MySQL staging load and extract (needs MYSQL_* env and empty staging tables)")
+    parser.add_argument("--memory-budget", type=int, metavar="MB",
+                        help="also benchmark the out-of-core transform + load under this memory budget")
+    parser.add_argument("--workers", type=int, nargs="+", metavar="N",
+                        help="also benchmark the partition-parallel transform at these worker counts, e.g. 1 2 4 8")
+    parser.add_argument("--compare", type=Path, help="earlier pipeline results file to compare against")
+    parser.add_argument("--output", type=Path, help="results file (default: benchmarks/results/pipeline-<ts>.json)")
+    args = parser.parse_args()
+
+    report = {
+        "benchmark": "pipeline",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "environment": environment(),
+        "seed": args.seed,
+        "scales": [],
+    }
+
+    # a fresh process per scale; ProcessPoolExecutor's workers are not daemonic,
+    # so the parallel transform can start its own pool inside
+    ctx = multiprocessing.get_context("spawn")
+    for n in args.scales:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            report["scales"].append(pool.submit(run_scale, n, args.seed, args.mysql, args.memory_budget,
+                                                args.workers).result())
+
+    out = args.output or RESULTS_DIR / f"pipeline-{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(f"\n✓ Results written to {out}")
+
+    if args.compare:
+        compare(report, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Synthea-shaped synthetic data at arbitrary scale.
+
+Encounter attributes (class, code, description, reason, duration, cost) and
+patient demographics are bootstrapped from the sample CSVs in data/synthea,
+so value distributions match real Synthea output. Volumes are skewed the
+way real claims data is: encounters per patient and per provider follow a
+Zipf-like power law, and encounter dates lean towards recent years.
+
+    raw = generate_raw(1_000_000)          # same dict shape as extract_from_mysql()
+    write_synthea_csv(raw, out_dir)        # Synthea CSV files, as read by load_to_mysql
+"""
+
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+SYNTHEA_DIR = BASE_DIR / "data" / "synthea"
+HRRP_FILE = BASE_DIR / "data" / "hrrp" / "FY_2025_Hospital_Readmissions_Reduction_Program_Hospital.csv"
+
+ENCOUNTERS_PER_PATIENT = 25
+ENCOUNTERS_PER_PROVIDER = 2000
+PROVIDERS_PER_ORGANIZATION = 5
+CONDITIONS_PER_ENCOUNTER = 0.2
+PROCEDURES_PER_ENCOUNTER = 0.5
+PATIENT_SKEW = 0.5     # Zipf exponents for encounter volume per entity
+PROVIDER_SKEW = 1.1
+CHUNK_ROWS = 1_000_000
+
+CONDITIONS = [
+    ("444814009", "Viral sinusitis (disorder)", 30),
+    ("195662009", "Acute viral pharyngitis (disorder)", 20),
+    ("10509002", "Acute bronchitis (disorder)", 15),
+    ("72892002", "Normal pregnancy", 10),
+    ("15777000", "Prediabetes", 8),
+    ("59621000", "Hypertension", 8),
+    ("44054006", "Diabetes", 4),
+    ("40055000", "Chronic sinusitis (disorder)", 3),
+    ("49436004", "Atrial Fibrillation", 1),
+    ("22298006", "Myocardial Infarction", 1),
+]
+PROCEDURES = [
+    ("430193006", "Medication Reconciliation (procedure)", 35, 450.0),
+    ("710824005", "Assessment of health and social care needs (procedure)", 20, 431.4),
+    ("171207006", "Depression screening (procedure)", 15, 431.4),
+    ("428191000124101", "Documentation of current medications", 12, 431.4),
+    ("23426006", "Measurement of respiratory function (procedure)", 8, 516.6),
+    ("76601001", "Intramuscular injection", 5, 516.6),
+    ("73761001", "Colonoscopy", 3, 10443.2),
+    ("415070008", "Percutaneous coronary intervention", 2, 21346.1),
+]
+
+_HEX = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+_UUID_HEX_POSITIONS = [i for i in range(36) if i not in (8, 13, 18, 23)]
+
+
+def uuids(rng: np.random.Generator, n: int) -> np.ndarray:
+    """n random UUID-formatted strings, built vectorized in chunks."""
+    out = np.empty(n, dtype="<U36")
+    for start in range(0, n, CHUNK_ROWS):
+        size = min(CHUNK_ROWS, n - start)
+        chars = np.full((size, 36), ord("-"), dtype=np.uint8)
+        chars[:, _UUID_HEX_POSITIONS] = _HEX[rng.integers(0, 16, size=(size, 32), dtype=np.uint8)]
+        out[start:start + size] = chars.view("S36").ravel().astype("<U36")
+    return out
+
+
+def skewed_choice(rng: np.random.Generator, k: int, n: int, skew: float) -> np.ndarray:
+    """n draws from range(k) with Zipf-like weights 1/rank**skew (ranks shuffled)."""
+    weights = 1.0 / np.arange(1, k + 1) ** skew
+    weights = rng.permutation(weights / weights.sum())
+    return np.searchsorted(np.cumsum(weights), rng.random(n), side="right").clip(0, k - 1)
+
+
+def _weighted(rng, options, n):
+    weights = np.array([o[2] for o in options], dtype="float64")
+    return rng.choice(len(options), size=n, p=weights / weights.sum())
+
+
+def generate_raw(n_encounters: int, seed: int = 0) -> dict:
+    """
+    Build a raw dataset with `n_encounters` encounters, shaped like the
+    output of extract_from_mysql() (staging-table columns and dtypes).
+    """
+    rng = np.random.default_rng(seed)
+    n_patients = max(n_encounters // ENCOUNTERS_PER_PATIENT, 50)
+    n_providers = max(n_encounters // ENCOUNTERS_PER_PROVIDER, 20)
+    n_organizations = max(n_providers // PROVIDERS_PER_ORGANIZATION, 5)
+
+    now = np.datetime64(datetime.now().replace(microsecond=0), "s")
+
+    # ---- organizations / providers ----
+    organization_ids = uuids(rng, n_organizations)
+    organizations = pd.DataFrame({
+        "id": organization_ids,
+        "name": [f"Synthetic Health Center {i}" for i in range(n_organizations)],
+    })
+
+    provider_ids = uuids(rng, n_providers)
+    providers = pd.DataFrame({
+        "provider_id": provider_ids,
+        "name": [f"Provider{i} Clinician{i % 997}" for i in range(n_providers)],
+        "gender": rng.choice(["M", "F"], size=n_providers),
+        "speciality": "GENERAL PRACTICE",
+        "organization": organization_ids[rng.integers(0, n_organizations, n_providers)],
+        "city": "Springfield",
+        "state": "MA",
+        "zip": "01106",
+    })
+
+    # ---- patients (demographics bootstrapped from the sample) ----
+    patient_template = pd.read_csv(SYNTHEA_DIR / "patients.csv", dtype=str, keep_default_na=False)
+    sample = patient_template.iloc[rng.integers(0, len(patient_template), n_patients)].reset_index(drop=True)
+    birth = now - (rng.uniform(0, 90, n_patients) * 365.25 * 86400).astype("timedelta64[s]")
+    died = rng.random(n_patients) < 0.15
+    death = birth + (rng.uniform(0.3, 1.0, n_patients) * (now - birth).astype("float64")).astype("timedelta64[s]")
+    patient_ids = uuids(rng, n_patients)
+    patients = pd.DataFrame({
+        "patient_id": patient_ids,
+        "birthdate": pd.Series(birth.astype("datetime64[D]")).dt.date,
+        "deathdate": pd.Series(np.where(died, death.astype("datetime64[D]"), np.datetime64("NaT"))).dt.date,
+        "first_name": sample["FIRST"].to_numpy(),
+        "last_name": sample["LAST"].to_numpy(),
+        "gender": sample["GENDER"].to_numpy(),
+        "race": sample["RACE"].to_numpy(),
+        "ethnicity": sample["ETHNICITY"].to_numpy(),
+        "city": sample["CITY"].to_numpy(),
+        "state": sample["STATE"].to_numpy(),
+        "zip": sample["ZIP"].to_numpy(),
+        "marital_status": sample["MARITAL"].replace("", None).to_numpy(),
+    })
+    patients.loc[~died, "deathdate"] = None
+
+    # ---- encounters (attributes bootstrapped from the sample) ----
+    template = pd.read_csv(SYNTHEA_DIR / "encounters.csv", dtype={"CODE": str, "REASONCODE": str})
+    template_duration = (
+        pd.to_datetime(template["STOP"]) - pd.to_datetime(template["START"])
+    ).dt.total_seconds().to_numpy()
+    rows = rng.integers(0, len(template), n_encounters)
+
+    years_ago = np.minimum(rng.exponential(8.0, n_encounters), 70.0)
+    start = now - (years_ago * 365.25 * 86400).astype("timedelta64[s]")
+    end = start + template_duration[rows].astype("timedelta64[s]")
+
+    encounter_ids = uuids(rng, n_encounters)
+    encounter_patients = skewed_choice(rng, n_patients, n_encounters, PATIENT_SKEW)
+    encounters = pd.DataFrame({
+        "encounter_id": encounter_ids,
+        "patient_id": patient_ids[encounter_patients],
+        "provider_id": provider_ids[skewed_choice(rng, n_providers, n_encounters, PROVIDER_SKEW)],
+        "encounter_type": template["CODE"].to_numpy()[rows],
+        "encounter_class": template["ENCOUNTERCLASS"].to_numpy()[rows],
+        "start_datetime": start.astype("datetime64[ns]"),
+        "end_datetime": end.astype("datetime64[ns]"),
+        "total_cost": template["TOTAL_CLAIM_COST"].to_numpy()[rows] * rng.lognormal(0.0, 0.25, n_encounters),
+        "reason_code": template["REASONCODE"].to_numpy()[rows],
+        "reason_description": template["REASONDESCRIPTION"].to_numpy()[rows],
+    })
+
+    # ---- conditions / procedures, attached to random encounters ----
+    def _children(rate):
+        n = int(n_encounters * rate)
+        parents = rng.integers(0, n_encounters, n)
+        return n, parents
+
+    n_conditions, parents = _children(CONDITIONS_PER_ENCOUNTER)
+    picks = _weighted(rng, CONDITIONS, n_conditions)
+    onset = start[parents].astype("datetime64[D]")
+    abated = rng.random(n_conditions) < 0.7
+    conditions = pd.DataFrame({
+        "condition_id": uuids(rng, n_conditions),
+        "patient_id": patient_ids[encounter_patients[parents]],
+        "encounter_id": encounter_ids[parents],
+        "code": np.array([c[0] for c in CONDITIONS])[picks],
+        "description": np.array([c[1] for c in CONDITIONS])[picks],
+        "onset_date": pd.Series(onset).dt.date,
+        "abatement_date": pd.Series(
+            np.where(abated, onset + rng.integers(7, 60, n_conditions).astype("timedelta64[D]"),
+                     np.datetime64("NaT"))
+        ).dt.date,
+    })
+    conditions.loc[~abated, "abatement_date"] = None
+
+    n_procedures, parents = _children(PROCEDURES_PER_ENCOUNTER)
+    picks = _weighted(rng, PROCEDURES, n_procedures)
+    procedures = pd.DataFrame({
+        "procedure_id": uuids(rng, n_procedures),
+        "patient_id": patient_ids[encounter_patients[parents]],
+        "encounter_id": encounter_ids[parents],
+        "code": np.array([p[0] for p in PROCEDURES])[picks],
+        "description": np.array([p[1] for p in PROCEDURES])[picks],
+        "performed_datetime": start[parents].astype("datetime64[ns]"),
+        "cost": np.array([p[3] for p in PROCEDURES])[picks],
+    })
+
+    return {
+        "providers": providers,
+        "patients": patients,
+        "encounters": encounters,
+        "conditions": conditions,
+        "procedures": procedures,
+        "organizations": organizations,
+        "readmissions": load_readmissions(),
+    }
+
+
+def load_readmissions() -> pd.DataFrame:
+    """The HRRP file as stg_hospital_readmissions rows (it does not scale with encounters)."""
+    hrrp = pd.read_csv(HRRP_FILE, dtype=str)
+    numeric = lambda col: pd.to_numeric(hrrp[col], errors="coerce")
+    return pd.DataFrame({
+        "id": np.arange(1, len(hrrp) + 1),
+        "hospital_id": hrrp["Facility ID"],
+        "hospital_name": hrrp["Facility Name"],
+        "measure_name": hrrp["Measure Name"],
+        "number_of_discharges": numeric("Number of Discharges"),
+        "expected_readmission_rate": numeric("Expected Readmission Rate"),
+        "predicted_readmission_rate": numeric("Predicted Readmission Rate"),
+        "excess_readmission_ratio": numeric("Excess Readmission Ratio"),
+        "number_of_readmissions": numeric("Number of Readmissions"),
+        "start_date": pd.to_datetime(hrrp["Start Date"], format="%m/%d/%Y").dt.date,
+        "end_date": pd.to_datetime(hrrp["End Date"], format="%m/%d/%Y").dt.date,
+    })
+
+
+# Synthea CSV header → staging column, per file (inverse of load_to_mysql's mappings)
+SYNTHEA_COLUMNS = {
+    "providers": {"Id": "provider_id", "NAME": "name", "GENDER": "gender", "SPECIALITY": "speciality",
+                  "ORGANIZATION": "organization", "CITY": "city", "STATE": "state", "ZIP": "zip"},
+    "patients": {"Id": "patient_id", "BIRTHDATE": "birthdate", "DEATHDATE": "deathdate",
+                 "FIRST": "first_name", "LAST": "last_name", "GENDER": "gender", "RACE": "race",
+                 "ETHNICITY": "ethnicity", "CITY": "city", "STATE": "state", "ZIP": "zip",
+                 "MARITAL": "marital_status"},
+    "encounters": {"Id": "encounter_id", "START": "start_datetime", "STOP": "end_datetime",
+                   "PATIENT": "patient_id", "PROVIDER": "provider_id", "ENCOUNTERCLASS": "encounter_class",
+                   "CODE": "encounter_type", "TOTAL_CLAIM_COST": "total_cost",
+                   "REASONCODE": "reason_code", "REASONDESCRIPTION": "reason_description"},
+    "conditions": {"START": "onset_date", "STOP": "abatement_date", "PATIENT": "patient_id",
+                   "ENCOUNTER": "encounter_id", "CODE": "code", "DESCRIPTION": "description"},
+    "procedures": {"DATE": "performed_datetime", "PATIENT": "patient_id", "ENCOUNTER": "encounter_id",
+                   "CODE": "code", "DESCRIPTION": "description", "BASE_COST": "cost"},
+    "organizations": {"Id": "id", "NAME": "name"},
+}
+
+
+def write_synthea_csv(raw: dict, out_dir: Path) -> Path:
+    """Write the generated tables as Synthea CSV files (ISO-8601 'Z' timestamps)."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name, columns in SYNTHEA_COLUMNS.items():
+        df = raw[name][list(columns.values())].copy()
+        for col in df.columns:
+            if pd.api.types.is_datetime64_any_dtype(df[col]):
+                df[col] = df[col].dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+        df.columns = list(columns.keys())
+        df.to_csv(out_dir / f"{name}.csv", index=False)
+    return out_dir
@@ -0,0 +1,134 @@
+"""
+Dashboard transport benchmark: JSON vs Arrow IPC per dashboard page.
+
+For every endpoint a page fetches, requests the JSON and the Arrow
+representation from a running API and records payload bytes and the time
+to turn the body into a plot-ready DataFrame (including the date parsing
+the JSON path needs).
+
+Usage:
+    uvicorn api.main:app &
+    python -m benchmarks.transport [--base-url http://127.0.0.1:8000/api] [--repeat 5]
+"""
+
+import argparse
+import io
+import json
+import statistics
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import requests
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+# (path, params, date columns) per dashboard page
+PAGES = {
+    "Overview": [
+        ("/appointments/series", {"start_year": 2015, "end_year": 2019}, ["month_year"]),
+        ("/appointments/monthly", {}, []),
+        ("/appointments/by-class", {}, []),
+    ],
+    "Provider Analytics": [
+        ("/providers/top", {"by": "total_encounters", "limit": 10}, []),
+        ("/providers/top", {"by": "total_revenue", "limit": 10}, []),
+        ("/providers/", {}, ["first_encounter", "last_encounter"]),
+    ],
+    "Appointment Trends": [
+        ("/appointments/series", {"start_year": 2018, "end_year": 2020}, ["month_year"]),
+        ("/appointments/cumulative", {"start_year": 2018, "end_year": 2020}, ["month_year"]),
+        ("/appointments/by-class", {"start_year": 2018, "end_year": 2020}, []),
+        ("/appointments/reasons", {"order_by": "total_appointments", "limit": 10}, []),
+        ("/appointments/reasons", {"order_by": "total_cost", "limit": 10}, []),
+    ],
+    "Readmission Analysis": [
+        ("/readmissions/rates", {"limit": 10}, []),
+    ],
+}
+
+
+def decode_json(body: bytes, dates: list) -> pd.DataFrame:
+    df = pd.DataFrame(json.loads(body))
+    for col in dates:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col])
+    return df
+
+
+def decode_arrow(body: bytes, dates: list) -> pd.DataFrame:
+    return pa.ipc.open_stream(io.BytesIO(body)).read_all().to_pandas(date_as_object=False)
+
+
+def measure(session, base_url, path, params, dates, fmt, repeat):
+    accept = ARROW_STREAM if fmt == "arrow" else "application/json"
+    response = session.get(base_url + path, params=params, headers={"Accept": accept}, timeout=120)
+    response.raise_for_status()
+    body = response.content
+    served = "arrow" if response.headers.get("Content-Type", "").startswith(ARROW_STREAM) else "json"
+    decode = decode_arrow if served == "arrow" else decode_json
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df = decode(body, dates)
+        timings.append(time.perf_counter() - start)
+
+    return {
+        "format": fmt,
+        "served_as": served,
+        "bytes": len(body),
+        "rows": len(df),
+        "decode_ms": round(statistics.median(timings) * 1000, 3),
+    }
+
+
+def run(base_url: str, repeat: int) -> dict:
+    session = requests.Session()
+    results = []
+    for page, endpoints in PAGES.items():
+        for path, params, dates in endpoints:
+            for fmt in ("json", "arrow"):
+                row = measure(session, base_url, path, params, dates, fmt, repeat)
+                row.update({"page": page, "endpoint": path, "params": params})
+                results.append(row)
+
+    totals = {}
+    for row in results:
+        key = (row["page"], row["format"])
+        total = totals.setdefault(key, {"page": row["page"], "format": row["format"], "bytes": 0, "decode_ms": 0.0})
+        total["bytes"] += row["bytes"]
+        total["decode_ms"] = round(total["decode_ms"] + row["decode_ms"], 3)
+
+    return {
+        "benchmark": "transport",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "base_url": base_url,
+        "endpoints": results,
+        "pages": list(totals.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000/api")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    report = run(args.base_url, args.repeat)
+
+    print(f"{'page':<22} {'format':<6} {'bytes':>10} {'decode ms':>10}")
+    for total in report["pages"]:
+        print(f"{total['page']:<22} {total['format']:<6} {total['bytes']:>10} {total['decode_ms']:>10}")
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    out = RESULTS_DIR / f"transport-{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.write_text(json.dumps(report, indent=2))
+    print(f"\n✓ Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Dashboard data-access layer for the Healthcare Analytics API.
+
+- One pooled keep-alive requests.Session per Streamlit server process
+- Page endpoints fetched concurrently
+- Responses cached with st.cache_data (TTL) keyed by data version (the
+  warehouse version and the API's in-memory snapshot version, as in the
+  API's ETags), cleared as soon as the API reports a new one
+- Conditional requests (If-None-Match / 304) so an expired cache entry for
+  unchanged data costs a header round-trip instead of a full payload
+- Arrow IPC negotiated for tabular endpoints (typed timestamps, dictionary
+  categories), falling back to JSON when the API answers with JSON
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from urllib3.util.retry import Retry
+
+BASE_URL = os.getenv("API_BASE_URL", "http://127.0.0.1:8000/api")
+HEALTH_URL = BASE_URL.rsplit("/api", 1)[0] + "/health"
+
+CACHE_TTL_SECONDS = int(os.getenv("DASHBOARD_CACHE_TTL", "300"))
+VERSION_TTL_SECONDS = int(os.getenv("DASHBOARD_VERSION_TTL", "30"))
+REQUEST_TIMEOUT = (3.05, 60)
+MAX_WORKERS = 8
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+# "arrow" negotiates Arrow with JSON fallback; "json" never asks for Arrow
+TRANSPORT = os.getenv("DASHBOARD_TRANSPORT", "arrow")
+ACCEPT = {
+    "arrow": f"{ARROW_STREAM}, application/json;q=0.9",
+    "json": "application/json",
+}[TRANSPORT]
+
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """Shared keep-alive session; connections are reused across reruns and users."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=MAX_WORKERS * 2,
+        max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504],
+                          allowed_methods=["GET"]),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Accept": ACCEPT})
+    return session
+
+
+# url -> (etag, payload); lets a 304 reuse the last body we decoded
+_etag_store = {}
+_etag_lock = threading.Lock()
+_state = {"version": None}
+
+
+def _http_get(path: str, params: tuple = ()):
+    """GET BASE_URL+path with If-None-Match; raises requests.HTTPError on failure."""
+    url = BASE_URL + path
+    key = url + "?" + "&".join(f"{k}={v}" for k, v in params)
+
+    headers = {}
+    with _etag_lock:
+        cached = _etag_store.get(key)
+    if cached:
+        headers["If-None-Match"] = cached[0]
+
+    response = get_session().get(url, params=dict(params), headers=headers, timeout=REQUEST_TIMEOUT)
+    if response.status_code == 304 and cached:
+        return cached[1]
+    response.raise_for_status()
+
+    payload = decode_response(response)
+    etag = response.headers.get("ETag")
+    if etag:
+        with _etag_lock:
+            _etag_store[key] = (etag, payload)
+    return payload
+
+
+def decode_response(response: requests.Response):
+    """Arrow stream -> typed DataFrame; anything else is parsed as JSON."""
+    if response.headers.get("Content-Type", "").startswith(ARROW_STREAM):
+        table = pa.ipc.open_stream(response.content).read_all()
+        return table.to_pandas(date_as_object=False)
+    return response.json()
+
+
+def to_frame(payload, columns: list = None, dates: tuple = ()) -> pd.DataFrame:
+    """
+    Normalize an endpoint payload to a DataFrame.
+
+    Arrow payloads are already typed; JSON payloads (list of rows) get the
+    `dates` columns parsed. A failed fetch (None) yields an empty frame.
+    """
+    if isinstance(payload, pd.DataFrame):
+        return payload.reindex(columns=columns) if columns else payload
+    df = pd.DataFrame(payload or [], columns=columns)
+    for col in dates:
+        if col in df.columns and df[col].dtype == object:
+            df[col] = pd.to_datetime(df[col])
+    return df
+
+
+@st.cache_data(ttl=VERSION_TTL_SECONDS, show_spinner=False)
+def _fetch_version():
+    try:
+        response = get_session().get(HEALTH_URL, headers={"Accept": "application/json"},
+                                     timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        health = response.json()
+        # snapshot-served endpoints change with the snapshot, not the warehouse
+        versions = (health.get("warehouse_version"), (health.get("snapshot") or {}).get("version"))
+        return "|".join(v for v in versions if v) or None
+    except requests.exceptions.RequestException:
+        return None
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def _fetch_cached(path: str, params: tuple, version):
+    # `version` is only part of the cache key
+    return _http_get(path, params)
+
+
+def warehouse_version():
+    """Current data version (warehouse|snapshot); drops every cached response when it changes."""
+    version = _fetch_version()
+    if version is not None and version != _state["version"]:
+        if _state["version"] is not None:
+            _fetch_cached.clear()
+            with _etag_lock:
+                _etag_store.clear()
+        _state["version"] = version
+    return version
+
+
+def fetch(path: str, params: dict = None):
+    """Fetch one endpoint through the cache."""
+    return _fetch_cached(path, tuple(sorted((params or {}).items())), warehouse_version())
+
+
+def fetch_many(endpoints: dict):
+    """
+    Fetch several endpoints concurrently.
+
+    endpoints: {name: path} or {name: (path, params)}
+    Returns (data, errors): payloads by name, and error messages by name
+    for endpoints that failed (their payload is None).
+    """
+    version = warehouse_version()
+    ctx = get_script_run_ctx()
+
+    def _attach_ctx():
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+
+    def _one(spec):
+        path, params = spec if isinstance(spec, tuple) else (spec, None)
+        return _fetch_cached(path, tuple(sorted((params or {}).items())), version)
+
+    data, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(endpoints) or 1),
+                            initializer=_attach_ctx) as pool:
+        futures = {name: pool.submit(_one, spec) for name, spec in endpoints.items()}
+        for name, future in futures.items():
+            try:
+                data[name] = future.result()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                data[name] = None
+                errors[name] = str(e)
+    return data, errors
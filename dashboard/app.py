@@ -1,9 +1,7 @@
 import streamlit as st
-import requests
-import pandas as pd
 import plotly.express as px
 
-BASE_URL = "http://127.0.0.1:8000/api"
+from api_client import fetch_many, to_frame
 
 st.set_page_config(
     page_title="Healthcare Analytics Dashboard",
@@ -30,28 +28,23 @@ st.markdown("---")
 # --------------------------
 if page == "Overview":
 
-    response = requests.get(f"{BASE_URL}/providers")
-
-    if response.status_code == 200:
-        providers = response.json()
-    else:
-        st.error(f"API Error: {response.status_code}")
-        st.write(response.text)
-        providers = []
-
-    response = requests.get(f"{BASE_URL}/appointments/analytics")
-    try:
-        appointments = response.json()
-    except requests.exceptions.JSONDecodeError:
-        st.error("Failed to load appointment analytics. Response is not valid JSON.")
-        st.write("Response content:", response.text)
-        appointments = []
-    
-    readmissions = requests.get(f"{BASE_URL}/readmissions/rates").json()
-
-    df_providers = pd.DataFrame(providers)
-    df_appointments = pd.DataFrame(appointments)
-    df_readmissions = pd.DataFrame(readmissions)
+    # Every chart's shape is computed by the API; only plot-ready rows come back
+    data, errors = fetch_many({
+        "providers": "/providers/summary",
+        "series": ("/appointments/series", {"start_year": 2015, "end_year": 2019}),
+        "monthly": "/appointments/monthly",
+        "by_class": "/appointments/by-class",
+        "readmissions": "/readmissions/stats",
+    })
+    for name, error in errors.items():
+        st.error(f"API Error ({name}): {error}")
+
+    providers_summary = data["providers"] or {}
+    readmissions_summary = data["readmissions"] or {}
+    df_series = to_frame(data["series"], ["month_year", "encounter_class", "total_appointments"],
+                         dates=["month_year"])
+    df_heat = to_frame(data["monthly"], ["year", "month", "total_appointments"])
+    df_pie = to_frame(data["by_class"], ["encounter_class", "total_appointments", "avg_duration"])
 
      # ---------------- KPI CARDS ----------------
     with st.container():
@@ -59,32 +52,24 @@ if page == "Overview":
 
         col1.metric(
             label="👨‍⚕️ Total Providers",
-            value=len(df_providers),
+            value=providers_summary.get("provider_count", 0),
         )
         col2.metric(
             label="📅 Total Appointments",
-            value=df_appointments["total_appointments"].sum(),
+            value=df_pie["total_appointments"].sum(),
         )
         col3.metric(
             label="🏥 Avg Readmission Rate",
-            value=f"{round(df_readmissions['readmission_rate'].mean(), 2)}%",
+            value=f"{round(readmissions_summary.get('avg_ratio') or 0, 2)}%",
         )
         col4.metric(
             label="💉 Total Encounter Classes",  # Updated label
-            value=df_appointments["encounter_class"].nunique(),  # use encounter_class
+            value=df_pie["encounter_class"].nunique(),  # use encounter_class
         )
 
-    # Convert month_year to datetime for better x-axis handling
-    df_appointments["month_year"] = pd.to_datetime(
-        df_appointments["year"].astype(str) + "-" + df_appointments["month"].astype(str) + "-01"
-    )
-
-    # Filter for years 2015 to 2019
-    df_filtered = df_appointments[(df_appointments["year"] >= 2015) & (df_appointments["year"] <= 2019)]
-
-    # Create the line chart
+    # Create the line chart (series already limited to 2015-2019 by the API)
     fig = px.line(
-        df_filtered,
+        df_series,
         x="month_year",
         y="total_appointments",
         color="encounter_class",
@@ -109,7 +94,6 @@ if page == "Overview":
     # Display chart
     st.plotly_chart(fig, use_container_width=True)
 
-    df_heat = df_appointments.groupby(["year", "month"])["total_appointments"].sum().reset_index()
     fig_heat = px.density_heatmap(
         df_heat,
         x="month",
@@ -125,20 +109,10 @@ if page == "Overview":
     )
     st.plotly_chart(fig_heat, use_container_width=True)
 
-    # Group and sort
-    if "encounter_class" in df_appointments.columns:
-        df_pie = (
-            df_appointments
-            .groupby("encounter_class")["total_appointments"]
-            .sum()
-            .reset_index()
-            .sort_values("total_appointments", ascending=False)
-        )
-
-    # Create pie chart
+    # Create pie chart (grouped and sorted by the API)
     fig_pie = px.pie(
         df_pie,
-        names="encounter_class" if "encounter_class" in df_appointments.columns else "speciality",
+        names="encounter_class",
         values="total_appointments",
         title="🥧 Encounter Class Distribution"
     )
@@ -154,12 +128,16 @@ if page == "Overview":
 # --------------------------
 elif page == "Provider Analytics":
 
-    try:
-        providers = requests.get(f"{BASE_URL}/providers").json()
-        df = pd.DataFrame(providers)
-    except Exception as e:
-        st.error(f"Could not load provider data: {e}")
-        df = pd.DataFrame()
+    data, errors = fetch_many({
+        "summary": "/providers/summary",
+        "top_encounters": ("/providers/top", {"by": "total_encounters", "limit": 10}),
+        "top_revenue": ("/providers/top", {"by": "total_revenue", "limit": 10}),
+    })
+    for name, error in errors.items():
+        st.error(f"Could not load provider data ({name}): {error}")
+    summary = data["summary"] or {}
+    top_columns = ["provider_key", "provider_name", "total_encounters", "unique_patients",
+                   "avg_encounter_duration_hrs", "total_revenue"]
 
     # --------------------------
     # 📊 KPI Metrics
@@ -167,10 +145,10 @@ elif page == "Provider Analytics":
     st.markdown('<h3 style="color: red;">📈 Key Metrics</h3>', unsafe_allow_html=True)
     col1, col2, col3, col4 = st.columns(4)
     col1, col2, col3, col4 = st.columns(4)
-    col1.metric("👨‍⚕️ Total Providers", df["provider_name"].nunique())
-    col2.metric("📅 Total Encounters", int(df["total_encounters"].sum()) if "total_encounters" in df.columns else 0)
-    col3.metric("🧑‍🤝‍🧑 Unique Patients", df["unique_patients"].sum() if "unique_patients" in df.columns else 0)
-    total_revenue = df['total_revenue'].sum() if "total_revenue" in df.columns else 0
+    col1.metric("👨‍⚕️ Total Providers", summary.get("total_providers", 0))
+    col2.metric("📅 Total Encounters", int(summary.get("total_encounters", 0)))
+    col3.metric("🧑‍🤝‍🧑 Unique Patients", summary.get("unique_patients", 0))
+    total_revenue = summary.get("total_revenue", 0)
     total_revenue_million = total_revenue / 1_000_000
     col4.metric(
         label="💰 Total Revenue (Million $)", 
@@ -181,7 +159,7 @@ elif page == "Provider Analytics":
     # 📊 Visualizations
     # --------------------------
     # 1️⃣ Total Encounters by Provider (Top 10)
-    top10_df = df.sort_values("total_encounters", ascending=False).head(10)
+    top10_df = to_frame(data["top_encounters"], top_columns)
 
     fig1 = px.bar(
         top10_df,
@@ -205,7 +183,7 @@ elif page == "Provider Analytics":
     st.plotly_chart(fig1, use_container_width=True)
 
   # 2️⃣ Revenue by Provider (Top 10)
-    top10_revenue = df.sort_values("total_revenue", ascending=False).head(10)
+    top10_revenue = to_frame(data["top_revenue"], top_columns)
 
     # Function to convert numbers to K / M format
     def format_currency(value):
@@ -240,7 +218,7 @@ elif page == "Provider Analytics":
     st.plotly_chart(fig2, use_container_width=True)
 
    # 3️⃣ Total Encounters & Unique Patients (Top 10)
-    top10_enc = df.sort_values("total_encounters", ascending=False).head(10)
+    top10_enc = top10_df
 
     fig_enc = px.bar(
         top10_enc,
@@ -261,23 +239,25 @@ elif page == "Provider Analytics":
 
     st.plotly_chart(fig_enc, use_container_width=True)
 
+    st.markdown('<h3 style="color:red;">👨‍⚕️ Provider Productivity</h3>', unsafe_allow_html=True)
+
+    # 🔍 Search Box (filtered server-side)
+    search = st.text_input("Search Provider")
+
+    data, errors = fetch_many({"providers": ("/providers/", {"q": search} if search else None)})
+    if errors:
+        st.error(f"Could not load provider data: {errors['providers']}")
+    df = to_frame(data["providers"], dates=["first_encounter", "last_encounter"])
+
     # Remove unwanted columns safely
     columns_to_drop = ["provider_id", "organization", "organization_id","provider_key","total_encounters","unique_patients","avg_cost_per_encounter","total_revenue","avg_cost_per_encounter","avg_encounter_duration_hrs"]
     df = df.drop(columns=[col for col in columns_to_drop if col in df.columns])
 
     # Add first_encounter and last_encounter columns (if they exist in data)
     if "first_encounter" in df.columns:
-        df["first_encounter"] = pd.to_datetime(df["first_encounter"]).dt.strftime("%Y-%m-%d %H:%M:%S")
+        df["first_encounter"] = df["first_encounter"].dt.strftime("%Y-%m-%d %H:%M:%S")
     if "last_encounter" in df.columns:
-        df["last_encounter"] = pd.to_datetime(df["last_encounter"]).dt.strftime("%Y-%m-%d %H:%M:%S")
-
-    st.markdown('<h3 style="color:red;">👨‍⚕️ Provider Productivity</h3>', unsafe_allow_html=True)
-
-    # 🔍 Search Box
-    search = st.text_input("Search Provider")
-
-    if search:
-        df = df[df["provider_name"].str.contains(search, case=False, na=False)]
+        df["last_encounter"] = df["last_encounter"].dt.strftime("%Y-%m-%d %H:%M:%S")
 
     # --------------------------
     # 📊 Chart Section
@@ -310,34 +290,29 @@ elif page == "Provider Analytics":
 # --------------------------
 elif page == "Appointment Trends":
 
-    BASE_URL = "http://127.0.0.1:8000/api"
-
     # -------------------------------
-    # Fetch Data
+    # Fetch Data (2018-2020 series, KPI summary and reasons in parallel)
     # -------------------------------
-    data = requests.get(f"{BASE_URL}/appointments/analytics").json()
-    df_appointments = pd.DataFrame(data)
+    years = {"start_year": 2018, "end_year": 2020}
+    data, errors = fetch_many({
+        "series": ("/appointments/series", years),
+        "cumulative": ("/appointments/cumulative", years),
+        "duration": ("/appointments/by-class", years),
+        "summary": "/appointments/summary",
+        "reasons": ("/appointments/reasons", {"order_by": "total_appointments", "limit": 10}),
+        "reasons_cost": ("/appointments/reasons", {"order_by": "total_cost", "limit": 10}),
+    })
+    for name, error in errors.items():
+        st.error(f"API Error ({name}): {error}")
 
     st.markdown('<h3 style="color:red;">📅 Appointment Trends Dashboard</h3>', unsafe_allow_html=True)
 
-    # -------------------------------
-    # Fetch KPI Summary
-    # -------------------------------
-    try:
-        summary_data = requests.get(f"{BASE_URL}/appointments/summary").json()
-        summary = summary_data[0] if isinstance(summary_data, list) and len(summary_data) > 0 else {}
-    except:
-        summary = {}
+    summary_data = data["summary"]
+    summary = summary_data[0] if isinstance(summary_data, list) and len(summary_data) > 0 else {}
 
-    # -------------------------------
-    # Fetch Reasons
-    # -------------------------------
-    try:
-        reasons_data = requests.get(f"{BASE_URL}/appointments/reasons").json()
-        if isinstance(reasons_data, dict):
-            reasons_data = [reasons_data]
-    except:
-        reasons_data = []
+    reasons_data = data["reasons"]
+    if isinstance(reasons_data, dict):
+        reasons_data = [reasons_data]
 
     # -------------------------------
     # KPI SECTION
@@ -357,22 +332,10 @@ elif page == "Appointment Trends":
     col4.metric("💰 Total Cost ($)", f"{summary.get('total_cost', 0)/1_000_000:.2f}M")
 
     # -------------------------------
-    # PREPROCESS DATA
+    # PREPROCESS DATA (filtered and grouped by the API)
     # -------------------------------
-    df_appointments["month_year"] = pd.to_datetime(
-        df_appointments["year"].astype(str) + "-" +
-        df_appointments["month"].astype(str) + "-01"
-    )
-
-    # Filter only years (NO non-zero filtering now)
-    df_filtered = df_appointments[
-        (df_appointments["year"] >= 2018) &
-        (df_appointments["year"] <= 2020)
-    ]
-
-    df_grouped = df_filtered.groupby(
-    ["month_year", "encounter_class"]
-    )["total_appointments"].sum().reset_index()
+    df_grouped = to_frame(data["series"], ["month_year", "encounter_class", "total_appointments"],
+                          dates=["month_year"])
 
     fig_area = px.line(
     df_grouped,
@@ -397,12 +360,13 @@ elif page == "Appointment Trends":
     # -------------------------------
     # CUMULATIVE TREND
     # -------------------------------
-    df_cum = df_filtered.groupby("month_year")["total_appointments"].sum().cumsum().reset_index()
+    df_cum = to_frame(data["cumulative"], ["month_year", "total_appointments", "cumulative_appointments"],
+                      dates=["month_year"])
 
     fig_cum = px.line(
         df_cum,
         x="month_year",
-        y="total_appointments",
+        y="cumulative_appointments",
         title="📈 Cumulative Appointments Trend",
         template="plotly_white",
         markers=True
@@ -416,7 +380,7 @@ elif page == "Appointment Trends":
     # -------------------------------
     # TOP 10 REASONS
     # -------------------------------
-    df_reasons = pd.DataFrame(reasons_data)
+    df_reasons = to_frame(reasons_data)
 
     required_cols = ["reason_code", "reason_description",
                      "total_appointments", "unique_patients", "total_cost"]
@@ -451,9 +415,7 @@ elif page == "Appointment Trends":
     # -------------------------------
     # COST ONLY COMPARISON (Orange + Values)
     # -------------------------------
-    df_reason_cost = df_reasons.sort_values(
-        "total_cost", ascending=False
-    ).head(10)
+    df_reason_cost = to_frame(data["reasons_cost"], required_cols)
 
     fig_compare = px.bar(
         df_reason_cost,
@@ -489,18 +451,21 @@ elif page == "Appointment Trends":
     # -------------------------------
     # DURATION SCATTER
     # -------------------------------
-    df_duration = df_filtered.groupby("encounter_class").agg(
-        avg_duration=("avg_duration", "mean"),
-        total_appointments=("total_appointments", "sum")
-    ).reset_index()
+    df_duration = to_frame(data["duration"], ["encounter_class", "total_appointments", "avg_duration"])
 
 # --------------------------
 # READMISSION ANALYSIS
 # --------------------------
 elif page == "Readmission Analysis":
 
-    data = requests.get(f"{BASE_URL}/readmissions/rates").json()
-    df = pd.DataFrame(data)
+    data, errors = fetch_many({
+        "stats": "/readmissions/stats",
+        "top": ("/readmissions/rates", {"limit": 10}),
+    })
+    for name, error in errors.items():
+        st.error(f"API Error ({name}): {error}")
+    stats = data["stats"] or {}
+    df = to_frame(data["top"])
 
     # --------------------------
     # 🏥 Readmission KPI Metrics
@@ -512,11 +477,11 @@ elif page == "Readmission Analysis":
     # Total Hospitals
     col1.metric(
         label="🏨 Total Hospitals",
-        value=f"{df['hospital_name'].nunique()}" if "hospital_name" in df.columns else "0"
+        value=f"{stats.get('total_hospitals', 0)}"
     )
 
     # Average Readmission Rate
-    avg_rate = df['readmission_rate'].mean() if "readmission_rate" in df.columns else 0
+    avg_rate = stats.get("avg_ratio") or 0
     col2.metric(
         label="📊 Average Readmission Rate (%)",
         value=f"{avg_rate:.2f}%"
@@ -532,21 +497,20 @@ elif page == "Readmission Analysis":
             return str(number)
     
     # Total Readmissions
-    total_readmissions = df['number_of_readmissions'].sum() if "number_of_readmissions" in df.columns else 0
+    total_readmissions = stats.get("total_readmissions") or 0
     col3.metric(
         label="🧪 Total Readmissions",
         value=format_k_m(total_readmissions)
     )
 
     # Highest Readmission Rate
-    max_rate = df['readmission_rate'].max() if "readmission_rate" in df.columns else 0
+    max_rate = stats.get("max_ratio") or 0
     col4.metric(
         label="⚠️ Highest Readmission Rate (%)",
         value=f"{max_rate:.2f}%"
     )
 
-    # Sort and take top 10
-    df = df.sort_values(by="readmission_rate", ascending=False).head(10)
+    # Top 10 by readmission rate (sorted and limited by the API)
 
     fig = px.bar(
         df,
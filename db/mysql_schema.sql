@@ -16,6 +16,7 @@ DROP TABLE IF EXISTS stg_patients;
 DROP TABLE IF EXISTS stg_providers;
 DROP TABLE IF EXISTS stg_organizations;
 DROP TABLE IF EXISTS stg_hospital_readmissions;
+DROP TABLE IF EXISTS etl_source_files;
 
 CREATE TABLE stg_providers (
     provider_id     VARCHAR(36) PRIMARY KEY,
@@ -26,7 +27,20 @@ CREATE TABLE stg_providers (
     city            VARCHAR(100),
     state           VARCHAR(2),
     zip             VARCHAR(10),
-    created_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    row_fingerprint CHAR(16),
+    created_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- -----------------------------------------------------------
+-- Staging: Organizations
+-- -----------------------------------------------------------
+CREATE TABLE stg_organizations (
+    id              VARCHAR(36) PRIMARY KEY,
+    name            VARCHAR(200),
+    row_fingerprint CHAR(16),
+    created_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- -----------------------------------------------------------
@@ -45,7 +59,9 @@ CREATE TABLE stg_patients (
     state           VARCHAR(50),
     zip             VARCHAR(10),
     marital_status  CHAR(1),
-    created_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    row_fingerprint CHAR(16),
+    created_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- -----------------------------------------------------------
@@ -62,7 +78,9 @@ CREATE TABLE stg_encounters (
     total_cost          DECIMAL(12, 2),
     reason_code         VARCHAR(20),
     reason_description  VARCHAR(200),
+    row_fingerprint     CHAR(16),
     created_at          TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at          TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (patient_id) REFERENCES stg_patients(patient_id),
     FOREIGN KEY (provider_id) REFERENCES stg_providers(provider_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -78,7 +96,9 @@ CREATE TABLE stg_conditions (
     description     VARCHAR(200),
     onset_date      DATE,
     abatement_date  DATE NULL,
+    row_fingerprint CHAR(16),
     created_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (patient_id) REFERENCES stg_patients(patient_id),
     FOREIGN KEY (encounter_id) REFERENCES stg_encounters(encounter_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -94,7 +114,9 @@ CREATE TABLE stg_procedures (
     description         VARCHAR(200),
     performed_datetime  DATETIME,
     cost                DECIMAL(12, 2),
+    row_fingerprint     CHAR(16),
     created_at          TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at          TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (patient_id) REFERENCES stg_patients(patient_id),
     FOREIGN KEY (encounter_id) REFERENCES stg_encounters(encounter_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -114,7 +136,24 @@ CREATE TABLE stg_hospital_readmissions (
     number_of_readmissions      INT,
     start_date                  DATE,
     end_date                    DATE,
-    created_at                  TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    row_fingerprint             CHAR(16),
+    created_at                  TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at                  TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_readmissions_measure (hospital_id, measure_name)  -- re-loads upsert on it
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- -----------------------------------------------------------
+-- Loader: source manifest (what of each input file is staged)
+-- -----------------------------------------------------------
+CREATE TABLE etl_source_files (
+    source_name         VARCHAR(50) PRIMARY KEY,
+    file_path           VARCHAR(500),
+    size_bytes          BIGINT,
+    mtime_ns            BIGINT,
+    content_hash        CHAR(64),          -- sha256 of bytes [0, committed_offset); zip members: CRC-size
+    committed_offset    BIGINT,            -- end of the last complete line staged
+    key_counts          LONGBLOB,          -- natural-key occurrence counts of the staged rows (identity.pack_key_counts)
+    updated_at          TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- -----------------------------------------------------------
@@ -0,0 +1,157 @@
+"""
+Checkpoints for resumable pipeline runs.
+
+Stage outputs (the raw extract tables, the star-schema tables) are cached
+as Parquet under data/checkpoints/<stage>/<key>/, where the key is a
+fingerprint of everything the output depends on:
+
+    extract   → source watermark + extract code version
+    transform → extract key + transform code version
+
+A rerun with the same key reads the cached tables instead of recomputing
+the stage. The run state (data/checkpoints/_last_run.json) records the key
+and completion time of every finished stage, so `--resume` can continue
+from the last successful stage without touching the source.
+
+A checkpoint directory is written under a temporary name and renamed into
+place once every table is on disk; a half-written checkpoint is never read.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+BASE_DIR = Path(__file__).resolve().parent
+CHECKPOINT_DIR = Path(os.getenv("ETL_CHECKPOINT_DIR", BASE_DIR / "data" / "checkpoints"))
+KEEP_PER_STAGE = int(os.getenv("ETL_CHECKPOINT_KEEP", "2"))
+MAX_WORKERS = 8
+
+MANIFEST = "_manifest.json"
+RUN_STATE = "_last_run.json"
+
+# Source files whose code shapes each stage's output
+STAGE_CODE = {
+    "extract": ["extract/*.py"],
+    "transform": ["transform/*.py"],
+}
+STAGE_CODE_EXCLUDE = {"transform/pipeline.py"}
+
+
+def code_version(stage: str) -> str:
+    """Hash of the source files a stage depends on, plus the pandas/pyarrow versions."""
+    digest = hashlib.sha256(f"{pd.__version__}|{pa.__version__}".encode())
+    for pattern in STAGE_CODE[stage]:
+        for path in sorted(BASE_DIR.glob(pattern)):
+            rel = path.relative_to(BASE_DIR).as_posix()
+            if rel not in STAGE_CODE_EXCLUDE:
+                digest.update(rel.encode())
+                digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def stage_key(stage: str, *inputs) -> str:
+    """Checkpoint key for a stage from its (JSON-serializable) inputs and code version."""
+    payload = json.dumps([stage, code_version(stage), *inputs], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:24]
+
+
+def _stage_dir(stage: str, key: str) -> Path:
+    return CHECKPOINT_DIR / stage / key
+
+
+def load_manifest(stage: str, key: str):
+    """Manifest of a complete checkpoint, or None."""
+    path = _stage_dir(stage, key) / MANIFEST
+    return json.loads(path.read_text()) if path.exists() else None
+
+
+def load_checkpoint(stage: str, key: str):
+    """Cached tables for (stage, key) as {name: DataFrame}, or None if there is no checkpoint."""
+    manifest = load_manifest(stage, key)
+    if manifest is None:
+        return None
+    path = _stage_dir(stage, key)
+
+    def _read(name):
+        return pq.read_table(path / f"{name}.parquet").to_pandas()
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = {name: pool.submit(_read, name) for name in manifest["tables"]}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def save_checkpoint(stage: str, key: str, tables: dict) -> Path:
+    """Write tables for (stage, key) atomically, then prune older checkpoints of the stage."""
+    stage_root = CHECKPOINT_DIR / stage
+    stage_root.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix=f".{key}-", dir=stage_root))
+    try:
+        def _write(name, df):
+            # spilled fact tables (out-of-core / parallel transform) are already Arrow on disk
+            table = df.to_arrow() if hasattr(df, "to_arrow") else pa.Table.from_pandas(df, preserve_index=False)
+            pq.write_table(table, tmp / f"{name}.parquet", compression="snappy")
+
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+            for future in [pool.submit(_write, name, df) for name, df in tables.items()]:
+                future.result()
+
+        manifest = {
+            "stage": stage,
+            "key": key,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "tables": {name: len(df) for name, df in tables.items()},
+        }
+        (tmp / MANIFEST).write_text(json.dumps(manifest, indent=1))
+
+        target = _stage_dir(stage, key)
+        if target.exists():
+            shutil.rmtree(target)
+        os.replace(tmp, target)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    _prune(stage_root)
+    return target
+
+
+def _prune(stage_root: Path):
+    checkpoints = sorted(
+        (p for p in stage_root.iterdir() if p.is_dir() and (p / MANIFEST).exists()),
+        key=lambda p: (p / MANIFEST).stat().st_mtime,
+        reverse=True,
+    )
+    for old in checkpoints[KEEP_PER_STAGE:]:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+# ---- run state ----
+
+def read_run_state() -> dict:
+    path = CHECKPOINT_DIR / RUN_STATE
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def write_run_state(state: dict):
+    CHECKPOINT_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = CHECKPOINT_DIR / f".{RUN_STATE}.tmp"
+    tmp.write_text(json.dumps(state, indent=1, default=str))
+    os.replace(tmp, CHECKPOINT_DIR / RUN_STATE)
+
+
+def mark_stage_done(state: dict, stage: str, key: str, **details):
+    """Record a finished stage in the run state (persisted immediately)."""
+    state.setdefault("stages", {})[stage] = {
+        "key": key,
+        "completed_at": datetime.now().isoformat(timespec="seconds"),
+        **details,
+    }
+    write_run_state(state)
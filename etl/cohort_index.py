@@ -0,0 +1,118 @@
+"""
+Patient cohort index, published with the API snapshot.
+
+Built once per ETL run from the fact tables (etl/snapshot.py) and written
+next to the snapshot tables as two Arrow tables the API turns into
+Roaring-style bitmaps (api/core/cohorts.py):
+
+    cohort_patients   one row per patient of dim_patients, sorted by patient_key;
+                      the row number is the patient's id in every bitmap
+    cohort_index      (field, value, patient_count, patients) sorted by field and
+                      value: the ascending ids of the patients that have the value
+
+A patient has a value when any of their rows has it, so fields combine at
+the patient level: "condition X AND year 2019" is a patient with condition
+X who had some encounter in 2019. encounter_class_year ("inpatient:2019")
+pins class and year to the same encounter.
+
+Spilled fact tables (out-of-core / parallel transforms) are read one batch
+file at a time, only the columns the index needs.
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from etl.transform.out_of_core import SpilledTable
+
+COHORT_TABLES = ["cohort_patients", "cohort_index"]
+
+
+def _encounter_fields(df: pd.DataFrame) -> dict:
+    year = df["start_datetime"].dt.year.astype("Int64").astype(str).where(df["start_datetime"].notna())
+    return {
+        "encounter_class": df["encounter_class"],
+        "year": year,
+        "encounter_class_year": df["encounter_class"] + ":" + year,
+        "provider": df["provider_key"],
+    }
+
+
+# source table → columns read, and the field values of each of its rows
+COHORT_SOURCES = {
+    "dim_patients": {
+        "columns": ["patient_key", "gender"],
+        "fields": lambda df: {"gender": df["gender"]},
+    },
+    "fact_encounters": {
+        "columns": ["patient_key", "provider_key", "encounter_class", "start_datetime"],
+        "fields": _encounter_fields,
+    },
+    "fact_conditions": {
+        "columns": ["patient_key", "condition_key"],
+        "fields": lambda df: {"condition": df["condition_key"]},
+    },
+    "fact_procedures": {
+        "columns": ["patient_key", "code"],
+        "fields": lambda df: {"procedure": df["code"]},
+    },
+}
+
+
+def build_cohort_index(transformed: dict) -> dict:
+    """The COHORT_TABLES as Arrow tables; empty dict without dim_patients."""
+    if "dim_patients" not in transformed:
+        return {}
+    patients = np.sort(transformed["dim_patients"]["patient_key"].dropna().unique().astype(str))
+
+    pairs = {}   # field → [(value, patient id) frames]
+    for name, source in COHORT_SOURCES.items():
+        if name not in transformed:
+            continue
+        for batch in _batches(transformed[name], source["columns"]):
+            ids, known = _patient_ids(patients, batch["patient_key"])
+            for field, values in source["fields"](batch).items():
+                frame = pd.DataFrame({"value": values.to_numpy(dtype=object)[known], "patient": ids})
+                pairs.setdefault(field, []).append(frame.dropna().drop_duplicates())
+
+    fields, values, counts, members = [], [], [], []
+    for field in sorted(pairs):
+        frame = pd.concat(pairs[field], ignore_index=True).astype({"value": str}).drop_duplicates()
+        frame = frame.sort_values(["value", "patient"], kind="stable")
+        value = frame["value"].to_numpy()
+        starts = np.flatnonzero(np.r_[True, value[1:] != value[:-1]]) if len(frame) else np.array([], dtype=np.int64)
+        fields.extend([field] * len(starts))
+        values.extend(value[starts])
+        counts.append(np.diff(np.r_[starts, len(frame)]))
+        members.append(frame["patient"].to_numpy(dtype="int32"))
+
+    counts = np.concatenate(counts) if counts else np.array([], dtype="int64")
+    index = pa.table({
+        "field": pa.array(fields, type=pa.string()),
+        "value": pa.array(values, type=pa.string()),
+        "patient_count": pa.array(counts, type=pa.int64()),
+        "patients": pa.ListArray.from_arrays(
+            pa.array(np.r_[0, np.cumsum(counts)].astype("int32")),
+            pa.array(np.concatenate(members) if members else np.array([], dtype="int32"))),
+    })
+    return {"cohort_patients": pa.table({"patient_key": pa.array(patients, type=pa.string())}),
+            "cohort_index": index}
+
+
+def _patient_ids(patients: np.ndarray, keys: pd.Series):
+    """(ids of the rows whose patient is in dim_patients, mask of those rows)."""
+    keys = keys.fillna("").to_numpy(dtype=str)
+    ids = np.searchsorted(patients, keys)
+    known = ids < len(patients)
+    known[known] = patients[ids[known]] == keys[known]
+    return ids[known].astype("int32"), known
+
+
+def _batches(table, columns: list):
+    """The table's index columns as DataFrames: itself, or a spilled table's batch files."""
+    if not isinstance(table, SpilledTable):
+        yield table[columns]
+        return
+    for path in table.files():
+        yield pq.read_table(path, columns=columns).to_pandas()
@@ -6,11 +6,24 @@ Handles data ingestion from:
     - APIs (future)
 """
 
-from .extract import extract_from_mysql
-# If you have CSV extraction:
-# from .extract import extract_from_csv
+from .extract import (
+    csv_watermark,
+    extract_from_csv,
+    extract_from_mysql,
+    extract_table,
+    iter_csv_batches,
+    iter_mysql_batches,
+    key_hashes,
+    mysql_watermark,
+)
 
 __all__ = [
     "extract_from_mysql",
-    # "extract_from_csv",
+    "mysql_watermark",
+    "extract_from_csv",
+    "csv_watermark",
+    "extract_table",
+    "iter_csv_batches",
+    "iter_mysql_batches",
+    "key_hashes",
 ]
\ No newline at end of file
@@ -1,9 +1,18 @@
 import os
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
 from dotenv import load_dotenv
 from urllib.parse import quote_plus
 import sqlalchemy
 
+from etl.extract.identity import SEPARATOR, surrogate_ids
+from etl.extract import streams
+from etl.extract.sources import SOURCES, source_path
+from etl.instrumentation import span
+
 load_dotenv()
 
 def _get_mysql_connection_string():
@@ -15,25 +24,234 @@ def _get_mysql_connection_string():
     return f"mysql+mysqlconnector://{user}:{password}@{host}:{port}/{database}"
 
 
+STAGING_TABLES = {name: spec["table"] for name, spec in SOURCES.items()}
+
+
+def _select(name: str) -> str:
+    """SELECT of a staging table's data columns (not the loader's row_fingerprint/updated_at)."""
+    spec = SOURCES[name]
+    columns = ([spec["row_id"]] if "row_id" in spec else []) + list(spec["columns"]) + ["created_at"]
+    return f"SELECT {', '.join(columns)} FROM {spec['table']}"
+
+
 def extract_from_mysql():
     """Extract all staging tables from MySQL into DataFrames."""
     conn_str = _get_mysql_connection_string()
     engine = sqlalchemy.create_engine(conn_str)
 
     print("Extracting from MySQL...")
-    data = {
-        "providers": pd.read_sql("SELECT * FROM stg_providers", engine),
-        "patients": pd.read_sql("SELECT * FROM stg_patients", engine),
-        "encounters": pd.read_sql("SELECT * FROM stg_encounters", engine),
-        "conditions": pd.read_sql("SELECT * FROM stg_conditions", engine),
-        "procedures": pd.read_sql("SELECT * FROM stg_procedures", engine),
-        "readmissions": pd.read_sql("SELECT * FROM stg_hospital_readmissions", engine),
-    }
+    data = {}
+    for name, table in STAGING_TABLES.items():
+        with span(f"extract.{name}", **{"db.sql.table": table}) as s:
+            data[name] = pd.read_sql(_select(name), engine)
+            s.set_output(data[name])
     engine.dispose()
     print("✓ Extraction complete")
     return data
 
 
+def iter_mysql_batches(name: str, batch_rows: int):
+    """Stream one staging table as DataFrames of at most batch_rows rows (server-side cursor)."""
+    engine = sqlalchemy.create_engine(_get_mysql_connection_string())
+    try:
+        with engine.connect().execution_options(stream_results=True) as conn:
+            yield from pd.read_sql(_select(name), conn, chunksize=batch_rows)
+    finally:
+        engine.dispose()
+
+
+def mysql_watermark() -> dict:
+    """
+    Cheap change marker for the staging tables: row count and newest
+    updated_at per table (upserts touch it), in one round-trip. Used to key
+    extract checkpoints.
+    """
+    engine = sqlalchemy.create_engine(_get_mysql_connection_string())
+    query = " UNION ALL ".join(
+        f"SELECT '{name}' AS source_table, COUNT(*) AS row_count, MAX(updated_at) AS max_updated_at FROM {table}"
+        for name, table in STAGING_TABLES.items()
+    )
+    try:
+        df = pd.read_sql(query, engine)
+    finally:
+        engine.dispose()
+    return {row.source_table: [int(row.row_count), str(row.max_updated_at)] for row in df.itertuples()}
+
+
+# ---- CSV (direct, no staging database) ----
+
+CSV_BLOCK_SIZE = 16 << 20
+TIMESTAMP_TYPE = pa.timestamp("s", tz="UTC")
+NUMBER_PATTERN = r"^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$"
+
+
+def extract_from_csv(synthea_dir=None, cms_dir=None) -> dict:
+    """
+    Read the Synthea/HRRP CSVs straight into the raw-table dict that
+    extract_from_mysql() returns, applying the staging loader's cleaning
+    (trimmed strings, empty → NULL, naive UTC datetimes, dates, lenient
+    numerics, derived ids, parent filtering) without the MySQL round-trip.
+    Parsing is multithreaded Arrow with explicit column types.
+    """
+    print("Extracting from CSV files...")
+    data = {}
+    for name, spec in SOURCES.items():
+        path = source_path(name, synthea_dir, cms_dir)
+        with span(f"extract.{name}", file=str(path)) as s:
+            table = _read_csv_or_empty(path, spec)
+            if streams.exists(path):
+                s.set(bytes_in=streams.stat(path)["size_bytes"])
+            if "parent" in spec:
+                parent, key = spec["parent"]
+                table = table.filter(pc.is_in(table[key], value_set=pa.array(data[parent][key])))
+            data[name] = _to_staging_frame(table, spec)
+            s.set_output(data[name])
+    print("✓ Extraction complete")
+    return data
+
+
+def extract_table(source: str, name: str, synthea_dir=None, cms_dir=None) -> pd.DataFrame:
+    """One raw table in full from "csv" or "mysql" (no parent filtering)."""
+    with span(f"extract.{name}", source=source) as s:
+        if source == "mysql":
+            engine = sqlalchemy.create_engine(_get_mysql_connection_string())
+            try:
+                df = pd.read_sql(_select(name), engine)
+            finally:
+                engine.dispose()
+        else:
+            spec = SOURCES[name]
+            df = _to_staging_frame(_read_csv_or_empty(source_path(name, synthea_dir, cms_dir), spec), spec)
+        s.set_output(df)
+    return df
+
+
+def _read_csv_or_empty(path, spec) -> pa.Table:
+    if streams.exists(path):
+        return _read_csv(path, spec)
+    print(f"  ⚠ File not found: {path}")
+    return pa.table({col: pa.array([], type=_arrow_type(spec["types"].get(col)))
+                     for col, csv_col in spec["columns"].items() if csv_col})
+
+
+def _arrow_type(kind):
+    return {"timestamp": TIMESTAMP_TYPE, "date": pa.timestamp("s"), "float": pa.string()}.get(kind, pa.string())
+
+
+def _csv_options(spec, block_size: int):
+    rename = {csv_col: col for col, csv_col in spec["columns"].items() if csv_col}
+    read_options = pacsv.ReadOptions(use_threads=True, block_size=block_size)
+    convert_options = pacsv.ConvertOptions(
+        include_columns=list(rename),
+        column_types={csv_col: _arrow_type(spec["types"].get(col)) for csv_col, col in rename.items()},
+        timestamp_parsers=[pacsv.ISO8601, "%m/%d/%Y"],
+        strings_can_be_null=True,
+        quoted_strings_can_be_null=True,
+    )
+    return rename, read_options, convert_options
+
+
+def _read_csv(path, spec) -> pa.Table:
+    rename, read_options, convert_options = _csv_options(spec, CSV_BLOCK_SIZE)
+    # pyarrow reads (and decompresses) ahead on its I/O thread while the parse runs
+    with streams.open_arrow(path) as source:
+        table = pacsv.read_csv(source, read_options=read_options, convert_options=convert_options)
+    return table.rename_columns([rename[c] for c in table.column_names])
+
+
+def iter_csv_batches(name: str, block_bytes: int, parent_keys=None, synthea_dir=None, cms_dir=None):
+    """
+    Stream one source CSV as staging-typed DataFrames, one per ~block_bytes
+    of input, with the same cleaning as extract_from_csv(). Rows of a child
+    table are kept only if key_hashes() of their parent key is in
+    parent_keys (when given).
+    """
+    spec = SOURCES[name]
+    path = source_path(name, synthea_dir, cms_dir)
+    if not streams.exists(path):
+        print(f"  ⚠ File not found: {path}")
+        return
+    rename, read_options, convert_options = _csv_options(spec, block_bytes)
+    offset = 0
+    seen = {}   # natural keys of earlier batches, for duplicate-key ids
+    with streams.open_arrow(path) as source, \
+            pacsv.open_csv(source, read_options=read_options, convert_options=convert_options) as reader:
+        for batch in reader:
+            table = pa.Table.from_batches([batch]).rename_columns([rename[c] for c in batch.schema.names])
+            if parent_keys is not None and "parent" in spec:
+                key = spec["parent"][1]
+                hashes = key_hashes(table[key])
+                found = np.searchsorted(parent_keys, hashes).clip(max=len(parent_keys) - 1)
+                table = table.filter(pa.array(parent_keys[found] == hashes if len(parent_keys) else
+                                              np.zeros(len(hashes), dtype=bool)))
+            frame = _to_staging_frame(table, spec, seen)
+            if "row_id" in spec:
+                frame[spec["row_id"]] += offset
+            offset += len(frame)
+            yield frame
+
+
+def key_hashes(values) -> np.ndarray:
+    """64-bit hashes of key values; sorted, they make a compact membership set for parent filtering."""
+    if isinstance(values, (pa.Array, pa.ChunkedArray)):
+        values = values.to_numpy(zero_copy_only=False)
+    return pd.util.hash_array(np.asarray(values, dtype=object))
+
+
+def _to_staging_frame(table: pa.Table, spec, seen: dict = None) -> pd.DataFrame:
+    """Apply the staging column types and cleaning, in staging column order."""
+    n = table.num_rows
+    columns = {}
+    for col, csv_col in spec["columns"].items():
+        if csv_col is None:
+            columns[col] = None   # derived below, from the cleaned natural key
+            continue
+        values = table[col]
+        kind = spec["types"].get(col)
+        if kind == "timestamp":
+            values = pc.cast(values, pa.timestamp("ns"))              # naive UTC, like DATETIME
+        elif kind == "date":
+            values = pc.cast(values, pa.date32())
+        elif kind == "float":
+            valid = pc.match_substring_regex(values, NUMBER_PATTERN)
+            values = pc.cast(pc.if_else(valid, values, pa.scalar(None, pa.string())), pa.float64())
+        else:
+            values = pc.utf8_trim_whitespace(values)
+            values = pc.if_else(pc.equal(values, ""), pa.scalar(None, pa.string()), values)
+        columns[col] = values
+
+    for col, csv_col in spec["columns"].items():
+        if csv_col is None:
+            columns[col] = surrogate_ids(_natural_keys(columns, spec["natural_key"]), seen)
+
+    if "row_id" in spec:
+        columns = {spec["row_id"]: pa.array(np.arange(1, n + 1)), **columns}
+    return pa.table(columns).to_pandas()
+
+
+def _natural_keys(columns: dict, names: list) -> np.ndarray:
+    """Natural-key text per row, formatted as the staging loader writes the values."""
+    texts = []
+    for name in names:
+        values = columns[name]
+        if pa.types.is_timestamp(values.type):
+            values = pc.strftime(pc.cast(values, pa.timestamp("s"), safe=False), format="%Y-%m-%d %H:%M:%S")
+        elif pa.types.is_date(values.type):
+            values = pc.strftime(values, format="%Y-%m-%d")
+        texts.append(values)
+    keys = pc.binary_join_element_wise(*texts, SEPARATOR, null_handling="replace", null_replacement="")
+    return keys.to_numpy(zero_copy_only=False)
+
+
+def csv_watermark(synthea_dir=None, cms_dir=None) -> dict:
+    """Size and mtime (and zip member CRC) of every source file; used to key extract checkpoints."""
+    watermark = {}
+    for name in SOURCES:
+        path = source_path(name, synthea_dir, cms_dir)
+        watermark[name] = list(streams.stat(path).values()) if streams.exists(path) else None
+    return watermark
+
+
 if __name__ == "__main__":
     dfs = extract_from_mysql()
     for name, df in dfs.items():
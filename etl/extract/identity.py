@@ -0,0 +1,109 @@
+"""
+Deterministic row identity for the staging tables.
+
+Synthea conditions and procedures have no id column. Their surrogate ids
+are hashed from the natural-key columns named in SOURCES ("natural_key").
+The MySQL staging loader and the direct CSV extract therefore give the same
+row the same id on every run. Rows that repeat a natural key get the
+occurrence number mixed in, so duplicates stay distinct.
+
+Row fingerprints hash a staging row's full content; a re-ingest compares
+them with the stored ones to find new and changed rows.
+
+Both are built on pandas' keyed SipHash (hash_array): vectorized, and stable
+across processes, unlike hash().
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+SEPARATOR = "\x1f"
+
+# Two independent 64-bit hashes make the 128 bits of an id
+_ID_HASH_KEYS = ("stg-natural-key-", "stg-natural-key+")
+_FINGERPRINT_HASH_KEY = "stg-row-contents"
+
+_HEX = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+_UUID_HEX_POSITIONS = [i for i in range(36) if i not in (8, 13, 18, 23)]
+
+
+def join_values(values) -> str:
+    """Canonical text of one row's values (None → empty)."""
+    return SEPARATOR.join("" if v is None else str(v) for v in values)
+
+
+def surrogate_ids(keys, seen: dict = None) -> pa.Array:
+    """
+    UUID-formatted ids (version 8, RFC 4122 variant) for natural-key strings.
+
+    seen: state carried across the batches of one streamed table, so a key
+          repeated in a later batch still gets its next occurrence number
+    """
+    keys = np.asarray(keys, dtype=object)
+    hashes = pd.util.hash_array(keys, hash_key=_ID_HASH_KEYS[0])
+    occurrence = pd.Series(hashes).groupby(hashes, sort=False).cumcount().to_numpy()
+    if seen is not None:
+        occurrence += _previous_occurrences(hashes, seen)
+    repeated = occurrence > 0
+    if repeated.any():
+        keys = keys.copy()
+        keys[repeated] = [f"{k}{SEPARATOR}#{n}" for k, n in zip(keys[repeated], occurrence[repeated])]
+        hashes = hashes.copy()
+        hashes[repeated] = pd.util.hash_array(keys[repeated], hash_key=_ID_HASH_KEYS[0])
+    raw = np.stack([hashes, pd.util.hash_array(keys, hash_key=_ID_HASH_KEYS[1])], axis=1)
+    return format_uuids(raw.astype(">u8").view(np.uint8).reshape(len(keys), 16).copy(), version=8)
+
+
+def count_keys(keys, seen: dict):
+    """Fold natural-key strings into surrogate_ids' `seen` state without making their ids."""
+    hashes = pd.util.hash_array(np.asarray(keys, dtype=object), hash_key=_ID_HASH_KEYS[0])
+    _previous_occurrences(hashes, seen)
+
+
+def pack_key_counts(seen: dict) -> bytes:
+    """surrogate_ids' `seen` state as bytes (the sorted key hashes, then their counts), e.g. for a manifest row."""
+    hashes = seen.get("hashes", np.empty(0, dtype=np.uint64))
+    counts = seen.get("counts", np.empty(0, dtype=np.int64))
+    return hashes.astype("<u8").tobytes() + counts.astype("<i8").tobytes()
+
+
+def unpack_key_counts(data: bytes) -> dict:
+    """The `seen` state written by pack_key_counts."""
+    n = len(data) // 16
+    return {"hashes": np.frombuffer(data, dtype="<u8", count=n).astype(np.uint64),
+            "counts": np.frombuffer(data, dtype="<i8", count=n, offset=8 * n).astype(np.int64)}
+
+
+def row_fingerprints(rows) -> np.ndarray:
+    """16-hex-digit content hash of each row (tuples of staging values)."""
+    hashes = pd.util.hash_array(np.array([join_values(row) for row in rows], dtype=object),
+                                hash_key=_FINGERPRINT_HASH_KEY)
+    return np.char.mod("%016x", hashes)
+
+
+def format_uuids(raw: np.ndarray, version: int) -> pa.Array:
+    """Format (n, 16) uint8 rows as UUID strings, without a per-row Python loop."""
+    n = len(raw)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | (version << 4)
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80   # RFC 4122 variant
+    chars = np.full((n, 36), ord("-"), dtype=np.uint8)
+    chars[:, _UUID_HEX_POSITIONS] = _HEX[np.stack([raw >> 4, raw & 0x0F], axis=2).reshape(n, 32)]
+    offsets = np.arange(0, 36 * (n + 1), 36, dtype=np.int32)
+    return pa.Array.from_buffers(pa.string(), n, [None, pa.py_buffer(offsets), pa.py_buffer(chars.tobytes())])
+
+
+def _previous_occurrences(hashes: np.ndarray, seen: dict) -> np.ndarray:
+    """Occurrences of each key hash in earlier batches; folds this batch into `seen`."""
+    previous = seen.get("hashes", np.empty(0, dtype=np.uint64))
+    counts = seen.get("counts", np.empty(0, dtype=np.int64))
+    before = np.zeros(len(hashes), dtype=np.int64)
+    if len(previous):
+        found = np.searchsorted(previous, hashes).clip(max=len(previous) - 1)
+        hit = previous[found] == hashes
+        before[hit] = counts[found[hit]]
+    batch, batch_counts = np.unique(hashes, return_counts=True)
+    merged, inverse = np.unique(np.concatenate([previous, batch]), return_inverse=True)
+    seen["hashes"] = merged
+    seen["counts"] = np.bincount(inverse, weights=np.concatenate([counts, batch_counts])).astype(np.int64)
+    return before
@@ -0,0 +1,166 @@
+"""
+Source file specifications shared by the MySQL staging loader and the
+direct CSV extract.
+
+Each raw table maps staging columns to CSV headers (None = id hashed from
+the `natural_key` columns, see etl/extract/identity.py), names the `key`
+columns that identify a row across loads, and pins the type of every
+non-string column:
+    "timestamp" → ISO-8601 Synthea timestamps, stored as naive UTC DATETIME
+    "date"      → ISO or MM/DD/YYYY dates
+    "float"     → numeric; values that do not parse become NULL
+Rows of tables with a `parent` are kept only when their key exists in the
+parent table (conditions/procedures of loaded encounters). Files may also
+be gzip/zstd-compressed or zip members (etl/extract/streams.py).
+"""
+
+import os
+from pathlib import Path
+
+from etl.extract.streams import locate
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+SYNTHEA_DIR = Path(os.getenv("SYNTHEA_DIR", BASE_DIR / "data" / "synthea"))
+CMS_DIR = Path(os.getenv("CMS_DIR", BASE_DIR / "data" / "hrrp"))
+
+SOURCES = {
+    "providers": {
+        "dir": "synthea",
+        "file": "providers.csv",
+        "table": "stg_providers",
+        "key": ["provider_id"],
+        "columns": {
+            "provider_id": "Id",
+            "name": "NAME",
+            "gender": "GENDER",
+            "speciality": "SPECIALITY",
+            "organization": "ORGANIZATION",
+            "city": "CITY",
+            "state": "STATE",
+            "zip": "ZIP",
+        },
+        "types": {},
+    },
+    "patients": {
+        "dir": "synthea",
+        "file": "patients.csv",
+        "table": "stg_patients",
+        "key": ["patient_id"],
+        "columns": {
+            "patient_id": "Id",
+            "birthdate": "BIRTHDATE",
+            "deathdate": "DEATHDATE",
+            "first_name": "FIRST",
+            "last_name": "LAST",
+            "gender": "GENDER",
+            "race": "RACE",
+            "ethnicity": "ETHNICITY",
+            "city": "CITY",
+            "state": "STATE",
+            "zip": "ZIP",
+            "marital_status": "MARITAL",
+        },
+        "types": {"birthdate": "date", "deathdate": "date"},
+    },
+    "encounters": {
+        "dir": "synthea",
+        "file": "encounters.csv",
+        "table": "stg_encounters",
+        "key": ["encounter_id"],
+        "columns": {
+            "encounter_id": "Id",
+            "patient_id": "PATIENT",
+            "provider_id": "PROVIDER",
+            "encounter_type": "CODE",
+            "encounter_class": "ENCOUNTERCLASS",
+            "start_datetime": "START",
+            "end_datetime": "STOP",
+            "total_cost": "TOTAL_CLAIM_COST",
+            "reason_code": "REASONCODE",
+            "reason_description": "REASONDESCRIPTION",
+        },
+        "types": {"start_datetime": "timestamp", "end_datetime": "timestamp", "total_cost": "float"},
+    },
+    "conditions": {
+        "dir": "synthea",
+        "file": "conditions.csv",
+        "table": "stg_conditions",
+        "key": ["condition_id"],
+        "natural_key": ["patient_id", "encounter_id", "code", "onset_date"],
+        "columns": {
+            "condition_id": None,
+            "patient_id": "PATIENT",
+            "encounter_id": "ENCOUNTER",
+            "code": "CODE",
+            "description": "DESCRIPTION",
+            "onset_date": "START",
+            "abatement_date": "STOP",
+        },
+        "types": {"onset_date": "date", "abatement_date": "date"},
+        "parent": ("encounters", "encounter_id"),
+    },
+    "procedures": {
+        "dir": "synthea",
+        "file": "procedures.csv",
+        "table": "stg_procedures",
+        "key": ["procedure_id"],
+        "natural_key": ["patient_id", "encounter_id", "code", "performed_datetime"],
+        "columns": {
+            "procedure_id": None,
+            "patient_id": "PATIENT",
+            "encounter_id": "ENCOUNTER",
+            "code": "CODE",
+            "description": "DESCRIPTION",
+            "performed_datetime": "DATE",
+            "cost": "BASE_COST",
+        },
+        "types": {"performed_datetime": "timestamp", "cost": "float"},
+        "parent": ("encounters", "encounter_id"),
+    },
+    "organizations": {
+        "dir": "synthea",
+        "file": "organizations.csv",
+        "table": "stg_organizations",
+        "key": ["id"],
+        "columns": {
+            "id": "Id",
+            "name": "NAME",
+        },
+        "types": {},
+    },
+    "readmissions": {
+        "dir": "cms",
+        "file": "FY_2025_Hospital_Readmissions_Reduction_Program_Hospital.csv",
+        "table": "stg_hospital_readmissions",
+        "row_id": "id",  # AUTO_INCREMENT in staging
+        "key": ["hospital_id", "measure_name"],
+        "columns": {
+            "hospital_id": "Facility ID",
+            "hospital_name": "Facility Name",
+            "measure_name": "Measure Name",
+            "number_of_discharges": "Number of Discharges",
+            "expected_readmission_rate": "Expected Readmission Rate",
+            "predicted_readmission_rate": "Predicted Readmission Rate",
+            "excess_readmission_ratio": "Excess Readmission Ratio",
+            "number_of_readmissions": "Number of Readmissions",
+            "start_date": "Start Date",
+            "end_date": "End Date",
+        },
+        "types": {
+            "number_of_discharges": "float",
+            "expected_readmission_rate": "float",
+            "predicted_readmission_rate": "float",
+            "excess_readmission_ratio": "float",
+            "number_of_readmissions": "float",
+            "start_date": "date",
+            "end_date": "date",
+        },
+    },
+}
+
+
+def source_path(name: str, synthea_dir=None, cms_dir=None) -> Path:
+    """Where a source's data is: the plain CSV, or a compressed copy / zip member of it (streams.locate)."""
+    spec = SOURCES[name]
+    directory = (synthea_dir or SYNTHEA_DIR) if spec["dir"] == "synthea" else (cms_dir or CMS_DIR)
+    return locate(Path(directory) / spec["file"])
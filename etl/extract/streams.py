@@ -0,0 +1,214 @@
+"""
+Raw source files, plain or compressed.
+
+Exports can be staged as they are distributed, with no decompression step
+on disk first:
+
+    data/synthea/encounters.csv          plain
+    data/synthea/encounters.csv.gz       gzip
+    data/synthea/encounters.csv.zst      zstd
+    data/synthea/synthea.zip             any member named encounters.csv
+
+locate() resolves the expected plain path to whichever of these exists. A
+zip member is addressed as <archive>.zip/<member>. gzip and zstd are
+decoded by pyarrow and zip members by zipfile; both release the GIL, so
+read_blocks() decompresses on a background thread while the caller parses.
+A single gzip/zstd stream cannot be split, so each source gets one
+decompression thread.
+"""
+
+import os
+import queue
+import threading
+import zipfile
+from pathlib import Path
+
+import pyarrow as pa
+
+CODECS = {".gz": "gzip", ".zst": "zstd"}
+BLOCK_BYTES = 1 << 20
+PREFETCH_BLOCKS = 8
+
+
+def locate(path) -> Path:
+    """The existing variant of a plain source path (itself, .gz, .zst or a zip member); `path` if none exists."""
+    path = Path(path)
+    if path.exists():
+        return path
+    for suffix in CODECS:
+        candidate = path.with_name(path.name + suffix)
+        if candidate.exists():
+            return candidate
+    if path.parent.is_dir():
+        for archive in sorted(path.parent.glob("*.zip")):
+            with zipfile.ZipFile(archive) as zf:
+                member = next((n for n in zf.namelist() if n.rsplit("/", 1)[-1] == path.name), None)
+            if member:
+                return archive / member
+    return path
+
+
+def split_archive(path: Path):
+    """(archive, member) for a zip member path, else (None, None)."""
+    for parent in Path(path).parents:
+        if parent.suffix == ".zip" and parent.is_file():
+            return parent, Path(path).relative_to(parent).as_posix()
+    return None, None
+
+
+def codec(path: Path):
+    """Compression of a source: "gzip", "zstd", "zip" or None for plain files."""
+    if split_archive(path)[0] is not None:
+        return "zip"
+    return CODECS.get(Path(path).suffix)
+
+
+def exists(path: Path) -> bool:
+    archive, member = split_archive(path)
+    if archive is None:
+        return Path(path).exists()
+    with zipfile.ZipFile(archive) as zf:
+        return member in zf.namelist()
+
+
+def stat(path: Path) -> dict:
+    """
+    Change marker of a source: size and mtime of the file on disk (the
+    archive, for a zip member), plus the member's CRC and uncompressed size.
+    """
+    archive, member = split_archive(path)
+    st = os.stat(archive or path)
+    marker = {"size_bytes": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if archive is not None:
+        with zipfile.ZipFile(archive) as zf:
+            info = zf.getinfo(member)
+        marker["member_crc"] = f"{info.CRC:08x}-{info.file_size}"
+    return marker
+
+
+def open_binary(path: Path):
+    """Binary reader of the decompressed content; use as a context manager."""
+    archive, member = split_archive(path)
+    if archive is not None:
+        return _ZipMember(archive, member)
+    compression = CODECS.get(Path(path).suffix)
+    if compression:
+        return pa.input_stream(str(path), compression=compression)
+    return open(path, "rb")
+
+
+def open_arrow(path: Path):
+    """The decompressed content as a pyarrow input stream (for pyarrow.csv)."""
+    archive, member = split_archive(path)
+    if archive is not None:
+        return pa.PythonFile(_ZipMember(archive, member), mode="r")
+    return pa.input_stream(str(path), compression=CODECS.get(Path(path).suffix))
+
+
+def read_blocks(path: Path, start: int = 0, end: int = None):
+    """
+    Decompressed content in blocks of about BLOCK_BYTES, read and decoded on
+    a background thread up to PREFETCH_BLOCKS ahead. start/end are byte
+    offsets in plain files (compressed sources are always read whole).
+    """
+    def produce(put):
+        with open_binary(path) as f:
+            remaining = None
+            if start or end is not None:
+                f.seek(start)
+                remaining = None if end is None else end - start
+            while remaining is None or remaining > 0:
+                block = f.read(BLOCK_BYTES if remaining is None else min(BLOCK_BYTES, remaining))
+                if not block:
+                    break
+                put(block)
+                if remaining is not None:
+                    remaining -= len(block)
+
+    return prefetch(produce, PREFETCH_BLOCKS, name=f"read-{Path(path).name}")
+
+
+def prefetch(produce, depth: int, name: str = "prefetch"):
+    """
+    Run produce(put) on a daemon thread and yield what it puts, at most
+    `depth` items ahead of the consumer. Errors are re-raised in the consumer.
+    """
+    items = queue.Queue(maxsize=depth)
+    done = object()
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise _Stopped
+
+    def run():
+        try:
+            produce(put)
+            put(done)
+        except _Stopped:
+            pass
+        except BaseException as e:   # handed to the consumer
+            try:
+                put(e)
+            except _Stopped:
+                pass
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+class _Stopped(Exception):
+    """The consumer of a prefetch() went away."""
+
+
+class _ZipMember:
+    """An open zip member that also closes its archive."""
+
+    def __init__(self, archive: Path, member: str):
+        self._zip = zipfile.ZipFile(archive)
+        self._file = self._zip.open(member)
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return self._file.seekable()
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def close(self):
+        self._file.close()
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
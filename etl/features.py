@@ -0,0 +1,331 @@
+"""
+Patient feature store: per-patient longitudinal rollups maintained from fact deltas.
+
+For every staged partition of a source fact table (etl/load/warehouse.py
+stages one file per month partition, with a content fingerprint) the store
+keeps that partition's per-patient partial aggregates: counts, sums, min,
+max. A load only recomputes the partials of partitions whose fingerprint
+changed and folds the difference into the feature table:
+
+    counts/sums  += new partial - replaced partial
+    min/max      min/max with the new partial; patients whose current
+                 extreme came from a replaced partial are re-merged from
+                 all of their partials
+
+Layout under FEATURE_STORE_DIR (default etl/data/features/):
+
+    _manifest.json                       generation, partition fingerprint → partial file,
+                                         current feature file; replaced atomically (commit point)
+    partials/<table>/<gen>.parquet       per-patient partials of the partitions refolded in a
+                                         generation, one row group per partition
+    patient_features-<gen>.parquet       one row per patient, sorted by patient_key
+
+Readers (api/core/features.py) only follow the manifest, so a half-written
+generation is never read; files of older generations are removed once the
+new manifest is in place.
+"""
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from etl.load.warehouse import partition_codes, partition_id
+from etl.transform.schema import TABLE_SCHEMAS
+
+BASE_DIR = Path(__file__).resolve().parent
+FEATURE_STORE_DIR = Path(os.getenv("FEATURE_STORE_DIR", BASE_DIR / "data" / "features"))
+FEATURE_VERSION = 2          # bump when a feature definition changes; the store is rebuilt
+ROW_GROUP_SIZE = 64 * 1024   # patient_key min/max statistics per row group act as a coarse index
+
+MANIFEST = "_manifest.json"
+
+ENCOUNTER_CLASSES = ["ambulatory", "emergency", "inpatient", "outpatient", "urgentcare", "wellness"]
+
+
+def _encounter_partials(df: pd.DataFrame) -> pd.DataFrame:
+    known = df["encounter_class"].where(df["encounter_class"].isin(ENCOUNTER_CLASSES), "other")
+    classes = {f"encounters_{c}": known.eq(c) for c in ENCOUNTER_CLASSES + ["other"]}
+    return df.assign(**classes).groupby(PARTIAL_KEYS).agg(
+        encounters=("encounter_id", "count"),
+        **{name: (name, "sum") for name in classes},
+        total_cost=("total_cost", "sum"),
+        total_duration_hours=("duration_hours", "sum"),
+        first_encounter=("start_datetime", "min"),
+        last_encounter=("start_datetime", "max"),
+    )
+
+
+def _procedure_partials(df: pd.DataFrame) -> pd.DataFrame:
+    return df.groupby(PARTIAL_KEYS).agg(
+        procedures=("procedure_id", "count"),
+        procedure_cost=("cost", "sum"),
+        last_procedure=("performed_datetime", "max"),
+    )
+
+
+def _condition_partials(df: pd.DataFrame) -> pd.DataFrame:
+    return df.groupby(PARTIAL_KEYS).agg(
+        conditions=("condition_id", "count"),
+        conditions_active=("is_active", "sum"),
+        first_condition=("onset_datetime", "min"),
+        last_condition=("onset_datetime", "max"),
+    )
+
+
+PARTIAL_KEYS = ["partition", "patient_key"]
+
+# source fact table → columns read from its staged partitions, partial builder,
+# and how each feature merges; "count" is the column that says a patient has rows
+FEATURE_SOURCES = {
+    "fact_encounters": {
+        "columns": ["encounter_id", "patient_key", "encounter_class", "start_datetime",
+                    "duration_hours", "total_cost"],
+        "partials": _encounter_partials,
+        "count": "encounters",
+        "merge": {
+            "encounters": "sum",
+            **{f"encounters_{c}": "sum" for c in ENCOUNTER_CLASSES + ["other"]},
+            "total_cost": "sum",
+            "total_duration_hours": "sum",
+            "first_encounter": "min",
+            "last_encounter": "max",
+        },
+    },
+    "fact_procedures": {
+        "columns": ["procedure_id", "patient_key", "performed_datetime", "cost"],
+        "partials": _procedure_partials,
+        "count": "procedures",
+        "merge": {
+            "procedures": "sum",
+            "procedure_cost": "sum",
+            "last_procedure": "max",
+        },
+    },
+    "fact_conditions": {
+        "columns": ["condition_id", "patient_key", "onset_datetime", "is_active"],
+        "partials": _condition_partials,
+        "count": "conditions",
+        "merge": {
+            "conditions": "sum",
+            "conditions_active": "sum",
+            "first_condition": "min",
+            "last_condition": "max",
+        },
+    },
+}
+
+FEATURE_COLUMNS = [name for source in FEATURE_SOURCES.values() for name in source["merge"]]
+
+
+class PatientFeatureStore:
+    """Feature table plus the per-partition partials it was folded from."""
+
+    def __init__(self, root: Path = None):
+        self.root = Path(root or FEATURE_STORE_DIR)
+
+    def manifest(self) -> dict:
+        path = self.root / MANIFEST
+        return json.loads(path.read_text()) if path.exists() else {}
+
+    def features(self) -> pd.DataFrame:
+        """Current feature table, indexed by patient_key."""
+        return self._read_features(self.manifest())
+
+    def update(self, staged: dict, rebuild: bool = False) -> dict:
+        """
+        Fold the staged fact partitions that changed since the last update into
+        the feature table and publish a new generation.
+        `staged` is stage_tables() output; tables missing from it keep their partials.
+        Returns {"patients", "partitions", "stale"} (partitions refolded, patients re-merged).
+        """
+        manifest = self.manifest()
+        generation = manifest.get("generation", 0) + 1   # never reuse a live generation's file names
+        if rebuild or manifest.get("version") != FEATURE_VERSION:
+            manifest = {"version": FEATURE_VERSION, "partitions": {}, "features": None}
+        partitions = {name: dict(parts) for name, parts in manifest["partitions"].items()}
+        features = self._read_features(manifest)
+
+        refolded = stale = 0
+        for name, source in FEATURE_SOURCES.items():
+            if name not in staged:
+                continue
+            current = partitions.setdefault(name, {})
+            incoming = staged[name]["partitions"]
+            changed = [pid for pid, part in incoming.items()
+                       if current.get(pid, {}).get("fingerprint") != part["fingerprint"]]
+            replaced = [pid for pid in current if pid in changed or pid not in incoming]
+            if not changed and not replaced:
+                continue
+
+            removed = self._read_partials(name, [current.pop(pid) for pid in replaced])
+            added = self._partials(name, source, [incoming[pid]["path"] for pid in changed])
+            current.update(self._write_partials(name, added, generation,
+                                                {pid: incoming[pid]["fingerprint"] for pid in changed}))
+
+            features, n_stale = self._fold(features, name, source, removed, added, current)
+            refolded += len(set(changed) | set(replaced))
+            stale += n_stale
+
+        if not refolded and manifest.get("features"):
+            print(f"    = patient_features: unchanged, skipped ({len(features)} patients)")
+            return {"patients": len(features), "partitions": 0, "stale": 0}
+
+        self._publish(features, {"version": FEATURE_VERSION, "generation": generation,
+                                 "partitions": partitions})
+        print(f"    ✓ patient_features: {len(features)} patients ({refolded} partitions refolded, "
+              f"{stale} patients re-merged) → {self.root}")
+        return {"patients": len(features), "partitions": refolded, "stale": stale}
+
+    # ---- folding ----
+
+    def _partials(self, name: str, source: dict, paths: list) -> pd.DataFrame:
+        """Per-(partition, patient) partials of a set of staged partition files, in one pass."""
+        field = TABLE_SCHEMAS[name]["partition_field"]   # feature sources are partitioned facts
+        columns = source["columns"] + ([field] if field not in source["columns"] else [])
+        if not paths:
+            return _empty_partials(source["merge"])
+        df = ds.dataset(paths, format="parquet").to_table(columns=columns).to_pandas()
+        codes, rows = np.unique(partition_codes(df[field]), return_inverse=True)
+        df["partition"] = np.array([partition_id(code) for code in codes], dtype=object)[rows]
+        return source["partials"](df)
+
+    def _fold(self, features, name, source, removed, added, current):
+        """Apply one source's partial deltas; returns (features, patients re-merged)."""
+        merge = source["merge"]
+        sums = [col for col, how in merge.items() if how == "sum"]
+        extremes = [col for col, how in merge.items() if how != "sum"]
+        old = _merge_partials(removed, merge)
+        new = _merge_partials(added, merge)
+
+        features = features.reindex(features.index.union(new.index))
+        features[sums] = features[sums].fillna(0).add(new[sums], fill_value=0).sub(old[sums], fill_value=0)
+
+        # an extreme that came from a replaced partition cannot be subtracted out
+        before = features.reindex(old.index)[extremes]
+        stale = old.index[(old[extremes] == before).any(axis=1).to_numpy()]
+        for col in extremes:
+            current_value = features[col]
+            other = new[col].reindex(features.index).astype(current_value.dtype)
+            better = other < current_value if merge[col] == "min" else other > current_value
+            features[col] = current_value.mask(other.notna() & (current_value.isna() | better), other)
+
+        if len(stale):
+            exact = _merge_partials(self._read_partials(name, current.values(), stale), merge).reindex(stale)
+            exact[sums] = exact[sums].fillna(0)
+            features.loc[stale, list(merge)] = exact[list(merge)]
+
+        # a patient without rows in this source has no features from it
+        empty = features[source["count"]].fillna(0) <= 0
+        features.loc[empty, sums] = 0
+        features.loc[empty, extremes] = pd.NaT
+        counts = [s["count"] for s in FEATURE_SOURCES.values()]
+        return features[(features[counts].fillna(0) > 0).any(axis=1)], len(stale)
+
+    # ---- storage ----
+
+    def _read_features(self, manifest: dict) -> pd.DataFrame:
+        if manifest.get("features"):
+            return pq.read_table(self.root / manifest["features"]).to_pandas().set_index("patient_key")
+        return _empty_features()
+
+    def _write_partials(self, name: str, partials: pd.DataFrame, generation: int, fingerprints: dict) -> dict:
+        """One file per generation, one row group per partition; returns the manifest entries."""
+        directory = self.root / "partials" / name
+        directory.mkdir(parents=True, exist_ok=True)
+        file = f"{generation}.parquet"
+        partials = partials.sort_index(level="partition")
+        table = pa.Table.from_pandas(partials.reset_index(), preserve_index=False)
+        pids = partials.index.get_level_values("partition")
+        entries = {}
+        with pq.ParquetWriter(directory / file, table.schema, compression="snappy") as writer:
+            row_group = 0
+            for pid, fp in fingerprints.items():
+                start, stop = pids.searchsorted(pid, side="left"), pids.searchsorted(pid, side="right")
+                if start == stop:   # no rows with a patient key: nothing to keep
+                    entries[pid] = {"fingerprint": fp, "file": None, "row_group": None}
+                    continue
+                writer.write_table(table.slice(start, stop - start), row_group_size=stop - start)
+                entries[pid] = {"fingerprint": fp, "file": file, "row_group": row_group}
+                row_group += 1
+        return entries
+
+    def _read_partials(self, name: str, entries, patients: pd.Index = None) -> pd.DataFrame:
+        """Partials behind manifest entries, optionally only the given patients' rows."""
+        by_file = {}
+        for entry in entries:
+            if entry["file"] is not None:
+                by_file.setdefault(entry["file"], []).append(entry["row_group"])
+        tables = []
+        for file, row_groups in by_file.items():
+            table = pq.ParquetFile(self.root / "partials" / name / file).read_row_groups(sorted(row_groups))
+            if patients is not None:
+                table = table.filter(pc.is_in(table.column("patient_key"),
+                                              value_set=pa.array(patients.tolist(), type=pa.string())))
+            tables.append(table)
+        if not tables:
+            return _empty_partials(FEATURE_SOURCES[name]["merge"])
+        return pa.concat_tables(tables).to_pandas().set_index(PARTIAL_KEYS)
+
+    def _publish(self, features: pd.DataFrame, manifest: dict):
+        """Write the feature file, then swap the manifest in; older generations are removed after."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        features = _typed(features).sort_index()
+        file = f"patient_features-{manifest['generation']}.parquet"
+        pq.write_table(pa.Table.from_pandas(features.reset_index(), preserve_index=False),
+                       self.root / file, compression="snappy", row_group_size=ROW_GROUP_SIZE)
+        manifest["features"] = file
+        manifest["patients"] = len(features)
+
+        tmp = self.root / f".{MANIFEST}.tmp"
+        tmp.write_text(json.dumps(manifest, indent=1))
+        os.replace(tmp, self.root / MANIFEST)
+        self._prune(manifest)
+
+    def _prune(self, manifest: dict):
+        for path in self.root.glob("patient_features-*.parquet"):
+            if path.name != manifest["features"]:
+                path.unlink(missing_ok=True)
+        for name in FEATURE_SOURCES:
+            # a partial file stays while any of its partitions is still live
+            live = {part["file"] for part in manifest["partitions"].get(name, {}).values()}
+            for path in (self.root / "partials" / name).glob("*.parquet"):
+                if path.name not in live:
+                    path.unlink(missing_ok=True)
+
+
+def _merge_partials(partials: pd.DataFrame, merge: dict) -> pd.DataFrame:
+    """Merge (partition, patient) partials into one row per patient."""
+    if partials.empty:
+        return _empty_partials(merge).droplevel("partition")
+    return partials.groupby(level="patient_key").agg(merge)
+
+
+def _empty_partials(merge: dict) -> pd.DataFrame:
+    index = pd.MultiIndex.from_arrays([[], []], names=PARTIAL_KEYS)
+    return pd.DataFrame({col: pd.Series([], dtype="float64" if how == "sum" else "datetime64[ns, UTC]")
+                         for col, how in merge.items()}).set_axis(index)
+
+
+def _empty_features() -> pd.DataFrame:
+    return _typed(pd.DataFrame(columns=FEATURE_COLUMNS, index=pd.Index([], name="patient_key", dtype=object)))
+
+
+def _typed(features: pd.DataFrame) -> pd.DataFrame:
+    """Counts as int64, sums as float64, extremes as UTC timestamps."""
+    features = features.copy()
+    for source in FEATURE_SOURCES.values():
+        for col, how in source["merge"].items():
+            if how != "sum":
+                features[col] = pd.to_datetime(features[col], utc=True)
+            elif col == source["count"] or col.startswith(f"{source['count']}_"):
+                features[col] = features[col].fillna(0).astype(np.int64)
+            else:
+                features[col] = features[col].fillna(0).astype(np.float64)
+    return features[FEATURE_COLUMNS]
@@ -0,0 +1,303 @@
+"""
+Stage-level instrumentation for the ETL pipeline.
+
+A span measures one stage or builder: wall and CPU time, rows in/out,
+output bytes, peak resident memory and garbage-collector activity.
+Finished spans are kept in memory (finished_spans()) and, when a trace
+file is configured, appended to it as JSON lines in the OpenTelemetry
+span JSON shape (context ids, parent_id, start/end time, attributes,
+status), so they can be replayed into any OTel-aware tool.
+
+    with span("extract.encounters") as s:
+        df = ...
+        s.set_output(df)
+
+    @traced("transform.fact_encounters")
+    def build_fact_encounters(encounters_df, ...): ...
+
+Configuration (environment, or configure() / run_pipeline flags):
+    ETL_TRACE_FILE        JSON-lines output path (unset: in-memory only)
+    ETL_PROFILE           comma-separated span name patterns (fnmatch) to run
+                          under cProfile; .prof files go next to the trace file
+    ETL_TRACEMALLOC       span name patterns to run under tracemalloc; adds the
+                          peak traced bytes and top allocation sites to the span
+    ETL_TRACE_DEEP_BYTES  "1" to count string payloads in bytes_out (slower)
+"""
+
+import contextvars
+import cProfile
+import fnmatch
+import functools
+import gc
+import json
+import os
+import resource
+import secrets
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent
+TRACE_DIR = BASE_DIR / "data" / "traces"
+
+RSS_SAMPLE_SECONDS = 0.01
+TRACEMALLOC_TOP = 10
+SERVICE_NAME = "etl-pipeline"
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _patterns(value) -> list:
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [v.strip() for v in value if v.strip()]
+
+
+_config = {
+    "trace_file": os.getenv("ETL_TRACE_FILE") or None,
+    "profile": _patterns(os.getenv("ETL_PROFILE")),
+    "tracemalloc": _patterns(os.getenv("ETL_TRACEMALLOC")),
+    "deep_bytes": os.getenv("ETL_TRACE_DEEP_BYTES") == "1",
+}
+
+
+def configure(trace_file=None, profile=None, tracemalloc=None, deep_bytes=None):
+    """Override the environment configuration; arguments left as None are unchanged."""
+    if trace_file is not None:
+        _config["trace_file"] = str(trace_file)
+    if profile is not None:
+        _config["profile"] = _patterns(profile)
+    if tracemalloc is not None:
+        _config["tracemalloc"] = _patterns(tracemalloc)
+    if deep_bytes is not None:
+        _config["deep_bytes"] = bool(deep_bytes)
+
+
+def trace_file():
+    return _config["trace_file"]
+
+
+def current_rss() -> int:
+    """Resident set size in bytes (Linux /proc; elsewhere the lifetime peak)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+# ---- peak RSS: one sampler thread shared by all open spans ----
+
+_open_spans = set()
+_open_lock = threading.Lock()
+_sampler = None
+
+
+def _sample_rss():
+    while True:
+        time.sleep(RSS_SAMPLE_SECONDS)
+        rss = current_rss()
+        with _open_lock:
+            for s in _open_spans:
+                if rss > s._peak_rss:
+                    s._peak_rss = rss
+
+
+def _track(s, open_: bool):
+    global _sampler
+    with _open_lock:
+        if open_:
+            _open_spans.add(s)
+            if _sampler is None:
+                _sampler = threading.Thread(target=_sample_rss, name="etl-rss-sampler", daemon=True)
+                _sampler.start()
+        else:
+            _open_spans.discard(s)
+
+
+# ---- spans ----
+
+_current = contextvars.ContextVar("etl_span", default=None)
+_finished = []
+_finished_lock = threading.Lock()
+_write_lock = threading.Lock()
+_profiling = threading.local()
+
+
+def frame_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=_config["deep_bytes"]).sum())
+
+
+class Span:
+    def __init__(self, name: str, parent=None, attributes: dict = None):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.attributes = dict(attributes or {})
+        self.error = None
+
+    def set(self, **attributes):
+        """Set span attributes; plain keys are namespaced under `etl.`."""
+        for key, value in attributes.items():
+            self.attributes[key if "." in key else f"etl.{key}"] = value
+
+    def set_output(self, result):
+        """Record rows_out / bytes_out for a DataFrame (or a dict of DataFrames)."""
+        frames = result.values() if isinstance(result, dict) else [result]
+        frames = [f for f in frames if isinstance(f, pd.DataFrame)]
+        if frames:
+            self.set(rows_out=sum(len(f) for f in frames), bytes_out=sum(frame_bytes(f) for f in frames))
+
+    # -- lifecycle --
+
+    def _start(self):
+        self._profile = self._tracemalloc = None
+        if _matches(self.name, _config["profile"]) and not getattr(_profiling, "active", False):
+            self._profile = cProfile.Profile()
+            _profiling.active = True
+            self._profile.enable()
+        if _matches(self.name, _config["tracemalloc"]) and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracemalloc = True
+
+        self._gc = [stat["collections"] for stat in gc.get_stats()]
+        self._start_rss = self._peak_rss = current_rss()
+        _track(self, True)
+        self.start_time = datetime.now(timezone.utc)
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+
+    def _finish(self):
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        self.end_time = datetime.now(timezone.utc)
+        _track(self, False)
+        peak = max(self._peak_rss, current_rss())
+
+        self.set(wall_s=round(wall, 6), cpu_s=round(cpu, 6),
+                 peak_rss_bytes=peak, rss_growth_bytes=peak - self._start_rss)
+        for generation, (before, stat) in enumerate(zip(self._gc, gc.get_stats())):
+            self.set(**{f"etl.gc.gen{generation}_collections": stat["collections"] - before})
+        rows = self.attributes.get("etl.rows_in") or self.attributes.get("etl.rows_out")
+        if rows and wall > 0:
+            self.set(rows_per_s=round(rows / wall))
+
+        if self._tracemalloc:
+            snapshot = tracemalloc.take_snapshot()
+            _, traced_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.set(tracemalloc_peak_bytes=traced_peak, tracemalloc_top=[
+                f"{stat.traceback[0].filename}:{stat.traceback[0].lineno} {stat.size}B"
+                for stat in snapshot.statistics("lineno")[:TRACEMALLOC_TOP]
+            ])
+        if self._profile:
+            self._profile.disable()
+            _profiling.active = False
+            path = _output_dir() / f"{self.name}-{self.span_id}.prof"
+            self._profile.dump_stats(path)
+            self.set(profile_file=str(path))
+
+        _record(self)
+
+    def to_dict(self) -> dict:
+        """OpenTelemetry span JSON (as produced by the SDK's console exporter)."""
+        return {
+            "name": self.name,
+            "context": {"trace_id": f"0x{self.trace_id}", "span_id": f"0x{self.span_id}", "trace_state": "[]"},
+            "kind": "SpanKind.INTERNAL",
+            "parent_id": f"0x{self.parent.span_id}" if self.parent else None,
+            "start_time": self.start_time.isoformat().replace("+00:00", "Z"),
+            "end_time": self.end_time.isoformat().replace("+00:00", "Z"),
+            "status": {"status_code": "ERROR", "description": self.error} if self.error
+                      else {"status_code": "OK"},
+            "attributes": self.attributes,
+            "events": [],
+            "links": [],
+            "resource": {"attributes": {"service.name": SERVICE_NAME}, "schema_url": ""},
+        }
+
+
+def _matches(name: str, patterns: list) -> bool:
+    return any(fnmatch.fnmatchcase(name, p) for p in patterns)
+
+
+def _output_dir() -> Path:
+    out = Path(_config["trace_file"]).parent if _config["trace_file"] else TRACE_DIR
+    out.mkdir(parents=True, exist_ok=True)
+    return out
+
+
+def _record(s: Span):
+    with _finished_lock:
+        _finished.append(s)
+    path = _config["trace_file"]
+    if path:
+        line = json.dumps(s.to_dict(), default=str)
+        with _write_lock:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class span:
+    """Context manager opening a child of the current span (or a new trace)."""
+
+    def __init__(self, name: str, **attributes):
+        self._span = Span(name, parent=_current.get(), attributes=None)
+        self._span.set(**attributes)
+
+    def __enter__(self) -> Span:
+        self._token = _current.set(self._span)
+        self._span._start()
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self._span.error = f"{exc_type.__name__}: {exc}"
+        self._span._finish()
+        _current.reset(self._token)
+        return False
+
+
+def traced(name: str):
+    """Decorator: run a builder inside a span, recording rows in (first DataFrame arg) and out."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name) as s:
+                first = next((a for a in args if isinstance(a, pd.DataFrame)), None)
+                if first is not None:
+                    s.set(rows_in=len(first))
+                result = fn(*args, **kwargs)
+                s.set_output(result)
+                return result
+        return wrapper
+    return decorator
+
+
+def finished_spans(trace_id: str = None) -> list:
+    """Spans finished so far in this process (optionally for one trace), in end order."""
+    with _finished_lock:
+        return [s for s in _finished if trace_id is None or s.trace_id == trace_id]
+
+
+def print_summary(root: Span, top: int = 10):
+    """Print the slowest spans under `root` with their rows and peak memory."""
+    spans = [s for s in finished_spans(root.trace_id) if s is not root]
+    spans.sort(key=lambda s: s.attributes.get("etl.wall_s", 0), reverse=True)
+    total = root.attributes.get("etl.wall_s") or 1
+    print(f"  {'span':<42} {'wall s':>9} {'share':>6} {'rows out':>12} {'peak RSS MB':>12}")
+    for s in spans[:top]:
+        wall = s.attributes.get("etl.wall_s", 0)
+        rows = s.attributes.get("etl.rows_out")
+        print(f"  {s.name:<42} {wall:>9.3f} {wall / total:>6.1%} "
+              f"{rows if rows is not None else '':>12} {s.attributes['etl.peak_rss_bytes'] / 2**20:>12.1f}")
@@ -6,7 +6,11 @@ Loads transformed data into:
 """
 
 from .load_to_bigquery import load_to_bigquery
+from .warehouse import BigQueryWarehouse, LocalWarehouse, load_tables
 
 __all__ = [
     "load_to_bigquery",
+    "load_tables",
+    "BigQueryWarehouse",
+    "LocalWarehouse",
 ]
\ No newline at end of file
@@ -1,15 +1,54 @@
 """
 Load CSV data files into MySQL staging tables (Simple Path Version)
+
+Loads are idempotent: ids of conditions/procedures are derived from their
+natural keys (etl/extract/identity.py) and every row carries a content
+fingerprint, so a re-run inserts new rows, updates changed ones and leaves
+the rest alone. --bulk is the fast path for a first load into empty tables.
+
+A source manifest (etl_source_files) records size, mtime, content hash and
+committed byte offset per input file. Unchanged files are skipped without
+being parsed, files that only grew are read from the committed offset, and
+the manifest row is written in the same transaction as the staged rows.
+The manifest row also keeps the occurrence count of every natural key
+staged so far, so a key repeated in the tail gets the same id as in a full
+read without the committed part being parsed again.
+--force ignores the manifest.
+
+Sources may be gzip/zstd-compressed or zip members (etl/extract/streams.py)
+and are read as streams, never decompressed to disk. Decompression runs on
+a reader thread and the INSERTs on a writer thread (write_behind), so the
+file, the parser and the database work at the same time.
 """
 
 import os
 import csv
+import hashlib
+import io
 import sys
 import mysql.connector
-import uuid
 import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from datetime import datetime
+from operator import itemgetter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from etl.extract import streams
+from etl.extract.identity import (
+    count_keys,
+    join_values,
+    pack_key_counts,
+    row_fingerprints,
+    surrogate_ids,
+    unpack_key_counts,
+)
+from etl.extract.sources import SOURCES
 
 load_dotenv()
 
@@ -28,6 +67,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Rows per multi-row INSERT
+BULK_BATCH_ROWS = int(os.getenv("MYSQL_BULK_BATCH_ROWS", "20000"))
+# INSERT batches the parser may run ahead of the database writer
+WRITE_BEHIND_BATCHES = int(os.getenv("MYSQL_WRITE_BEHIND_BATCHES", "4"))
+
 def get_connection():
     """Create MySQL connection from environment variables."""
     return mysql.connector.connect(
@@ -39,12 +83,151 @@ def get_connection():
     )
 
 
-def load_csv_to_table(cursor, filepath, table_name, column_mapping, parent_check=None):
+def read_csv_rows(filepath, column_mapping, valid_parent_keys=None, parent_column=None, natural_key=None,
+                  offset=0, end=None, seen=None):
+    """
+    Parse a CSV into staging-table tuples, cleaning values on the way: the
+    column_mapping columns in order, then the row fingerprint. Columns mapped
+    to None get ids hashed from the natural_key columns.
+
+    offset/end: byte range of data lines to read (the header is always read
+    from the top); see plan_ingest.
+    seen: natural-key occurrence counts of the rows before `offset`
+          (surrogate_ids' state, e.g. from the manifest), updated in place
+          with the rows read; counted from the file when empty
+    """
+    return [row for batch in iter_csv_rows(filepath, column_mapping, valid_parent_keys, parent_column,
+                                           natural_key, offset, end, seen=seen)
+            for row in batch]
+
+
+def iter_csv_rows(filepath, column_mapping, valid_parent_keys=None, parent_column=None, natural_key=None,
+                  offset=0, end=None, batch_rows=None, seen=None):
+    """read_csv_rows in batches of batch_rows (default BULK_BATCH_ROWS) rows."""
+    batch_rows = batch_rows or BULK_BATCH_ROWS
+    seen = {} if seen is None else seen   # natural-key occurrences carried across batches
+    if offset and natural_key and not seen:
+        _count_prefix_keys(filepath, column_mapping, valid_parent_keys, parent_column, natural_key, offset, seen)
+    rows = []
+    for values in _clean_rows(_csv_lines(filepath, offset, end), column_mapping, valid_parent_keys, parent_column):
+        rows.append(values)
+        if len(rows) == batch_rows:
+            yield _finish_rows(rows, column_mapping, natural_key, seen)
+            rows = []
+    if rows:
+        yield _finish_rows(rows, column_mapping, natural_key, seen)
+
+
+def _clean_rows(lines, column_mapping, valid_parent_keys=None, parent_column=None):
+    """CSV lines (header first) → lists of cleaned column_mapping values (None for derived columns)."""
+    for row in csv.DictReader(lines):
+        # 🔹 skip row if it doesn't match parent
+        if valid_parent_keys and row.get(parent_column) not in valid_parent_keys:
+            continue
+
+        values = []
+        for db_col, csv_col in column_mapping.items():
+            if csv_col is None:
+                values.append(None)  # derived below
+            else:
+                val = row.get(csv_col)
+                if val:
+                    val = val.strip()
+                    # Fix ISO 8601 datetime
+                    if "datetime" in db_col.lower():
+                        val = val.replace("T", " ").replace("Z", "")
+                    # Fix DATE format (MM/DD/YYYY -> YYYY-MM-DD)
+                    elif "date" in db_col.lower():
+                        try:
+                            dt = datetime.strptime(val, "%m/%d/%Y")
+                            val = dt.strftime("%Y-%m-%d")
+                        except ValueError:
+                            pass
+                    # Convert numeric columns to float or int
+                    elif db_col in ["number_of_discharges", "number_of_readmissions",
+                                    "expected_readmission_rate", "predicted_readmission_rate",
+                                    "excess_readmission_ratio", "total_cost", "cost", "BASE_COST"]:
+                        try:
+                            val = float(val)
+                        except (ValueError, TypeError):
+                            val = None  # replace invalid text with NULL
+                values.append(val or None)
+
+        yield values
+
+
+def _count_prefix_keys(filepath, column_mapping, valid_parent_keys, parent_column, natural_key, offset, seen):
+    """
+    Fold the natural keys of the rows before `offset` (already staged) into
+    `seen`, so a key repeated in an appended tail gets the occurrence number,
+    and so the id, a full read would give it. Only needed when the manifest
+    has no counts for the file (rows recorded before it kept them).
+    """
+    positions = [list(column_mapping).index(c) for c in natural_key]
+    keys = []
+    for values in _clean_rows(_csv_lines(filepath, 0, offset), column_mapping, valid_parent_keys, parent_column):
+        keys.append(join_values([values[p] for p in positions]))
+        if len(keys) == BULK_BATCH_ROWS:
+            count_keys(keys, seen)
+            keys = []
+    if keys:
+        count_keys(keys, seen)
+
+
+def _finish_rows(rows, column_mapping, natural_key, seen):
+    """Fill in derived ids and append the fingerprint to each row."""
+    columns = list(column_mapping)
+    for i, (db_col, csv_col) in enumerate(column_mapping.items()):
+        if csv_col is None:
+            positions = [columns.index(c) for c in natural_key]
+            ids = surrogate_ids([join_values([row[p] for p in positions]) for row in rows], seen)
+            for row, id_ in zip(rows, ids.to_pylist()):
+                row[i] = id_
+    return [(*row, fingerprint) for row, fingerprint in zip(rows, row_fingerprints(rows).tolist())]
+
+
+def _csv_lines(filepath, offset=0, end=None):
+    """
+    Decoded lines of a CSV source: the header, then the lines in [offset, end).
+    Blocks are read and decompressed ahead on a streams.read_blocks thread.
+    """
+    if offset:   # a tail of a plain file: header from the top, then seek
+        with open(filepath, "rb") as f:
+            header = f.readline()
+        yield header.decode("utf-8")
+        blocks = streams.read_blocks(filepath, max(offset, len(header)), end)
+    else:
+        blocks = streams.read_blocks(filepath, 0, end)
+    partial = b""
+    for block in blocks:
+        cut = block.rfind(b"\n") + 1
+        if not cut:
+            partial += block
+            continue
+        # newline="" keeps line endings, as csv wants
+        yield from io.StringIO((partial + block[:cut]).decode("utf-8"), newline="")
+        partial = block[cut:]
+    if partial:
+        yield partial.decode("utf-8")
+
+
+def load_csv_to_table(cursor, filepath, table_name, column_mapping, parent_check=None,
+                      key_columns=None, natural_key=None, offset=0, end=None, seen=None):
     """
     parent_check: optional tuple (parent_table, parent_column, csv_child_column)
     Only insert rows where CSV child_column exists in parent_table.parent_column
+
+    key_columns: columns identifying a row across loads; rows already staged
+    under the same key are updated when their fingerprint changed and skipped
+    otherwise. Returns the number of rows written.
+
+    offset/end: byte range of the file to read (plan_ingest)
+    seen: natural-key occurrence counts, as for read_csv_rows
+
+    Rows are parsed, diffed and written a batch at a time; the INSERTs run on
+    a write_behind thread while the next batch is parsed.
     """
-    if not os.path.exists(filepath):
+    if not streams.exists(filepath):
         print(f"File not found: {filepath}")
         logger.warning(f"File not found: {filepath}")
         return 0
@@ -57,225 +240,431 @@ def load_csv_to_table(cursor, filepath, table_name, column_mapping, parent_check
         valid_parent_keys = set(row[0] for row in cursor.fetchall())
         logger.info(f"Filtering rows based on parent table '{parent_table}' ({len(valid_parent_keys)} valid keys)")
 
-    rows = []
-    with open(filepath, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            # 🔹 skip row if it doesn't match parent
-            if valid_parent_keys and row.get(parent_check[2]) not in valid_parent_keys:
-                continue
-
-            values = []
-            for db_col, csv_col in column_mapping.items():
-                if csv_col is None:
-                    values.append(str(uuid.uuid4()))
-                else:
-                    val = row.get(csv_col)
-                    if val:
-                        val = val.strip()
-                        # Fix ISO 8601 datetime
-                        if "datetime" in db_col.lower():
-                            val = val.replace("T", " ").replace("Z", "")
-                        # Fix DATE format (MM/DD/YYYY -> YYYY-MM-DD)
-                        elif "date" in db_col.lower():
-                            try:
-                                dt = datetime.strptime(val, "%m/%d/%Y")
-                                val = dt.strftime("%Y-%m-%d")
-                            except ValueError:
-                                pass
-                        # Convert numeric columns to float or int
-                        elif db_col in ["number_of_discharges", "number_of_readmissions",
-                                        "expected_readmission_rate", "predicted_readmission_rate",
-                                        "excess_readmission_ratio", "total_cost", "cost", "BASE_COST"]:
-                            try:
-                                val = float(val)
-                            except (ValueError, TypeError):
-                                val = None  # replace invalid text with NULL
-                    values.append(val or None)
-
-            rows.append(tuple(values))
+    columns = list(column_mapping) + ["row_fingerprint"]
+    existing, key = {}, None
+    if key_columns:
+        existing = staged_fingerprints(cursor, table_name, key_columns)
+        key = itemgetter(*[columns.index(c) for c in key_columns])
+        if len(key_columns) == 1:
+            key = (lambda get: lambda row: (get(row),))(key)
 
-    if not rows:
+    db_columns = ", ".join(columns)
+    placeholders = ", ".join(["%s"] * len(columns))
+    sql = f"INSERT INTO {table_name} ({db_columns}) VALUES ({placeholders})"
+    updates = ", ".join(f"{c} = new.{c}" for c in columns if c not in (key_columns or []))
+    upsert = f"{sql} AS new ON DUPLICATE KEY UPDATE {updates}"
+
+    total = new_count = changed_count = 0
+    batches = iter_csv_rows(filepath, column_mapping, valid_parent_keys, parent_check[2] if parent_check else None,
+                            natural_key, offset, end, seen=seen)
+    try:
+        with write_behind(cursor) as write:
+            for rows in batches:
+                total += len(rows)
+                new, changed = rows, []
+                if existing:
+                    new, changed = [], []
+                    for row in rows:
+                        fingerprint = existing.get(key(row))
+                        if fingerprint is None:
+                            new.append(row)
+                        elif fingerprint != row[-1]:
+                            changed.append(row)
+                write(sql, new)
+                write(upsert, changed)
+                new_count += len(new)
+                changed_count += len(changed)
+    except mysql.connector.Error as e:
+        logger.error(f"MySQL error while inserting into {table_name}: {e}")
+        raise
+
+    if not total:
         print(f"⚠ No data in {filepath} after filtering")
         logger.warning(f"No data in {filepath} after filtering")
         return 0
+    unchanged = total - new_count - changed_count
+    print(f"  {table_name}: {new_count} new, {changed_count} changed, {unchanged} unchanged")
+    logger.info(f"{table_name}: {new_count} new, {changed_count} changed, {unchanged} unchanged")
+    return new_count + changed_count
 
-    db_columns = ", ".join(column_mapping.keys())
-    placeholders = ", ".join(["%s"] * len(column_mapping))
-    sql = f"INSERT INTO {table_name} ({db_columns}) VALUES ({placeholders})"
+
+@contextmanager
+def write_behind(cursor, depth=None):
+    """
+    Yields write(statement, rows): executemany() on one writer thread,
+    BULK_BATCH_ROWS rows per call, so the caller keeps parsing while the
+    database works. At most `depth` (WRITE_BEHIND_BATCHES) calls are pending;
+    the block exits once all have run, and a failed write is raised.
+    """
+    depth = depth or WRITE_BEHIND_BATCHES
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="mysql-writer") as writer:
+        def write(statement, rows):
+            for start in range(0, len(rows), BULK_BATCH_ROWS):
+                if len(pending) >= depth:
+                    pending.popleft().result()
+                pending.append(writer.submit(cursor.executemany, statement, rows[start:start + BULK_BATCH_ROWS]))
+
+        try:
+            yield write
+            while pending:
+                pending.popleft().result()
+        finally:
+            for future in pending:   # after an error: drop what has not started
+                future.cancel()
+
+
+def staged_fingerprints(cursor, table_name, key_columns):
+    """{key tuple: row_fingerprint} of the rows already in a staging table."""
+    cursor.execute(f"SELECT {', '.join(key_columns)}, row_fingerprint FROM {table_name}")
+    return {tuple(row[:-1]): row[-1] for row in cursor.fetchall()}
+
+
+# -------------------- Bulk-load mode --------------------
+# For loads into empty staging tables: FK and unique checks are off for the
+# session, secondary indexes and foreign keys are dropped before the load and
+# rebuilt once at the end (one sorted build per index instead of a B-tree
+# insert per row), rows go in primary-key order in large multi-row INSERTs,
+# and referential integrity is checked in one set-based pass.
+
+# (label, source, parent_check) in load order
+STEPS = [
+    ("providers", "providers", None),
+    ("patients", "patients", None),
+    ("encounters", "encounters", None),
+    ("conditions (only matched encounters)", "conditions", ("stg_encounters", "encounter_id", "ENCOUNTER")),
+    ("procedures (only matched encounters)", "procedures", ("stg_encounters", "encounter_id", "ENCOUNTER")),
+    ("organizations", "organizations", None),
+    ("CMS readmissions", "readmissions", None),
+]
+
+
+def table_layout(cursor, table_name):
+    """Primary key, secondary indexes and foreign keys of a table, from information_schema."""
+    cursor.execute("""
+        SELECT INDEX_NAME, NON_UNIQUE, COLUMN_NAME FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        ORDER BY INDEX_NAME, SEQ_IN_INDEX
+    """, (table_name,))
+    primary, indexes = [], {}
+    for index_name, non_unique, column in cursor.fetchall():
+        if index_name == "PRIMARY":
+            primary.append(column)
+        else:
+            indexes.setdefault(index_name, (not int(non_unique), []))[1].append(column)
+
+    cursor.execute("""
+        SELECT CONSTRAINT_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
+        FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND REFERENCED_TABLE_NAME IS NOT NULL
+        ORDER BY CONSTRAINT_NAME, ORDINAL_POSITION
+    """, (table_name,))
+    foreign_keys = {}
+    for name, column, parent_table, parent_column in cursor.fetchall():
+        fk = foreign_keys.setdefault(name, ([], parent_table, []))
+        fk[0].append(column)
+        fk[2].append(parent_column)
+    return {"primary": primary, "indexes": indexes, "foreign_keys": foreign_keys}
+
+
+@contextmanager
+def deferred_constraints(cursor, tables):
+    """
+    Bulk-load session over `tables`: yields their layouts with FK/unique checks
+    off and secondary indexes and foreign keys dropped; rebuilds whatever is
+    missing on exit, even after a failed load.
+    """
+    layouts = {table: table_layout(cursor, table) for table in tables}
+    cursor.execute("SET SESSION foreign_key_checks = 0, SESSION unique_checks = 0")
+    try:
+        for table, layout in layouts.items():
+            drops = [f"DROP FOREIGN KEY {name}" for name in layout["foreign_keys"]]
+            if drops:
+                cursor.execute(f"ALTER TABLE {table} {', '.join(drops)}")
+            drops = [f"DROP INDEX {name}" for name in layout["indexes"]]
+            if drops:
+                cursor.execute(f"ALTER TABLE {table} {', '.join(drops)}")
+        yield layouts
+    finally:
+        for table, layout in layouts.items():
+            started = time.perf_counter()
+            current = table_layout(cursor, table)
+            adds = [f"ADD {'UNIQUE ' if unique else ''}INDEX {name} ({', '.join(columns)})"
+                    for name, (unique, columns) in layout["indexes"].items() if name not in current["indexes"]]
+            if adds:
+                cursor.execute(f"ALTER TABLE {table} {', '.join(adds)}")
+            # with foreign_key_checks off this is a metadata change; check_references did the validation
+            fks = [f"ADD CONSTRAINT {name} FOREIGN KEY ({', '.join(columns)}) "
+                   f"REFERENCES {parent}({', '.join(parent_columns)})"
+                   for name, (columns, parent, parent_columns) in layout["foreign_keys"].items()
+                   if name not in current["foreign_keys"]]
+            if fks:
+                cursor.execute(f"ALTER TABLE {table} {', '.join(fks)}")
+            if adds or fks:
+                print(f"  ↺ {table}: rebuilt {len(adds)} indexes, {len(fks)} foreign keys "
+                      f"in {time.perf_counter() - started:.2f}s")
+        cursor.execute("SET SESSION foreign_key_checks = 1, SESSION unique_checks = 1")
+
+
+def bulk_load_csv_to_table(cursor, filepath, table_name, column_mapping, key_columns=(), natural_key=None,
+                           end=None, seen=None):
+    """
+    Bulk-mode insert: rows in primary-key order, BULK_BATCH_ROWS per INSERT.
+    Parent filtering is left to check_references, which prunes orphans afterwards.
+    """
+    if not streams.exists(filepath):
+        print(f"File not found: {filepath}")
+        logger.warning(f"File not found: {filepath}")
+        return 0
+
+    rows = read_csv_rows(filepath, column_mapping, natural_key=natural_key, end=end, seen=seen)
+    if not rows:
+        print(f"⚠ No data in {filepath}")
+        logger.warning(f"No data in {filepath}")
+        return 0
+
+    columns = list(column_mapping) + ["row_fingerprint"]
+    if key_columns and all(c in columns for c in key_columns):
+        # appends to the clustered index instead of splitting pages; ids are ASCII,
+        # so Python's order matches the column collation
+        rows.sort(key=itemgetter(*[columns.index(c) for c in key_columns]))
+
+    sql = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
     try:
-        cursor.executemany(sql, rows)
+        with write_behind(cursor) as write:
+            write(sql, rows)
     except mysql.connector.Error as e:
         logger.error(f"MySQL error while inserting into {table_name}: {e}")
         raise
     return len(rows)
 
 
-def main():
+def check_references(cursor, layouts, prune):
+    """
+    Set-based referential-integrity pass after a bulk load.
+
+    prune: (child_table, child_column, parent_table, parent_column) relations
+           whose orphan rows are deleted, as parent_check does row by row
+    Every foreign key in `layouts` is then counted for dangling references.
+    Returns {"table.constraint": orphan rows} for the keys that fail.
+    """
+    for child, column, parent, parent_column in prune:
+        cursor.execute(f"""
+            DELETE c FROM {child} c LEFT JOIN {parent} p ON p.{parent_column} = c.{column}
+            WHERE p.{parent_column} IS NULL
+        """)
+        print(f"  ✓ {child}: {cursor.rowcount} rows without a {parent} row dropped")
+
+    orphans = {}
+    for child, layout in layouts.items():
+        for name, (columns, parent, parent_columns) in layout["foreign_keys"].items():
+            join = " AND ".join(f"p.{pc} = c.{cc}" for cc, pc in zip(columns, parent_columns))
+            cursor.execute(f"""
+                SELECT COUNT(*) FROM {child} c LEFT JOIN {parent} p ON {join}
+                WHERE {' AND '.join(f'c.{cc} IS NOT NULL' for cc in columns)} AND p.{parent_columns[0]} IS NULL
+            """)
+            count = cursor.fetchone()[0]
+            if count:
+                orphans[f"{child}.{name}"] = count
+    return orphans
+
+
+# -------------------- Source manifest --------------------
+
+MANIFEST_TABLE = "etl_source_files"
+HASH_CHUNK_BYTES = 1 << 20
+
+
+def source_states(cursor):
+    """{source name: manifest row} of every file ingested so far."""
+    cursor.execute(f"SELECT source_name, size_bytes, mtime_ns, content_hash, committed_offset, key_counts "
+                   f"FROM {MANIFEST_TABLE}")
+    return {name: {"size_bytes": size, "mtime_ns": mtime, "content_hash": digest, "committed_offset": offset,
+                   "key_counts": bytes(counts) if counts is not None else None}
+            for name, size, mtime, digest, offset, counts in cursor.fetchall()}
+
+
+def plan_ingest(filepath, state=None):
+    """
+    Decide how much of a source file to read, against its manifest `state`.
+
+    Returns (offset, new_state): offset None means nothing new (skip the
+    file), 0 means read it all, and a positive offset means the file only
+    grew since the last load, so just the lines from there on are new. Only
+    complete lines are committed: a partly written last line is left for the
+    next run.
+
+    Compressed sources are all-or-nothing: a gzip/zstd stream cannot be
+    entered at an offset, so they are hashed whole (zip members by their
+    CRC) and re-read in full when the content changed.
+
+    new_state carries over the natural-key counts ("key_counts") of the
+    committed rows when they are still valid; the loader folds the rows it
+    reads into them before recording new_state.
+    """
+    marker = streams.stat(filepath)
+    if state and state["size_bytes"] == marker["size_bytes"] and state["mtime_ns"] == marker["mtime_ns"]:
+        return None, state
+
+    if streams.codec(filepath) is not None:
+        digest = marker.get("member_crc") or _file_hash(filepath)
+        new_state = {"size_bytes": marker["size_bytes"], "mtime_ns": marker["mtime_ns"],
+                     "content_hash": digest, "committed_offset": marker["size_bytes"], "key_counts": None}
+        return (None if state and state["content_hash"] == digest else 0), new_state
+
+    stat = os.stat(filepath)
+    end = _last_line_end(filepath, stat.st_size)
+    committed = state["committed_offset"] if state and state["committed_offset"] <= end else 0
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        _hash_bytes(f, digest, committed)
+        prefix_hash = digest.hexdigest()   # the content the manifest hashed last time
+        _hash_bytes(f, digest, end - committed)
+    new_state = {"size_bytes": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                 "content_hash": digest.hexdigest(), "committed_offset": end, "key_counts": None}
+
+    if committed and prefix_hash == state["content_hash"]:
+        new_state["key_counts"] = state.get("key_counts")
+        return (None if committed == end else committed), new_state
+    return 0, new_state
+
+
+def record_source_state(cursor, source, filepath, state):
+    """Upsert a file's manifest row; committed with the rows it describes."""
+    cursor.execute(f"""
+        INSERT INTO {MANIFEST_TABLE} (source_name, file_path, size_bytes, mtime_ns, content_hash, committed_offset,
+                                      key_counts)
+        VALUES (%s, %s, %s, %s, %s, %s, %s) AS new
+        ON DUPLICATE KEY UPDATE file_path = new.file_path, size_bytes = new.size_bytes, mtime_ns = new.mtime_ns,
+            content_hash = new.content_hash, committed_offset = new.committed_offset, key_counts = new.key_counts
+    """, (source, str(filepath), state["size_bytes"], state["mtime_ns"], state["content_hash"],
+          state["committed_offset"], state.get("key_counts")))
+
+
+def _file_hash(filepath):
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _hash_bytes(f, digest, length):
+    while length > 0:
+        chunk = f.read(min(HASH_CHUNK_BYTES, length))
+        if not chunk:
+            break
+        digest.update(chunk)
+        length -= len(chunk)
+
+
+def _last_line_end(filepath, size):
+    """Byte offset just past the last newline (0 if the file has none)."""
+    with open(filepath, "rb") as f:
+        position = size
+        while position > 0:
+            start = max(0, position - HASH_CHUNK_BYTES)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline >= 0:
+                return start + newline + 1
+            position = start
+    return 0
+
+
+def _log(message):
+    print(message)
+    logger.info(message)
+
+
+def _source_path(spec):
+    return streams.locate((SYNTHEA_DIR if spec["dir"] == "synthea" else CMS_DIR) + spec["file"])
+
+
+def _load_steps(conn, cursor, layouts=None, force=False):
+    """
+    Load every source in STEPS, committing per table together with its
+    manifest row; `layouts` switches to bulk mode (which reads every file in
+    full), `force` ignores the manifest.
+    """
+    states = {} if force or layouts is not None else source_states(cursor)
+    total = 0
+    for i, (label, key, parent_check) in enumerate(STEPS, 1):
+        spec = SOURCES[key]
+        filepath = _source_path(spec)
+        _log(f"[{i}] Loading {label}...")
+        if not streams.exists(filepath):
+            print(f"File not found: {filepath}")
+            logger.warning(f"File not found: {filepath}")
+            continue
+        started = time.perf_counter()
+        offset, state = plan_ingest(filepath, states.get(key))
+        # compressed sources are read to the end of the stream
+        end = state["committed_offset"] if streams.codec(filepath) is None else None
+        if offset is None:
+            if state != states.get(key):   # touched, or only a partial line appended
+                record_source_state(cursor, key, filepath, state)
+                conn.commit()
+            _log(f"= {key}: unchanged since the last load, skipped")
+            continue
+        if offset:
+            _log(f"  {key}: appended since the last load, reading from byte {offset:,}")
+        # natural-key counts of the committed rows, extended with the rows read
+        seen = unpack_key_counts(state["key_counts"]) if offset and state["key_counts"] else {}
+        if layouts is None:
+            count = load_csv_to_table(cursor, filepath, spec["table"], spec["columns"], parent_check,
+                                      spec["key"], spec.get("natural_key"), offset, end, seen)
+        else:
+            count = bulk_load_csv_to_table(cursor, filepath, spec["table"], spec["columns"],
+                                           layouts[spec["table"]]["primary"], spec.get("natural_key"), end, seen)
+        if spec.get("natural_key") and end is not None:   # only plain files are ever read from an offset
+            state = {**state, "key_counts": pack_key_counts(seen)}
+        record_source_state(cursor, key, filepath, state)
+        conn.commit()
+        elapsed = time.perf_counter() - started
+        _log(f"✓ {count} {key} written ({count / elapsed if elapsed else 0:,.0f} rows/s)")
+        total += count
+    return total
+
+
+def main(bulk: bool = False, force: bool = False):
+    title = f"MySQL Data Loader ({'Bulk' if bulk else 'Simple'} Version)"
     print("=" * 50)
-    print("MySQL Data Loader (Simple Version)")
+    print(title)
     print("=" * 50)
     logger.info("=" * 50)
-    logger.info("MySQL Data Loader (Simple Version)")
+    logger.info(title)
     logger.info("=" * 50)
 
     conn = get_connection()
     cursor = conn.cursor()
+    started = time.perf_counter()
 
     try:
-        print("[1] Loading providers...")
-        logger.info("[1] Loading providers...")
-        count = load_csv_to_table(
-            cursor,
-            SYNTHEA_DIR + "providers.csv",
-            "stg_providers",
-            {
-                "provider_id": "Id",
-                "name": "NAME",
-                "gender": "GENDER",
-                "speciality": "SPECIALITY",
-                "organization": "ORGANIZATION",
-                "city": "CITY",
-                "state": "STATE",
-                "zip": "ZIP"
-            },
-        )
-        conn.commit()
-        print(f"✓ {count} providers loaded")
-        logger.info(f"✓ {count} providers loaded")
-
-        logger.info("[2] Loading patients...")
-        print("[2] Loading patients...")
-        count = load_csv_to_table(
-            cursor,
-            SYNTHEA_DIR + "patients.csv",
-            "stg_patients",
-            {
-                "patient_id": "Id",
-                "birthdate": "BIRTHDATE",
-                "deathdate": "DEATHDATE",
-                "first_name": "FIRST",
-                "last_name": "LAST",
-                "gender": "GENDER",
-                "race": "RACE",
-                "ethnicity": "ETHNICITY",
-                "city": "CITY",
-                "state": "STATE",
-                "zip": "ZIP",
-                "marital_status": "MARITAL"
-            },
-        )
-        conn.commit()
-        print(f"✓ {count} patients loaded")
-        logger.info(f"✓ {count} patients loaded")
-
-        logger.info("[3] Loading encounters...")
-        print("[3] Loading encounters...")
-        count = load_csv_to_table(
-            cursor,
-            SYNTHEA_DIR + "encounters.csv",
-            "stg_encounters",
-            {
-                "encounter_id": "Id",
-                "patient_id": "PATIENT",
-                "provider_id": "PROVIDER",
-                "encounter_type": "CODE",
-                "encounter_class": "ENCOUNTERCLASS",
-                "start_datetime": "START",
-                "end_datetime": "STOP",
-                "total_cost": "TOTAL_CLAIM_COST",
-                "reason_code": "REASONCODE",
-                "reason_description": "REASONDESCRIPTION"
-            },
-        )
-        conn.commit()
-        print(f"✓ {count} encounters loaded")
-        logger.info(f"✓ {count} encounters loaded")
-
-        logger.info("[4] Loading conditions (only matched encounters)...")
-        print("[4] Loading conditions (only matched encounters)...")
-        count = load_csv_to_table(
-                cursor,
-                SYNTHEA_DIR + "conditions.csv",
-                "stg_conditions",
-                {
-                    "condition_id": None,
-                    "patient_id": "PATIENT",
-                    "encounter_id": "ENCOUNTER",
-                    "code": "CODE",
-                    "description": "DESCRIPTION",
-                    "onset_date": "START",
-                    "abatement_date": "STOP"
-                },
-                parent_check=("stg_encounters", "encounter_id", "ENCOUNTER")  # only matched
-            )
-        conn.commit()
-        print(f"✓ {count} conditions loaded")
-        logger.info(f"✓ {count} conditions loaded")
-
-        logger.info("[5] Loading procedures (only matched encounters)...")
-        print("[5] Loading procedures (only matched encounters)...")
-        count = load_csv_to_table(
-        cursor,
-        SYNTHEA_DIR + "procedures.csv",
-        "stg_procedures",
-        {
-            "procedure_id": None,
-            "patient_id": "PATIENT",
-            "encounter_id": "ENCOUNTER",
-            "code": "CODE",
-            "description": "DESCRIPTION",
-            "performed_datetime": "DATE",
-            "cost": "BASE_COST"
-        },
-        parent_check=("stg_encounters", "encounter_id", "ENCOUNTER")  # only matched
-        )
-        conn.commit()
-        print(f"✓ {count} procedures loaded")
-        logger.info(f"✓ {count} procedures loaded")
-
-        print("[6] Loading organizations...")
-        logger.info("[6] Loading organizations...")
-
-        count = load_csv_to_table(
-            cursor,
-            SYNTHEA_DIR + "organizations.csv",
-            "stg_organizations",
-            {
-                "id": "Id",
-                "name": "NAME"
-            },
-        )
+        if bulk:
+            tables = [SOURCES[key]["table"] for _, key, _ in STEPS]
+            with deferred_constraints(cursor, tables) as layouts:
+                total = _load_steps(conn, cursor, layouts)
+                prune = []
+                for _, key, parent_check in STEPS:
+                    if parent_check:
+                        parent_table, parent_column, csv_child_column = parent_check
+                        column = next(db for db, c in SOURCES[key]["columns"].items() if c == csv_child_column)
+                        prune.append((SOURCES[key]["table"], column, parent_table, parent_column))
+                orphans = check_references(cursor, layouts, prune)
+                conn.commit()
+                if orphans:
+                    for name, count in orphans.items():
+                        print(f"❌ {count} rows violate {name}")
+                        logger.error(f"{count} rows violate {name}")
+                    sys.exit(1)
+        else:
+            total = _load_steps(conn, cursor, force=force)
 
-        conn.commit()
-
-        print(f"✓ {count} organizations loaded")
-        logger.info(f"✓ {count} organizations loaded")
-
-        logger.info("[7] Loading CMS readmissions...")
-        print("[7] Loading CMS readmissions...")
-        count = load_csv_to_table(
-            cursor,
-            CMS_DIR + "FY_2025_Hospital_Readmissions_Reduction_Program_Hospital.csv",
-            "stg_hospital_readmissions",
-            {
-                "hospital_id": "Facility ID",
-                "hospital_name": "Facility Name",
-                "measure_name": "Measure Name",
-                "number_of_discharges": "Number of Discharges",
-                "expected_readmission_rate": "Expected Readmission Rate",
-                "predicted_readmission_rate": "Predicted Readmission Rate",
-                "excess_readmission_ratio": "Excess Readmission Ratio",
-                "number_of_readmissions": "Number of Readmissions",
-                "start_date": "Start Date",
-                "end_date": "End Date"
-            },
-        )
-        conn.commit()
-        print(f"✓ {count} readmission records loaded")
+        elapsed = time.perf_counter() - started
         print("\n✅ All data loaded successfully!")
-        logger.info(f"✓ {count} readmission records loaded")
         logger.info("\n✅ All data loaded successfully!")
+        _log(f"  {total} rows in {elapsed:.1f}s ({total / elapsed if elapsed else 0:,.0f} rows/s)")
 
     except mysql.connector.Error as e:
         print(f"❌ MySQL Error: {e}")
@@ -287,5 +676,20 @@ def main():
         cursor.close()
         conn.close()
 
+
+def truncate_staging():
+    """Empty every staging table and the source manifest (bulk mode expects empty tables)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SET SESSION foreign_key_checks = 0")
+        for _, key, _ in STEPS:
+            cursor.execute(f"TRUNCATE TABLE {SOURCES[key]['table']}")
+        cursor.execute(f"TRUNCATE TABLE {MANIFEST_TABLE}")
+        cursor.execute("SET SESSION foreign_key_checks = 1")
+    finally:
+        cursor.close()
+        conn.close()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(bulk="--bulk" in sys.argv, force="--force" in sys.argv)
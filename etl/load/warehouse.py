@@ -0,0 +1,506 @@
+"""
+Warehouse loaders with a shared job interface.
+
+Every table is serialized exactly once to Parquet staging files that
+already match the schema contract (etl/transform/schema.py). Partitioned
+tables are staged as one file per month partition; each staged partition
+carries a content fingerprint. A warehouse turns staged files into jobs:
+
+    job = warehouse.submit(table_name, staged, spec, mode, partitions, removed)
+    job.result()
+
+A batch is a table's full current content, so a staged partition is the
+whole of that month. load_tables() compares fingerprints with the
+warehouse's load state, submits jobs only for tables whose partitions
+changed or disappeared, and waits on all of them together. Write modes
+(per table, from the contract):
+
+    merge   → the touched partitions are synced to the batch by natural_key:
+              changed rows updated, new rows inserted, rows no longer in the
+              batch deleted
+    replace → the touched partitions (or the whole unpartitioned table) are
+              replaced by the batch
+    full    → --full-refresh: the table is rewritten from the batch
+In every mode, partitions that no longer have rows are dropped and
+untouched partitions are kept.
+
+    BigQueryWarehouse → load jobs with explicit schema, monthly time
+                        partitioning and clustering. Full refreshes and new
+                        tables are one WRITE_TRUNCATE job for the whole
+                        table; later runs swap in partitions with
+                        `table$YYYYMM` WRITE_TRUNCATE, or go through a
+                        staging table and a single MERGE
+    LocalWarehouse    → file-based stand-in under data/warehouse/, one
+                        Parquet file per partition, swapped in with an
+                        atomic rename
+
+Rows are assumed to stay in their partition across runs: a merge only
+looks at the partitions the batch touches.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from etl.instrumentation import span
+from etl.transform.schema import TABLE_SCHEMAS, conform
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+OUTPUT_DIR = BASE_DIR / "data" / "warehouse"
+
+MAX_WORKERS = int(os.getenv("ETL_LOAD_WORKERS", "8"))
+
+WHOLE_TABLE = "__TABLE__"     # pseudo-partition for unpartitioned tables
+NULL_PARTITION = "__NULL__"   # rows whose partition field is NULL (BigQuery naming)
+
+
+# ---- Staging ----
+
+def partition_codes(values: pd.Series) -> np.ndarray:
+    """YYYYMM month code per row; -1 where the timestamp is missing."""
+    ts = values if pd.api.types.is_datetime64_any_dtype(values) else pd.to_datetime(values, errors="coerce")
+    codes = (ts.dt.year * 100 + ts.dt.month).to_numpy(dtype="float64", na_value=np.nan)
+    return np.where(np.isnan(codes), -1, codes).astype("int64")
+
+
+def partition_id(code: int) -> str:
+    return NULL_PARTITION if code < 0 else str(int(code))
+
+
+def fingerprint(row_hashes: np.ndarray) -> str:
+    """Order-independent fingerprint of a set of rows (count + wrapped hash sum)."""
+    return f"{len(row_hashes)}:{int(row_hashes.sum(dtype=np.uint64))}"
+
+
+def combine_fingerprints(*fingerprints: str) -> str:
+    """Fingerprint of the union of disjoint row sets, from their fingerprints."""
+    rows = total = 0
+    for fp in fingerprints:
+        n, s = fp.split(":")
+        rows, total = rows + int(n), (total + int(s)) % 2**64
+    return f"{rows}:{total}"
+
+
+def partition_groups(codes: np.ndarray):
+    """(partition code, row positions) for every partition present, in code order."""
+    order = np.argsort(codes, kind="stable")
+    unique_codes, starts = np.unique(codes[order], return_index=True)
+    ends = np.append(starts[1:], len(order))
+    for code, start, end in zip(unique_codes, starts, ends):
+        yield code, order[start:end]
+
+
+def stage_table(df, table_name: str, staging_dir: Path) -> dict:
+    """
+    Conform one DataFrame to its contract and write it as Parquet.
+
+    Returns {"rows": n, "partitions": {partition_id: {"path", "rows", "fingerprint"}}};
+    unpartitioned tables have the single partition WHOLE_TABLE.
+    """
+    spec = TABLE_SCHEMAS[table_name]
+    table = conform(df, table_name)
+    row_hashes = pd.util.hash_pandas_object(df[table.schema.names], index=False).to_numpy()
+
+    field = spec.get("partition_field")
+    if not field:
+        path = Path(staging_dir) / f"{table_name}.parquet"
+        pq.write_table(table, path, compression="snappy")
+        partitions = {WHOLE_TABLE: {"path": path, "rows": table.num_rows,
+                                    "fingerprint": fingerprint(row_hashes)}}
+        return {"rows": table.num_rows, "partitions": partitions}
+
+    part_dir = Path(staging_dir) / table_name
+    part_dir.mkdir()
+    partitions = {}
+    for code, rows in partition_groups(partition_codes(df[field])):
+        pid = partition_id(code)
+        path = part_dir / f"{pid}.parquet"
+        pq.write_table(table.take(pa.array(rows)), path, compression="snappy")
+        partitions[pid] = {"path": path, "rows": len(rows), "fingerprint": fingerprint(row_hashes[rows])}
+    return {"rows": table.num_rows, "partitions": partitions}
+
+
+def stage_tables(data: dict, staging_dir: Path) -> dict:
+    """
+    Stage every table in parallel (Arrow releases the GIL while encoding).
+    Tables that are already on disk (out-of-core SpilledTable) stage themselves.
+    """
+    def _stage(name, df):
+        if hasattr(df, "stage"):
+            return df.stage(staging_dir)
+        return stage_table(df, name, staging_dir)
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(data) or 1)) as pool:
+        futures = {name: pool.submit(_stage, name, df) for name, df in data.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def load_tables(data: dict, warehouse, full_refresh: bool = False, feature_store=None) -> None:
+    """
+    Stage all tables once, submit a job for every table whose content changed
+    since the last load, then wait on the jobs together.
+    With a feature_store (etl/features.py), the staged fact partitions are
+    also folded into the patient features.
+    Raises RuntimeError naming the tables that failed.
+    """
+    staging_dir = Path(tempfile.mkdtemp(prefix="_staging_", dir=warehouse.staging_root()))
+    try:
+        with span("load.stage", tables=len(data)) as s:
+            staged = stage_tables(data, staging_dir)
+            s.set(rows_out=sum(t["rows"] for t in staged.values()),
+                  partitions=sum(len(t["partitions"]) for t in staged.values()))
+        # before any job: warehouses may move the staged files into place
+        if feature_store is not None:
+            _update_features(feature_store, staged, full_refresh)
+        state = {} if full_refresh else warehouse.load_state()
+
+        with span("load.write", warehouse=type(warehouse).__name__, full_refresh=full_refresh) as s:
+            jobs, new_state = {}, {}
+            for name, table in staged.items():
+                spec = TABLE_SCHEMAS[name]
+                previous = state.get(name, {})
+                mode = "full" if full_refresh else spec.get("write_mode", "replace")
+                changed = [pid for pid, part in table["partitions"].items()
+                           if previous.get(pid) != part["fingerprint"]]
+                # months that lost all their rows (an unpartitioned table is replaced whole)
+                removed = [] if WHOLE_TABLE in table["partitions"] else \
+                    sorted(pid for pid in previous if pid not in table["partitions"] and pid != WHOLE_TABLE)
+                if not changed and not removed:
+                    print(f"    = {name}: unchanged, skipped")
+                    continue
+
+                jobs[name] = (warehouse.submit(name, table, spec, mode, changed, removed), len(changed))
+                new_state[name] = {pid: part["fingerprint"] for pid, part in table["partitions"].items()}
+
+            failed = {}
+            for name, (job, n_changed) in jobs.items():
+                try:
+                    job.result()
+                    n_parts = len(staged[name]["partitions"])
+                    detail = f" ({n_changed}/{n_parts} partitions)" if WHOLE_TABLE not in staged[name]["partitions"] else ""
+                    print(f"    ✓ {name}: {staged[name]['rows']} rows → {warehouse.table_id(name)}{detail}")
+                except Exception as e:
+                    failed[name] = e
+                    new_state.pop(name)
+                    print(f"    ❌ {name}: {e}")
+            s.set(tables_written=len(jobs) - len(failed),
+                  partitions_written=sum(n for name, (_, n) in jobs.items() if name not in failed))
+
+        if new_state:
+            warehouse.save_state(new_state)
+        if failed:
+            raise RuntimeError(f"Load failed for {', '.join(failed)}")
+
+        warehouse.finalize()
+    finally:
+        warehouse.close()
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def _update_features(feature_store, staged: dict, rebuild: bool):
+    """A failed feature update is reported, never fails the load; the next run refolds what it missed."""
+    with span("load.features") as s:
+        try:
+            s.set(**feature_store.update(staged, rebuild=rebuild))
+        except Exception as e:
+            print(f"    ⚠ patient_features: update failed: {e}")
+
+
+# ---- BigQuery ----
+
+class BigQueryWarehouse:
+    """Submits Parquet load jobs to BigQuery; uploads run concurrently."""
+
+    STATE_TABLE = "_etl_load_state"
+
+    def __init__(self, project_id: str, dataset_id: str, location: str = "US"):
+        from google.cloud import bigquery
+
+        self.bigquery = bigquery
+        self.client = bigquery.Client(project=project_id)
+        self.dataset_ref = f"{project_id}.{dataset_id}"
+        self.location = location
+        self._uploads = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+        self._ensure_dataset()
+
+    def staging_root(self):
+        return None  # system temp dir
+
+    def table_id(self, table_name: str) -> str:
+        return f"{self.dataset_ref}.{table_name}"
+
+    def job_config(self, spec: dict, write_disposition=None):
+        bq = self.bigquery
+        config = bq.LoadJobConfig(
+            source_format=bq.SourceFormat.PARQUET,
+            write_disposition=write_disposition or bq.WriteDisposition.WRITE_TRUNCATE,
+            schema=[bq.SchemaField(name, type_) for name, type_ in spec["columns"]],
+        )
+        if spec.get("partition_field"):
+            config.time_partitioning = bq.TimePartitioning(
+                type_=bq.TimePartitioningType.MONTH, field=spec["partition_field"]
+            )
+        if spec.get("clustering"):
+            config.clustering_fields = spec["clustering"]
+        return config
+
+    # -- load state (per-partition fingerprints of the last successful load) --
+
+    def load_state(self) -> dict:
+        state_id = self.table_id(self.STATE_TABLE)
+        self.client.query(f"""
+            CREATE TABLE IF NOT EXISTS `{state_id}` (
+                table_name STRING, partition_id STRING, fingerprint STRING, loaded_at TIMESTAMP
+            )
+        """).result()
+        state = {}
+        for row in self.client.query(f"SELECT table_name, partition_id, fingerprint FROM `{state_id}`").result():
+            state.setdefault(row["table_name"], {})[row["partition_id"]] = row["fingerprint"]
+        return state
+
+    def save_state(self, state: dict):
+        """Replace the state rows of the given tables in one transaction."""
+        bq = self.bigquery
+        state_id = self.table_id(self.STATE_TABLE)
+        staging_id = f"{state_id}__staging"
+        rows = [{"table_name": table, "partition_id": pid, "fingerprint": fp}
+                for table, partitions in state.items() for pid, fp in partitions.items()]
+        config = bq.LoadJobConfig(
+            write_disposition=bq.WriteDisposition.WRITE_TRUNCATE,
+            schema=[bq.SchemaField("table_name", "STRING"), bq.SchemaField("partition_id", "STRING"),
+                    bq.SchemaField("fingerprint", "STRING")],
+        )
+        self.client.load_table_from_json(rows, staging_id, job_config=config).result()
+        self.client.query(f"""
+            BEGIN TRANSACTION;
+            DELETE FROM `{state_id}` WHERE table_name IN (SELECT DISTINCT table_name FROM `{staging_id}`);
+            INSERT INTO `{state_id}` (table_name, partition_id, fingerprint, loaded_at)
+                SELECT table_name, partition_id, fingerprint, CURRENT_TIMESTAMP() FROM `{staging_id}`;
+            COMMIT TRANSACTION;
+        """).result()
+        self.client.delete_table(staging_id, not_found_ok=True)
+
+    # -- jobs --
+
+    def submit(self, table_name: str, staged: dict, spec: dict, mode: str, partitions: list, removed: list = ()):
+        """Upload in the background; the returned future resolves once the table is written."""
+        return self._uploads.submit(self._load, table_name, staged, spec, mode, partitions, removed)
+
+    def _load(self, table_name, staged, spec, mode, partitions, removed):
+        table_id = self.table_id(table_name)
+        self._drop_if_layout_changed(table_id, spec)
+
+        if mode == "full" or not self._exists(table_id):
+            # one job for the whole table: per-month jobs would count against the daily load job quota
+            self._load_file(self._whole_table_file(staged), table_id, spec).result()
+            return
+        paths = [staged["partitions"][pid]["path"] for pid in partitions]
+        if paths and mode == "merge":
+            self._merge(table_id, paths, spec, partitions)
+        elif paths and spec.get("partition_field"):
+            self._replace_partitions(table_id, staged, spec, partitions)
+        elif paths:
+            self._load_file(paths[0], table_id, spec).result()
+        for pid in removed:
+            self.client.delete_table(f"{table_id}${pid}", not_found_ok=True)
+
+    @staticmethod
+    def _whole_table_file(staged):
+        """All staged partitions as one Parquet file, copied a row group at a time."""
+        paths = [part["path"] for part in staged["partitions"].values()]
+        if len(paths) == 1:
+            return paths[0]
+        combined = Path(paths[0]).parent / "_table.parquet"
+        with pq.ParquetWriter(combined, pq.read_schema(paths[0]), compression="snappy") as writer:
+            for path in paths:
+                parquet = pq.ParquetFile(path)
+                for i in range(parquet.num_row_groups):
+                    writer.write_table(parquet.read_row_group(i))
+        return combined
+
+    def _load_file(self, path, destination, spec, write_disposition=None):
+        with open(path, "rb") as f:
+            job = self.client.load_table_from_file(
+                f, destination, job_config=self.job_config(spec, write_disposition)
+            )
+        return job
+
+    def _replace_partitions(self, table_id, staged, spec, partitions):
+        """Swap in each touched partition atomically via the `table$YYYYMM` decorator."""
+        jobs = [self._load_file(staged["partitions"][pid]["path"], f"{table_id}${pid}", spec)
+                for pid in partitions]
+        for job in jobs:
+            job.result()
+
+    def _merge(self, table_id, paths, spec, partitions):
+        """
+        Load the touched partitions into a staging table and sync them with one
+        MERGE: upsert the batch, delete rows of those partitions it no longer has.
+        """
+        staging_id = f"{table_id}__staging"
+        staging_file = Path(paths[0]).with_name(f"_merge_{Path(paths[0]).name}")
+        pq.write_table(pa.concat_tables([pq.read_table(p) for p in paths]), staging_file)
+
+        staging_spec = {"columns": spec["columns"]}
+        self._load_file(staging_file, staging_id, staging_spec).result()
+
+        key = spec["natural_key"]
+        on = " AND ".join(f"T.{k} = S.{k}" for k in key)
+        field = spec.get("partition_field")
+        stale = ""   # deletes are bounded to the touched partitions
+        if field:
+            months = [f"'{pid}'" for pid in partitions if pid != NULL_PARTITION]
+            bounds = [f"FORMAT_TIMESTAMP('%Y%m', T.{field}) IN ({', '.join(months)})"] if months else []
+            if NULL_PARTITION in partitions:
+                bounds.append(f"T.{field} IS NULL")
+            stale = f" AND ({' OR '.join(bounds)})"
+        if field and NULL_PARTITION not in partitions:
+            # Prune the target scan to the month range the batch touches
+            lo, hi = min(partitions), max(partitions)
+            hi_year, hi_month = divmod(int(hi), 100)
+            hi_next = f"{hi_year + (hi_month == 12)}-{hi_month % 12 + 1:02d}-01"
+            on += (f" AND T.{field} >= TIMESTAMP('{lo[:4]}-{lo[4:]}-01')"
+                   f" AND T.{field} < TIMESTAMP('{hi_next}')")
+        updates = ", ".join(f"{name} = S.{name}" for name, _ in spec["columns"] if name not in key)
+
+        self.client.query(f"""
+            MERGE `{table_id}` T
+            USING `{staging_id}` S
+            ON {on}
+            WHEN MATCHED THEN UPDATE SET {updates}
+            WHEN NOT MATCHED THEN INSERT ROW
+            WHEN NOT MATCHED BY SOURCE{stale} THEN DELETE
+        """).result()
+        self.client.delete_table(staging_id, not_found_ok=True)
+
+    def _exists(self, table_id: str) -> bool:
+        from google.api_core.exceptions import NotFound
+
+        try:
+            self.client.get_table(table_id)
+            return True
+        except NotFound:
+            return False
+
+    def _drop_if_layout_changed(self, table_id: str, spec: dict):
+        """WRITE_TRUNCATE cannot change partitioning/clustering of an existing table."""
+        from google.api_core.exceptions import NotFound
+
+        try:
+            table = self.client.get_table(table_id)
+        except NotFound:
+            return
+        current_partition = table.time_partitioning.field if table.time_partitioning else None
+        if current_partition != spec.get("partition_field") or \
+                (table.clustering_fields or []) != (spec.get("clustering") or []):
+            self.client.delete_table(table_id)
+            print(f"    ↻ {table_id}: layout changed, table recreated")
+
+    def _ensure_dataset(self):
+        try:
+            self.client.get_dataset(self.dataset_ref)
+        except Exception:
+            dataset = self.bigquery.Dataset(self.dataset_ref)
+            dataset.location = self.location
+            self.client.create_dataset(dataset, exists_ok=True)
+            print(f"  ✓ Created BigQuery dataset: {self.dataset_ref}")
+
+    def finalize(self):
+        """Create the search index backing the API's provider name search (idempotent)."""
+        self.client.query(f"""
+            CREATE SEARCH INDEX IF NOT EXISTS provider_search_idx
+            ON `{self.dataset_ref}.mart_provider_productivity`(provider_search_name)
+        """).result()
+        print("    ✓ search index: mart_provider_productivity(provider_search_name)")
+
+    def close(self):
+        self._uploads.shutdown(wait=True)
+
+
+# ---- Local (file-based) ----
+
+class LocalWarehouse:
+    """
+    File-based stand-in with the same job interface.
+
+    Layout under root/:
+        dim_providers.parquet                 unpartitioned table
+        fact_encounters/201902.parquet        one file per month partition
+        fact_encounters/null.parquet          rows without a partition timestamp
+        _load_state.json                      partition fingerprints of the last load
+
+    Staged files live inside root/, so swapping in a table or partition is
+    an atomic rename; readers never see a partially written file.
+    """
+
+    STATE_FILE = "_load_state.json"
+
+    def __init__(self, root: Path = OUTPUT_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+
+    def staging_root(self):
+        return self.root
+
+    def table_id(self, table_name: str) -> str:
+        if TABLE_SCHEMAS[table_name].get("partition_field"):
+            return f"{table_name}/"
+        return f"{table_name}.parquet"
+
+    def partition_path(self, table_name: str, pid: str) -> Path:
+        name = "null" if pid == NULL_PARTITION else pid
+        return self.root / table_name / f"{name}.parquet"
+
+    def load_state(self) -> dict:
+        path = self.root / self.STATE_FILE
+        return json.loads(path.read_text()) if path.exists() else {}
+
+    def save_state(self, state: dict):
+        merged = {**self.load_state(), **state}
+        tmp = self.root / f".{self.STATE_FILE}.tmp"
+        tmp.write_text(json.dumps(merged, indent=1, sort_keys=True))
+        os.replace(tmp, self.root / self.STATE_FILE)
+
+    def submit(self, table_name: str, staged: dict, spec: dict, mode: str, partitions: list, removed: list = ()):
+        return self._pool.submit(self._write, table_name, staged, spec, mode, partitions, removed)
+
+    def _write(self, table_name, staged, spec, mode, partitions, removed):
+        """
+        Every mode swaps in the staged files: a staged partition is the whole
+        of its month, so replacing it is the merge.
+        """
+        if not spec.get("partition_field"):
+            os.replace(staged["partitions"][WHOLE_TABLE]["path"], self.root / f"{table_name}.parquet")
+            return
+
+        table_dir = self.root / table_name
+        table_dir.mkdir(exist_ok=True)
+        legacy = self.root / f"{table_name}.parquet"   # single-file layout from older loads
+        if legacy.exists():
+            legacy.unlink()
+
+        for pid in partitions:
+            os.replace(staged["partitions"][pid]["path"], self.partition_path(table_name, pid))
+        for pid in removed:
+            self.partition_path(table_name, pid).unlink(missing_ok=True)
+
+        if mode == "full":
+            keep = {self.partition_path(table_name, pid).name for pid in staged["partitions"]}
+            for path in table_dir.glob("*.parquet"):
+                if path.name not in keep:
+                    path.unlink()
+
+    def finalize(self):
+        pass
+
+    def close(self):
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,77 @@
+"""
+Provider name search index, published with the API snapshot.
+
+Built once per ETL run from dim_providers / mart_provider_productivity
+and written next to the snapshot tables (etl/snapshot.py) as three Arrow
+tables the API searches in process (api/core/search.py):
+
+    search_providers         one row per provider (doc_id = row number), most
+                             encounters first, with its normalized name
+    search_provider_tokens   (token, doc_id) for every word of every name, sorted
+                             by token: a word prefix is one binary-searched range
+    search_provider_grams    (gram, doc_ids) posting lists of the 3-grams of every
+                             word and of a word-start gram (" " + word), sorted by
+                             gram: substring and typo-tolerant matches
+
+Names are normalized for matching by normalize_names(): accents folded,
+lower-cased, anything but letters and digits turned into word breaks. The
+API applies the same normalization to queries.
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+GRAM = 3
+SEARCH_TABLES = ["search_providers", "search_provider_tokens", "search_provider_grams"]
+
+DOC_COLUMNS = ["provider_key", "provider_name", "speciality", "organization_name", "total_encounters"]
+
+
+def normalize_names(names: pd.Series) -> pd.Series:
+    """Match form of names (api/core/search.py normalize() does the same to one query)."""
+    return (
+        names.fillna("").astype(str)
+        .str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+        .str.lower()
+        .str.replace(r"[^a-z0-9]+", " ", regex=True)
+        .str.strip()
+    )
+
+
+def build_provider_search_index(dim_providers: pd.DataFrame, mart_provider_productivity: pd.DataFrame = None) -> dict:
+    """The SEARCH_TABLES as Arrow tables, ranked by the providers' encounter counts."""
+    docs = dim_providers[["provider_key", "provider_name", "speciality", "organization_key"]]
+    if mart_provider_productivity is not None:
+        docs = docs.merge(mart_provider_productivity[["provider_key", "organization_name", "total_encounters"]],
+                          on="provider_key", how="left")
+    else:
+        docs = docs.assign(organization_name=None, total_encounters=0)
+    docs = docs.assign(total_encounters=docs["total_encounters"].fillna(0).astype("int64"))
+    # popularity order: a lower doc_id wins a tie in the ranking
+    docs = docs.sort_values(["total_encounters", "provider_key"], ascending=[False, True], kind="stable")
+    docs = docs[DOC_COLUMNS].reset_index(drop=True)
+    docs["search_name"] = normalize_names(docs["provider_name"])
+
+    words = docs["search_name"].str.split().explode().dropna()
+    words = words[words != ""]
+    tokens = pd.DataFrame({"token": words.to_numpy(), "doc_id": words.index.to_numpy(dtype="int32")})
+    tokens = tokens.drop_duplicates().sort_values(["token", "doc_id"], kind="stable")
+
+    padded = " " + tokens["token"]
+    grams = tokens.assign(gram=[[t[i:i + GRAM] for i in range(len(t) - GRAM + 1)] for t in padded])
+    grams = grams.explode("gram").dropna(subset=["gram"])[["gram", "doc_id"]].drop_duplicates()
+    grams = grams.sort_values(["gram", "doc_id"], kind="stable")
+    starts = np.flatnonzero(np.r_[True, grams["gram"].to_numpy()[1:] != grams["gram"].to_numpy()[:-1]]) \
+        if len(grams) else np.array([], dtype=np.int64)
+    offsets = np.r_[starts, len(grams)].astype("int32")
+    postings = pa.ListArray.from_arrays(pa.array(offsets), pa.array(grams["doc_id"].to_numpy(dtype="int32")))
+
+    return {
+        "search_providers": pa.Table.from_pandas(docs, preserve_index=False),
+        "search_provider_tokens": pa.Table.from_pandas(tokens, preserve_index=False),
+        "search_provider_grams": pa.table({
+            "gram": pa.array(grams["gram"].to_numpy()[starts], type=pa.string()),
+            "doc_ids": postings,
+        }),
+    }
@@ -0,0 +1,124 @@
+"""
+Analytics snapshots for the API.
+
+After a successful load, the marts and small dimensions the API serves are
+published as a versioned snapshot: one uncompressed Arrow IPC file per
+table (the API memory-maps them), typed by the schema contract.
+
+    data/snapshots/<version>/<table>.arrow
+    data/snapshots/<version>/_manifest.json
+    data/snapshots/_current.json            pointer to the live version; replaced atomically
+
+The provider search index (etl/search_index.py) and the patient cohort
+index (etl/cohort_index.py) are built here and published with the tables.
+The cohort index is derived from the fact tables, which are not in the
+snapshot, so its content is part of the version digest.
+
+A version directory is complete before the pointer names it, so the API
+(api/core/snapshot.py) never sees a half-written snapshot. Publishing the
+same content again keeps the current version, so API ETags stay valid.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+
+from etl.cohort_index import build_cohort_index
+from etl.search_index import build_provider_search_index
+from etl.transform.schema import conform
+
+BASE_DIR = Path(__file__).resolve().parent
+SNAPSHOT_DIR = Path(os.getenv("SNAPSHOT_DIR", BASE_DIR / "data" / "snapshots"))
+KEEP_VERSIONS = 2
+
+CURRENT = "_current.json"
+MANIFEST = "_manifest.json"
+
+# Tables small enough to hold in the API process
+SNAPSHOT_TABLES = [
+    "dim_providers",
+    "dim_organizations",
+    "fact_readmissions",
+    "mart_provider_productivity",
+    "mart_appointment_analytics",
+    "mart_provider_readmissions",
+    "mart_provider_network",
+    "mart_provider_centrality",
+]
+
+
+def current_version(root: Path = None):
+    path = Path(root or SNAPSHOT_DIR) / CURRENT
+    return json.loads(path.read_text())["version"] if path.exists() else None
+
+
+def publish_snapshot(transformed: dict, root: Path = None) -> str:
+    """Publish the snapshot tables of a transform result; returns the live version."""
+    root = Path(root or SNAPSHOT_DIR)
+    names = [name for name in SNAPSHOT_TABLES if name in transformed]
+    cohorts = build_cohort_index(transformed)
+    digest = _content_digest({name: transformed[name] for name in names}, cohorts)
+
+    current = current_version(root)
+    if current and current.endswith(digest):
+        print(f"    = snapshot: unchanged, keeping {current}")
+        return current
+
+    version = f"{datetime.now():%Y%m%dT%H%M%S}-{digest}"
+    root.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix=f".{version}-", dir=root))
+    try:
+        arrow_tables = {name: conform(transformed[name], name) for name in names}
+        if "dim_providers" in transformed:
+            arrow_tables.update(build_provider_search_index(transformed["dim_providers"],
+                                                            transformed.get("mart_provider_productivity")))
+        arrow_tables.update(cohorts)
+        tables = {}
+        for name, table in arrow_tables.items():
+            with pa.OSFile(str(tmp / f"{name}.arrow"), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            tables[name] = table.num_rows
+        manifest = {"version": version, "created_at": datetime.now().isoformat(timespec="seconds"),
+                    "tables": tables}
+        (tmp / MANIFEST).write_text(json.dumps(manifest, indent=1))
+        os.replace(tmp, root / version)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    pointer = root / f".{CURRENT}.tmp"
+    pointer.write_text(json.dumps({"version": version}))
+    os.replace(pointer, root / CURRENT)
+    _prune(root, version)
+    print(f"    ✓ snapshot {version}: {len(tables)} tables → {root}")
+    return version
+
+
+def _content_digest(tables: dict, derived: dict = None) -> str:
+    """Digest of the snapshot DataFrames plus Arrow tables derived from elsewhere."""
+    digest = hashlib.sha256()
+    for name, df in tables.items():
+        digest.update(name.encode())
+        digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    for name, table in (derived or {}).items():
+        digest.update(name.encode())
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        digest.update(sink.getvalue())
+    return digest.hexdigest()[:12]
+
+
+def _prune(root: Path, live: str):
+    """Keep the newest KEEP_VERSIONS versions; the API may still be serving the previous one."""
+    versions = sorted((p for p in root.iterdir() if p.is_dir() and (p / MANIFEST).exists()),
+                      key=lambda p: p.name, reverse=True)
+    for old in versions[KEEP_VERSIONS:]:
+        if old.name != live:
+            shutil.rmtree(old, ignore_errors=True)
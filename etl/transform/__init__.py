@@ -4,7 +4,9 @@ Applies cleaning, normalization, and business logic.
 """
 
 from .transform import transform_all
+from .schema import TABLE_SCHEMAS
 
 __all__ = [
     "transform_all",
+    "TABLE_SCHEMAS",
 ]
\ No newline at end of file
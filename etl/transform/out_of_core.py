@@ -0,0 +1,629 @@
+"""
+Out-of-core transform for fact tables larger than memory.
+
+transform_out_of_core() produces the same tables as transform_all(), but
+the encounter, procedure and condition facts never exist in memory as a whole:
+
+    dims   providers, patients, organizations and readmissions are small and
+           built in memory as usual; dim_conditions and dim_date are built
+           from the distinct values collected while streaming
+    facts  the source is streamed in batches (CSV blocks or a server-side
+           MySQL cursor); each batch goes through the regular build_fact_*
+           builder, is conformed to the schema contract and spilled to one
+           Parquet file per batch, with one row group per month partition
+    marts  every fact batch is reduced to mergeable partials (count, sum,
+           min, max, quantile sketches, distinct key pairs) hash-partitioned by group key into
+           buckets; buffered buckets are spilled to disk when the memory
+           budget is exceeded, and each bucket is reduced on its own at the end;
+           the provider network is built from the distinct patient/provider
+           pairs of every batch, far fewer than the encounters
+
+Facts are returned as SpilledTable objects, which the load layer stages
+one partition at a time (etl/load/warehouse.py). Peak memory is bounded by
+the batch size, the largest month partition and the largest aggregation
+bucket instead of the table size.
+
+Configuration (environment, or transform_out_of_core() arguments):
+    ETL_MEMORY_BUDGET_MB  soft limit on the process's resident memory (default 2048);
+                          sizes the batches and triggers spills when exceeded
+    ETL_SPILL_DIR         spill files (default data/spill; keep it on the same
+                          filesystem as the local warehouse)
+"""
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from etl.extract import extract_table, iter_csv_batches, iter_mysql_batches, key_hashes
+from etl.instrumentation import current_rss, span
+from etl.load.warehouse import (
+    WHOLE_TABLE,
+    combine_fingerprints,
+    fingerprint,
+    partition_codes,
+    partition_groups,
+    partition_id,
+)
+from etl.transform.schema import TABLE_SCHEMAS, conform
+from etl.transform.sketches import merge_sketch_columns, sketch_columns
+from etl.transform.transform import (
+    MART_SKETCHES,
+    build_dim_conditions,
+    build_dim_date,
+    build_dim_organizations,
+    build_dim_patients,
+    build_dim_providers,
+    build_fact_conditions,
+    build_fact_encounters,
+    build_fact_patient_readmissions,
+    build_fact_procedures,
+    build_fact_readmissions,
+    build_mart_appointment_analytics,
+    build_mart_provider_centrality,
+    build_mart_provider_network,
+    build_mart_provider_productivity,
+    build_mart_provider_readmissions,
+    finish_mart_appointment_analytics,
+    finish_mart_provider_productivity,
+    inpatient_stays,
+    patient_provider_pairs,
+)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+SPILL_DIR = Path(os.getenv("ETL_SPILL_DIR", BASE_DIR / "data" / "spill"))
+MEMORY_BUDGET_MB = int(os.getenv("ETL_MEMORY_BUDGET_MB", "2048"))
+
+# A CSV block grows ~5-6x on its way to a builder's output frame (Arrow
+# buffers, pandas object strings, the builder's copy), so a batch reads
+# 1/BATCH_FRACTION of the budget; aggregation buffers may hold another 1/4.
+BATCH_FRACTION = 16
+MIN_BATCH_BYTES = 1 << 20
+MIN_SPILL_BYTES = 8 << 20
+MYSQL_ROW_BYTES = 256
+AGGREGATE_BUCKETS = 16
+OBJECT_BYTES = 80   # a short Python str, for buffer size estimates
+# Spill files are read back once and rewritten (stage()) or merged, so they
+# skip compression, dictionaries and statistics: a batch writes one small row
+# group per month, and each of those costs more to encode than to store
+SPILL_WRITE_OPTIONS = {"compression": "none", "use_dictionary": False, "write_statistics": False}
+
+
+def transform_out_of_core(source: str = "csv", memory_budget_mb: int = None, spill_dir=None,
+                          synthea_dir=None, cms_dir=None) -> dict:
+    """
+    Stream extract → transform under a memory budget.
+    Returns the transform_all() table dict; fact tables are SpilledTable
+    objects (call release() once they are loaded).
+    """
+    budget = (memory_budget_mb or MEMORY_BUDGET_MB) << 20
+    batch_bytes = max(MIN_BATCH_BYTES, budget // BATCH_FRACTION)
+    spill_root = Path(spill_dir or SPILL_DIR)
+    spill_root.mkdir(parents=True, exist_ok=True)
+
+    def batches(name, parent_keys=None):
+        if source == "mysql":
+            return iter_mysql_batches(name, max(1, batch_bytes // MYSQL_ROW_BYTES))
+        return iter_csv_batches(name, batch_bytes, parent_keys=parent_keys,
+                                synthea_dir=synthea_dir, cms_dir=cms_dir)
+
+    print(f"  Running out-of-core transformations (memory budget {budget >> 20} MB, "
+          f"batches of ~{batch_bytes >> 20} MB)...")
+
+    def small(name):
+        return extract_table(source, name, synthea_dir=synthea_dir, cms_dir=cms_dir)
+
+    dim_providers = build_dim_providers(small("providers"))
+    dim_patients = build_dim_patients(small("patients"))
+    dim_organizations = build_dim_organizations(small("organizations"))
+    fact_readmissions = build_fact_readmissions(small("readmissions"))
+
+    agg_dir = Path(tempfile.mkdtemp(prefix="aggregate-", dir=spill_root))
+    fact_encounters = SpilledTable("fact_encounters", spill_root)
+    fact_procedures = SpilledTable("fact_procedures", spill_root)
+    fact_conditions = SpilledTable("fact_conditions", spill_root)
+    try:
+        marts = mart_aggregates(agg_dir, budget // 8)
+        # ── encounters: fact batches, mart partials, dim_date dates, parent keys ──
+        dates, parent_keys, stays, pairs = [], [], [], []
+        with span("transform.out_of_core.encounters") as s:
+            for batch in batches("encounters"):
+                if source == "csv":
+                    parent_keys.append(key_hashes(batch["encounter_id"]))
+                # dim_date is only complete after this pass; the builder does not read it
+                fact = build_fact_encounters(batch, dim_providers, dim_patients, None)
+                del batch
+                fact_encounters.append(fact)
+                dates.append(fact["start_datetime"].dropna().dt.normalize().unique())
+                stays.append(inpatient_stays(fact))
+                pairs.append(patient_provider_pairs(fact))
+
+                update_mart_aggregates(marts, fact)
+                del fact
+                if current_rss() > budget:   # over budget: move what can move to disk
+                    for aggregate in marts.values():
+                        if aggregate.buffered_bytes > MIN_SPILL_BYTES:
+                            aggregate.spill()
+            s.set(rows_out=len(fact_encounters), batches=fact_encounters.batches,
+                  spills=sum(a.spills for a in marts.values()))
+
+        if source == "csv":
+            parent_keys = np.sort(np.concatenate(parent_keys)) if parent_keys else np.array([], dtype=np.uint64)
+        else:
+            parent_keys = None   # staging tables already enforce the foreign key
+        dim_date = build_dim_date(pd.DataFrame(
+            {"start_datetime": np.unique(np.concatenate(dates)) if dates else pd.Series([], dtype="datetime64[ns]")}))
+        # inpatient stays are a small slice of the encounters: linked in memory, in one sorted pass
+        fact_patient_readmissions = build_fact_patient_readmissions(concat_stays(stays))
+        del stays
+
+        # ── procedures / conditions ──
+        with span("transform.out_of_core.procedures") as s:
+            for batch in batches("procedures", parent_keys):
+                fact_procedures.append(build_fact_procedures(batch, dim_patients, dim_date))
+            s.set(rows_out=len(fact_procedures), batches=fact_procedures.batches)
+
+        with span("transform.out_of_core.conditions") as s:
+            codes = []
+            for batch in batches("conditions", parent_keys):
+                codes.append(batch[["code", "description"]].drop_duplicates())
+                fact_conditions.append(build_fact_conditions(batch))
+            s.set(rows_out=len(fact_conditions), batches=fact_conditions.batches)
+            conditions = (pd.concat(codes, ignore_index=True) if codes
+                          else pd.DataFrame(columns=["code", "description"]))
+            dim_conditions = build_dim_conditions(conditions)
+        del parent_keys
+
+        # ── marts: reduce the partials bucket by bucket ──
+        with span("transform.out_of_core.marts") as s:
+            results = {name: aggregate.result() for name, aggregate in marts.items()}
+            mart_provider_productivity, mart_appointment_analytics = finish_marts(
+                results, dim_providers, dim_organizations)
+            mart_provider_readmissions = build_mart_provider_readmissions(
+                fact_patient_readmissions, dim_providers, dim_organizations)
+            mart_provider_network, mart_provider_centrality = provider_network(
+                pairs, dim_providers, dim_organizations)
+            s.set(spills=sum(a.spills for a in marts.values()))
+    except BaseException:
+        fact_encounters.release()
+        fact_procedures.release()
+        fact_conditions.release()
+        raise
+    finally:
+        shutil.rmtree(agg_dir, ignore_errors=True)
+
+    transformed = {
+        "dim_providers": dim_providers,
+        "dim_patients": dim_patients,
+        "dim_conditions": dim_conditions,
+        "dim_date": dim_date,
+        "dim_organizations": dim_organizations,
+        "fact_encounters": fact_encounters,
+        "fact_procedures": fact_procedures,
+        "fact_conditions": fact_conditions,
+        "fact_readmissions": fact_readmissions,
+        "fact_patient_readmissions": fact_patient_readmissions,
+        "mart_provider_productivity": mart_provider_productivity,
+        "mart_appointment_analytics": mart_appointment_analytics,
+        "mart_provider_readmissions": mart_provider_readmissions,
+        "mart_provider_network": mart_provider_network,
+        "mart_provider_centrality": mart_provider_centrality,
+    }
+
+    for name, df in transformed.items():
+        spilled = f" (spilled, {df.batches} batches)" if isinstance(df, SpilledTable) else ""
+        print(f"✓ {name}: {len(df)} rows, {len(df.columns)} cols{spilled}")
+
+    return transformed
+
+
+def release(transformed: dict):
+    """Delete the spill files behind any SpilledTable in a transform result."""
+    for table in transformed.values():
+        if isinstance(table, SpilledTable):
+            table.release()
+
+
+# Tables built from the dims and facts rather than from the source
+DERIVED_TABLES = ("fact_patient_readmissions", "mart_provider_productivity", "mart_appointment_analytics",
+                  "mart_provider_readmissions", "mart_provider_network", "mart_provider_centrality")
+
+
+def derive_tables(tables: dict, memory_budget_mb: int = None, spill_dir=None) -> dict:
+    """
+    DERIVED_TABLES rebuilt from the dims and facts of a transform result, e.g.
+    once validation has taken rows out of them. Spilled fact_encounters are
+    streamed a batch file at a time through the partials of
+    transform_out_of_core(); in-memory ones go through the regular builders.
+    """
+    encounters = tables["fact_encounters"]
+    dim_providers, dim_organizations = tables["dim_providers"], tables["dim_organizations"]
+    if not isinstance(encounters, SpilledTable):
+        readmissions = build_fact_patient_readmissions(encounters)
+        pairs = patient_provider_pairs(encounters)
+        network = build_mart_provider_network(pairs)
+        return {
+            "fact_patient_readmissions": readmissions,
+            "mart_provider_productivity": build_mart_provider_productivity(encounters, dim_providers,
+                                                                           dim_organizations),
+            "mart_appointment_analytics": build_mart_appointment_analytics(encounters, tables["dim_date"]),
+            "mart_provider_readmissions": build_mart_provider_readmissions(readmissions, dim_providers,
+                                                                           dim_organizations),
+            "mart_provider_network": network,
+            "mart_provider_centrality": build_mart_provider_centrality(network, pairs, dim_providers,
+                                                                       dim_organizations),
+        }
+
+    budget = (memory_budget_mb or MEMORY_BUDGET_MB) << 20
+    spill_root = Path(spill_dir or SPILL_DIR)
+    spill_root.mkdir(parents=True, exist_ok=True)
+    agg_dir = Path(tempfile.mkdtemp(prefix="aggregate-", dir=spill_root))
+    try:
+        marts = mart_aggregates(agg_dir, budget // 8)
+        stays, pairs = [], []
+        for path in encounters.files():
+            fact = pq.read_table(path).to_pandas()
+            stays.append(inpatient_stays(fact))
+            pairs.append(patient_provider_pairs(fact))
+            update_mart_aggregates(marts, fact)
+            del fact
+            if current_rss() > budget:
+                for aggregate in marts.values():
+                    if aggregate.buffered_bytes > MIN_SPILL_BYTES:
+                        aggregate.spill()
+        productivity, appointments = finish_marts({name: aggregate.result() for name, aggregate in marts.items()},
+                                                  dim_providers, dim_organizations)
+    finally:
+        shutil.rmtree(agg_dir, ignore_errors=True)
+    readmissions = build_fact_patient_readmissions(concat_stays(stays))
+    network, centrality = provider_network(pairs, dim_providers, dim_organizations)
+    return {
+        "fact_patient_readmissions": readmissions,
+        "mart_provider_productivity": productivity,
+        "mart_appointment_analytics": appointments,
+        "mart_provider_readmissions": build_mart_provider_readmissions(readmissions, dim_providers, dim_organizations),
+        "mart_provider_network": network,
+        "mart_provider_centrality": centrality,
+    }
+
+
+# ---- mart partials shared with the partition-parallel transform ----
+
+def concat_stays(stays: list) -> pd.DataFrame:
+    """Concatenate per-batch inpatient_stays() frames (an empty frame when there are none)."""
+    stays = [frame for frame in stays if len(frame)]
+    return pd.concat(stays, ignore_index=True) if stays else pd.DataFrame(
+        {"encounter_id": [], "patient_key": [], "provider_key": [], "encounter_class": [],
+         "start_datetime": pd.Series([], dtype="datetime64[ns]"),
+         "end_datetime": pd.Series([], dtype="datetime64[ns]")})
+
+
+def provider_network(pairs: list, dim_providers, dim_organizations) -> tuple:
+    """The network marts from per-batch patient_provider_pairs() frames."""
+    pairs = [frame for frame in pairs if len(frame)]
+    pairs = (pd.concat(pairs, ignore_index=True).drop_duplicates(ignore_index=True) if pairs
+             else pd.DataFrame({"patient_key": pd.Series([], dtype=object), "provider_key": pd.Series([], dtype=object)}))
+    network = build_mart_provider_network(pairs)
+    return network, build_mart_provider_centrality(network, pairs, dim_providers, dim_organizations)
+
+
+PROVIDER_KEYS = ["provider_key"]
+APPOINTMENT_KEYS = ["year", "quarter", "month", "month_name", "encounter_type", "encounter_class"]
+
+
+def mart_aggregates(spill_dir: Path, budget_bytes: int) -> dict:
+    """Empty PartialAggregates for both marts, keyed by mart name."""
+    partials = {"n": ("encounter_id", "count"), "duration_sum": ("duration_hours", "sum"),
+                "duration_n": ("duration_hours", "count"), "cost_sum": ("total_cost", "sum"),
+                "cost_n": ("total_cost", "count"),
+                **{name: (column, "sketch") for name, column in MART_SKETCHES.items()}}
+    return {
+        "mart_provider_productivity": PartialAggregate(
+            PROVIDER_KEYS,
+            partials={**partials, "first_encounter": ("start_datetime", "min"),
+                      "last_encounter": ("start_datetime", "max")},
+            distinct={"unique_patients": "patient_key"},
+            spill_dir=Path(spill_dir) / "provider_productivity", budget_bytes=budget_bytes,
+        ),
+        "mart_appointment_analytics": PartialAggregate(
+            APPOINTMENT_KEYS,
+            partials=partials,
+            distinct={"unique_patients": "patient_key", "unique_providers": "provider_key"},
+            spill_dir=Path(spill_dir) / "appointment_analytics", budget_bytes=budget_bytes,
+        ),
+    }
+
+
+def update_mart_aggregates(aggregates: dict, fact: pd.DataFrame):
+    """Fold a batch of fact_encounters into the mart aggregates."""
+    aggregates["mart_provider_productivity"].update(fact)
+    dated = fact[fact["start_datetime"].notna()]   # no dim_date row, as in the in-memory merge
+    aggregates["mart_appointment_analytics"].update(pd.concat([_calendar(dated["start_datetime"]), dated], axis=1))
+
+
+def finish_marts(results: dict, dim_providers, dim_organizations):
+    """Both marts from their merged aggregates (PartialAggregate.result() per mart name)."""
+    agg = results["mart_provider_productivity"]
+    agg = pd.DataFrame({
+        "provider_key": agg["provider_key"],
+        "total_encounters": agg["n"],
+        "unique_patients": agg["unique_patients"],
+        "avg_encounter_duration_hrs": agg["duration_sum"] / agg["duration_n"],
+        "total_revenue": agg["cost_sum"],
+        "avg_cost_per_encounter": agg["cost_sum"] / agg["cost_n"],
+        "first_encounter": agg["first_encounter"],
+        "last_encounter": agg["last_encounter"],
+        **{name: agg[name] for name in MART_SKETCHES},
+    })
+    mart_provider_productivity = finish_mart_provider_productivity(agg, dim_providers, dim_organizations)
+
+    agg = results["mart_appointment_analytics"]
+    agg = pd.concat([agg[APPOINTMENT_KEYS], pd.DataFrame({
+        "encounter_count": agg["n"],
+        "unique_patients": agg["unique_patients"],
+        "unique_providers": agg["unique_providers"],
+        "avg_duration_hrs": agg["duration_sum"] / agg["duration_n"],
+        "total_cost": agg["cost_sum"],
+        "avg_cost": agg["cost_sum"] / agg["cost_n"],
+        **{name: agg[name] for name in MART_SKETCHES},
+    })], axis=1)
+    return mart_provider_productivity, finish_mart_appointment_analytics(agg)
+
+
+def _calendar(start: pd.Series) -> pd.DataFrame:
+    """The dim_date attributes the appointment mart groups by, computed per row."""
+    return pd.DataFrame({
+        "year": start.dt.year.astype("int64"),
+        "quarter": start.dt.quarter.astype("int64"),
+        "month": start.dt.month.astype("int64"),
+        "month_name": start.dt.month_name(),
+    }, index=start.index)
+
+
+def _estimated_bytes(df: pd.DataFrame) -> int:
+    """Frame size without scanning string payloads (memory_usage(deep=True) is slow on objects)."""
+    strings = sum(df[c].dtype == object for c in df.columns)
+    return int(df.memory_usage(index=False).sum()) + strings * len(df) * OBJECT_BYTES
+
+
+def _open(files: dict, path: Path) -> pq.ParquetFile:
+    """Open a spill file once per pass (reading the footer again for every row group is slow)."""
+    if path not in files:
+        files[path] = pq.ParquetFile(path)
+    return files[path]
+
+
+class SpilledTable:
+    """
+    A contract-typed fact table on disk: one Parquet file per appended batch,
+    one row group per partition, plus the partition fingerprints load_tables()
+    compares against the warehouse state.
+    """
+
+    def __init__(self, name: str, spill_root: Path = None, directory: Path = None, prefix: str = "batch"):
+        self.name = name
+        self.columns = [column for column, _ in TABLE_SCHEMAS[name]["columns"]]
+        self.directory = Path(directory) if directory else Path(tempfile.mkdtemp(prefix=f"{name}-", dir=spill_root))
+        self.prefix = prefix
+        self.rows = 0
+        self.batches = 0
+        self._pieces = {}        # partition id → [(file, row group)]
+        self._fingerprints = {}  # partition id → fingerprint
+
+    def __len__(self):
+        return self.rows
+
+    def append(self, df: pd.DataFrame):
+        """Conform one batch of builder output and spill it, one row group per partition."""
+        table = conform(df, self.name)
+        row_hashes = pd.util.hash_pandas_object(df[table.schema.names], index=False).to_numpy()
+        field = TABLE_SCHEMAS[self.name].get("partition_field")
+        if field:
+            groups = [(partition_id(code), rows) for code, rows in partition_groups(partition_codes(df[field]))]
+        else:
+            groups = [(WHOLE_TABLE, np.arange(len(df)))]
+
+        path = self.directory / f"{self.prefix}-{self.batches:05d}.parquet"
+        # one take() into partition order, then zero-copy slices per row group
+        ordered = table.take(pa.array(np.concatenate([rows for _, rows in groups]))) if len(groups) > 1 else table
+        start = 0
+        with pq.ParquetWriter(path, table.schema, **SPILL_WRITE_OPTIONS) as writer:
+            for row_group, (pid, rows) in enumerate(groups):
+                writer.write_table(ordered.slice(start, len(rows)), row_group_size=len(rows))
+                start += len(rows)
+                self._pieces.setdefault(pid, []).append((path, row_group))
+                fp = fingerprint(row_hashes[rows])
+                self._fingerprints[pid] = combine_fingerprints(self._fingerprints[pid], fp) \
+                    if pid in self._fingerprints else fp
+        self.rows += table.num_rows
+        self.batches += 1
+
+    def absorb(self, other: "SpilledTable"):
+        """Take over the spill files of another SpilledTable of the same table (e.g. a worker's)."""
+        for pid, pieces in other._pieces.items():
+            self._pieces.setdefault(pid, []).extend(pieces)
+            fp = other._fingerprints[pid]
+            self._fingerprints[pid] = combine_fingerprints(self._fingerprints[pid], fp) \
+                if pid in self._fingerprints else fp
+        self.rows += other.rows
+        self.batches += other.batches
+
+    def stage(self, staging_dir: Path) -> dict:
+        """Compact the spill files into load_tables()' staged layout, one partition at a time."""
+        files = {}
+        partitions = {}
+        part_dir = Path(staging_dir) / self.name
+        part_dir.mkdir()
+        for pid, pieces in self._pieces.items():
+            table = pa.concat_tables(_open(files, path).read_row_group(row_group) for path, row_group in pieces)
+            path = part_dir / f"{pid}.parquet"
+            pq.write_table(table, path, compression="snappy")
+            partitions[pid] = {"path": path, "rows": table.num_rows, "fingerprint": self._fingerprints[pid]}
+        for f in files.values():
+            f.close()
+        return {"rows": self.rows, "partitions": partitions}
+
+    def files(self) -> list:
+        """The spill files, one per appended batch, in append order."""
+        return sorted({path for pieces in self._pieces.values() for path, _ in pieces})
+
+    def to_arrow(self) -> pa.Table:
+        """The whole table in memory, in contract types."""
+        paths = self.files()
+        if not paths:
+            return conform(pd.DataFrame(columns=self.columns), self.name)
+        return pa.concat_tables(pq.read_table(p) for p in paths)
+
+    def to_pandas(self) -> pd.DataFrame:
+        return self.to_arrow().to_pandas()
+
+    def release(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+# ---- spill-to-disk partial aggregation ----
+
+# How a partial of each aggregation is merged with the partials of other batches
+# ("sketch" partials are digests, merged by etl/transform/sketches.py)
+MERGE = {"count": "sum", "sum": "sum", "min": "min", "max": "max"}
+
+
+class PartialAggregate:
+    """
+    Group-by over a stream of batches with mergeable partials.
+
+    update() reduces a batch to one partial row per group (`partials`:
+    output name → (column, count|sum|min|max|sketch)) and to the distinct
+    (group, value) pairs of every `distinct` column, tagged with a bucket
+    derived from the group key hash, and buffers them. Once the buffers
+    exceed budget_bytes (or spill() is called) they are written to
+    spill_dir: one file per kind and spill, one row group per bucket.
+    result() merges everything in memory if nothing was spilled, otherwise
+    one bucket at a time, so only the largest bucket ever has to fit in
+    memory; distinct counts stay exact either way.
+    """
+
+    def __init__(self, keys: list, partials: dict, distinct: dict, spill_dir: Path,
+                 budget_bytes: int, buckets: int = AGGREGATE_BUCKETS):
+        self.keys = list(keys)
+        self.partials = partials
+        self.distinct = distinct
+        self.spill_dir = Path(spill_dir)
+        self.budget_bytes = budget_bytes
+        self.buckets = buckets
+        self.spills = 0
+        self._buffers = {}   # kind → [DataFrame]
+        self._buffered = 0
+        self._spilled = {}   # kind → [(file, {bucket: row group})]
+
+    @property
+    def buffered_bytes(self) -> int:
+        return self._buffered
+
+    def update(self, df: pd.DataFrame):
+        plain = {name: spec for name, spec in self.partials.items() if spec[1] != "sketch"}
+        sketches = {name: column for name, (column, how) in self.partials.items() if how == "sketch"}
+        partial = df.groupby(self.keys).agg(**plain).reset_index()
+        self._buffer("partial", partial.assign(**sketch_columns(df, self.keys, sketches)))
+        for name, column in self.distinct.items():
+            self._buffer(name, df[self.keys + [column]].dropna(subset=[column]).drop_duplicates())
+        if self._buffered > self.budget_bytes:
+            self.spill()
+
+    def _buffer(self, kind: str, frame: pd.DataFrame):
+        self._buffers.setdefault(kind, []).append(frame)
+        self._buffered += _estimated_bytes(frame) + sum(
+            len(digest) for name, (_, how) in self.partials.items() if how == "sketch" and name in frame
+            for digest in frame[name] if digest is not None)
+
+    def spill(self):
+        """Write the buffers to disk, grouped by bucket, and free them."""
+        if not self._buffers:
+            return
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        for kind, frames in self._buffers.items():
+            frame = pd.concat(frames, ignore_index=True)
+            buckets = pd.util.hash_pandas_object(frame[self.keys], index=False).to_numpy() % self.buckets
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            path = self.spill_dir / f"{kind}-{self.spills:05d}.parquet"
+            groups = list(partition_groups(buckets.astype("int64")))
+            ordered = table.take(pa.array(np.concatenate([rows for _, rows in groups]))) if len(groups) > 1 else table
+            row_groups = {}
+            start = 0
+            with pq.ParquetWriter(path, table.schema, **SPILL_WRITE_OPTIONS) as writer:
+                for row_group, (bucket, rows) in enumerate(groups):
+                    writer.write_table(ordered.slice(start, len(rows)), row_group_size=len(rows))
+                    start += len(rows)
+                    row_groups[int(bucket)] = row_group
+            self._spilled.setdefault(kind, []).append((path, row_groups))
+        self._buffers = {}
+        self._buffered = 0
+        self.spills += 1
+
+    def absorb(self, other: "PartialAggregate"):
+        """Take over the spilled partials of another aggregate of the same shape (e.g. a worker's)."""
+        other.spill()
+        for kind, spilled in other._spilled.items():
+            self._spilled.setdefault(kind, []).extend(spilled)
+        self.spills += other.spills
+
+    def bucket_result(self, bucket: int):
+        """Merged aggregates of one bucket of the spilled partials, or None if it is empty."""
+        files = {}
+        try:
+            part = {kind: self._read_bucket(kind, bucket, files) for kind in ["partial", *self.distinct]}
+        finally:
+            for f in files.values():
+                f.close()
+        return self._merge(part) if part["partial"] is not None else None
+
+    def _read_bucket(self, kind: str, bucket: int, files: dict):
+        frames = [_open(files, path).read_row_group(row_groups[bucket]).to_pandas()
+                  for path, row_groups in self._spilled.get(kind, []) if bucket in row_groups]
+        return pd.concat(frames, ignore_index=True) if frames else None
+
+    def result(self, map=map) -> pd.DataFrame:
+        """
+        Merged aggregates: keys, every partial and one count per distinct
+        column, sorted by keys. Buckets are merged independently through
+        `map` (a process pool's map merges them in parallel).
+        """
+        if self.spills:
+            self.spill()   # flush the rest so every bucket is read the same way
+            results = [r for r in map(self.bucket_result, range(self.buckets)) if r is not None]
+        else:
+            part = {kind: pd.concat(self._buffers[kind], ignore_index=True) if kind in self._buffers else None
+                    for kind in ["partial", *self.distinct]}
+            # a single update() is already one row per group and distinct pairs (e.g. a worker's partition)
+            reduced = all(len(frames) == 1 for frames in self._buffers.values())
+            results = [self._merge(part, reduced)] if part["partial"] is not None else []
+        return self.combine(results)
+
+    def combine(self, results: list) -> pd.DataFrame:
+        """One result from the results of disjoint sets of groups (buckets, partitions)."""
+        if not results:
+            return pd.DataFrame(columns=self.keys + list(self.partials) + list(self.distinct))
+        return pd.concat(results, ignore_index=True).sort_values(self.keys, ignore_index=True)
+
+    def _merge(self, part: dict, reduced: bool = False) -> pd.DataFrame:
+        if reduced:
+            merged = part["partial"]
+        else:
+            merge = {name: (name, MERGE[how]) for name, (_, how) in self.partials.items() if how != "sketch"}
+            sketches = [name for name, (_, how) in self.partials.items() if how == "sketch"]
+            merged = part["partial"].groupby(self.keys).agg(**merge).reset_index()
+            merged = merged.assign(**merge_sketch_columns(part["partial"], self.keys, sketches))
+        for name in self.distinct:
+            pairs = part[name]
+            if pairs is None:
+                merged[name] = 0
+                continue
+            counts = (pairs if reduced else pairs.drop_duplicates()).groupby(self.keys).size().rename(name).reset_index()
+            merged = merged.merge(counts, on=self.keys, how="left")
+            merged[name] = merged[name].fillna(0).astype("int64")
+        return merged
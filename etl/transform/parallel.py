@@ -0,0 +1,322 @@
+"""
+Partition-parallel transform across CPU cores.
+
+transform_parallel() produces the same tables as transform_all(), with the
+fact builders and the mart aggregation spread over a process pool:
+
+    partition  encounters and procedures are hash-partitioned (by provider,
+               or by start month) into a few partitions per worker; each
+               partition is written once as an Arrow IPC stream into a
+               shared-memory segment
+    workers    map their segment zero-copy, run build_fact_encounters /
+               build_fact_procedures, spill the conformed fact rows with
+               their partition fingerprints (out_of_core.SpilledTable) and
+               fold the encounters into the mart partials
+    merge      the mart whose groups cannot span partitions (provider
+               productivity when partitioned by provider, appointment
+               analytics when partitioned by month) is finished inside the
+               workers and only concatenated; the other one is merged
+               bucket by bucket, again in the pool
+    link       each partition also returns its inpatient stays and distinct
+               patient/provider pairs; readmissions and shared patients can
+               cross partitions, so they are linked in the parent
+
+Dimensions are small and built in the parent while the workers run, as is
+fact_conditions (narrow rows, no aggregation). The other facts come back as SpilledTable objects that the load layer stages directly, so
+fact rows never travel back through the parent process. With one worker
+there is nothing to spread: the whole input is a single partition,
+transformed in the parent without a pool or shared memory.
+
+Configuration:
+    ETL_TRANSFORM_WORKERS    process count (default: CPU count)
+    ETL_PARTITION_BY         "date" (default, balanced under provider skew) or "provider"
+"""
+
+import contextlib
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from etl.instrumentation import span
+from etl.load.warehouse import partition_codes
+from etl.transform.out_of_core import (
+    MEMORY_BUDGET_MB,
+    SPILL_DIR,
+    SpilledTable,
+    concat_stays,
+    finish_marts,
+    mart_aggregates,
+    provider_network,
+    update_mart_aggregates,
+)
+from etl.transform.transform import (
+    build_dim_conditions,
+    build_dim_date,
+    build_dim_organizations,
+    build_dim_patients,
+    build_dim_providers,
+    build_fact_conditions,
+    build_fact_encounters,
+    build_fact_patient_readmissions,
+    build_fact_procedures,
+    build_fact_readmissions,
+    build_mart_provider_readmissions,
+    inpatient_stays,
+    patient_provider_pairs,
+)
+
+TRANSFORM_WORKERS = int(os.getenv("ETL_TRANSFORM_WORKERS", "0")) or os.cpu_count() or 1
+PARTITION_BY = os.getenv("ETL_PARTITION_BY", "date")
+PARTITIONS_PER_WORKER = 4
+
+# partition scheme → (column partitioning encounters, column partitioning procedures);
+# procedures carry no provider, so they are spread by encounter instead
+PARTITION_COLUMNS = {
+    "provider": ("provider_id", "encounter_id"),
+    "date": ("start_datetime", "performed_datetime"),
+}
+# the mart whose groups never span two partitions under each scheme
+DISJOINT_MART = {
+    "provider": "mart_provider_productivity",
+    "date": "mart_appointment_analytics",
+}
+
+
+def transform_parallel(raw_data: dict, workers: int = None, partition_by: str = None, spill_dir=None) -> dict:
+    """
+    transform_all() on a process pool. Returns the same table dict; fact
+    tables are SpilledTable objects (out_of_core.release() once loaded).
+    """
+    workers = workers or TRANSFORM_WORKERS
+    partition_by = partition_by or PARTITION_BY
+    if partition_by not in PARTITION_COLUMNS:
+        raise ValueError(f"Unsupported partitioning {partition_by!r}; expected one of {sorted(PARTITION_COLUMNS)}")
+    # one worker gains nothing from a pool: its partition runs in this process, unshared
+    n_partitions = workers * PARTITIONS_PER_WORKER if workers > 1 else 1
+    spill_root = Path(spill_dir or SPILL_DIR)
+    spill_root.mkdir(parents=True, exist_ok=True)
+
+    print(f"  Running transformations on {workers} processes ({n_partitions} partitions by {partition_by})...")
+
+    encounter_col, procedure_col = PARTITION_COLUMNS[partition_by]
+    segments = []
+    agg_dir = Path(tempfile.mkdtemp(prefix="aggregate-", dir=spill_root))
+    fact_encounters = SpilledTable("fact_encounters", spill_root)
+    fact_procedures = SpilledTable("fact_procedures", spill_root)
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) if workers > 1 else None
+    try:
+        with pool or contextlib.nullcontext():
+            with span("transform.parallel.partition", partitions=n_partitions) as s:
+                tasks = []
+                if pool:
+                    shared = _share_partitions(raw_data["encounters"], encounter_col, n_partitions, workers)
+                    segments.extend(shared)
+                    for part, segment in enumerate(shared):
+                        tasks.append(pool.submit(_encounter_partition, part, segment, fact_encounters.directory,
+                                                 agg_dir / f"part-{part:04d}", partition_by,
+                                                 (MEMORY_BUDGET_MB << 20) // workers))
+                    shared = _share_partitions(raw_data["procedures"], procedure_col, n_partitions, workers)
+                    segments.extend(shared)
+                    for part, segment in enumerate(shared):
+                        tasks.append(pool.submit(_procedure_partition, part, segment, fact_procedures.directory))
+                s.set(bytes_out=sum(segment[1] for segment in segments))
+
+            # dimensions are cheap; build them while the workers run
+            dim_providers = build_dim_providers(raw_data["providers"])
+            dim_patients = build_dim_patients(raw_data["patients"])
+            dim_conditions = build_dim_conditions(raw_data["conditions"])
+            dim_organizations = build_dim_organizations(raw_data["organizations"])
+            fact_conditions = build_fact_conditions(raw_data["conditions"])
+            fact_readmissions = build_fact_readmissions(raw_data["readmissions"])
+
+            with span("transform.parallel.workers", workers=workers):
+                finished = {name: [] for name in DISJOINT_MART.values()}
+                merged = mart_aggregates(agg_dir / "merged", MEMORY_BUDGET_MB << 20)
+                dates, stays, pairs = [], [], []
+                done = (task.result() for task in as_completed(tasks)) if pool else [
+                    _encounter_facts(0, raw_data["encounters"], fact_encounters.directory, agg_dir / "part-0000",
+                                     partition_by, MEMORY_BUDGET_MB << 20, whole=True),
+                    _procedure_facts(0, raw_data["procedures"], fact_procedures.directory)]
+                for table, marts, part_dates, part_stays, part_pairs in done:
+                    (fact_encounters if table.name == "fact_encounters" else fact_procedures).absorb(table)
+                    for name, mart in marts.items():
+                        if isinstance(mart, pd.DataFrame):
+                            finished[name].append(mart)
+                        else:
+                            merged[name].absorb(mart)
+                    if part_dates is not None:
+                        dates.append(part_dates)
+                    if part_stays is not None:
+                        stays.append(part_stays)
+                    if part_pairs is not None:
+                        pairs.append(part_pairs)
+            _release_segments(segments)
+
+            with span("transform.parallel.merge"):
+                dim_date = build_dim_date(pd.DataFrame(
+                    {"start_datetime": np.unique(np.concatenate(dates)) if dates
+                     else pd.Series([], dtype="datetime64[ns]")}))
+                results = {}
+                for name, aggregate in merged.items():
+                    if finished[name]:
+                        results[name] = aggregate.combine(finished[name])
+                    else:
+                        results[name] = aggregate.result(map=pool.map if pool else map)
+                mart_provider_productivity, mart_appointment_analytics = finish_marts(
+                    results, dim_providers, dim_organizations)
+                # one sorted pass over every partition's inpatient stays (readmissions cross months)
+                fact_patient_readmissions = build_fact_patient_readmissions(concat_stays(stays))
+                mart_provider_readmissions = build_mart_provider_readmissions(
+                    fact_patient_readmissions, dim_providers, dim_organizations)
+                mart_provider_network, mart_provider_centrality = provider_network(
+                    pairs, dim_providers, dim_organizations)
+    except BaseException:
+        fact_encounters.release()
+        fact_procedures.release()
+        raise
+    finally:
+        _release_segments(segments)
+        shutil.rmtree(agg_dir, ignore_errors=True)
+
+    transformed = {
+        "dim_providers": dim_providers,
+        "dim_patients": dim_patients,
+        "dim_conditions": dim_conditions,
+        "dim_date": dim_date,
+        "dim_organizations": dim_organizations,
+        "fact_encounters": fact_encounters,
+        "fact_procedures": fact_procedures,
+        "fact_conditions": fact_conditions,
+        "fact_readmissions": fact_readmissions,
+        "fact_patient_readmissions": fact_patient_readmissions,
+        "mart_provider_productivity": mart_provider_productivity,
+        "mart_appointment_analytics": mart_appointment_analytics,
+        "mart_provider_readmissions": mart_provider_readmissions,
+        "mart_provider_network": mart_provider_network,
+        "mart_provider_centrality": mart_provider_centrality,
+    }
+
+    for name, df in transformed.items():
+        print(f"✓ {name}: {len(df)} rows, {len(df.columns)} cols")
+
+    return transformed
+
+
+def _pool_context():
+    """forkserver with this module preloaded where available (workers start without re-importing
+    pandas/pyarrow); spawn elsewhere. Plain fork is avoided: the parent runs Arrow and sampler threads."""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload([__name__])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+# ---- shared-memory partitions ----
+
+def partition_of(values: pd.Series, n_partitions: int) -> np.ndarray:
+    """Partition number per row: by month for timestamps, by key hash otherwise."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return partition_codes(values) % n_partitions
+    return (pd.util.hash_array(values.to_numpy(dtype=object)) % np.uint64(n_partitions)).astype("int64")
+
+
+def _share_partitions(df: pd.DataFrame, column: str, n_partitions: int, threads: int):
+    """(segment name, size) of one shared-memory Arrow IPC stream per partition, in partition order."""
+    table = pa.Table.from_pandas(df, preserve_index=False, nthreads=threads)
+    parts = partition_of(df[column], n_partitions)
+    order = np.argsort(parts, kind="stable")
+    bounds = np.searchsorted(parts[order], np.arange(n_partitions + 1))
+
+    def share(part):
+        return _to_shared(table.take(pa.array(order[bounds[part]:bounds[part + 1]])))
+
+    # take() and the IPC writes run in Arrow without the GIL
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(share, range(n_partitions)))
+
+
+def _to_shared(table: pa.Table):
+    mock = pa.MockOutputStream()
+    with pa.ipc.new_stream(mock, table.schema) as writer:
+        writer.write_table(table)
+    size = mock.size()
+    segment = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    _write_stream(pa.py_buffer(segment.buf), table)
+    segment.close()   # only possible once Arrow has dropped its views of the segment
+    return segment.name, size
+
+
+def _write_stream(buffer, table: pa.Table):
+    with pa.FixedSizeBufferWriter(buffer) as sink, pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _read_shared(segment) -> pd.DataFrame:
+    name, size = segment
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return _read_stream(pa.py_buffer(shm.buf)[:size])
+    finally:
+        shm.close()   # only possible once Arrow has dropped its views of the segment
+
+
+def _read_stream(buffer) -> pd.DataFrame:
+    with pa.ipc.open_stream(buffer) as reader:
+        table = reader.read_all()   # zero-copy views into the segment
+    return table.to_pandas()        # the builders need pandas; this copies out
+
+
+def _release_segments(segments: list):
+    while segments:
+        name, _ = segments.pop()
+        try:
+            shared_memory.SharedMemory(name=name).unlink()
+        except FileNotFoundError:
+            pass
+
+
+# ---- worker tasks (run in the pool processes, or in the parent with one worker) ----
+
+def _encounter_partition(part: int, segment, fact_dir: Path, agg_dir: Path, partition_by: str, budget_bytes: int):
+    return _encounter_facts(part, _read_shared(segment), fact_dir, agg_dir, partition_by, budget_bytes)
+
+
+def _encounter_facts(part: int, encounters: pd.DataFrame, fact_dir: Path, agg_dir: Path, partition_by: str,
+                     budget_bytes: int, whole: bool = False):
+    # the fact builders only read their source frame; dimensions are not shipped to workers
+    fact = build_fact_encounters(encounters, None, None, None)
+
+    table = SpilledTable("fact_encounters", directory=fact_dir, prefix=f"part-{part:04d}")
+    if len(fact):
+        table.append(fact)
+
+    marts = mart_aggregates(agg_dir, budget_bytes)
+    update_mart_aggregates(marts, fact)
+    for name, aggregate in marts.items():
+        if whole or name == DISJOINT_MART[partition_by]:
+            marts[name] = aggregate.result()   # complete: no other partition has these groups
+        else:
+            aggregate.spill()                  # merged by the parent, bucket by bucket
+    dates = fact["start_datetime"].dropna().dt.normalize().unique()
+    return table, marts, dates, inpatient_stays(fact), patient_provider_pairs(fact)
+
+
+def _procedure_partition(part: int, segment, fact_dir: Path):
+    return _procedure_facts(part, _read_shared(segment), fact_dir)
+
+
+def _procedure_facts(part: int, procedures: pd.DataFrame, fact_dir: Path):
+    fact = build_fact_procedures(procedures, None, None)
+    table = SpilledTable("fact_procedures", directory=fact_dir, prefix=f"part-{part:04d}")
+    if len(fact):
+        table.append(fact)
+    return table, {}, None, None, None
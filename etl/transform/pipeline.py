@@ -1,61 +1,256 @@
 """
-ETL Pipeline Orchestrator: Extract → Transform → Load
+ETL Pipeline Orchestrator: Extract → Transform → Validate → Load
 Runs the full pipeline from source data to BigQuery (or Parquet fallback).
 """
 
 import sys
-import time
+from datetime import datetime
 from pathlib import Path
 
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-from etl.extract import extract_from_mysql
+from etl.extract import csv_watermark, extract_from_csv, extract_from_mysql, mysql_watermark
 from etl.transform import transform_all
+from etl.transform.out_of_core import release, transform_out_of_core
+from etl.transform.parallel import transform_parallel
 from etl.load import load_to_bigquery
+from etl import checkpoint, instrumentation
+from etl.features import PatientFeatureStore
+from etl.snapshot import publish_snapshot
+from etl.validate import SAMPLE_FRACTION, validate
+from etl.instrumentation import span
 
+# source name → (extractor, watermark); the watermark keys extract checkpoints
+SOURCES = {
+    "csv": (extract_from_csv, csv_watermark),
+    "mysql": (extract_from_mysql, mysql_watermark),
+}
 
-def run_pipeline(source: str = "csv"):
+
+def run_pipeline(source: str = "csv", full_refresh: bool = False, resume: bool = False,
+                 use_checkpoints: bool = True, out_of_core: bool = False, memory_budget_mb: int = None,
+                 workers: int = None, features: bool = True, validation: str = "full",
+                 sample_fraction: float = None):
     """
     Run the full ETL pipeline.
 
     Args:
-        source: "csv" for CSV files, "mysql" for MySQL database
+        source: "csv" reads the Synthea/HRRP CSVs directly (no staging
+            database), "mysql" extracts the MySQL staging tables
+        full_refresh: rewrite every warehouse table instead of loading only
+            the partitions that changed since the last run
+        resume: continue from the last successful stage of the previous run,
+            reusing its extract checkpoint without checking the source again
+        use_checkpoints: read/write stage checkpoints (etl/checkpoint.py)
+        out_of_core: stream extract → transform in batches under a memory
+            budget (etl/transform/out_of_core.py), for fact tables larger
+            than RAM; stage outputs are not checkpointed in this mode
+        memory_budget_mb: memory budget of the out-of-core mode
+            (default ETL_MEMORY_BUDGET_MB)
+        workers: run the fact builders and mart aggregation on this many
+            processes over hash-partitioned data (etl/transform/parallel.py)
+        features: fold the loaded fact partitions into the patient feature
+            store (etl/features.py); only changed partitions are refolded
+        validation: "full" checks every row against the data-quality rules
+            (etl/validate.py) and quarantines the bad ones before the load,
+            "sample" is a pre-flight check on a sample_fraction of the rows
+            (default ETL_VALIDATE_SAMPLE) that stops before loading, "off"
+            skips the stage
+
+    Stage outputs are checkpointed under a key derived from the source
+    watermark and the code version, so a rerun on unchanged inputs skips
+    extract and transform, and a load that already succeeded for the same
+    data is not repeated. Validation runs on every run, cached or not,
+    right before the load. After the load, the marts and small dimensions
+    are published as the API's in-memory snapshot (etl/snapshot.py).
+
+    Every stage and builder runs inside an instrumentation span
+    (etl/instrumentation.py); a summary of the slowest spans is printed at
+    the end and, with a trace file configured, all spans are written as JSON lines.
     """
+    if source not in SOURCES:
+        raise ValueError(f"Unsupported source {source!r}; expected one of {sorted(SOURCES)}")
+    if validation not in ("full", "sample", "off"):
+        raise ValueError(f"Unsupported validation {validation!r}; expected 'full', 'sample' or 'off'")
+    extract, watermark = SOURCES[source]
+
     print("=" * 60)
     print("  DataFoundation — ETL Pipeline")
     print("=" * 60)
     print()
 
-    start_time = time.time()
+    previous = checkpoint.read_run_state()
+    state = {"source": source, "started_at": datetime.now().isoformat(timespec="seconds"), "stages": {}}
 
-    # ── EXTRACT ──
-    print("📥 [1/3] EXTRACT")
-    print("-" * 40)
-    if source == "mysql":
-        raw_data = extract_from_mysql()
-    print()
+    with span("pipeline", source=source, full_refresh=full_refresh, resume=resume) as root:
+        extract_key = transform_key = None
+        if use_checkpoints:
+            extract_key = _resumable_extract_key(previous, source) if resume else None
+            if extract_key is None:
+                extract_key = checkpoint.stage_key("extract", source, watermark())
+            transform_key = checkpoint.stage_key("transform", extract_key)
 
-    # ── TRANSFORM ──
-    print("🔄 [2/3] TRANSFORM")
-    print("-" * 40)
-    transformed_data = transform_all(raw_data)
-    print()
+        transformed_data = None if out_of_core else _cached("transform", transform_key)
+        if out_of_core:
+            print("📥🔄 [1-2/4] EXTRACT + TRANSFORM (out-of-core)")
+            print("-" * 40)
+            with span("transform", out_of_core=True) as s:
+                transformed_data = transform_out_of_core(source, memory_budget_mb=memory_budget_mb)
+                s.set_output(transformed_data)
+            if use_checkpoints:
+                checkpoint.mark_stage_done(state, "extract", extract_key, out_of_core=True)
+                checkpoint.mark_stage_done(state, "transform", transform_key, out_of_core=True)
+            print()
+        elif transformed_data is not None:
+            print("📥🔄 [1-2/4] EXTRACT + TRANSFORM")
+            print("-" * 40)
+            print(f"  ↺ inputs unchanged, using checkpoint transform/{transform_key}")
+            checkpoint.mark_stage_done(state, "extract", extract_key, cached=True)
+            checkpoint.mark_stage_done(state, "transform", transform_key, cached=True)
+            print()
+        else:
+            # ── EXTRACT ──
+            print("📥 [1/4] EXTRACT")
+            print("-" * 40)
+            with span("extract") as s:
+                raw_data = _cached("extract", extract_key)
+                if raw_data is not None:
+                    print(f"  ↺ source unchanged, using checkpoint extract/{extract_key}")
+                else:
+                    raw_data = extract()
+                    _save("extract", extract_key, raw_data)
+                s.set_output(raw_data)
+            if use_checkpoints:
+                checkpoint.mark_stage_done(state, "extract", extract_key)
+            print()
 
-    # ── LOAD ──
-    print("📤 [3/3] LOAD")
-    print("-" * 40)
-    load_to_bigquery(transformed_data)
-    print()
+            # ── TRANSFORM ──
+            print("🔄 [2/4] TRANSFORM")
+            print("-" * 40)
+            with span("transform", workers=workers or 1) as s:
+                transformed_data = transform_parallel(raw_data, workers=workers) if workers else transform_all(raw_data)
+                s.set_output(transformed_data)
+            del raw_data
+            _save("transform", transform_key, transformed_data)
+            if use_checkpoints:
+                checkpoint.mark_stage_done(state, "transform", transform_key)
+            print()
+
+        # ── VALIDATE ──
+        preflight = validation == "sample"
+        if validation != "off":
+            print("🔍 [3/4] VALIDATE" + (" (sampled pre-flight)" if preflight else ""))
+            print("-" * 40)
+            sample = (sample_fraction or SAMPLE_FRACTION) if preflight else None
+            try:
+                with span("validate", sample=sample) as s:
+                    transformed_data, report = validate(transformed_data, sample=sample)
+                    s.set(rows_quarantined=sum(r["quarantined"] for r in report.values()))
+            except BaseException:
+                release(transformed_data)
+                raise
+            print()
+
+        # ── LOAD ──
+        print("📤 [4/4] LOAD")
+        print("-" * 40)
+        last_load = previous.get("stages", {}).get("load", {})
+        if preflight:
+            print(f"  - pre-flight check passed on a {sample:.1%} sample, nothing loaded "
+                  f"(run with full validation to load)")
+            release(transformed_data)
+        elif (use_checkpoints and not full_refresh and last_load.get("key") == transform_key
+                and last_load.get("destination") != "parquet-fallback"):
+            print(f"  ↺ already loaded to {last_load['destination']} at {last_load['completed_at']}, skipping")
+            state["stages"]["load"] = last_load
+            checkpoint.write_run_state(state)
+            _publish(transformed_data)
+            release(transformed_data)
+        else:
+            try:
+                with span("load") as s:
+                    destination = load_to_bigquery(transformed_data, full_refresh=full_refresh,
+                                                   feature_store=PatientFeatureStore() if features else None)
+                    s.set(destination=destination)
+                _publish(transformed_data)
+            finally:
+                release(transformed_data)
+            if use_checkpoints:
+                checkpoint.mark_stage_done(state, "load", transform_key, destination=destination)
+        print()
 
-    elapsed = time.time() - start_time
     print("=" * 60)
-    print(f"  ✅ Pipeline completed in {elapsed:.2f}s")
+    print(f"  ✅ Pipeline completed in {root.attributes['etl.wall_s']:.2f}s")
     print("=" * 60)
+    instrumentation.print_summary(root)
+    if instrumentation.trace_file():
+        print(f"  ✓ Trace written to {instrumentation.trace_file()}")
 
     return transformed_data
 
 
+def _resumable_extract_key(previous: dict, source: str):
+    """Extract key of the previous run, if it was for this source and its checkpoint still exists."""
+    key = previous.get("stages", {}).get("extract", {}).get("key")
+    if previous.get("source") == source and key and checkpoint.load_manifest("extract", key):
+        print(f"  ↺ resuming run started {previous['started_at']}")
+        return key
+    print("  ⚠ no resumable run found, starting from the beginning")
+    return None
+
+
+def _cached(stage: str, key):
+    if key is None:
+        return None
+    with span(f"checkpoint.read.{stage}") as s:
+        tables = checkpoint.load_checkpoint(stage, key)
+        s.set(hit=tables is not None)
+        if tables is not None:
+            s.set_output(tables)
+    return tables
+
+
+def _save(stage: str, key, tables: dict):
+    """Checkpoint a stage output; a failed write only costs the cache, never the run."""
+    if key is None:
+        return
+    try:
+        with span(f"checkpoint.write.{stage}"):
+            checkpoint.save_checkpoint(stage, key, tables)
+    except Exception as e:
+        print(f"  ⚠ could not checkpoint {stage}: {e}")
+
+
+def _publish(transformed: dict):
+    """Publish the API snapshot of the loaded marts; a failure leaves the API on its previous snapshot."""
+    try:
+        with span("snapshot.publish"):
+            publish_snapshot(transformed)
+    except Exception as e:
+        print(f"  ⚠ could not publish the API snapshot: {e}")
+
+
+def _option(name: str):
+    """Value of a `--name=value` command-line option, or None."""
+    prefix = f"--{name}="
+    return next((arg[len(prefix):] for arg in sys.argv if arg.startswith(prefix)), None)
+
+
 if __name__ == "__main__":
     source = "mysql" if "--mysql" in sys.argv else "csv"
-    run_pipeline(source=source)
\ No newline at end of file
+    # --trace[=FILE] spans as JSON lines; --profile=/--tracemalloc=<span patterns, comma-separated>
+    trace = _option("trace") or ("--trace" in sys.argv and
+                                 instrumentation.TRACE_DIR / f"pipeline-{datetime.now():%Y%m%d-%H%M%S}.jsonl")
+    instrumentation.configure(trace_file=trace or None, profile=_option("profile"),
+                              tracemalloc=_option("tracemalloc"))
+    # --out-of-core [--memory-budget=MB] streams facts in batches instead of holding them in memory
+    # --workers=N transforms on N processes
+    # --validate=sample [--sample=FRACTION] pre-flight data-quality check only; --validate=off skips validation
+    budget, workers, sample = _option("memory-budget"), _option("workers"), _option("sample")
+    run_pipeline(source=source, full_refresh="--full-refresh" in sys.argv, resume="--resume" in sys.argv,
+                 use_checkpoints="--no-checkpoint" not in sys.argv,
+                 out_of_core="--out-of-core" in sys.argv or budget is not None,
+                 memory_budget_mb=int(budget) if budget else None, workers=int(workers) if workers else None,
+                 features="--no-features" not in sys.argv, validation=_option("validate") or "full",
+                 sample_fraction=float(sample) if sample else None)
\ No newline at end of file
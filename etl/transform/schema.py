@@ -0,0 +1,316 @@
+"""
+Schema contract for the star-schema tables produced by transform_all().
+
+Each table pins its column names and warehouse types (BigQuery type names),
+plus the physical layout and write policy used by the load layer:
+    partition_field → TIMESTAMP column the table is time-partitioned on (monthly)
+    clustering      → clustering columns, in order
+    natural_key     → columns identifying a row across runs (MERGE / upsert key)
+    write_mode      → "merge"   upsert by natural_key, touched partitions only
+                      "replace" rewrite the table (or touched partitions) from the batch
+
+The load layer derives both the Arrow schema used for Parquet staging and
+the BigQuery load schema from here, so types never depend on autodetect.
+"""
+
+import pyarrow as pa
+
+TABLE_SCHEMAS = {
+    "dim_providers": {
+        "columns": [
+            ("provider_key", "STRING"),
+            ("provider_id", "STRING"),
+            ("name", "STRING"),
+            ("provider_name", "STRING"),   # canonical display name (canonical_provider_names)
+            ("gender", "STRING"),
+            ("speciality", "STRING"),
+            ("organization_key", "STRING"),
+            ("city", "STRING"),
+            ("state", "STRING"),
+            ("zip", "STRING"),
+        ],
+        "natural_key": ["provider_key"],
+        "write_mode": "merge",
+    },
+    "dim_patients": {
+        "columns": [
+            ("patient_key", "STRING"),
+            ("patient_id", "STRING"),
+            ("first_name", "STRING"),
+            ("last_name", "STRING"),
+            ("full_name", "STRING"),
+            ("birthdate", "DATE"),
+            ("deathdate", "DATE"),
+            ("age", "INT64"),
+            ("gender", "STRING"),
+            ("race", "STRING"),
+            ("ethnicity", "STRING"),
+            ("city", "STRING"),
+            ("state", "STRING"),
+            ("zip", "STRING"),
+            ("marital_status", "STRING"),
+        ],
+        "natural_key": ["patient_key"],
+        "write_mode": "merge",
+    },
+    "dim_conditions": {
+        "columns": [
+            ("condition_key", "STRING"),
+            ("code", "STRING"),
+            ("description", "STRING"),
+        ],
+        "natural_key": ["condition_key"],
+        "write_mode": "merge",
+    },
+    "dim_date": {
+        "columns": [
+            ("date_key", "INT64"),
+            ("full_date", "DATE"),
+            ("year", "INT64"),
+            ("quarter", "INT64"),
+            ("month", "INT64"),
+            ("month_name", "STRING"),
+            ("week", "INT64"),
+            ("day_of_week", "INT64"),
+            ("day_name", "STRING"),
+            ("is_weekend", "BOOL"),
+        ],
+        "natural_key": ["date_key"],
+        "write_mode": "merge",
+    },
+    "dim_organizations": {
+        "columns": [
+            ("organization_key", "STRING"),
+            ("organization_id", "STRING"),
+            ("organization_name", "STRING"),
+        ],
+        "natural_key": ["organization_key"],
+        "write_mode": "merge",
+    },
+    "fact_encounters": {
+        "columns": [
+            ("encounter_id", "STRING"),
+            ("patient_key", "STRING"),
+            ("provider_key", "STRING"),
+            ("date_key", "INT64"),
+            ("encounter_type", "STRING"),
+            ("encounter_class", "STRING"),
+            ("start_datetime", "TIMESTAMP"),
+            ("end_datetime", "TIMESTAMP"),
+            ("duration_hours", "FLOAT64"),
+            ("total_cost", "FLOAT64"),
+            ("reason_code", "STRING"),
+            ("reason_description", "STRING"),
+        ],
+        "natural_key": ["encounter_id"],
+        "write_mode": "merge",
+        "partition_field": "start_datetime",
+        "clustering": ["provider_key", "patient_key"],
+    },
+    "fact_procedures": {
+        "columns": [
+            ("procedure_id", "STRING"),
+            ("patient_key", "STRING"),
+            ("encounter_id", "STRING"),
+            ("date_key", "INT64"),
+            ("code", "STRING"),
+            ("description", "STRING"),
+            ("performed_datetime", "TIMESTAMP"),
+            ("cost", "FLOAT64"),
+        ],
+        "natural_key": ["procedure_id"],
+        "write_mode": "merge",
+        "partition_field": "performed_datetime",
+        "clustering": ["patient_key"],
+    },
+    "fact_conditions": {
+        "columns": [
+            ("condition_id", "STRING"),
+            ("patient_key", "STRING"),
+            ("encounter_id", "STRING"),
+            ("condition_key", "STRING"),
+            ("date_key", "INT64"),
+            ("onset_datetime", "TIMESTAMP"),      # Synthea START date, at 00:00 UTC
+            ("abatement_datetime", "TIMESTAMP"),  # NULL while the condition is active
+            ("is_active", "BOOL"),
+            ("duration_days", "FLOAT64"),
+        ],
+        "natural_key": ["condition_id"],
+        "write_mode": "merge",
+        "partition_field": "onset_datetime",
+        "clustering": ["condition_key", "patient_key"],
+    },
+    "fact_readmissions": {
+        "columns": [
+            ("readmission_id", "INT64"),
+            ("hospital_id", "STRING"),
+            ("hospital_name", "STRING"),
+            ("measure_name", "STRING"),
+            ("number_of_discharges", "INT64"),
+            ("expected_readmission_rate", "FLOAT64"),
+            ("predicted_readmission_rate", "FLOAT64"),
+            ("excess_readmission_ratio", "FLOAT64"),
+            ("number_of_readmissions", "INT64"),
+            ("start_date", "DATE"),
+            ("end_date", "DATE"),
+        ],
+        "natural_key": ["hospital_id", "measure_name"],
+        "write_mode": "merge",
+    },
+    "fact_patient_readmissions": {
+        "columns": [
+            ("encounter_id", "STRING"),
+            ("patient_key", "STRING"),
+            ("provider_key", "STRING"),
+            ("date_key", "INT64"),
+            ("admit_datetime", "TIMESTAMP"),
+            ("discharge_datetime", "TIMESTAMP"),
+            ("length_of_stay_days", "FLOAT64"),
+            ("readmit_encounter_id", "STRING"),
+            ("readmit_datetime", "TIMESTAMP"),
+            ("days_to_readmission", "FLOAT64"),
+            ("is_readmitted", "BOOL"),
+            ("window_days", "INT64"),
+        ],
+        "natural_key": ["encounter_id"],
+        "write_mode": "merge",
+        "partition_field": "discharge_datetime",
+        "clustering": ["provider_key", "patient_key"],
+    },
+    "mart_provider_productivity": {
+        "columns": [
+            ("provider_key", "STRING"),
+            ("provider_id", "STRING"),
+            ("provider_name", "STRING"),
+            ("provider_search_name", "STRING"),
+            ("speciality", "STRING"),
+            ("organization_key", "STRING"),
+            ("organization_name", "STRING"),
+            ("total_encounters", "INT64"),
+            ("unique_patients", "INT64"),
+            ("avg_encounter_duration_hrs", "FLOAT64"),
+            ("total_revenue", "FLOAT64"),
+            ("avg_cost_per_encounter", "FLOAT64"),
+            ("first_encounter", "TIMESTAMP"),
+            ("last_encounter", "TIMESTAMP"),
+            ("cost_sketch", "BYTES"),       # t-digests (etl/transform/sketches.py)
+            ("duration_sketch", "BYTES"),
+        ],
+        "natural_key": ["provider_key"],
+        "write_mode": "replace",
+    },
+    "mart_appointment_analytics": {
+        "columns": [
+            ("year", "INT64"),
+            ("quarter", "INT64"),
+            ("month", "INT64"),
+            ("month_name", "STRING"),
+            ("encounter_type", "STRING"),
+            ("encounter_class", "STRING"),
+            ("encounter_count", "INT64"),
+            ("unique_patients", "INT64"),
+            ("unique_providers", "INT64"),
+            ("avg_duration_hrs", "FLOAT64"),
+            ("total_cost", "FLOAT64"),
+            ("avg_cost", "FLOAT64"),
+            ("cost_sketch", "BYTES"),
+            ("duration_sketch", "BYTES"),
+        ],
+        "natural_key": ["year", "month", "encounter_type", "encounter_class"],
+        "write_mode": "replace",
+    },
+    "mart_provider_readmissions": {
+        "columns": [
+            ("provider_key", "STRING"),
+            ("provider_id", "STRING"),
+            ("provider_name", "STRING"),
+            ("speciality", "STRING"),
+            ("organization_key", "STRING"),
+            ("organization_name", "STRING"),
+            ("number_of_discharges", "INT64"),
+            ("number_of_readmissions", "INT64"),
+            ("observed_readmission_rate", "FLOAT64"),
+            ("expected_readmission_rate", "FLOAT64"),
+            ("excess_readmission_ratio", "FLOAT64"),
+            ("avg_days_to_readmission", "FLOAT64"),
+        ],
+        "natural_key": ["provider_key"],
+        "write_mode": "replace",
+    },
+    # shared-patient network: one row per direction of every linked provider pair
+    "mart_provider_network": {
+        "columns": [
+            ("provider_key", "STRING"),
+            ("neighbor_key", "STRING"),
+            ("shared_patients", "INT64"),
+            ("jaccard", "FLOAT64"),
+            ("neighbor_rank", "INT64"),
+        ],
+        "natural_key": ["provider_key", "neighbor_key"],
+        "write_mode": "replace",
+        "clustering": ["provider_key"],
+    },
+    "mart_provider_centrality": {
+        "columns": [
+            ("provider_key", "STRING"),
+            ("provider_id", "STRING"),
+            ("provider_name", "STRING"),
+            ("speciality", "STRING"),
+            ("organization_key", "STRING"),
+            ("organization_name", "STRING"),
+            ("patients", "INT64"),
+            ("degree", "INT64"),
+            ("weighted_degree", "INT64"),
+            ("degree_centrality", "FLOAT64"),
+            ("eigenvector_centrality", "FLOAT64"),
+            ("component", "INT64"),
+            ("component_size", "INT64"),
+        ],
+        "natural_key": ["provider_key"],
+        "write_mode": "replace",
+    },
+    # rows rejected by etl/validate.py in the latest run
+    "dq_quarantine": {
+        "columns": [
+            ("table_name", "STRING"),
+            ("row_key", "STRING"),
+            ("rules", "STRING"),
+            ("row_json", "STRING"),
+        ],
+        "natural_key": ["table_name", "row_key"],
+        "write_mode": "replace",
+    },
+}
+
+ARROW_TYPES = {
+    "STRING": pa.string(),
+    "INT64": pa.int64(),
+    "FLOAT64": pa.float64(),
+    "BOOL": pa.bool_(),
+    "BYTES": pa.binary(),
+    "DATE": pa.date32(),
+    # Synthea timestamps are UTC ("Z"); naive pandas datetimes are read as UTC
+    "TIMESTAMP": pa.timestamp("us", tz="UTC"),
+}
+
+
+def arrow_schema(table_name: str) -> pa.Schema:
+    """Arrow schema for a contracted table."""
+    return pa.schema(
+        [pa.field(name, ARROW_TYPES[type_]) for name, type_ in TABLE_SCHEMAS[table_name]["columns"]]
+    )
+
+
+def conform(df, table_name: str) -> pa.Table:
+    """
+    Convert a transformed DataFrame to an Arrow table matching the contract:
+    contracted columns only, in contract order, cast to the pinned types.
+    Raises KeyError if a contracted column is missing.
+    """
+    schema = arrow_schema(table_name)
+    missing = [name for name in schema.names if name not in df.columns]
+    if missing:
+        raise KeyError(f"{table_name} is missing contracted columns: {missing}")
+
+    table = pa.Table.from_pandas(df[schema.names], preserve_index=False)
+    return table.cast(schema)
@@ -0,0 +1,141 @@
+"""
+Mergeable quantile sketches for the mart builders.
+
+Cost and duration distributions are heavily skewed, so the marts carry a
+t-digest of each next to the means: a few dozen centroids (mean, weight)
+that summarize a group's values, dense at the tails and coarse in the
+middle. Two digests merge by pooling their centroids and compressing
+again, so per-batch or per-partition digests (out-of-core / parallel
+transforms) and mart rows (the API, across providers or months) combine
+without going back to the facts.
+
+Compression is vectorized over groups: centroids are sorted by (group,
+mean), each one's cumulative-weight midpoint q within its group is mapped
+through the scale function k(q) = COMPRESSION / 2π · asin(2q − 1), and
+centroids in the same unit k-bucket are pooled. A group keeps at most
+about COMPRESSION / 2 centroids; groups of at most COMPRESSION / 2 values
+are not pooled, so their digests stay exact.
+
+Serialized form, one value per group (Arrow binary, BYTES in the
+warehouse; api/core/sketches.py reads it): little-endian float64
+[min, max, mean_1 .. mean_k, weight_1 .. weight_k], null when the group
+has no values.
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+COMPRESSION = 100
+
+
+def _compress(groups: np.ndarray, means: np.ndarray, weights: np.ndarray):
+    """
+    Pool the centroids of every group into k-buckets → (groups, means, weights), sorted.
+    api/core/sketches.py has the same function (the API does not import etl/); tests/test_sketches.py
+    keeps the two, and the two decoders, in step.
+    """
+    order = np.lexsort((means, groups))
+    groups, means, weights = groups[order], means[order], weights[order]
+    if not len(groups):
+        return groups, means, weights
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    totals = np.add.reduceat(weights, starts)
+    sizes = np.diff(np.r_[starts, len(groups)])
+    before = np.cumsum(weights) - weights - np.repeat(np.cumsum(weights)[starts] - weights[starts], sizes)
+    q = (before + weights / 2) / np.repeat(totals, sizes)
+    bucket = np.floor(COMPRESSION / (2 * np.pi) * np.arcsin(np.clip(2 * q - 1, -1, 1))).astype(np.int64)
+    exact = np.repeat(totals <= COMPRESSION / 2, sizes)   # small groups keep every centroid
+    bucket[exact] = COMPRESSION + np.flatnonzero(exact)
+
+    bounds = np.flatnonzero(np.r_[True, (groups[1:] != groups[:-1]) | (bucket[1:] != bucket[:-1])])
+    pooled = np.add.reduceat(weights, bounds)
+    return groups[bounds], np.add.reduceat(means * weights, bounds) / pooled, pooled
+
+
+def _encode(n: int, groups: np.ndarray, means: np.ndarray, weights: np.ndarray,
+            minimum: np.ndarray, maximum: np.ndarray) -> pa.Array:
+    """Compressed centroids (sorted by group) → one binary digest per group 0..n-1."""
+    counts = np.bincount(groups, minlength=n)
+    lengths = np.where(counts > 0, 2 + 2 * counts, 0)
+    starts = np.r_[0, np.cumsum(lengths)]
+    values = np.empty(starts[-1], dtype="<f8")
+    present = np.flatnonzero(counts)
+    values[starts[present]] = minimum[present]
+    values[starts[present] + 1] = maximum[present]
+    first = np.r_[0, np.cumsum(counts)][groups]            # first centroid of each centroid's group
+    position = starts[groups] + 2 + np.arange(len(groups)) - first
+    values[position] = means
+    values[position + counts[groups]] = weights
+    valid = pa.array(counts > 0).buffers()[1]
+    return pa.Array.from_buffers(pa.binary(), n, [valid, pa.py_buffer((starts * 8).astype(np.int32)),
+                                                  pa.py_buffer(values)])
+
+
+def _decode(blobs: pa.Array):
+    """Binary digests → (row of each centroid, means, weights, minimum per row, maximum per row)."""
+    offsets = np.frombuffer(blobs.buffers()[1], dtype=np.int32)[blobs.offset:blobs.offset + len(blobs) + 1]
+    data = blobs.buffers()[2]
+    values = np.frombuffer(data, dtype="<f8", count=(offsets[-1] - offsets[0]) // 8, offset=offsets[0]) \
+        if data is not None and offsets[-1] > offsets[0] else np.empty(0)
+    starts = (offsets[:-1] - offsets[0]) // 8
+    counts = np.maximum((offsets[1:] - offsets[:-1]) // 8 - 2, 0) // 2
+    present = counts > 0
+    minimum = np.full(len(blobs), np.nan)
+    maximum = np.full(len(blobs), np.nan)
+    minimum[present] = values[starts[present]]
+    maximum[present] = values[starts[present] + 1]
+    rows = np.repeat(np.arange(len(blobs)), counts)
+    position = starts[rows] + 2 + np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return rows, values[position], values[position + counts[rows]], minimum, maximum
+
+
+def _extremes(n: int, groups: np.ndarray, low: np.ndarray, high: np.ndarray) -> tuple:
+    """(min of low, max of high) per group 0..n-1 (NaN for a group without rows)."""
+    order = np.argsort(groups, kind="stable")
+    groups = groups[order]
+    minimum, maximum = np.full(n, np.nan), np.full(n, np.nan)
+    if len(groups):
+        starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+        minimum[groups[starts]] = np.minimum.reduceat(low[order], starts)
+        maximum[groups[starts]] = np.maximum.reduceat(high[order], starts)
+    return minimum, maximum
+
+
+def _group_codes(df: pd.DataFrame, keys: list) -> tuple:
+    """(group number per row, -1 for null keys; group count) in groupby(keys) order."""
+    codes = df.groupby(keys, sort=True).ngroup().to_numpy()
+    return codes, int(codes.max()) + 1 if len(codes) else 0
+
+
+def sketch_columns(df: pd.DataFrame, keys: list, columns: dict) -> dict:
+    """
+    Digests of the values of each column per group of `keys` ({output name:
+    column}), aligned with df.groupby(keys).agg(...) rows.
+    """
+    codes, n = _group_codes(df, keys)
+    out = {}
+    for name, column in columns.items():
+        values = pd.to_numeric(df[column], errors="coerce").to_numpy(dtype=np.float64)
+        keep = (codes >= 0) & ~np.isnan(values)
+        groups, values = codes[keep], values[keep]
+        centroids = _compress(groups, values, np.ones(len(values)))
+        out[name] = _encode(n, *centroids, *_extremes(n, groups, values, values)).to_numpy(zero_copy_only=False)
+    return out
+
+
+def merge_sketch_columns(df: pd.DataFrame, keys: list, names: list) -> dict:
+    """
+    Merge the digest columns `names` of rows sharing a group of `keys`,
+    aligned with df.groupby(keys).agg(...) rows.
+    """
+    codes, n = _group_codes(df, keys)
+    out = {}
+    for name in names:
+        rows, means, weights, row_min, row_max = _decode(pa.array(df[name].to_numpy(dtype=object), type=pa.binary()))
+        keep = codes[rows] >= 0
+        centroids = _compress(codes[rows][keep], means[keep], weights[keep])
+        known = (codes >= 0) & ~np.isnan(row_min)
+        extremes = _extremes(n, codes[known], row_min[known], row_max[known])
+        out[name] = _encode(n, *centroids, *extremes).to_numpy(zero_copy_only=False)
+    return out
@@ -2,7 +2,24 @@
 Transform module: Clean data, calculate healthcare metrics, build star schema tables.
 """
 
+import os
+
+import numpy as np
 import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+from etl.instrumentation import traced
+from etl.transform.sketches import sketch_columns
+
+# HRRP counts an unplanned readmission within 30 days of discharge
+READMISSION_WINDOW_DAYS = int(os.getenv("ETL_READMISSION_WINDOW_DAYS", "30"))
+# Two providers are linked in the network when they share at least this many patients
+NETWORK_MIN_SHARED_PATIENTS = int(os.getenv("ETL_NETWORK_MIN_SHARED_PATIENTS", "2"))
+CENTRALITY_MAX_ITERATIONS = 200
+CENTRALITY_TOLERANCE = 1e-9
+# Quantile sketch columns of the encounter marts → the fact column they summarize (etl/transform/sketches.py)
+MART_SKETCHES = {"cost_sketch": "total_cost", "duration_sketch": "duration_hours"}
 
 def transform_all(raw_data: dict) -> dict:
     """
@@ -16,26 +33,41 @@ def transform_all(raw_data: dict) -> dict:
     dim_patients = build_dim_patients(raw_data["patients"])
     dim_conditions = build_dim_conditions(raw_data["conditions"])
     dim_date = build_dim_date(raw_data["encounters"])
+    dim_organizations = build_dim_organizations(raw_data["organizations"])
 
     # Build facts
     fact_encounters = build_fact_encounters(raw_data["encounters"], dim_providers, dim_patients, dim_date)
     fact_procedures = build_fact_procedures(raw_data["procedures"], dim_patients, dim_date)
+    fact_conditions = build_fact_conditions(raw_data["conditions"])
     fact_readmissions = build_fact_readmissions(raw_data["readmissions"])
+    fact_patient_readmissions = build_fact_patient_readmissions(fact_encounters)
 
     # Build data marts
-    mart_provider_productivity = build_mart_provider_productivity(fact_encounters,dim_providers)
+    mart_provider_productivity = build_mart_provider_productivity(fact_encounters, dim_providers, dim_organizations)
     mart_appointment_analytics = build_mart_appointment_analytics(fact_encounters, dim_date)
+    mart_provider_readmissions = build_mart_provider_readmissions(
+        fact_patient_readmissions, dim_providers, dim_organizations)
+    pairs = patient_provider_pairs(fact_encounters)
+    mart_provider_network = build_mart_provider_network(pairs)
+    mart_provider_centrality = build_mart_provider_centrality(
+        mart_provider_network, pairs, dim_providers, dim_organizations)
 
     transformed = {
         "dim_providers": dim_providers,
         "dim_patients": dim_patients,
         "dim_conditions": dim_conditions,
         "dim_date": dim_date,
+        "dim_organizations": dim_organizations,
         "fact_encounters": fact_encounters,
         "fact_procedures": fact_procedures,
+        "fact_conditions": fact_conditions,
         "fact_readmissions": fact_readmissions,
+        "fact_patient_readmissions": fact_patient_readmissions,
         "mart_provider_productivity": mart_provider_productivity,
         "mart_appointment_analytics": mart_appointment_analytics,
+        "mart_provider_readmissions": mart_provider_readmissions,
+        "mart_provider_network": mart_provider_network,
+        "mart_provider_centrality": mart_provider_centrality,
     }
 
     for name, df in transformed.items():
@@ -46,22 +78,36 @@ def transform_all(raw_data: dict) -> dict:
 
 # ---- Dimension Builders ----
 
+@traced("transform.dim_providers")
 def build_dim_providers(providers_df: pd.DataFrame) -> pd.DataFrame:
     """Build provider dimension table."""
     dim = providers_df.copy()
 
     dim = dim.rename(columns={
         "provider_id": "provider_key",
-        "organization_id": "organization_key"
+        "organization": "organization_key"
     })
 
     dim["provider_id"] = dim["provider_key"]
+    dim["provider_name"] = canonical_provider_names(dim["name"])
 
     dim["speciality"] = dim["speciality"].fillna("Unknown")
 
     return dim
 
 
+def canonical_provider_names(names: pd.Series) -> pd.Series:
+    """Display form of Synthea provider names: digits removed, whitespace collapsed, title case."""
+    return (
+        names
+        .str.replace(r"\d+", "", regex=True)
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+        .str.title()
+    )
+
+
+@traced("transform.dim_patients")
 def build_dim_patients(patients_df: pd.DataFrame) -> pd.DataFrame:
     """Build patient dimension with derived fields."""
     dim = patients_df.copy()
@@ -73,7 +119,7 @@ def build_dim_patients(patients_df: pd.DataFrame) -> pd.DataFrame:
     dim["full_name"] = dim["full_name"].str.strip()
 
     # Calculate age
-    dim["birthdate"] = pd.to_datetime(dim["birthdate"], errors="coerce")
+    dim["birthdate"] = _datetimes(dim["birthdate"])
     today = pd.Timestamp.now()
     dim["age"] = dim["birthdate"].apply(
         lambda x: int((today - x).days / 365.25) if pd.notna(x) else None
@@ -88,6 +134,7 @@ def build_dim_patients(patients_df: pd.DataFrame) -> pd.DataFrame:
     return dim
 
 
+@traced("transform.dim_conditions")
 def build_dim_conditions(conditions_df: pd.DataFrame) -> pd.DataFrame:
     """Build condition dimension (unique codes)."""
     dim = conditions_df[["code", "description"]].drop_duplicates().reset_index(drop=True)
@@ -95,30 +142,26 @@ def build_dim_conditions(conditions_df: pd.DataFrame) -> pd.DataFrame:
     return dim[["condition_key", "code", "description"]]
 
 
+@traced("transform.dim_date")
 def build_dim_date(encounters_df: pd.DataFrame) -> pd.DataFrame:
     """Build date dimension from encounter dates."""
-    encounters_df["start_datetime"] = pd.to_datetime(encounters_df["start_datetime"], errors="coerce")
-    dates = encounters_df["start_datetime"].dropna().dt.date.unique()
-    dates = sorted(dates)
-
-    records = []
-    for d in dates:
-        dt = pd.Timestamp(d)
-        records.append({
-            "date_key": int(dt.strftime("%Y%m%d")),
-            "full_date": d,
-            "year": dt.year,
-            "quarter": dt.quarter,
-            "month": dt.month,
-            "month_name": dt.strftime("%B"),
-            "week": dt.isocalendar()[1],
-            "day_of_week": dt.dayofweek,
-            "day_name": dt.strftime("%A"),
-            "is_weekend": dt.dayofweek >= 5,
-        })
-
-    return pd.DataFrame(records)
+    encounters_df["start_datetime"] = _datetimes(encounters_df["start_datetime"])
+    days = pd.DatetimeIndex(encounters_df["start_datetime"].dropna().dt.normalize().unique()).sort_values()
+
+    return pd.DataFrame({
+        "date_key": (days.year * 10000 + days.month * 100 + days.day).astype("int64"),
+        "full_date": days.date,
+        "year": days.year.astype("int64"),
+        "quarter": days.quarter.astype("int64"),
+        "month": days.month.astype("int64"),
+        "month_name": days.month_name(),
+        "week": days.isocalendar()["week"].to_numpy(dtype="int64"),
+        "day_of_week": days.dayofweek.astype("int64"),
+        "day_name": days.day_name(),
+        "is_weekend": days.dayofweek >= 5,
+    })
 
+@traced("transform.dim_organizations")
 def build_dim_organizations(org_df: pd.DataFrame) -> pd.DataFrame:
     """Build organization dimension table."""
     dim = org_df.copy()
@@ -133,12 +176,25 @@ def build_dim_organizations(org_df: pd.DataFrame) -> pd.DataFrame:
 
 # ---- Fact Builders ----
 
+def _datetimes(values: pd.Series) -> pd.Series:
+    """Parse to datetime64, skipping columns that already are (to_datetime still samples them for its cache)."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    return pd.to_datetime(values, errors="coerce")
+
+
+def date_keys(timestamps: pd.Series) -> pd.Series:
+    """YYYYMMDD dim_date keys; missing timestamps give <NA> (quarantined by etl/validate.py)."""
+    return (timestamps.dt.year * 10000 + timestamps.dt.month * 100 + timestamps.dt.day).astype("Int64")
+
+
+@traced("transform.fact_encounters")
 def build_fact_encounters(encounters_df, dim_providers, dim_patients, dim_date):
     """Build encounter fact table with calculated duration."""
     fact = encounters_df.copy()
 
-    fact["start_datetime"] = pd.to_datetime(fact["start_datetime"], errors="coerce")
-    fact["end_datetime"] = pd.to_datetime(fact["end_datetime"], errors="coerce")
+    fact["start_datetime"] = _datetimes(fact["start_datetime"])
+    fact["end_datetime"] = _datetimes(fact["end_datetime"])
 
     # Calculate duration in hours
     fact["duration_hours"] = (
@@ -148,7 +204,7 @@ def build_fact_encounters(encounters_df, dim_providers, dim_patients, dim_date):
     # Create keys
     fact["patient_key"] = fact["patient_id"]
     fact["provider_key"] = fact["provider_id"]
-    fact["date_key"] = fact["start_datetime"].dt.strftime("%Y%m%d").astype(int)
+    fact["date_key"] = date_keys(fact["start_datetime"])
 
     # Cast cost
     fact["total_cost"] = pd.to_numeric(fact["total_cost"], errors="coerce").fillna(0)
@@ -161,12 +217,13 @@ def build_fact_encounters(encounters_df, dim_providers, dim_patients, dim_date):
     return fact[columns]
 
 
+@traced("transform.fact_procedures")
 def build_fact_procedures(procedures_df, dim_patients, dim_date):
     """Build procedure fact table."""
     fact = procedures_df.copy()
-    fact["performed_datetime"] = pd.to_datetime(fact["performed_datetime"], errors="coerce")
+    fact["performed_datetime"] = _datetimes(fact["performed_datetime"])
     fact["patient_key"] = fact["patient_id"]
-    fact["date_key"] = fact["performed_datetime"].dt.strftime("%Y%m%d").astype(int)
+    fact["date_key"] = date_keys(fact["performed_datetime"])
     fact["cost"] = pd.to_numeric(fact["cost"], errors="coerce").fillna(0)
 
     columns = ["procedure_id", "patient_key", "encounter_id", "date_key",
@@ -174,6 +231,26 @@ def build_fact_procedures(procedures_df, dim_patients, dim_date):
     return fact[columns]
 
 
+@traced("transform.fact_conditions")
+def build_fact_conditions(conditions_df):
+    """Build condition fact table: one row per diagnosis, active while it has no abatement date."""
+    fact = conditions_df.copy()
+    fact["onset_datetime"] = _datetimes(fact["onset_date"])
+    fact["abatement_datetime"] = _datetimes(fact["abatement_date"])
+    fact["patient_key"] = fact["patient_id"]
+    fact["condition_key"] = fact["code"]
+    fact["date_key"] = date_keys(fact["onset_datetime"])
+    fact["is_active"] = fact["abatement_datetime"].isna()
+    fact["duration_days"] = (
+        (fact["abatement_datetime"] - fact["onset_datetime"]).dt.total_seconds() / 86400
+    ).round(2)
+
+    columns = ["condition_id", "patient_key", "encounter_id", "condition_key", "date_key",
+               "onset_datetime", "abatement_datetime", "is_active", "duration_days"]
+    return fact[columns]
+
+
+@traced("transform.fact_readmissions")
 def build_fact_readmissions(readmissions_df):
     """Build readmissions fact table."""
     fact = readmissions_df.copy()
@@ -185,8 +262,8 @@ def build_fact_readmissions(readmissions_df):
     for col in numeric_cols:
         fact[col] = pd.to_numeric(fact[col], errors="coerce").fillna(0)
 
-    fact["start_date"] = pd.to_datetime(fact["start_date"], errors="coerce")
-    fact["end_date"] = pd.to_datetime(fact["end_date"], errors="coerce")
+    fact["start_date"] = _datetimes(fact["start_date"])
+    fact["end_date"] = _datetimes(fact["end_date"])
 
     columns = ["readmission_id", "hospital_id", "hospital_name", "measure_name",
                "number_of_discharges", "expected_readmission_rate",
@@ -195,10 +272,87 @@ def build_fact_readmissions(readmissions_df):
     return fact[columns]
 
 
+# ---- Readmission Linkage ----
+
+INPATIENT_STAY_COLUMNS = ["encounter_id", "patient_key", "provider_key", "encounter_class",
+                          "start_datetime", "end_datetime"]
+
+
+def inpatient_stays(fact_encounters):
+    """Inpatient encounters with an admission and a discharge time: the candidate index stays."""
+    mask = (
+        fact_encounters["encounter_class"].eq("inpatient")
+        & fact_encounters["patient_key"].notna()
+        & fact_encounters["start_datetime"].notna()
+        & fact_encounters["end_datetime"].notna()
+    )
+    return fact_encounters.loc[mask, INPATIENT_STAY_COLUMNS]
+
+
+@traced("transform.fact_patient_readmissions")
+def build_fact_patient_readmissions(fact_encounters, window_days=None):
+    """
+    Link every inpatient stay to the patient's next inpatient admission.
+
+    One row per index stay. A stay counts as readmitted when the same patient
+    is admitted again no earlier than its discharge and within window_days
+    of it (stays that overlap the index stay are transfers, not readmissions).
+    Stays are sorted once by (patient, admission time) and each discharge is
+    binary-searched in that order, so there is no self-join.
+    """
+    window_days = READMISSION_WINDOW_DAYS if window_days is None else window_days
+    stays = inpatient_stays(fact_encounters)
+
+    patient = pd.factorize(stays["patient_key"], sort=True)[0]
+    admit = stays["start_datetime"].to_numpy(dtype="datetime64[ns]")
+    discharge = stays["end_datetime"].to_numpy(dtype="datetime64[ns]")
+    order = np.lexsort((admit, patient))
+    patient, admit, discharge = patient[order], admit[order], discharge[order]
+    stays = stays.iloc[order].reset_index(drop=True)
+
+    # (patient, seconds) packed into one sortable int64 key
+    admit_s = admit.astype("datetime64[s]").astype("int64")
+    discharge_s = discharge.astype("datetime64[s]").astype("int64")
+    origin = min(admit_s.min(), discharge_s.min()) if len(stays) else 0
+    span = max(admit_s.max(), discharge_s.max()) - origin + 1 if len(stays) else 1
+    if len(stays) and (patient.max() + 1) > np.iinfo("int64").max // span:
+        raise OverflowError("Too many patients for the packed readmission key")
+    admit_key = patient * span + (admit_s - origin)
+    discharge_key = patient * span + (discharge_s - origin)
+
+    # first admission of the same patient at or after each discharge (never the stay itself)
+    rows = np.arange(len(stays))
+    nxt = np.maximum(np.searchsorted(admit_key, discharge_key, side="left"), rows + 1)
+    found = nxt < len(stays)
+    nxt = np.where(found, nxt, rows)
+    found &= patient[nxt] == patient
+    gap = (admit[nxt] - discharge) / np.timedelta64(1, "D")
+    readmitted = found & (gap >= 0) & (gap <= window_days)
+
+    fact = stays[["encounter_id", "patient_key", "provider_key"]].copy()
+    fact["admit_datetime"] = stays["start_datetime"]
+    fact["discharge_datetime"] = stays["end_datetime"]
+    fact["date_key"] = date_keys(fact["discharge_datetime"]).astype("int64")
+    fact["length_of_stay_days"] = ((discharge - admit) / np.timedelta64(1, "D")).round(2)
+    fact["readmit_encounter_id"] = stays["encounter_id"].to_numpy()[nxt]
+    fact["readmit_datetime"] = stays["start_datetime"].to_numpy()[nxt]
+    fact.loc[~readmitted, ["readmit_encounter_id", "readmit_datetime"]] = None
+    fact["days_to_readmission"] = np.where(readmitted, gap, np.nan).round(2)
+    fact["is_readmitted"] = readmitted
+    fact["window_days"] = window_days
+
+    columns = ["encounter_id", "patient_key", "provider_key", "date_key",
+               "admit_datetime", "discharge_datetime", "length_of_stay_days",
+               "readmit_encounter_id", "readmit_datetime", "days_to_readmission",
+               "is_readmitted", "window_days"]
+    return fact[columns]
+
+
 # ---- Data Mart Builders ----
 
+@traced("transform.mart_provider_productivity")
 def build_mart_provider_productivity(fact_encounters, dim_providers, dim_organizations):
-    """Build provider productivity data mart."""
+    """Build provider productivity data mart, with cost and duration sketches per provider."""
     
     agg = fact_encounters.groupby("provider_key").agg(
         total_encounters=("encounter_id", "count"),
@@ -209,16 +363,32 @@ def build_mart_provider_productivity(fact_encounters, dim_providers, dim_organiz
         first_encounter=("start_datetime", "min"),
         last_encounter=("start_datetime", "max"),
     ).reset_index()
+    agg = agg.assign(**sketch_columns(fact_encounters, ["provider_key"], MART_SKETCHES))
+    return finish_mart_provider_productivity(agg, dim_providers, dim_organizations)
+
+
+def finish_mart_provider_productivity(agg, dim_providers, dim_organizations):
+    """Round the per-provider aggregates and attach provider/organization attributes."""
+    agg = agg.copy()
 
     # Round numeric columns
     agg["avg_encounter_duration_hrs"] = agg["avg_encounter_duration_hrs"].round(2)
     agg["total_revenue"] = agg["total_revenue"].round(2)
     agg["avg_cost_per_encounter"] = agg["avg_cost_per_encounter"].round(2)
 
+    mart = attach_provider_attributes(agg, dim_providers, dim_organizations)
+    # Lower-cased copy for server-side name search (search-indexed in BigQuery)
+    mart["provider_search_name"] = mart["provider_name"].str.lower()
+
+    return mart
+
+
+def attach_provider_attributes(agg, dim_providers, dim_organizations):
+    """Join provider and organization attributes onto per-provider rows."""
     # -----------------------------
     # Merge Provider Dimension
     # -----------------------------
-    provider_cols = ["provider_key", "provider_id", "name", "speciality", "organization_key"]
+    provider_cols = ["provider_key", "provider_id", "provider_name", "speciality", "organization_key"]
     mart = agg.merge(
         dim_providers[provider_cols],
         on="provider_key",
@@ -234,26 +404,16 @@ def build_mart_provider_productivity(fact_encounters, dim_providers, dim_organiz
         how="left"
     )
 
-    # Rename provider name column
-    mart = mart.rename(columns={"name": "provider_name"})
-
-    # Clean provider name (remove numbers + format)
-    mart["provider_name"] = (
-        mart["provider_name"]
-        .str.replace(r"\d+", "", regex=True)
-        .str.strip()
-        .str.title()
-    )
-
     return mart
 
 
+@traced("transform.mart_appointment_analytics")
 def build_mart_appointment_analytics(fact_encounters, dim_date):
-    """Build appointment analytics data mart."""
+    """Build appointment analytics data mart, with cost and duration sketches per row."""
     merged = fact_encounters.merge(dim_date, on="date_key", how="left")
+    keys = ["year", "quarter", "month", "month_name", "encounter_type", "encounter_class"]
 
-    agg = merged.groupby(["year", "quarter", "month", "month_name",
-                           "encounter_type", "encounter_class"]).agg(
+    agg = merged.groupby(keys).agg(
         encounter_count=("encounter_id", "count"),
         unique_patients=("patient_key", "nunique"),
         unique_providers=("provider_key", "nunique"),
@@ -261,9 +421,137 @@ def build_mart_appointment_analytics(fact_encounters, dim_date):
         total_cost=("total_cost", "sum"),
         avg_cost=("total_cost", "mean"),
     ).reset_index()
+    agg = agg.assign(**sketch_columns(merged, keys, MART_SKETCHES))
+    return finish_mart_appointment_analytics(agg)
+
 
+def finish_mart_appointment_analytics(agg):
+    """Round the per-period aggregates."""
+    agg = agg.copy()
     agg["avg_duration_hrs"] = agg["avg_duration_hrs"].round(2)
     agg["total_cost"] = agg["total_cost"].round(2)
     agg["avg_cost"] = agg["avg_cost"].round(2)
 
-    return agg
\ No newline at end of file
+    return agg
+
+
+@traced("transform.mart_provider_readmissions")
+def build_mart_provider_readmissions(fact_patient_readmissions, dim_providers, dim_organizations):
+    """
+    Build the per-provider readmission mart, shaped like the CMS HRRP measures.
+
+    Index stays are attributed to the discharging provider. Rates are in
+    percent like HRRP's; the expected rate is the rate over all linked stays
+    (no case-mix adjustment), so the excess ratio is observed / population.
+    """
+    agg = fact_patient_readmissions.groupby("provider_key").agg(
+        number_of_discharges=("encounter_id", "count"),
+        number_of_readmissions=("is_readmitted", "sum"),
+        avg_days_to_readmission=("days_to_readmission", "mean"),
+    ).reset_index()
+
+    discharges = agg["number_of_discharges"].sum()
+    expected = 100 * agg["number_of_readmissions"].sum() / discharges if discharges else np.nan
+    agg["observed_readmission_rate"] = (100 * agg["number_of_readmissions"] / agg["number_of_discharges"]).round(4)
+    agg["expected_readmission_rate"] = round(expected, 4)
+    agg["excess_readmission_ratio"] = (agg["observed_readmission_rate"] / expected).round(4) if expected else np.nan
+    agg["avg_days_to_readmission"] = agg["avg_days_to_readmission"].round(2)
+
+    return attach_provider_attributes(agg, dim_providers, dim_organizations)
+
+
+# ---- Provider Network ----
+
+def patient_provider_pairs(fact_encounters):
+    """Distinct (patient_key, provider_key) pairs: who has seen whom."""
+    return fact_encounters[["patient_key", "provider_key"]].dropna().drop_duplicates(ignore_index=True)
+
+
+def _incidence(pairs):
+    """Sparse 0/1 patient × provider matrix of the pairs, and the provider keys of its columns."""
+    patients = pd.factorize(pairs["patient_key"])[0]
+    providers, provider_keys = pd.factorize(pairs["provider_key"], sort=True)
+    incidence = sp.csr_matrix((np.ones(len(pairs), dtype=np.int32), (patients, providers)),
+                              shape=(patients.max() + 1 if len(pairs) else 0, len(provider_keys)))
+    incidence.data[:] = 1   # a pair listed twice is still one patient
+    return incidence, np.asarray(provider_keys, dtype=object)
+
+
+@traced("transform.mart_provider_network")
+def build_mart_provider_network(pairs, min_shared=None):
+    """
+    Build the shared-patient provider network as an edge list.
+
+    With B the sparse patient × provider incidence matrix, B.T @ B holds the
+    number of patients every two providers have both seen (its diagonal is
+    each provider's own patient count). The product only touches provider
+    pairs that actually share a patient, so there is no provider self-join.
+    Edges with at least min_shared shared patients are kept, once in each
+    direction: a provider's neighbors are one contiguous slice, strongest first.
+    """
+    min_shared = NETWORK_MIN_SHARED_PATIENTS if min_shared is None else min_shared
+    incidence, keys = _incidence(pairs)
+    shared = (incidence.T @ incidence).tocsr()
+    patients = shared.diagonal()
+
+    edges = sp.triu(shared, k=1).tocoo()
+    keep = edges.data >= max(min_shared, 1)
+    a, b, weight = edges.row[keep], edges.col[keep], edges.data[keep]
+    source, target, weight = np.r_[a, b], np.r_[b, a], np.r_[weight, weight]
+
+    network = pd.DataFrame({
+        "provider_key": keys[source],
+        "neighbor_key": keys[target],
+        "shared_patients": weight.astype("int64"),
+        "jaccard": (weight / (patients[source] + patients[target] - weight)).round(4),
+    })
+    network = network.sort_values(["provider_key", "shared_patients", "neighbor_key"],
+                                  ascending=[True, False, True], kind="stable", ignore_index=True)
+    network["neighbor_rank"] = network.groupby("provider_key").cumcount() + 1
+    return network
+
+
+@traced("transform.mart_provider_centrality")
+def build_mart_provider_centrality(mart_provider_network, pairs, dim_providers, dim_organizations):
+    """
+    Per-provider metrics of the shared-patient network: degree (linked
+    providers), weighted degree (shared patients over all links), degree
+    centrality (degree / (providers - 1)), eigenvector centrality (scaled so
+    the most central provider is 1) and the connected component.
+    """
+    incidence, keys = _incidence(pairs)
+    position = pd.Index(keys)
+    rows = position.get_indexer(mart_provider_network["provider_key"])
+    cols = position.get_indexer(mart_provider_network["neighbor_key"])
+    n = len(keys)
+    adjacency = sp.csr_matrix((mart_provider_network["shared_patients"].to_numpy(dtype=np.float64), (rows, cols)),
+                              shape=(n, n))
+
+    agg = pd.DataFrame({"provider_key": keys})
+    agg["patients"] = np.asarray(incidence.sum(axis=0)).ravel().astype("int64")
+    agg["degree"] = np.diff(adjacency.indptr)
+    agg["weighted_degree"] = np.asarray(adjacency.sum(axis=1)).ravel().astype("int64")
+    agg["degree_centrality"] = (agg["degree"] / (n - 1)).round(6) if n > 1 else 0.0
+    agg["eigenvector_centrality"] = _eigenvector_centrality(adjacency).round(6)
+    n_components, labels = connected_components(adjacency, directed=False)
+    agg["component"] = labels
+    agg["component_size"] = np.bincount(labels, minlength=n_components)[labels]
+
+    return attach_provider_attributes(agg, dim_providers, dim_organizations)
+
+
+def _eigenvector_centrality(adjacency):
+    """Leading eigenvector of a symmetric non-negative matrix by power iteration, max-scaled."""
+    n = adjacency.shape[0]
+    if n == 0 or adjacency.nnz == 0:
+        return np.zeros(n)
+    x = np.full(n, 1 / np.sqrt(n))
+    for _ in range(CENTRALITY_MAX_ITERATIONS):
+        # (A + I) x: same eigenvectors, no oscillation on bipartite-like graphs
+        nxt = adjacency @ x + x
+        nxt /= np.linalg.norm(nxt)
+        done = np.abs(nxt - x).max() < CENTRALITY_TOLERANCE
+        x = nxt
+        if done:
+            break
+    return x / x.max()
@@ -0,0 +1,384 @@
+"""
+Data-quality validation between transform and load.
+
+Each table's rules are declared in RULES and evaluated as whole-column
+operations:
+
+    not_null(column)                 the value is present
+    unique(*columns)                 no earlier row has the same key (the first one is kept)
+    references(column, table, key)   a present value exists in another table's key column
+    in_range(column, low, high)      a present value lies within the bounds
+    null_rate(column, max_rate)      share of missing values, over the whole table
+
+Row rules act on the rows that break them: "quarantine" takes them out of
+the table and into dq_quarantine (loaded with the other tables, one row per
+rejected row with the rules it broke), "warn" only counts them. When more
+than ETL_DQ_MAX_QUARANTINE_RATE of a table would be quarantined the input
+is treated as broken and validation fails instead. Rules with action
+"fail" stop the run on any violation.
+
+Tables are validated in RULES order, so references see their parent after
+its own quarantine: procedures and conditions of a quarantined encounter are
+quarantined too.
+Spilled fact tables (out-of-core / parallel transforms) are checked one
+batch file at a time and rewritten only when rows were quarantined.
+
+The readmission linkage and the marts are built from the facts in the
+transform. When rows are quarantined from the tables above them in RULES,
+they are rebuilt from the validated tables (derive_tables() in
+etl/transform/out_of_core.py) before the linkage is validated, and linkage
+rows quarantined in turn are taken out of mart_provider_readmissions, so
+every loaded table counts the same rows.
+
+Sampled mode (sample=fraction) is a fast pre-flight check: rules run on the
+rows whose natural-key hash falls in the sampled fraction (so every copy of
+a sampled key is in the sample and uniqueness stays exact for it), parent
+keys stay complete, and violation counts are scaled up to estimates. Tables
+under SAMPLE_MIN_ROWS rows are checked in full. Nothing is quarantined;
+limits apply to the estimated rates.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from etl.instrumentation import span
+from etl.transform.out_of_core import DERIVED_TABLES, SpilledTable, derive_tables
+from etl.transform.schema import TABLE_SCHEMAS
+from etl.transform.transform import build_mart_provider_readmissions
+
+QUARANTINE_TABLE = "dq_quarantine"
+MAX_QUARANTINE_RATE = float(os.getenv("ETL_DQ_MAX_QUARANTINE_RATE", "0.05"))
+SAMPLE_FRACTION = float(os.getenv("ETL_VALIDATE_SAMPLE", "0.01"))
+# Smaller tables are checked in full even in sampled mode
+SAMPLE_MIN_ROWS = 50_000
+
+_SAMPLE_HASH_KEY = "dq-sampled-rows-"   # hash_array keys are 16 bytes
+
+
+# ---- rule declarations ----
+
+def not_null(column, action="quarantine"):
+    return {"check": "not_null", "name": f"{column} is not null", "columns": [column], "action": action}
+
+
+def unique(*columns, action="quarantine"):
+    return {"check": "unique", "name": f"unique({', '.join(columns)})", "columns": list(columns), "action": action}
+
+
+def references(column, table, key, action="quarantine"):
+    return {"check": "references", "name": f"{column} in {table}.{key}", "columns": [column],
+            "parent": (table, key), "action": action}
+
+
+def in_range(column, low=None, high=None, action="quarantine"):
+    bounds = " and ".join(b for b in (low is not None and f">= {low}", high is not None and f"<= {high}") if b)
+    return {"check": "in_range", "name": f"{column} {bounds}", "columns": [column], "low": low, "high": high,
+            "action": action}
+
+
+def null_rate(column, max_rate, action="warn"):
+    return {"check": "null_rate", "name": f"{column} null rate <= {max_rate:.0%}", "columns": [column],
+            "max_rate": max_rate, "action": action}
+
+
+RULES = {
+    "dim_organizations": [unique("organization_key"), not_null("organization_key")],
+    "dim_providers": [
+        unique("provider_key"),
+        not_null("provider_key"),
+        references("organization_key", "dim_organizations", "organization_key", action="warn"),
+    ],
+    "dim_patients": [
+        unique("patient_key"),
+        not_null("patient_key"),
+        in_range("age", low=0, high=130, action="warn"),
+    ],
+    "dim_conditions": [unique("condition_key"), not_null("condition_key")],
+    "dim_date": [unique("date_key"), not_null("date_key")],
+    "fact_encounters": [
+        not_null("encounter_id"),
+        unique("encounter_id"),
+        not_null("start_datetime"),
+        references("patient_key", "dim_patients", "patient_key"),
+        references("provider_key", "dim_providers", "provider_key"),
+        references("date_key", "dim_date", "date_key"),
+        in_range("duration_hours", low=0),
+        in_range("total_cost", low=0),
+        null_rate("end_datetime", 0.05),
+    ],
+    "fact_procedures": [
+        not_null("procedure_id"),
+        unique("procedure_id"),
+        not_null("performed_datetime"),
+        references("patient_key", "dim_patients", "patient_key"),
+        references("encounter_id", "fact_encounters", "encounter_id"),
+        # dim_date is built from encounter start dates only
+        references("date_key", "dim_date", "date_key", action="warn"),
+        in_range("cost", low=0),
+    ],
+    "fact_conditions": [
+        not_null("condition_id"),
+        unique("condition_id"),
+        not_null("onset_datetime"),
+        references("patient_key", "dim_patients", "patient_key"),
+        references("encounter_id", "fact_encounters", "encounter_id"),
+        references("condition_key", "dim_conditions", "condition_key"),
+        in_range("duration_days", low=0),
+    ],
+    "fact_patient_readmissions": [
+        unique("encounter_id"),
+        references("encounter_id", "fact_encounters", "encounter_id"),
+        in_range("length_of_stay_days", low=0),
+        in_range("days_to_readmission", low=0),
+    ],
+    "fact_readmissions": [
+        unique("hospital_id", "measure_name"),
+        not_null("hospital_id"),
+        in_range("number_of_discharges", low=0),
+        in_range("number_of_readmissions", low=0),
+        in_range("excess_readmission_ratio", low=0, action="warn"),
+        null_rate("hospital_name", 0.01),
+    ],
+}
+
+
+# ---- validation ----
+
+def validate(transformed: dict, sample: float = None) -> tuple:
+    """
+    Validate the transform output against RULES.
+
+    Returns (tables, report): the tables without their quarantined rows plus
+    a dq_quarantine table (in sampled mode the input tables, unchanged), and
+    per table {"rows", "checked", "quarantined", "violations": {rule: rows},
+    "null_rates": {rule: share}}; sampled counts are estimates. Spilled tables
+    that had rows quarantined are rewritten and their old files released.
+    Raises RuntimeError naming the rules that failed.
+    """
+    tables = dict(transformed)
+    report, failures, quarantined = {}, [], []
+    rederived = False
+    parents = {}   # (table, key) → pd.Index of the key values
+
+    def parent_index(table, key):
+        if (table, key) not in parents:
+            values = _column(tables[table], key) if table in tables else pd.Series([], dtype=object)
+            parents[(table, key)] = pd.Index(values.dropna().unique())
+        return parents[(table, key)]
+
+    try:
+        for name, rules in RULES.items():
+            if name not in tables:
+                continue
+            if name in DERIVED_TABLES and quarantined and not rederived and sample is None:
+                _rederive(tables, lambda: derive_tables(tables))
+                rederived = True
+            table = tables[name]
+            sampled = sample if sample is not None and len(table) > SAMPLE_MIN_ROWS else None
+            with span(f"validate.{name}", sampled=sampled is not None) as s:
+                state = {"seen": {}, "counts": {}, "nulls": {}, "failed": set(), "checked": 0}
+                reasons = []
+                for batch in _batches(table, rules, sampled):
+                    if sampled is not None:
+                        batch = batch[_sampled(batch, name, sampled)]
+                    reasons.append(_check(batch, rules, state, parent_index))
+
+                rows, checked = len(table), state["checked"]
+                scale = rows / checked if sampled is not None and checked else 1
+                result = {
+                    "rows": rows,
+                    "checked": checked,
+                    "quarantined": round(sum(int(np.count_nonzero(r)) for r in reasons) * scale),
+                    "violations": {rule["name"]: round(state["counts"].get(rule["name"], 0) * scale)
+                                   for rule in rules if rule["check"] != "null_rate"},
+                    "null_rates": {rule["name"]: state["nulls"].get(rule["name"], 0) / checked if checked else 0.0
+                                   for rule in rules if rule["check"] == "null_rate"},
+                }
+                failures += _failures(name, rules, state, result)
+
+                if sample is None and result["quarantined"] and not failures:
+                    tables[name], rejected = _quarantine(table, name, rules, reasons)
+                    quarantined.append(rejected)
+                    for cached in [k for k in parents if k[0] == name]:   # children must not see rejected keys
+                        del parents[cached]
+
+                report[name] = result
+                s.set(rows_in=rows, quarantined=result["quarantined"])
+            _print_report(name, result, rules, sample, sampled is not None)
+
+        if sample is None and report.get("fact_patient_readmissions", {}).get("quarantined") and not failures:
+            _rederive(tables, lambda: {"mart_provider_readmissions": build_mart_provider_readmissions(
+                tables["fact_patient_readmissions"], tables["dim_providers"], tables["dim_organizations"])})
+        if sample is None:
+            columns = [c for c, _ in TABLE_SCHEMAS[QUARANTINE_TABLE]["columns"]]
+            tables[QUARANTINE_TABLE] = (pd.concat(quarantined, ignore_index=True) if quarantined
+                                        else pd.DataFrame({c: pd.Series([], dtype=object) for c in columns}))
+        if failures:
+            for failure in failures:
+                print(f"    ❌ {failure}")
+            raise RuntimeError(f"Validation failed: {'; '.join(failures)}")
+    except BaseException:
+        for name, table in tables.items():   # rewritten spill files of a run that does not go on
+            if isinstance(table, SpilledTable) and table is not transformed.get(name):
+                table.release()
+        raise
+    return tables, report
+
+
+def _rederive(tables: dict, build):
+    """Swap in the tables build() rebuilds from the validated ones."""
+    with span("validate.rederive"):
+        derived = build()
+        for name, table in derived.items():
+            if name in tables:
+                tables[name] = table
+    print(f"    ↺ rebuilt {', '.join(n for n in derived if n in tables)} without the quarantined rows")
+
+
+def _check(df: pd.DataFrame, rules: list, state: dict, parent_index) -> np.ndarray:
+    """
+    Evaluate the rules on one batch. Returns per row a bit mask of the
+    quarantine rules it broke (bit i = rules[i]); 0 keeps the row.
+    """
+    reasons = np.zeros(len(df), dtype=np.uint64)
+    state["checked"] += len(df)
+    for i, rule in enumerate(rules):
+        column = rule["columns"][0]
+        check = rule["check"]
+        if check == "null_rate":
+            state["nulls"][rule["name"]] = state["nulls"].get(rule["name"], 0) + int(df[column].isna().sum())
+            continue
+        if check == "not_null":
+            broken = df[column].isna().to_numpy()
+        elif check == "unique":
+            broken = _duplicates(df[rule["columns"]], state["seen"].setdefault(rule["name"], {}))
+        elif check == "references":
+            broken = _missing_from(parent_index(*rule["parent"]), df[column])
+        elif check == "in_range":
+            values = df[column].to_numpy(dtype="float64", na_value=np.nan)
+            broken = np.zeros(len(df), dtype=bool)
+            if rule["low"] is not None:
+                broken |= values < rule["low"]
+            if rule["high"] is not None:
+                broken |= values > rule["high"]
+        else:
+            raise ValueError(f"Unknown validation check {check!r}")
+
+        count = int(np.count_nonzero(broken))
+        state["counts"][rule["name"]] = state["counts"].get(rule["name"], 0) + count
+        if rule["action"] == "quarantine":
+            reasons[broken] |= np.uint64(1 << i)
+        elif rule["action"] == "fail" and count:
+            state["failed"].add(rule["name"])
+    return reasons
+
+
+def _duplicates(keys: pd.DataFrame, seen: dict) -> np.ndarray:
+    """Rows whose key appeared earlier in this batch or an earlier one; folds the batch into `seen`."""
+    hashes = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+    previous = seen.get("hashes", np.empty(0, dtype=np.uint64))
+    repeated = pd.Series(hashes).duplicated(keep="first").to_numpy()
+    if len(previous):
+        repeated |= np.isin(hashes, previous)
+    seen["hashes"] = np.union1d(previous, hashes)
+    return repeated
+
+
+def _missing_from(index: pd.Index, values: pd.Series) -> np.ndarray:
+    """Present values that are not in `index`."""
+    present = values.notna().to_numpy()
+    missing = np.zeros(len(values), dtype=bool)
+    missing[present] = index.get_indexer(values[present]) < 0
+    return missing
+
+
+def _failures(name: str, rules: list, state: dict, result: dict) -> list:
+    failures = [f"{name}: {rule} (action fail)" for rule in sorted(state["failed"])]
+    for rule in rules:
+        rate = result["null_rates"].get(rule["name"])
+        if rate is not None and rate > rule["max_rate"]:
+            message = f"{name}: {rule['name']} ({rate:.1%} missing)"
+            if rule["action"] == "fail":
+                failures.append(message)
+            else:
+                print(f"    ⚠ {message}")
+    if result["rows"] and result["quarantined"] / result["rows"] > MAX_QUARANTINE_RATE:
+        failures.append(f"{name}: {result['quarantined'] / result['rows']:.1%} of rows rejected "
+                        f"(limit {MAX_QUARANTINE_RATE:.0%}, ETL_DQ_MAX_QUARANTINE_RATE)")
+    return failures
+
+
+def _quarantine(table, name: str, rules: list, reasons: list):
+    """Split the rejected rows off a table; returns (kept table, dq_quarantine rows)."""
+    if not isinstance(table, SpilledTable):
+        bad = reasons[0] != 0
+        return table[~bad].reset_index(drop=True), _rejected_rows(table[bad], name, rules, reasons[0][bad])
+
+    kept = SpilledTable(name, table.directory.parent)
+    rejected = []
+    try:
+        for batch, batch_reasons in zip(_batches(table, rules, None), reasons):
+            bad = batch_reasons != 0
+            if bad.any():
+                rejected.append(_rejected_rows(batch[bad], name, rules, batch_reasons[bad]))
+            kept.append(batch[~bad])
+    except BaseException:
+        kept.release()
+        raise
+    table.release()
+    return kept, pd.concat(rejected, ignore_index=True)
+
+
+def _rejected_rows(df: pd.DataFrame, name: str, rules: list, reasons: np.ndarray) -> pd.DataFrame:
+    """dq_quarantine rows: table, natural key, the rules each row broke, the row as JSON."""
+    names = {code: "; ".join(rule["name"] for i, rule in enumerate(rules) if int(code) >> i & 1)
+             for code in np.unique(reasons)}
+    key = df[TABLE_SCHEMAS[name]["natural_key"]].astype("string").fillna("")
+    return pd.DataFrame({
+        "table_name": name,
+        "row_key": key.iloc[:, 0].str.cat(key.iloc[:, 1:], sep="|") if key.shape[1] > 1 else key.iloc[:, 0],
+        "rules": pd.Series(reasons, index=df.index).map(names),
+        "row_json": df.to_json(orient="records", lines=True, date_format="iso").splitlines(),
+    }, index=df.index)
+
+
+def _batches(table, rules: list, sample):
+    """The table as DataFrames: itself, or a spilled table's batch files (only the rule columns when sampled)."""
+    if not isinstance(table, SpilledTable):
+        yield table
+        return
+    columns = None
+    if sample is not None:
+        columns = sorted({c for rule in rules for c in rule["columns"]} | set(TABLE_SCHEMAS[table.name]["natural_key"]))
+    for path in table.files():
+        yield pq.read_table(path, columns=columns).to_pandas()
+
+
+def _column(table, column: str) -> pd.Series:
+    if isinstance(table, SpilledTable):
+        return pd.concat([pq.read_table(path, columns=[column]).column(column).to_pandas() for path in table.files()]
+                         or [pd.Series([], dtype=object)], ignore_index=True)
+    return table[column]
+
+
+def _sampled(df: pd.DataFrame, name: str, fraction: float) -> np.ndarray:
+    """Rows whose natural-key hash falls in the lowest `fraction` of the hash range."""
+    keys = df[TABLE_SCHEMAS[name]["natural_key"]]
+    hashes = pd.util.hash_pandas_object(keys, index=False, hash_key=_SAMPLE_HASH_KEY).to_numpy()
+    return hashes <= np.uint64(min(fraction, 1.0) * np.iinfo(np.uint64).max)
+
+
+def _print_report(name: str, result: dict, rules: list, sample, sampled: bool):
+    found = {rule: n for rule, n in result["violations"].items() if n}
+    checked = f" ({result['checked']:,} sampled)" if sampled else ""
+    if not found:
+        print(f"    ✓ {name}: {result['rows']:,} rows{checked}, {len(rules)} rules passed")
+        return
+    approx = "~" if sampled else ""
+    warn_only = {rule["name"] for rule in rules if rule["action"] == "warn"}
+    detail = ", ".join(f"{rule}: {approx}{n:,}" + (" (warn)" if rule in warn_only else "") for rule, n in found.items())
+    verb = "would be quarantined" if sample is not None else "quarantined"
+    print(f"    ⚠ {name}: {approx}{result['quarantined']:,} rows {verb}{checked} — {detail}")
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from api.core.cohorts import ARRAY_MAX, Bitmap, CohortIndex, parse
+from etl.cohort_index import build_cohort_index
+
+N = 300_000   # five 65536-id chunks
+
+
+def _random_ids(rng, dense_chunks=()):
+    """A sorted id set: sparse over every chunk, dense (bitset containers) in `dense_chunks`."""
+    ids = [rng.choice(N, 2000, replace=False)]
+    for chunk in dense_chunks:
+        ids.append((chunk << 16) + rng.choice(1 << 16, ARRAY_MAX * 3, replace=False))
+    return np.unique(np.concatenate(ids))
+
+
+@pytest.fixture(scope="module")
+def id_sets():
+    rng = np.random.default_rng(7)
+    return _random_ids(rng, dense_chunks=(0, 2)), _random_ids(rng, dense_chunks=(2, 3))
+
+
+def test_bitmap_operations_match_set_semantics(id_sets):
+    a_ids, b_ids = id_sets
+    a, b = Bitmap.from_sorted(a_ids), Bitmap.from_sorted(b_ids)
+    a_set, b_set = set(a_ids.tolist()), set(b_ids.tolist())
+    assert {c.dtype for c in a.containers.values()} == {np.dtype(np.uint16), np.dtype(np.uint64)}
+
+    for bitmap, expected in [(a, a_set), (a & b, a_set & b_set), (a | b, a_set | b_set),
+                             (a - b, a_set - b_set), (b - a, b_set - a_set)]:
+        assert len(bitmap) == len(expected)
+        assert set(np.flatnonzero(bitmap.mask(N)).tolist()) == expected
+
+
+def test_operations_compact_containers(id_sets):
+    a_ids, _ = id_sets
+    dense = Bitmap.from_sorted(a_ids)
+    sparse = Bitmap.from_sorted(a_ids[::50])
+    # a dense chunk ANDed down to a few ids goes back to an array container
+    assert all(c.dtype == np.uint16 for c in (dense & sparse).containers.values())
+    assert len(Bitmap.full(N) - dense) == N - len(a_ids)
+    assert len(dense - dense) == 0 and not (dense - dense).containers
+
+
+def test_parse_precedence_and_errors():
+    assert parse('gender:F OR condition:"heart failure" AND NOT year:2019') == (
+        "or", ("term", "gender", "F"),
+        ("and", ("term", "condition", "heart failure"), ("not", ("term", "year", "2019"))))
+    assert parse("(gender:F OR gender:M) and year:2019")[0] == "and"
+    for bad in ["", "gender:F AND", "(gender:F", "gender:F)", "gender", "gender:F year:2019"]:
+        with pytest.raises(ValueError):
+            parse(bad)
+
+
+def test_cohort_index_evaluates_at_the_patient_level():
+    transformed = {
+        "dim_patients": pd.DataFrame({"patient_key": ["p1", "p2", "p3", "p4"], "gender": ["F", "M", "F", "M"]}),
+        "fact_encounters": pd.DataFrame({
+            "patient_key": ["p1", "p1", "p2", "p3", "p9"],
+            "provider_key": ["d1", "d2", "d1", "d2", "d1"],
+            "encounter_class": ["inpatient", "ambulatory", "ambulatory", "inpatient", "inpatient"],
+            "start_datetime": pd.to_datetime(["2019-03-01", "2020-01-01", "2019-05-01", "2020-02-01",
+                                              "2019-01-01"]),
+        }),
+        "fact_conditions": pd.DataFrame({"patient_key": ["p1", "p4"], "condition_key": ["c1", "c1"]}),
+    }
+    tables = build_cohort_index(transformed)
+    index = CohortIndex(tables["cohort_patients"], tables["cohort_index"])
+    keys = np.array(index.patient_keys.to_pylist())
+
+    def cohort(expression):
+        return set(keys[index.evaluate(parse(expression)).mask(len(index))])
+
+    assert cohort("condition:c1 AND year:2020") == {"p1"}
+    assert cohort("encounter_class_year:inpatient:2019") == {"p1"}   # p9 is not in dim_patients
+    assert cohort("encounter_class_year:inpatient:2020") == {"p3"}
+    assert cohort("gender:F AND NOT condition:c1") == {"p3"}
+    assert cohort("provider:d1 OR condition:c1") == {"p1", "p2", "p4"}
+    assert cohort("condition:unknown") == set()
+
+    values, counts = index.breakdown(index.evaluate(parse("gender:F")), "year")
+    assert dict(zip(values.to_pylist(), counts.tolist())) == {"2019": 1, "2020": 2}
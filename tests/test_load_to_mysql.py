@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip("mysql.connector")
+
+from etl.extract.identity import pack_key_counts, unpack_key_counts
+from etl.extract.sources import SOURCES
+from etl.load.load_to_mysql import plan_ingest, read_csv_rows
+
+HEADER = "START,STOP,PATIENT,ENCOUNTER,CODE,DESCRIPTION\n"
+ROW = "2019-01-0{day},,p1,e1,{code},Condition {code}\n"
+
+
+def _read(path, offset=0, end=None, seen=None):
+    spec = SOURCES["conditions"]
+    return read_csv_rows(str(path), spec["columns"], natural_key=spec["natural_key"], offset=offset, end=end,
+                         seen=seen)
+
+
+def _ingest_with_appended_duplicate(path):
+    """(staged rows, key counts, tail offset, tail end) of a file whose appended tail repeats a staged key."""
+    path.write_text(HEADER + ROW.format(day=1, code="k") + ROW.format(day=2, code="x"))
+    offset, state = plan_ingest(str(path))
+    seen = {}
+    staged = _read(path, end=state["committed_offset"], seen=seen)
+    state["key_counts"] = pack_key_counts(seen)
+
+    with open(path, "a") as f:
+        f.write(ROW.format(day=1, code="k"))   # the first row's natural key again
+    offset, state = plan_ingest(str(path), state)
+    assert offset > 0
+    return staged, state["key_counts"], offset, state["committed_offset"]
+
+
+def test_appended_duplicate_key_matches_full_load(tmp_path):
+    path = tmp_path / "conditions.csv"
+    staged, key_counts, offset, end = _ingest_with_appended_duplicate(path)
+    tail = _read(path, offset, end, seen=unpack_key_counts(key_counts))
+
+    full = _read(path)
+    assert staged + tail == full
+    assert len({row[0] for row in full}) == 3
+
+
+def test_appended_tail_without_key_counts_recounts_the_prefix(tmp_path):
+    path = tmp_path / "conditions.csv"
+    staged, _, offset, end = _ingest_with_appended_duplicate(path)
+    assert staged + _read(path, offset, end) == _read(path)
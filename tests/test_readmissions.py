@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import generate_raw
+from etl.transform import transform_all
+from etl.transform.transform import build_fact_patient_readmissions
+
+
+def _encounters(*stays):
+    """fact_encounters rows from (encounter_id, patient_key, encounter_class, start, end)."""
+    df = pd.DataFrame(stays, columns=["encounter_id", "patient_key", "encounter_class", "start_datetime",
+                                      "end_datetime"])
+    return df.assign(provider_key="d1", start_datetime=pd.to_datetime(df["start_datetime"]),
+                     end_datetime=pd.to_datetime(df["end_datetime"]))
+
+
+def _links(fact):
+    return dict(zip(fact["encounter_id"], fact["readmit_encounter_id"].where(fact["is_readmitted"], None)))
+
+
+def test_links_each_stay_to_the_next_admission_in_the_window():
+    fact = build_fact_patient_readmissions(_encounters(
+        ("a", "p1", "inpatient", "2019-01-01", "2019-01-03"),
+        ("b", "p1", "inpatient", "2019-01-10", "2019-01-12"),
+        ("c", "p1", "inpatient", "2019-03-01", "2019-03-02"),   # 48 days after b
+        ("d", "p2", "inpatient", "2019-01-01", "2019-01-05"),
+        ("e", "p2", "inpatient", "2019-01-04", "2019-01-08"),   # admitted before d's discharge: a transfer
+        ("f", "p3", "inpatient", "2019-01-01", "2019-01-02"),
+        ("g", "p3", "ambulatory", "2019-01-05", "2019-01-05"),  # not an admission
+        ("h", "p4", "inpatient", "2019-01-01", "2019-01-02"),
+        ("i", "p4", "inpatient", "2019-02-01", "2019-02-03"),   # exactly 30 days: inside the window
+    ), window_days=30)
+
+    assert len(fact) == 8
+    assert _links(fact) == {"a": "b", "b": None, "c": None, "d": None, "e": None, "f": None, "h": "i", "i": None}
+    assert fact.set_index("encounter_id").loc["a", "days_to_readmission"] == 7
+    assert fact["window_days"].eq(30).all()
+
+
+def test_matches_a_brute_force_self_join():
+    fact_encounters = transform_all(generate_raw(3000, seed=5))["fact_encounters"]
+    fact = build_fact_patient_readmissions(fact_encounters, window_days=365)   # long enough to link some stays
+
+    stays = fact_encounters[fact_encounters["encounter_class"].eq("inpatient")].dropna(
+        subset=["patient_key", "start_datetime", "end_datetime"])
+    expected = {}
+    for stay in stays.itertuples():
+        later = stays[stays["patient_key"].eq(stay.patient_key) & stays["start_datetime"].ge(stay.end_datetime)
+                      & stays["encounter_id"].ne(stay.encounter_id)]
+        gap = (later["start_datetime"].min() - stay.end_datetime) / np.timedelta64(1, "D") if len(later) else None
+        expected[stay.encounter_id] = gap is not None and gap <= 365
+
+    assert fact["is_readmitted"].any()
+    assert dict(zip(fact["encounter_id"], fact["is_readmitted"])) == expected
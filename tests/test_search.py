@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+
+from api.core.search import ProviderSearchIndex, normalize
+from etl.search_index import build_provider_search_index, normalize_names
+
+PROVIDERS = [
+    # provider_key, provider_name, total_encounters
+    ("k1", "Dr. José Smith", 10),
+    ("k2", "Anna Smithson", 50),
+    ("k3", "Blacksmith Clinic", 5),
+    ("k4", "Li Wei", 20),
+    ("k5", "Maria Lopez", 1),
+]
+
+
+@pytest.fixture(scope="module")
+def index():
+    keys, names, encounters = zip(*PROVIDERS)
+    dim_providers = pd.DataFrame({"provider_key": keys, "provider_name": names, "speciality": "GP",
+                                  "organization_key": "o1"})
+    mart = pd.DataFrame({"provider_key": keys, "organization_name": "Org", "total_encounters": encounters})
+    tables = build_provider_search_index(dim_providers, mart)
+    return ProviderSearchIndex(tables["search_providers"], tables["search_provider_tokens"],
+                               tables["search_provider_grams"])
+
+
+def _search(index, query):
+    docs, _, kind = index.search(query)
+    return index.docs.column("provider_key").take(docs).to_pylist(), kind
+
+
+def test_query_and_index_normalization_agree():
+    names = ["Dr. José Smith", "ANNA-Smithson", "  Li   Wei ", "Zoë O'Brien"]
+    assert normalize_names(pd.Series(names)).tolist() == [normalize(name) for name in names]
+    assert normalize("Zoë O'Brien") == "zoe o brien"
+
+
+def test_whole_words_rank_above_prefixes_and_infixes(index):
+    # smith: a whole word (k1), a word prefix (k2), inside a word (k3)
+    assert _search(index, "smith") == (["k1", "k2", "k3"], "all_words")
+
+
+def test_every_query_word_must_match(index):
+    assert _search(index, "jose smith") == (["k1"], "all_words")
+    assert _search(index, "JOSÉ") == (["k1"], "all_words")
+
+
+def test_short_words_match_word_starts_only(index):
+    assert _search(index, "li") == (["k4"], "all_words")
+    assert _search(index, "ei")[0] == []   # inside "wei": too short for a 3-gram match
+
+
+def test_ties_go_to_the_provider_with_more_encounters(index):
+    # both are prefix matches of one word; k2 has more encounters
+    keys, _ = _search(index, "s")
+    assert keys == ["k2", "k1"]
+
+
+def test_typos_fall_back_to_fuzzy_matches(index):
+    keys, kind = _search(index, "smiht")
+    assert kind == "fuzzy" and "k1" in keys
+    assert _search(index, "qqqq") == ([], None)
+    assert _search(index, "  ") == ([], None)
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from api.core import sketches as api_sketches
+from etl.transform import sketches as etl_sketches
+
+
+def _digests(n_groups=6, rows=5000, seed=0):
+    """One cost digest per group, as the mart builders write them (groups of 1 to ~5000 values)."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"group": rng.zipf(1.5, rows) % n_groups, "cost": rng.lognormal(5, 1.5, rows)})
+    blobs = etl_sketches.sketch_columns(df, ["group"], {"cost_sketch": "cost"})["cost_sketch"]
+    return pa.array(blobs, type=pa.binary())
+
+
+def test_compress_is_the_same_in_the_etl_and_the_api():
+    rng = np.random.default_rng(1)
+    groups = rng.integers(0, 8, 20000)
+    means, weights = rng.lognormal(3, 1, 20000), rng.integers(1, 5, 20000).astype(np.float64)
+    for etl_part, api_part in zip(etl_sketches._compress(groups, means, weights),
+                                  api_sketches._compress(groups, means, weights)):
+        np.testing.assert_array_equal(etl_part, api_part)
+
+
+def test_decoders_agree_on_sliced_arrays():
+    blobs = _digests()
+    for sliced in (blobs, blobs[1:], blobs[2:5]):
+        rows, means, weights, minimum, maximum = etl_sketches._decode(sliced)
+        digests = api_sketches.Digests.decode(sliced)
+        np.testing.assert_array_equal(rows, digests.groups)
+        np.testing.assert_array_equal(means, digests.means)
+        np.testing.assert_array_equal(weights, digests.weights)
+        np.testing.assert_array_equal(minimum, digests.minimum)
+        np.testing.assert_array_equal(maximum, digests.maximum)
+
+
+def test_small_groups_keep_every_value():
+    rng = np.random.default_rng(2)
+    values = {0: rng.lognormal(5, 1, etl_sketches.COMPRESSION // 2), 1: rng.normal(10, 3, 7), 2: np.array([4.5])}
+    df = pd.DataFrame({"group": np.repeat(list(values), [len(v) for v in values.values()]),
+                       "cost": np.concatenate(list(values.values()))})
+    blobs = pa.array(etl_sketches.sketch_columns(df, ["group"], {"s": "cost"})["s"], type=pa.binary())
+
+    digests = api_sketches.Digests.decode(blobs)
+    ps = [0, 1, 25, 50, 90, 99.9, 100]
+    estimates = digests.percentiles(ps)
+    for group, group_values in values.items():
+        mine = digests.groups == group
+        np.testing.assert_array_equal(digests.means[mine], np.sort(group_values))
+        assert (digests.weights[mine] == 1).all()
+        np.testing.assert_allclose(estimates[group], np.percentile(group_values, ps, method="hazen"))
+
+
+def test_merged_digests_stay_exact_while_small_and_compress_when_large():
+    rng = np.random.default_rng(3)
+    small, large = rng.normal(0, 1, 40), rng.lognormal(3, 1, 20000)
+    df = pd.DataFrame({"batch": np.r_[np.zeros(20), np.ones(20), np.full(len(large), 2)].astype(int),
+                       "group": np.r_[np.zeros(40), np.ones(len(large))].astype(int),
+                       "cost": np.r_[small, large]})
+    partial = df.groupby(["batch", "group"]).size().reset_index()[["batch", "group"]]
+    partial["s"] = etl_sketches.sketch_columns(df, ["batch", "group"], {"s": "cost"})["s"]
+    merged = pa.array(etl_sketches.merge_sketch_columns(partial, ["group"], ["s"])["s"], type=pa.binary())
+
+    digests = api_sketches.Digests.decode(merged)
+    np.testing.assert_array_equal(digests.means[digests.groups == 0], np.sort(small))
+    assert digests.totals().tolist() == [40, len(large)]
+    assert (digests.groups == 1).sum() <= etl_sketches.COMPRESSION
+    p50 = digests.percentiles([50])[1, 0]
+    assert abs(p50 - np.median(large)) / np.median(large) < 0.02
@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate_raw
+from etl.transform import transform_all
+from etl.transform.out_of_core import DERIVED_TABLES
+from etl.validate import QUARANTINE_TABLE, validate
+
+
+@pytest.fixture(scope="module")
+def corrupted():
+    """A synthetic dataset with one negative-cost and one orphan inpatient encounter, and the same without them."""
+    raw = generate_raw(2000, seed=3)
+    encounters = raw["encounters"]
+    bad = list(encounters.index[encounters["encounter_class"].eq("inpatient")][:2])
+    encounters.loc[bad[0], "total_cost"] = -50
+    encounters.loc[bad[1], "patient_id"] = "no-such-patient"
+    clean = {**raw, "encounters": encounters.drop(index=bad).reset_index(drop=True)}
+    return raw, encounters.loc[bad, "encounter_id"].tolist(), clean
+
+
+def test_bad_rows_are_quarantined_with_their_children(corrupted):
+    raw, bad_ids, _ = corrupted
+    transformed = transform_all(raw)
+    tables, report = validate(transformed)
+
+    assert not tables["fact_encounters"]["encounter_id"].isin(bad_ids).any()
+    assert report["fact_encounters"]["quarantined"] == 2
+    quarantine = tables[QUARANTINE_TABLE]
+    assert set(quarantine.loc[quarantine["table_name"] == "fact_encounters", "row_key"]) == set(bad_ids)
+    children = transformed["fact_procedures"]["encounter_id"].isin(bad_ids).sum()
+    assert report["fact_procedures"]["quarantined"] == children
+
+
+def test_derived_tables_count_only_validated_rows(corrupted):
+    raw, _, clean = corrupted
+    tables, _ = validate(transform_all(raw))
+    expected = transform_all(clean)
+    for name in DERIVED_TABLES:
+        columns = [c for c in expected[name].columns if not c.endswith("_sketch")]
+        actual = tables[name][columns].sort_values(columns[:3]).reset_index(drop=True)
+        wanted = expected[name][columns].sort_values(columns[:3]).reset_index(drop=True)
+        pd.testing.assert_frame_equal(actual, wanted, check_dtype=False, obj=name)
+
+
+def test_sampled_validation_changes_nothing(corrupted):
+    raw, _, _ = corrupted
+    transformed = transform_all(raw)
+    tables, report = validate(transformed, sample=0.5)
+    assert QUARANTINE_TABLE not in tables
+    assert all(tables[name] is transformed[name] for name in transformed)
@@ -0,0 +1,52 @@
+import pandas as pd
+import pyarrow.parquet as pq
+
+from etl.load.warehouse import LocalWarehouse, load_tables
+from etl.transform.schema import TABLE_SCHEMAS
+
+
+def _frame(name, **columns):
+    """A contract-shaped DataFrame with the given columns; the others are null."""
+    n = len(next(iter(columns.values())))
+    return pd.DataFrame({column: columns.get(column, [None] * n) for column, _ in TABLE_SCHEMAS[name]["columns"]})
+
+
+def _encounters(ids, starts):
+    return _frame("fact_encounters", encounter_id=ids, start_datetime=pd.to_datetime(starts))
+
+
+def _warehouse_rows(root, name, column):
+    path = root / name
+    files = sorted(path.glob("*.parquet")) if path.is_dir() else [root / f"{name}.parquet"]
+    return sorted(v for f in files for v in pq.read_table(f).column(column).to_pylist())
+
+
+def test_merge_deletes_rows_that_left_the_batch(tmp_path):
+    january = ["2019-01-05", "2019-01-06", "2019-01-07"]
+    load_tables({"fact_encounters": _encounters(["a", "b", "c"], january)}, LocalWarehouse(tmp_path))
+    load_tables({"fact_encounters": _encounters(["a", "b"], january[:2])}, LocalWarehouse(tmp_path))
+    assert _warehouse_rows(tmp_path, "fact_encounters", "encounter_id") == ["a", "b"]
+
+
+def test_merge_drops_partitions_that_lost_every_row(tmp_path):
+    load_tables({"fact_encounters": _encounters(["a", "b"], ["2019-01-05", "2019-02-05"])}, LocalWarehouse(tmp_path))
+    load_tables({"fact_encounters": _encounters(["a"], ["2019-01-05"])}, LocalWarehouse(tmp_path))
+    assert _warehouse_rows(tmp_path, "fact_encounters", "encounter_id") == ["a"]
+    assert [p.name for p in (tmp_path / "fact_encounters").glob("*.parquet")] == ["201901.parquet"]
+    assert list(LocalWarehouse(tmp_path).load_state()["fact_encounters"]) == ["201901"]
+
+
+def test_merge_of_unpartitioned_table_deletes_rows(tmp_path):
+    load_tables({"dim_providers": _frame("dim_providers", provider_key=["k1", "k2"])}, LocalWarehouse(tmp_path))
+    load_tables({"dim_providers": _frame("dim_providers", provider_key=["k1"])}, LocalWarehouse(tmp_path))
+    assert _warehouse_rows(tmp_path, "dim_providers", "provider_key") == ["k1"]
+
+
+def test_unchanged_partitions_are_not_rewritten(tmp_path):
+    starts = ["2019-01-05", "2019-02-05"]
+    load_tables({"fact_encounters": _encounters(["a", "b"], starts)}, LocalWarehouse(tmp_path))
+    january = tmp_path / "fact_encounters" / "201901.parquet"
+    written = january.stat().st_mtime_ns
+    load_tables({"fact_encounters": _encounters(["a", "c"], starts)}, LocalWarehouse(tmp_path))
+    assert january.stat().st_mtime_ns == written
+    assert _warehouse_rows(tmp_path, "fact_encounters", "encounter_id") == ["a", "c"]